@@ -2,6 +2,7 @@ import os
 import sys
 import secrets
 import logging
+import click
 from flask_migrate import Migrate
 
 # Add the project root to Python path so the 'backend' package can be found
@@ -30,6 +31,10 @@ from backend.routes.delivery import delivery_bp
 from backend.routes.sucursales import sucursales_bp
 # Sprint 6
 from backend.routes.auditoria import auditoria_bp
+# Dashboard en tiempo real (registra handlers Socket.IO del namespace /dashboard)
+import backend.routes.dashboard_socket  # noqa: F401
+# Salas por usuario, sucursal y estación del namespace principal
+import backend.routes.salas_socket  # noqa: F401
 
 # ---------------------------------------------------------------------------
 # Logging configuration
@@ -61,6 +66,12 @@ def create_app():
         from flask import redirect, url_for
         return redirect(url_for('auth.login'))
 
+    # Detrás de nginx: IP real del cliente para rate limiting y logs
+    proxies = app.config.get('PROXIES_CONFIABLES', 0)
+    if proxies:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxies, x_proto=proxies)
+
     # Development settings
     if app.config.get('DEBUG') or os.getenv('FLASK_ENV') == 'development':
         app.config['DEBUG'] = True
@@ -75,7 +86,9 @@ def create_app():
     db.init_app(app)
     Migrate(app, db)
     login_manager.init_app(app)
-    socketio.init_app(app)
+    # Con varios procesos, los emits se reparten por la cola (Redis) a todos los workers
+    socketio.init_app(app, message_queue=app.config.get('SOCKETIO_MESSAGE_QUEUE') or None,
+                      async_mode=app.config.get('SOCKETIO_ASYNC_MODE') or None)
     csrf.init_app(app)
     limiter.init_app(app)
     cache.init_app(app)
@@ -202,10 +215,109 @@ def create_app():
         except Exception:
             pass
 
+        # Outbox de pagos: pendientes, errores y lag
+        outbox_info = {}
+        if db_ok:
+            try:
+                from backend.services.outbox import estado_outbox
+                outbox_info = estado_outbox()
+            except Exception:
+                db.session.rollback()
+
         return jf(status='ok' if db_ok else 'degraded', db=db_ok,
-                   pool=pool_info,
+                   pool=pool_info, outbox=outbox_info,
                    version=app.config.get('VERSION', '?')), 200 if db_ok else 503
 
+    # Rollup de ventas: backfill/reconstrucción desde el histórico
+    @app.cli.command('reconstruir-resumen-ventas')
+    @click.option('--desde', default=None, help='Fecha inicial YYYY-MM-DD (default: primera venta).')
+    @click.option('--hasta', default=None, help='Fecha final YYYY-MM-DD (default: hoy).')
+    def reconstruir_resumen_ventas_cmd(desde, hasta):
+        """Recalcula resumen_ventas_diarias a partir de sales/pagos."""
+        from datetime import date as _date
+        from backend.services.resumen_ventas import reconstruir_resumen
+        from backend.services.cache_reportes import invalidar_reportes_cerrados
+        filas = reconstruir_resumen(
+            _date.fromisoformat(desde) if desde else None,
+            _date.fromisoformat(hasta) if hasta else None,
+        )
+        invalidar_reportes_cerrados()
+        click.echo(f'Resumen de ventas reconstruido: {filas} filas.')
+
+    # Contadores KPI en Redis: reconstrucción desde sales y reporte de drift
+    @app.cli.command('reconciliar-kpis')
+    @click.option('--fecha', default=None, help='Día de negocio YYYY-MM-DD (default: hoy).')
+    @click.option('--sucursal', 'sucursales', multiple=True, type=int,
+                  help='Sucursal a revisar (repetible; default: todas).')
+    def reconciliar_kpis_cmd(fecha, sucursales):
+        """Compara los contadores KPI de Redis con sales/ordenes y los reescribe."""
+        from datetime import date as _date
+        from backend.services.contadores_kpi import reconciliar_kpis
+        reporte = reconciliar_kpis(
+            _date.fromisoformat(fecha) if fecha else None,
+            list(sucursales) or None,
+        )
+        for d in reporte:
+            suc = 'todas' if d['sucursal_id'] is None else d['sucursal_id']
+            click.echo(f"{d['fecha']} sucursal={suc} {d['campo']}: redis={d['redis']} sql={d['sql']}")
+        click.echo(f'Contadores KPI reconciliados: {len(reporte)} diferencias.')
+
+    @app.cli.command('recalcular-disponibilidad')
+    def recalcular_disponibilidad_cmd():
+        """Recalcula las unidades producibles de todos los productos con receta."""
+        from backend.services.disponibilidad import recalcular_disponibilidad
+        filas = recalcular_disponibilidad()
+        db.session.commit()
+        agotados = sum(1 for v in filas.values() if v and v['unidades'] == 0)
+        click.echo(f'Disponibilidad recalculada: {len(filas)} productos, {agotados} agotados.')
+
+    @app.cli.command('cerrar-inventario')
+    @click.option('--desde', default=None, help='Primer día YYYY-MM-DD (default: siguiente al último cierre).')
+    @click.option('--hasta', default=None, help='Último día YYYY-MM-DD (default: ayer).')
+    def cerrar_inventario_cmd(desde, hasta):
+        """Guarda el saldo de cada ingrediente al cierre de los días de negocio terminados."""
+        from datetime import date as _date
+        from backend.services.saldos_inventario import cerrar_dias
+        filas = cerrar_dias(
+            _date.fromisoformat(hasta) if hasta else None,
+            _date.fromisoformat(desde) if desde else None,
+        )
+        click.echo(f'Inventario cerrado: {filas} saldos.')
+
+    @app.cli.command('pronosticar-inventario')
+    def pronosticar_inventario_cmd():
+        """Recalcula el pronóstico de consumo y las compras sugeridas (cron nocturno)."""
+        from backend.services.pronostico_inventario import refrescar_pronostico
+        click.echo(f'Pronóstico de inventario: {refrescar_pronostico()} ingredientes.')
+
+    @app.cli.command('procesar-outbox')
+    @click.option('--reintentar-errores', is_flag=True, help='Regresa a la cola los eventos en error.')
+    def procesar_outbox_cmd(reintentar_errores):
+        """Procesa los eventos pendientes del outbox y muestra el lag."""
+        from backend.services.outbox import procesar_pendientes, reintentar_errores as _reintentar, estado_outbox
+        if reintentar_errores:
+            click.echo(f'Eventos regresados a la cola: {_reintentar()}')
+        total = 0
+        while True:
+            n = procesar_pendientes()
+            total += n
+            if not n:
+                break
+        estado = estado_outbox()
+        click.echo(f"Outbox: {total} procesados; pendientes={estado['pendientes']} "
+                   f"errores={estado['errores']} lag={estado['lag_seg']}s")
+
+    @app.cli.command('verificar-cola-cocina')
+    @click.option('--estacion', 'estaciones', multiple=True,
+                  help='Estación a revisar (repetible; default: todas).')
+    def verificar_cola_cocina_cmd(estaciones):
+        """Compara la cola de cocina con la base y publica las correcciones."""
+        from backend.services.cola_cocina import verificar_cola
+        diferencias = verificar_cola(list(estaciones) or None)
+        for d in diferencias:
+            click.echo(f"{d['estacion']} detalle={d['detalle_id']}: {d['tipo']}")
+        click.echo(f'Cola de cocina verificada: {len(diferencias)} diferencias.')
+
     logger.info('App creada — blueprints registrados.')
     return app
 
@@ -213,4 +325,6 @@ def create_app():
 app = create_app()
 
 if __name__ == "__main__":
+    from backend.services.outbox import programar_procesador
+    programar_procesador(app)
     socketio.run(app, debug=True, use_reloader=False, host='0.0.0.0', port=5005)
@@ -1,5 +1,6 @@
 # backend/extensions.py
 import os
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
 
 from flask_socketio import SocketIO
 from flask_login import LoginManager
@@ -12,6 +13,22 @@ from flask_limiter.util import get_remote_address
 from flask_caching import Cache
 from flask_session import Session
 
+
+def url_redis_db(numero, url=None):
+    """REDIS_URL apuntando a la base `numero`.
+
+    Reemplaza la base que ya traiga la URL (redis://host:6379/0 →
+    redis://host:6379/3) y conserva credenciales, puerto y query params;
+    en unix:// la base va en ?db=.
+    """
+    partes = urlsplit(url or os.getenv('REDIS_URL', 'redis://localhost:6379'))
+    if partes.scheme == 'unix':
+        query = dict(parse_qsl(partes.query))
+        query['db'] = str(numero)
+        return f'unix://{partes.path}?{urlencode(query)}'
+    return urlunsplit(partes._replace(path=f'/{numero}'))
+
+
 migrate = Migrate()
 login_manager = LoginManager()
 cors = CORS()
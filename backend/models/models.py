@@ -19,6 +19,7 @@ class Sucursal(db.Model):
     telefono = db.Column(db.String(20), nullable=True)
     activa = db.Column(db.Boolean, default=True)
     fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow)
+    hora_corte = db.Column(db.Integer, nullable=True)  # hora local 0-23 en que cierra el día de negocio
 
     usuarios = db.relationship('Usuario', backref='sucursal', lazy=True)
     mesas = db.relationship('Mesa', backref='sucursal', lazy=True)
@@ -150,6 +151,7 @@ class Orden(db.Model):
     es_para_llevar = db.Column(db.Boolean, default=False)
     canal = db.Column(db.String(30), default='local')  # local, uber_eats, rappi, didi_food
     tiempo_registro = db.Column(db.DateTime, default=datetime.utcnow)
+    fecha_negocio = db.Column(db.Date, nullable=True, index=True)  # día de negocio local (ver services/dia_negocio)
     fecha_pago = db.Column(db.DateTime, nullable=True)
     monto_recibido = db.Column(db.Numeric(10, 2), nullable=True)
     cambio = db.Column(db.Numeric(10, 2), nullable=True)
@@ -214,16 +216,24 @@ class Orden(db.Model):
 
 class OrdenDetalle(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    orden_id = db.Column(db.Integer, db.ForeignKey('orden.id'))
+    orden_id = db.Column(db.Integer, db.ForeignKey('orden.id'), index=True)
     producto_id = db.Column(db.Integer, db.ForeignKey('producto.id'))
     cantidad = db.Column(db.Integer, default=1)
     notas = db.Column(db.String(200))
     estado = db.Column(db.String(20), nullable=False, default='pendiente')
     entregado = db.Column(db.Boolean, default=False)
     precio_unitario = db.Column(db.Numeric(10, 2), nullable=True)
+    # Transiciones en cocina (UTC); ver services/tiempos_cocina
+    tiempo_enviado = db.Column(db.DateTime, nullable=True)
+    tiempo_listo = db.Column(db.DateTime, nullable=True)
+    tiempo_entregado = db.Column(db.DateTime, nullable=True)
 
     producto = db.relationship('Producto', backref='orden_detalles')
 
+    __table_args__ = (
+        db.Index('ix_orden_detalle_listo_producto', 'tiempo_listo', 'producto_id'),
+    )
+
     def to_dict(self):
         precio = float(self.precio_unitario) if self.precio_unitario is not None else float(self.producto.precio)
         return {
@@ -235,6 +245,9 @@ class OrdenDetalle(db.Model):
             'precio_unitario': precio,
             'producto': self.producto.to_dict(),
             'entregado': self.entregado,
+            'tiempo_enviado': self.tiempo_enviado.isoformat() if self.tiempo_enviado else None,
+            'tiempo_listo': self.tiempo_listo.isoformat() if self.tiempo_listo else None,
+            'tiempo_entregado': self.tiempo_entregado.isoformat() if self.tiempo_entregado else None,
         }
 
 
@@ -248,6 +261,7 @@ class Pago(db.Model):
     monto = db.Column(db.Numeric(10, 2), nullable=False)
     referencia = db.Column(db.String(100), nullable=True)
     fecha = db.Column(db.DateTime, default=datetime.utcnow)
+    fecha_negocio = db.Column(db.Date, nullable=True, index=True)
     registrado_por = db.Column(db.Integer, db.ForeignKey('usuario.id'), nullable=False)
 
     usuario = db.relationship('Usuario')
@@ -282,9 +296,82 @@ class RecetaDetalle(db.Model):
 
     __table_args__ = (
         db.UniqueConstraint('producto_id', 'ingrediente_id', name='uq_receta_prod_ing'),
+        # índice inverso ingrediente → productos (services/disponibilidad)
+        db.Index('ix_receta_ingrediente_producto', 'ingrediente_id', 'producto_id'),
     )
 
 
+class SubRecetaDetalle(db.Model):
+    """Cuánto de un componente lleva una unidad de ingrediente preparado.
+
+    El componente puede ser otro preparado (salsa → base de chiles → chiles);
+    backend.services.subrecetas valida que no haya ciclos.
+    """
+    __tablename__ = 'subreceta_detalle'
+    id = db.Column(db.Integer, primary_key=True)
+    preparado_id = db.Column(db.Integer, db.ForeignKey('ingredientes.id'), nullable=False)
+    componente_id = db.Column(db.Integer, db.ForeignKey('ingredientes.id'), nullable=False)
+    cantidad_por_unidad = db.Column(db.Numeric(12, 4), nullable=False)
+
+    preparado = db.relationship('Ingrediente', foreign_keys=[preparado_id], backref='subreceta')
+    componente = db.relationship('Ingrediente', foreign_keys=[componente_id])
+
+    __table_args__ = (
+        db.UniqueConstraint('preparado_id', 'componente_id', name='uq_subreceta_prep_comp'),
+        # índice inverso componente → preparados (ancestros a recalcular)
+        db.Index('ix_subreceta_componente_preparado', 'componente_id', 'preparado_id'),
+    )
+
+
+class ExplosionPreparado(db.Model):
+    """Subreceta de un preparado aplanada a ingredientes base.
+
+    Se recalcula en backend.services.subrecetas solo para el preparado que
+    cambió y sus ancestros.
+    """
+    __tablename__ = 'explosion_preparados'
+    preparado_id = db.Column(db.Integer, db.ForeignKey('ingredientes.id'), primary_key=True)
+    ingrediente_id = db.Column(db.Integer, db.ForeignKey('ingredientes.id'), primary_key=True)
+    cantidad_por_unidad = db.Column(db.Numeric(14, 6), nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_explosion_ingrediente', 'ingrediente_id'),
+    )
+
+
+class CostoProducto(db.Model):
+    """Costo de receta materializado por producto (Σ cantidad × costo_unitario).
+
+    Se recalcula en backend.services.costos al cambiar una receta o el costo
+    de un ingrediente. Solo existen filas para productos con receta.
+    """
+    __tablename__ = 'costos_producto'
+    producto_id = db.Column(db.Integer, db.ForeignKey('producto.id'), primary_key=True)
+    costo = db.Column(db.Numeric(12, 4), nullable=False, default=0)
+    num_ingredientes = db.Column(db.Integer, nullable=False, default=0)
+    actualizado = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    producto = db.relationship('Producto', backref=db.backref(
+        'costo_materializado', uselist=False, cascade='all, delete-orphan'))
+
+
+class DisponibilidadProducto(db.Model):
+    """Unidades que se pueden preparar con el stock actual (mínimo sobre la receta).
+
+    Se recalcula en backend.services.disponibilidad al mover stock o cambiar
+    una receta. Solo existen filas para productos con receta; sin fila = sin
+    límite.
+    """
+    __tablename__ = 'disponibilidad_productos'
+    producto_id = db.Column(db.Integer, db.ForeignKey('producto.id'), primary_key=True)
+    unidades = db.Column(db.Integer, nullable=False, default=0)
+    stock_bajo = db.Column(db.Boolean, nullable=False, default=False)  # algún ingrediente <= stock_minimo
+    actualizado = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    producto = db.relationship('Producto', backref=db.backref(
+        'disponibilidad', uselist=False, cascade='all, delete-orphan'))
+
+
 class MovimientoInventario(db.Model):
     """Registro de entradas, salidas, mermas y ajustes de stock."""
     __tablename__ = 'movimientos_inventario'
@@ -297,9 +384,38 @@ class MovimientoInventario(db.Model):
     orden_id = db.Column(db.Integer, db.ForeignKey('orden.id'), nullable=True)
     usuario_id = db.Column(db.Integer, db.ForeignKey('usuario.id'), nullable=False)
     fecha = db.Column(db.DateTime, default=datetime.utcnow)
+    fecha_negocio = db.Column(db.Date, nullable=True, index=True)
 
     usuario = db.relationship('Usuario')
 
+    __table_args__ = (
+        db.Index('ix_movimientos_fecha', 'fecha'),  # stock al momento (services/saldos_inventario)
+    )
+
+
+class SaldoInventario(db.Model):
+    """Existencia de un ingrediente al cierre de un día de negocio.
+
+    Se genera en backend.services.saldos_inventario (flask cerrar-inventario).
+    Los diarios se depuran después de SALDOS_DIAS_RETENCION; los de fin de
+    mes (cierre_mes) se conservan para la valuación.
+    """
+    __tablename__ = 'saldos_inventario'
+    ingrediente_id = db.Column(db.Integer, db.ForeignKey('ingredientes.id'), primary_key=True)
+    fecha = db.Column(db.Date, primary_key=True)
+    sucursal_id = db.Column(db.Integer, db.ForeignKey('sucursales.id'), nullable=True)
+    cantidad = db.Column(db.Numeric(14, 4), nullable=False, default=0)
+    costo_unitario = db.Column(db.Numeric(10, 2), nullable=False, default=0)
+    valor = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    cierre_mes = db.Column(db.Boolean, nullable=False, default=False)
+    creado = db.Column(db.DateTime, default=datetime.utcnow)
+
+    ingrediente = db.relationship('Ingrediente')
+
+    __table_args__ = (
+        db.Index('ix_saldos_fecha', 'fecha', 'sucursal_id'),
+    )
+
 
 # -------------------- AUDITORÍA (Sprint 6 - Item 3.5) --------------------
 
@@ -315,6 +431,7 @@ class AuditLog(db.Model):
     ip_address = db.Column(db.String(45), nullable=True)
     user_agent = db.Column(db.String(300), nullable=True)
     fecha = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    fecha_negocio = db.Column(db.Date, nullable=True, index=True)
 
     usuario = db.relationship('Usuario', backref='audit_logs')
 
@@ -393,6 +510,7 @@ class Sale(db.Model):
     __tablename__ = 'sales'
     id = db.Column(db.Integer, primary_key=True)
     fecha_hora = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    fecha_negocio = db.Column(db.Date, nullable=True, index=True)
     mesa_id = db.Column(db.Integer, db.ForeignKey('mesa.id'), nullable=True)
     usuario_id = db.Column(db.Integer, db.ForeignKey('usuario.id'), nullable=False)
     sucursal_id = db.Column(db.Integer, db.ForeignKey('sucursales.id'), nullable=True)
@@ -402,6 +520,10 @@ class Sale(db.Model):
     sucursal = db.relationship('Sucursal', backref='ventas')
     items = db.relationship('SaleItem', backref='sale', cascade='all, delete-orphan')
 
+    __table_args__ = (
+        db.Index('ix_sales_sucursal_fecha_negocio', 'sucursal_id', 'fecha_negocio'),
+    )
+
 
 class SaleItem(db.Model):
     __tablename__ = 'sale_items'
@@ -414,6 +536,37 @@ class SaleItem(db.Model):
     producto = db.relationship('Producto')
 
 
+# -------------------- RESUMEN DIARIO DE VENTAS (Reportes) --------------------
+
+class ResumenVentaDiaria(db.Model):
+    """Acumulado de ventas por sucursal × día × dimensión.
+
+    dimension='total' lleva una sola fila por día (clave=''); 'producto' y
+    'mesero' usan el id como clave, 'hora' la hora 0-23 y 'metodo' el método
+    de pago. Los reportes suman estas filas en lugar de re-escanear sales.
+    """
+    __tablename__ = 'resumen_ventas_diarias'
+    id = db.Column(db.Integer, primary_key=True)
+    fecha = db.Column(db.Date, nullable=False)
+    sucursal_id = db.Column(db.Integer, db.ForeignKey('sucursales.id'), nullable=True)
+    dimension = db.Column(db.String(20), nullable=False)  # total, producto, mesero, hora, metodo
+    clave = db.Column(db.String(50), nullable=False, default='')
+    num_ventas = db.Column(db.Integer, nullable=False, default=0)
+    cantidad = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('ix_resumen_dim_fecha_suc', 'dimension', 'fecha', 'sucursal_id'),
+    )
+
+
+# Una fila por (día, sucursal, dimensión, clave); sucursal NULL = 0 para que
+# "sin sucursal" también sea única. Es la llave del upsert de resumen_ventas.
+db.Index('uq_resumen_dia_clave', ResumenVentaDiaria.fecha,
+         db.func.coalesce(ResumenVentaDiaria.sucursal_id, db.literal_column('0')),
+         ResumenVentaDiaria.dimension, ResumenVentaDiaria.clave, unique=True)
+
+
 # -------------------- DELIVERY (Fase 4 - Item 21) --------------------
 
 class DeliveryOrden(db.Model):
@@ -441,20 +594,186 @@ class DeliveryOrden(db.Model):
     )
 
 
+# -------------------- OUTBOX (efectos posteriores al pago) --------------------
+
+class EventoOutbox(db.Model):
+    """Evento a procesar fuera del request (backend.services.outbox).
+
+    Se inserta en la misma transacción que lo origina; el procesador aplica
+    sus efectos y lo marca 'procesado' en una sola transacción.
+    """
+    __tablename__ = 'outbox_eventos'
+    id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(50), nullable=False)  # orden_pagada
+    datos = db.Column(db.Text, nullable=False)  # JSON
+    estado = db.Column(db.String(20), nullable=False, default='pendiente')  # pendiente, procesado, error
+    intentos = db.Column(db.Integer, nullable=False, default=0)
+    ultimo_error = db.Column(db.Text, nullable=True)
+    creado = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    disponible = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # siguiente intento
+    procesado = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_outbox_estado_disponible', 'estado', 'disponible'),
+    )
+
+
+# -------------------- DÍA DE NEGOCIO (fecha_negocio) --------------------
+
+def _sucursal_de(connection, modelo, id_):
+    if id_ is None:
+        return None
+    return connection.execute(
+        db.select(modelo.sucursal_id).where(modelo.id == id_)
+    ).scalar()
+
+
+def _asignar_fecha_negocio(momento_attr, sucursal_fn):
+    """before_insert: fija el timestamp y deriva fecha_negocio si no viene dada."""
+    def listener(mapper, connection, target):
+        from backend.services.dia_negocio import dia_negocio
+        if target.fecha_negocio is not None:
+            return
+        momento = getattr(target, momento_attr) or datetime.utcnow()
+        setattr(target, momento_attr, momento)
+        target.fecha_negocio = dia_negocio(momento, sucursal_fn(connection, target), connection)
+    return listener
+
+
+db.event.listen(Orden, 'before_insert', _asignar_fecha_negocio(
+    'tiempo_registro', lambda conn, t: t.sucursal_id))
+db.event.listen(Sale, 'before_insert', _asignar_fecha_negocio(
+    'fecha_hora', lambda conn, t: t.sucursal_id))
+db.event.listen(Pago, 'before_insert', _asignar_fecha_negocio(
+    'fecha', lambda conn, t: _sucursal_de(conn, Orden, t.orden_id)))
+db.event.listen(MovimientoInventario, 'before_insert', _asignar_fecha_negocio(
+    'fecha', lambda conn, t: _sucursal_de(conn, Ingrediente, t.ingrediente_id)))
+db.event.listen(AuditLog, 'before_insert', _asignar_fecha_negocio(
+    'fecha', lambda conn, t: None))
+
+
+# -------------------- TIEMPOS DE COCINA (orden_detalle) --------------------
+
+ESTADOS_ORDEN_EN_COCINA = ('enviado', 'en_preparacion', 'recibido', 'lista_para_entregar')
+
+
+def _detalle_estado_cambia(target, valor, anterior, initiator):
+    """Sella tiempo_listo / tiempo_entregado en la primera transición."""
+    if valor == anterior:
+        return
+    ahora = datetime.utcnow()
+    if valor == 'listo' and target.tiempo_listo is None:
+        target.tiempo_listo = ahora
+    elif valor == 'entregado' and target.tiempo_entregado is None:
+        target.tiempo_entregado = ahora
+
+
+def _orden_estado_cambia(target, valor, anterior, initiator):
+    """Al enviar la orden a cocina sella tiempo_enviado de sus detalles."""
+    if valor != 'enviado' or anterior == 'enviado' or target.id is None:
+        return
+    ahora = datetime.utcnow()
+    for detalle in target.detalles:
+        if detalle.tiempo_enviado is None:
+            detalle.tiempo_enviado = ahora
+
+
+def _detalle_before_insert(mapper, connection, target):
+    """Detalle agregado a una orden que ya está en cocina: enviado desde ya."""
+    if target.tiempo_enviado is not None or target.orden_id is None:
+        return
+    estado = connection.execute(
+        db.select(Orden.estado).where(Orden.id == target.orden_id)
+    ).scalar()
+    if estado in ESTADOS_ORDEN_EN_COCINA:
+        target.tiempo_enviado = datetime.utcnow()
+
+
+db.event.listen(OrdenDetalle.estado, 'set', _detalle_estado_cambia)
+db.event.listen(Orden.estado, 'set', _orden_estado_cambia)
+db.event.listen(OrdenDetalle, 'before_insert', _detalle_before_insert)
+
+
 # -------------------- HELPER: descontar inventario al pagar --------------------
 
+def descontar_inventario_por_ordenes(orden_ids, usuario_id, momento=None):
+    """Descuenta stock según receta estándar de todo lo vendido en las órdenes.
+
+    Los preparados se descuentan como sus ingredientes base
+    (subrecetas.receta_explotada). Consumo por (orden, ingrediente) en un
+    solo agregado SQL; el stock se
+    descuenta con UPDATE stock_actual = stock_actual - x (atómico, sin
+    perder descuentos concurrentes) y los movimientos 'salida_venta' se
+    insertan en bloque, uno por orden × ingrediente.
+
+    Returns:
+        número de movimientos registrados
+    """
+    from sqlalchemy import func, bindparam
+    from backend.services.dia_negocio import dia_negocio
+    from backend.services.subrecetas import receta_explotada
+    from backend.services.saldos_inventario import ajustar_saldos
+
+    orden_ids = list(orden_ids)
+    if not orden_ids:
+        return 0
+    receta = receta_explotada()
+    consumo = db.session.query(
+        OrdenDetalle.orden_id,
+        receta.c.ingrediente_id,
+        Ingrediente.sucursal_id,
+        func.sum(receta.c.cantidad_por_unidad * OrdenDetalle.cantidad),
+    ).join(receta, receta.c.producto_id == OrdenDetalle.producto_id) \
+        .join(Ingrediente, Ingrediente.id == receta.c.ingrediente_id) \
+        .filter(OrdenDetalle.orden_id.in_(orden_ids)) \
+        .group_by(OrdenDetalle.orden_id, receta.c.ingrediente_id, Ingrediente.sucursal_id) \
+        .all()
+    if not consumo:
+        return 0
+
+    por_ingrediente = {}
+    for _orden_id, ingrediente_id, _suc, cantidad in consumo:
+        por_ingrediente[ingrediente_id] = por_ingrediente.get(ingrediente_id, 0) + cantidad
+
+    # Orden fijo por id: dos descuentos concurrentes bloquean filas en el mismo orden
+    ingredientes = Ingrediente.__table__
+    db.session.execute(
+        ingredientes.update()
+        .where(ingredientes.c.id == bindparam('b_id'))
+        .values(stock_actual=ingredientes.c.stock_actual - bindparam('b_consumo')),
+        [{'b_id': i, 'b_consumo': por_ingrediente[i]} for i in sorted(por_ingrediente)],
+    )
+
+    momento = momento or datetime.utcnow()
+    dias = {}  # sucursal_id → fecha_negocio (el listener before_insert no corre en bloque)
+    for _orden_id, _ing, suc, _cant in consumo:
+        if suc not in dias:
+            dias[suc] = dia_negocio(momento, suc, db.session.connection())
+    db.session.execute(MovimientoInventario.__table__.insert(), [{
+        'ingrediente_id': ingrediente_id,
+        'tipo': 'salida_venta',
+        'cantidad': cantidad,
+        'orden_id': orden_id,
+        'usuario_id': usuario_id,
+        'motivo': f'Venta orden #{orden_id}',
+        'fecha': momento,
+        'fecha_negocio': dias[suc],
+    } for orden_id, ingrediente_id, suc, cantidad in consumo])
+
+    # Ventas procesadas después del cierre de su día: corregir los saldos ya cerrados
+    netos = {}
+    for _orden_id, ingrediente_id, suc, cantidad in consumo:
+        clave = (ingrediente_id, dias[suc])
+        netos[clave] = netos.get(clave, 0) - cantidad
+    ajustar_saldos(netos)
+
+    # Ingredientes ya cargados en la sesión: releer su stock
+    for obj in list(db.session.identity_map.values()):
+        if isinstance(obj, Ingrediente) and obj.id in por_ingrediente:
+            db.session.expire(obj, ['stock_actual'])
+    return len(consumo)
+
+
 def descontar_inventario_por_orden(orden, usuario_id):
     """Descuenta stock de ingredientes según receta estándar de cada producto vendido."""
-    for detalle in orden.detalles:
-        for receta in detalle.producto.receta_items:
-            cantidad_total = receta.cantidad_por_unidad * detalle.cantidad
-            receta.ingrediente.stock_actual -= cantidad_total
-            mov = MovimientoInventario(
-                ingrediente_id=receta.ingrediente_id,
-                tipo='salida_venta',
-                cantidad=cantidad_total,
-                orden_id=orden.id,
-                usuario_id=usuario_id,
-                motivo=f'Venta orden #{orden.id}',
-            )
-            db.session.add(mov)
+    return descontar_inventario_por_ordenes([orden.id], usuario_id)
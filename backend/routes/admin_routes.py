@@ -6,10 +6,15 @@ from backend.extensions import db
 from backend.services.sanitizer import sanitizar_texto, sanitizar_email
 from backend.models.models import Sale, SaleItem, Producto, Mesa, CorteCaja, Usuario, Categoria, Estacion, Pago, Orden, Ingrediente, OrdenDetalle
 from backend.services.password_policy import validar_password
+from backend.services.dia_negocio import hoy_negocio, ordenes_pagadas_en
+from backend.services.cache_reportes import cache_reporte
+from backend.services.dashboard import snapshot_dashboard, etag_snapshot, rango_periodo
+from backend.services.contadores_kpi import kpis_dia, top_productos_dia
+from backend.services.catalogo_menu import invalidar_menu
 from sqlalchemy.orm import joinedload
 from sqlalchemy import func
 from werkzeug.security import generate_password_hash
-from datetime import date, datetime, timedelta
+from datetime import datetime, timedelta
 from flask_login import current_user
 
 logger = logging.getLogger(__name__)
@@ -18,18 +23,23 @@ admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
 
 def _period_range():
-    """Return (start_date, end_date) tuple from ?period= query param.
+    """Return (start_date, end_date) business-day tuple from ?period= query param.
     Supports: today (default), yesterday, week, month.
     """
-    period = request.args.get('period', 'today')
-    hoy = date.today()
-    if period == 'yesterday':
-        return hoy - timedelta(days=1), hoy - timedelta(days=1)
-    elif period == 'week':
-        return hoy - timedelta(days=6), hoy
-    elif period == 'month':
-        return hoy - timedelta(days=29), hoy
-    return hoy, hoy  # today
+    return rango_periodo(request.args.get('period', 'today'), hoy_negocio(getattr(g, 'sucursal_id', None)))
+
+
+def _kpis_hoy(inicio, fin):
+    """Contadores Redis cuando el periodo es solo el día en curso; None si no aplica."""
+    suc_id = getattr(g, 'sucursal_id', None)
+    if inicio == fin == hoy_negocio(suc_id):
+        return kpis_dia(suc_id, inicio)
+    return None
+
+
+def _rango_7dias():
+    hoy = hoy_negocio(getattr(g, 'sucursal_id', None))
+    return hoy - timedelta(days=6), hoy
 
 
 @admin_bp.route('/dashboard', methods=['GET'])
@@ -74,50 +84,65 @@ def crear_usuario():
 
 @admin_bp.route('/api/dashboard/ventas_hoy')
 @login_required(roles=['admin','superadmin'])
+@cache_reporte(_period_range)
 def api_ventas_hoy():
     inicio, fin = _period_range()
+    kpis = _kpis_hoy(inicio, fin)
+    if kpis is not None:
+        return jsonify({'ventasHoy': kpis['ventas']})
     q = filtrar_por_sucursal(
         db.session.query(db.func.sum(Sale.total))
-        .filter(db.func.date(Sale.fecha_hora) >= inicio)
-        .filter(db.func.date(Sale.fecha_hora) <= fin), Sale,
+        .filter(Sale.fecha_negocio >= inicio)
+        .filter(Sale.fecha_negocio <= fin), Sale,
     )
     total = q.scalar() or 0
     return jsonify({'ventasHoy': float(total)})
 
 @admin_bp.route('/api/dashboard/ordenes_hoy')
 @login_required(roles=['admin','superadmin'])
+@cache_reporte(_period_range)
 def api_ordenes_hoy():
     inicio, fin = _period_range()
+    kpis = _kpis_hoy(inicio, fin)
+    if kpis is not None:
+        return jsonify({'ordenesHoy': kpis['ordenes']})
     count = filtrar_por_sucursal(
-        Sale.query.filter(db.func.date(Sale.fecha_hora) >= inicio)
-        .filter(db.func.date(Sale.fecha_hora) <= fin), Sale,
+        Sale.query.filter(Sale.fecha_negocio >= inicio)
+        .filter(Sale.fecha_negocio <= fin), Sale,
     ).count()
     return jsonify({'ordenesHoy': count})
 
 @admin_bp.route('/api/dashboard/ticket_promedio')
 @login_required(roles=['admin','superadmin'])
+@cache_reporte(_period_range)
 def api_ticket_promedio():
     inicio, fin = _period_range()
-    ventas = filtrar_por_sucursal(
-        Sale.query.filter(db.func.date(Sale.fecha_hora) >= inicio)
-        .filter(db.func.date(Sale.fecha_hora) <= fin), Sale,
-    ).all()
-    if not ventas:
-        return jsonify({'ticketPromedio': 0})
-    promedio = sum(v.total for v in ventas) / len(ventas)
-    return jsonify({'ticketPromedio': float(promedio)})
+    kpis = _kpis_hoy(inicio, fin)
+    if kpis is not None:
+        return jsonify({'ticketPromedio': kpis['ticket']})
+    promedio = filtrar_por_sucursal(
+        db.session.query(func.avg(Sale.total))
+        .filter(Sale.fecha_negocio >= inicio)
+        .filter(Sale.fecha_negocio <= fin), Sale,
+    ).scalar()
+    return jsonify({'ticketPromedio': float(promedio or 0)})
 
 @admin_bp.route('/api/dashboard/top_productos')
 @login_required(roles=['admin','superadmin'])
+@cache_reporte(_period_range)
 def api_top_productos():
     inicio, fin = _period_range()
+    if inicio == fin == hoy_negocio(getattr(g, 'sucursal_id', None)):
+        top = top_productos_dia(getattr(g, 'sucursal_id', None), inicio)
+        if top is not None:
+            return jsonify({'labels': [t[0] for t in top], 'data': [t[1] for t in top]})
     results = db.session.query(
         Producto.nombre,
         db.func.sum(SaleItem.cantidad).label('cantidad')
     ).join(SaleItem, SaleItem.producto_id == Producto.id) \
      .join(Sale, SaleItem.sale_id == Sale.id) \
-     .filter(db.func.date(Sale.fecha_hora) >= inicio) \
-     .filter(db.func.date(Sale.fecha_hora) <= fin) \
+     .filter(Sale.fecha_negocio >= inicio) \
+     .filter(Sale.fecha_negocio <= fin) \
      .filter(Sale.sucursal_id == g.sucursal_id if getattr(g, 'sucursal_id', None) else True) \
      .group_by(Producto.id) \
      .order_by(db.desc('cantidad')) \
@@ -185,13 +210,16 @@ def api_alertas_stock():
 
 @admin_bp.route('/api/dashboard/propinas_hoy')
 @login_required(roles=['admin','superadmin'])
+@cache_reporte(_period_range)
 def api_propinas_hoy():
     """Total de propinas del período."""
     inicio, fin = _period_range()
+    kpis = _kpis_hoy(inicio, fin)
+    if kpis is not None:
+        return jsonify({'propinas': kpis['propinas']})
     q = filtrar_por_sucursal(
         db.session.query(func.sum(Orden.propina)).filter(
-            func.date(Orden.fecha_pago) >= inicio,
-            func.date(Orden.fecha_pago) <= fin,
+            Orden.id.in_(ordenes_pagadas_en(inicio, fin)),
             Orden.propina > 0
         ), Orden
     )
@@ -221,17 +249,17 @@ def api_ultimo_corte():
 
 @admin_bp.route('/api/dashboard/ventas_7dias')
 @login_required(roles=['admin','superadmin'])
+@cache_reporte(_rango_7dias)
 def api_ventas_7dias():
     """Ventas diarias de los últimos 7 días."""
-    hoy = date.today()
-    inicio = hoy - timedelta(days=6)
+    inicio, hoy = _rango_7dias()
     results = filtrar_por_sucursal(
         db.session.query(
-            func.date(Sale.fecha_hora).label('dia'),
+            Sale.fecha_negocio.label('dia'),
             func.sum(Sale.total).label('total')
-        ).filter(func.date(Sale.fecha_hora) >= inicio)
-        .group_by(func.date(Sale.fecha_hora))
-        .order_by(func.date(Sale.fecha_hora)), Sale
+        ).filter(Sale.fecha_negocio >= inicio)
+        .group_by(Sale.fecha_negocio)
+        .order_by(Sale.fecha_negocio), Sale
     ).all()
 
     # Fill missing days with 0
@@ -268,6 +296,19 @@ def api_actividad_reciente():
         })
     return jsonify({'items': items})
 
+
+@admin_bp.route('/api/dashboard/snapshot')
+@login_required(roles=['admin','superadmin'])
+def api_dashboard_snapshot():
+    """Todos los KPIs del dashboard en una respuesta; 304 si no cambiaron."""
+    inicio, fin = _period_range()
+    suc_id = getattr(g, 'sucursal_id', None)
+    snapshot = snapshot_dashboard(inicio, fin, hoy_negocio(suc_id), suc_id)
+    resp = jsonify(snapshot)
+    resp.set_etag(etag_snapshot(snapshot))
+    resp.headers['Cache-Control'] = 'private, no-cache'
+    return resp.make_conditional(request)
+
 # --- Usuarios CRUD ---
 @admin_bp.route('/usuarios')
 @login_required(roles=['superadmin'])
@@ -347,6 +388,7 @@ def producto_nuevo():
         )
         db.session.add(p)
         db.session.commit()
+        invalidar_menu()
         flash('Producto creado', 'success')
         return redirect(url_for('admin.lista_productos'))
     categorias = Categoria.query.order_by(Categoria.nombre).all()
@@ -369,6 +411,7 @@ def producto_editar(id):
         p.categoria_id = int(request.form['categoria_id'])
         p.estacion_id = int(request.form['estacion_id'])
         db.session.commit()
+        invalidar_menu()
         flash('Producto actualizado', 'success')
         return redirect(url_for('admin.lista_productos'))
     categorias = Categoria.query.order_by(Categoria.nombre).all()
@@ -386,6 +429,7 @@ def producto_eliminar(id):
     p = Producto.query.get_or_404(id)
     db.session.delete(p)
     db.session.commit()
+    invalidar_menu()
     flash('Producto eliminado', 'success')
     return redirect(url_for('admin.lista_productos'))
 
@@ -451,17 +495,17 @@ def mesa_guardar_posicion(id):
 @admin_bp.route('/corte-caja', methods=['GET', 'POST'])
 @login_required(roles=['superadmin'])
 def corte_caja():
-    hoy = date.today()
+    hoy = hoy_negocio(getattr(g, 'sucursal_id', None))
 
     # Totales de venta del día (filtrado por sucursal)
     sale_q = filtrar_por_sucursal(
         db.session.query(func.sum(Sale.total)).filter(
-            func.date(Sale.fecha_hora) == hoy
+            Sale.fecha_negocio == hoy
         ), Sale,
     )
     total = sale_q.scalar() or Decimal('0')
     count = filtrar_por_sucursal(
-        Sale.query.filter(func.date(Sale.fecha_hora) == hoy), Sale,
+        Sale.query.filter(Sale.fecha_negocio == hoy), Sale,
     ).count()
     promedio = (float(total) / count) if count else 0
 
@@ -469,7 +513,7 @@ def corte_caja():
     pago_q = db.session.query(
         Pago.metodo,
         func.sum(Pago.monto).label('total'),
-    ).filter(func.date(Pago.fecha) == hoy)
+    ).filter(Pago.fecha_negocio == hoy)
     # Filtrar pagos por sucursal via Sale
     suc_id = getattr(g, 'sucursal_id', None)
     if suc_id is not None:
@@ -500,7 +544,7 @@ def corte_caja():
     # Propinas del día (Sprint 6 — 3.6)
     propinas_q = db.session.query(func.sum(Orden.propina)).filter(
         Orden.estado == 'pagada',
-        func.date(Orden.fecha_pago) == hoy,
+        Orden.id.in_(ordenes_pagadas_en(hoy, hoy)),
     )
     if suc_id is not None:
         propinas_q = propinas_q.filter(Orden.sucursal_id == suc_id)
@@ -562,26 +606,26 @@ def imprimir_corte(corte_id):
 @admin_bp.route('/corte-caja/pdf')
 @login_required(roles=['superadmin'])
 def export_corte_pdf():
-    """Exporta corte de caja del día a PDF."""
+    """Exporta corte de caja del día a PDF (render en segundo plano)."""
     from datetime import datetime as dt
-    from backend.services.pdf_generator import generar_pdf
+    from backend.services.pdf_generator import encolar_pdf, respuesta_pdf
 
-    hoy = date.today()
+    hoy = hoy_negocio(getattr(g, 'sucursal_id', None))
     sale_q = filtrar_por_sucursal(
-        db.session.query(func.sum(Sale.total)).filter(func.date(Sale.fecha_hora) == hoy), Sale)
+        db.session.query(func.sum(Sale.total)).filter(Sale.fecha_negocio == hoy), Sale)
     total = sale_q.scalar() or Decimal('0')
-    count = filtrar_por_sucursal(Sale.query.filter(func.date(Sale.fecha_hora) == hoy), Sale).count()
+    count = filtrar_por_sucursal(Sale.query.filter(Sale.fecha_negocio == hoy), Sale).count()
 
     pago_q = db.session.query(Pago.metodo, func.sum(Pago.monto).label('total'),
                                func.count(Pago.id).label('cantidad')
-                               ).filter(func.date(Pago.fecha) == hoy)
+                               ).filter(Pago.fecha_negocio == hoy)
     suc_id = getattr(g, 'sucursal_id', None)
     if suc_id is not None:
         pago_q = pago_q.join(Orden, Pago.orden_id == Orden.id).filter(Orden.sucursal_id == suc_id)
     pagos_hoy = pago_q.group_by(Pago.metodo).all()
 
     propinas_q = db.session.query(func.sum(Orden.propina)).filter(
-        Orden.estado == 'pagada', func.date(Orden.fecha_pago) == hoy)
+        Orden.estado == 'pagada', Orden.id.in_(ordenes_pagadas_en(hoy, hoy)))
     if suc_id is not None:
         propinas_q = propinas_q.filter(Orden.sucursal_id == suc_id)
 
@@ -593,12 +637,8 @@ def export_corte_pdf():
         'pagos_por_metodo': pagos_hoy,
     }
 
-    pdf = generar_pdf('pdf/corte_caja.html', fecha=str(hoy), resumen=resumen, now=dt.now())
-    if pdf:
-        return Response(pdf, mimetype='application/pdf',
-                        headers={'Content-Disposition': f'attachment;filename=corte_caja_{hoy}.pdf'})
-    flash('Error al generar PDF.', 'danger')
-    return redirect(url_for('admin.corte_caja'))
+    clave, estado = encolar_pdf('pdf/corte_caja.html', fecha=str(hoy), resumen=resumen, now=dt.now())
+    return respuesta_pdf(clave, estado, f'corte_caja_{hoy}.pdf')
 
 
 from backend.routes.meseros import meseros_bp
@@ -1,7 +1,11 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from backend.models.models import Orden, OrdenDetalle, Producto
-from backend.extensions import db, socketio
+from backend.extensions import db
 from backend.utils import obtener_ordenes_por_estacion, verificar_orden_completa, login_required
+from backend.services.kds import publicar_kds, cambios_orden
+from backend.services.salas import emitir, salas_orden
+from backend.services.eta_cocina import publicar_etas
+from backend.services.disponibilidad import unidades_disponibles
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
@@ -53,6 +57,8 @@ def marcar_detalle_listo(orden_id, detalle_id):
     detalle = OrdenDetalle.query.get_or_404(detalle_id)
     detalle.estado = 'listo'
     db.session.commit()
+    publicar_kds([('remove', detalle)])
+    publicar_etas(detalle.orden.sucursal_id)
     verificar_orden_completa(orden_id)
     return jsonify({'message': 'Item marcado como listo.'}), 200
 
@@ -62,6 +68,7 @@ def pagar_orden(orden_id):
     orden = Orden.query.get_or_404(orden_id)
     orden.estado = 'pagado'
     db.session.commit()
+    publicar_kds(cambios_orden(orden))
     return jsonify({'message': 'Orden pagada.'}), 200
 
 @api_bp.route('/ordenes/<int:orden_id>/detalle', methods=['GET', 'POST'])
@@ -76,6 +83,15 @@ def order_details(orden_id):
         producto = Producto.query.get_or_404(producto_id)
         orden = Orden.query.get_or_404(orden_id)
 
+        # Validación de stock (Sprint 2 — 3.2): unidades producibles precalculadas
+        if current_app.config.get('INVENTARIO_VALIDAR_STOCK'):
+            unidades, _ = unidades_disponibles(producto.id)
+            if unidades is not None and unidades < int(cantidad):
+                return jsonify({
+                    'error': 'Stock insuficiente' if unidades else 'Producto agotado',
+                    'disponibles': unidades,
+                }), 409
+
         detalle = OrdenDetalle(
             orden_id=orden.id,
             producto_id=producto.id,
@@ -87,7 +103,7 @@ def order_details(orden_id):
         db.session.add(detalle)
         db.session.commit()
 
-        socketio.emit('order_detail_added', {
+        emitir('order_detail_added', {
             'orden_id': orden.id,
             'detalle': {
                 'id': detalle.id,
@@ -97,7 +113,8 @@ def order_details(orden_id):
                 'notas': notas,
                 'estado': detalle.estado
             }
-        })
+        }, salas_orden(orden, cocina=True))
+        publicar_kds([('add', detalle)])
 
         verificar_orden_completa(orden.id)
 
@@ -5,7 +5,7 @@ from flask import Blueprint, render_template, request
 from backend.utils import login_required
 from backend.extensions import db
 from backend.models.models import AuditLog, Usuario
-from sqlalchemy import func
+from backend.services.dia_negocio import hoy_negocio
 from sqlalchemy.orm import joinedload
 
 logger = logging.getLogger(__name__)
@@ -16,8 +16,9 @@ auditoria_bp = Blueprint('auditoria', __name__, url_prefix='/admin/auditoria')
 @auditoria_bp.route('/')
 @login_required(roles=['superadmin'])
 def lista_auditoria():
-    fi = request.args.get('fecha_inicio', date.today().isoformat())
-    ff = request.args.get('fecha_fin', date.today().isoformat())
+    hoy = hoy_negocio()
+    fi = request.args.get('fecha_inicio', hoy.isoformat())
+    ff = request.args.get('fecha_fin', hoy.isoformat())
     accion_filtro = request.args.get('accion', '')
     entidad_filtro = request.args.get('entidad', '')
     page = request.args.get('page', 1, type=int)
@@ -25,8 +26,8 @@ def lista_auditoria():
     q = AuditLog.query.options(joinedload(AuditLog.usuario))
 
     q = q.filter(
-        func.date(AuditLog.fecha) >= date.fromisoformat(fi),
-        func.date(AuditLog.fecha) <= date.fromisoformat(ff),
+        AuditLog.fecha_negocio >= date.fromisoformat(fi),
+        AuditLog.fecha_negocio <= date.fromisoformat(ff),
     )
 
     if accion_filtro:
@@ -1,10 +1,18 @@
 import logging
-from flask import Blueprint, render_template, session, flash, redirect, url_for, jsonify
+from datetime import datetime
+from flask import Blueprint, render_template, session, flash, redirect, url_for, jsonify, g, abort, request, current_app
 from backend.models.models import Orden, OrdenDetalle, Producto, Estacion
-from backend.utils import login_required, verificar_orden_completa
-from backend.extensions import db, socketio
+from backend.utils import login_required, verificar_orden_completa, filtrar_por_sucursal
+from backend.extensions import db
 from flask_login import current_user
-from datetime import date
+from sqlalchemy.orm import contains_eager, joinedload
+from backend.services.dia_negocio import hoy_negocio
+from backend.services.kds import version_kds, item_kds, publicar_kds, preparar_kds, emitir_kds, consulta_pendientes
+from backend.services.cola_cocina import pendientes, programar_verificacion
+from backend.services.dashboard_tiempo_real import notificar_dashboard
+from backend.services.salas import emitir, salas_orden
+from backend.services.tiempos_cocina import umbrales_p90
+from backend.services.eta_cocina import publicar_etas
 
 logger = logging.getLogger(__name__)
 
@@ -37,25 +45,33 @@ STATION_CONFIG = {
 
 
 def _query_pending_detalles(estacion_nombre):
-    """Return pending OrdenDetalle items for a given station."""
-    return OrdenDetalle.query \
-        .join(Orden, OrdenDetalle.orden_id == Orden.id) \
-        .join(Producto, OrdenDetalle.producto_id == Producto.id) \
-        .join(Estacion, Producto.estacion_id == Estacion.id) \
-        .filter(
-            Estacion.nombre == estacion_nombre,
-            OrdenDetalle.estado == 'pendiente',
-            Orden.estado.in_(['enviado', 'en_preparacion', 'recibido', 'lista_para_entregar'])
-        ) \
+    """Return pending OrdenDetalle items for a given station (active sucursal)."""
+    return filtrar_por_sucursal(consulta_pendientes(estacion_nombre), Orden) \
         .order_by(Orden.tiempo_registro.asc(), OrdenDetalle.id.asc()).all()
 
 
-def _group_by_orden(detalles):
-    """Group a flat list of OrdenDetalle into {Orden: [detalles]} dict."""
-    grouped = {}
-    for d in detalles:
-        grouped.setdefault(d.orden, []).append(d)
-    return grouped
+def _items_estacion(estacion_nombre):
+    """Pending KDS items for the active sucursal: kitchen queue, SQL as fallback."""
+    programar_verificacion(current_app._get_current_object())
+    items = pendientes(estacion_nombre, g.sucursal_id)
+    if items is None:
+        items = [item_kds(d) for d in _query_pending_detalles(estacion_nombre)]
+    return items
+
+
+def _agrupar_items(items):
+    """Group queue items (already in arrival order) into order cards."""
+    ordenes = {}
+    for item in items:
+        orden = ordenes.setdefault(item['orden_id'], {
+            'id': item['orden_id'],
+            'tiempo_registro': item['tiempo_registro'],
+            'para_llevar': item['para_llevar'],
+            'mesa': item['mesa'],
+            'items': [],
+        })
+        orden['items'].append(item)
+    return list(ordenes.values())
 
 
 def _marcar_listo(orden_id, detalle_id):
@@ -64,14 +80,16 @@ def _marcar_listo(orden_id, detalle_id):
     detalle.estado = 'listo'
     db.session.commit()
     verificar_orden_completa(orden_id)
-    socketio.emit('item_listo_notificacion', {
+    publicar_kds([('remove', detalle)])
+    publicar_etas(detalle.orden.sucursal_id)
+    emitir('item_listo_notificacion', {
         'item_id': detalle.id,
         'orden_id': orden_id,
         'producto_id': detalle.producto_id,
         'producto_nombre': detalle.producto.nombre,
         'mesa_nombre': detalle.orden.mesa.numero if detalle.orden.mesa else 'Para Llevar',
         'mensaje': f'¡{detalle.producto.nombre} de la orden {orden_id} está listo!'
-    })
+    }, salas_orden(detalle.orden))
     return jsonify({'message': 'Producto marcado como listo'}), 200
 
 
@@ -90,34 +108,29 @@ def api_orders():
 @cocina_bp.route('/taqueros', endpoint='dashboard_taqueros_view')
 @login_required(roles='taquero')
 def view_taqueros():
-    cfg = STATION_CONFIG['taqueros']
-    detalles = _query_pending_detalles(cfg['estacion_db'])
-    ordenes_data = _group_by_orden(detalles)
-    return render_template('kds_station.html',
-                           ordenes_data=ordenes_data,
-                           station='taqueros', cfg=cfg)
+    return _vista_estacion('taqueros')
 
 
 @cocina_bp.route('/comal', endpoint='dashboard_comal_view')
 @login_required(roles='comal')
 def view_comal():
-    cfg = STATION_CONFIG['comal']
-    detalles = _query_pending_detalles(cfg['estacion_db'])
-    ordenes_data = _group_by_orden(detalles)
-    return render_template('kds_station.html',
-                           ordenes_data=ordenes_data,
-                           station='comal', cfg=cfg)
+    return _vista_estacion('comal')
 
 
 @cocina_bp.route('/bebidas', endpoint='dashboard_bebidas_view')
 @login_required(roles=['mesero', 'bebidas', 'admin', 'superadmin'])
 def view_bebidas():
-    cfg = STATION_CONFIG['bebidas']
-    detalles = _query_pending_detalles(cfg['estacion_db'])
-    ordenes_data = _group_by_orden(detalles)
+    return _vista_estacion('bebidas')
+
+
+def _vista_estacion(station):
+    cfg = STATION_CONFIG[station]
+    version = version_kds(cfg['estacion_db'], g.sucursal_id)  # antes de la lectura
+    ordenes = _agrupar_items(_items_estacion(cfg['estacion_db']))
     return render_template('kds_station.html',
-                           ordenes_data=ordenes_data,
-                           station='bebidas', cfg=cfg)
+                           ordenes=ordenes, kds_version=version,
+                           p90=umbrales_p90(g.sucursal_id),
+                           station=station, cfg=cfg)
 
 
 # ── Fragment endpoints (AJAX refresh) ──────────────────────────
@@ -141,13 +154,32 @@ def fragmento_ordenes_bebidas():
 
 def _fragmento(estacion_nombre):
     """Return JSON with rendered HTML fragment + count for a station."""
-    detalles = _query_pending_detalles(estacion_nombre)
-    ordenes_data = _group_by_orden(detalles)
-    total = sum(d.cantidad for d in detalles)
-    html = render_template('cocina/_kds_cards_fragment.html', ordenes_data=ordenes_data)
+    items = _items_estacion(estacion_nombre)
+    total = sum(i['cantidad'] for i in items)
+    html = render_template('cocina/_kds_cards_fragment.html', ordenes=_agrupar_items(items),
+                           p90=umbrales_p90(g.sucursal_id))
     return jsonify({'html': html, 'conteo_productos': total})
 
 
+@cocina_bp.route('/<station>/snapshot')
+@login_required(roles=['taquero', 'comal', 'bebidas', 'mesero', 'admin', 'superadmin'])
+def snapshot_estacion(station):
+    """Estado completo de una estación para resincronizar tras un hueco de versión."""
+    cfg = STATION_CONFIG.get(station)
+    if cfg is None:
+        abort(404)
+    if session.get('rol') not in cfg['roles_view']:
+        abort(403)
+    version = version_kds(cfg['estacion_db'], g.sucursal_id)  # antes de la lectura
+    items = _items_estacion(cfg['estacion_db'])
+    return jsonify({
+        'estacion': cfg['estacion_db'],
+        'version': version,
+        'items': [{k: v for k, v in i.items() if k != 'sucursal_id'} for i in items],
+        'p90': umbrales_p90(g.sucursal_id),
+    })
+
+
 # ── Mark-done endpoints ────────────────────────────────────────
 @cocina_bp.route('/taqueros/marcar/<int:orden_id>/<int:detalle_id>',
                   methods=['POST'], endpoint='marcar_taqueros_listo_view')
@@ -170,13 +202,90 @@ def marcar_bebidas(orden_id, detalle_id):
     return _marcar_listo(orden_id, detalle_id)
 
 
+
+@cocina_bp.route('/<station>/marcar/<int:orden_id>', methods=['POST'])
+@login_required(roles=['taquero', 'comal', 'bebidas', 'mesero'])
+def marcar_orden_lista(station, orden_id):
+    """Marca en lote los items de una orden en esta estación.
+
+    Body JSON opcional: {"detalle_ids": [...]}; sin él, todos los pendientes
+    de la estación. Un UPDATE, una revisión de orden completa, un commit,
+    un kds_delta por sala y un solo aviso al mesero.
+    """
+    cfg = STATION_CONFIG.get(station)
+    if cfg is None:
+        abort(404)
+    rol = session.get('rol')
+    if rol != 'superadmin' and rol not in cfg['roles_marcar']:
+        abort(403)
+    detalle_ids = (request.get_json(silent=True) or {}).get('detalle_ids')
+    if detalle_ids is not None and (
+            not isinstance(detalle_ids, list) or not all(isinstance(i, int) for i in detalle_ids)):
+        return jsonify({'error': 'detalle_ids debe ser una lista de enteros'}), 400
+
+    orden = Orden.query.options(joinedload(Orden.mesa)).get_or_404(orden_id)
+    query = OrdenDetalle.query \
+        .join(Producto, OrdenDetalle.producto_id == Producto.id) \
+        .join(Estacion, Producto.estacion_id == Estacion.id) \
+        .options(contains_eager(OrdenDetalle.producto).contains_eager(Producto.estacion)) \
+        .filter(
+            OrdenDetalle.orden_id == orden_id,
+            OrdenDetalle.estado == 'pendiente',
+            Estacion.nombre == cfg['estacion_db'],
+        )
+    if detalle_ids is not None:
+        query = query.filter(OrdenDetalle.id.in_(detalle_ids))
+    detalles = query.order_by(OrdenDetalle.id).all()
+    if not detalles:
+        return jsonify({'message': 'Nada pendiente que marcar', 'marcados': []}), 200
+
+    marcados = [d.id for d in detalles]
+    OrdenDetalle.query.filter(
+        OrdenDetalle.id.in_(marcados), OrdenDetalle.estado == 'pendiente',
+    ).update({OrdenDetalle.estado: 'listo', OrdenDetalle.tiempo_listo: datetime.utcnow()},
+             synchronize_session=False)
+
+    # Misma regla que verificar_orden_completa, dentro de la misma transacción
+    faltan = OrdenDetalle.query.filter(
+        OrdenDetalle.orden_id == orden_id, OrdenDetalle.estado != 'listo',
+    ).count()
+    completa = faltan == 0 and orden.estado not in ('finalizada', 'pagada', 'lista_para_entregar')
+    if completa:
+        orden.estado = 'lista_para_entregar'
+
+    # Armado antes del commit, con los objetos aún cargados
+    deltas = preparar_kds(('remove', d) for d in detalles)
+    mesa_nombre = orden.mesa.numero if orden.mesa else 'Para Llevar'
+    aviso = {
+        'orden_id': orden_id,
+        'mesa_nombre': mesa_nombre,
+        'items': [{'item_id': d.id, 'producto_id': d.producto_id, 'producto_nombre': d.producto.nombre}
+                  for d in detalles],
+        'orden_completa': completa,
+        'mensaje': (f'¡Toda la orden {orden_id} está lista para entregar!' if completa
+                    else f'¡{len(detalles)} producto(s) de la orden {orden_id} listos!'),
+    }
+    salas = salas_orden(orden)
+    sucursal_id = orden.sucursal_id
+    db.session.commit()
+
+    emitir_kds(deltas)
+    emitir('items_listos_notificacion', aviso, salas)
+    publicar_etas(sucursal_id)
+    if completa:
+        notificar_dashboard(sucursal_id)
+        logger.info('Orden %s marcada como lista_para_entregar', orden_id)
+    return jsonify({'message': 'Productos marcados como listos', 'marcados': marcados,
+                    'orden_completa': completa}), 200
+
+
 # ── Historial ──────────────────────────────────────────────────
 @cocina_bp.route('/historial')
 @login_required(roles=['admin', 'superadmin'])
 def historial_dia():
-    hoy = date.today()
+    hoy = hoy_negocio(getattr(g, 'sucursal_id', None))
     ordenes = Orden.query.filter(
-        db.func.date(Orden.tiempo_registro) == hoy,
+        Orden.fecha_negocio == hoy,
         Orden.estado.in_(['finalizada', 'pagada'])
     ).order_by(Orden.tiempo_registro.desc()).all()
 
@@ -0,0 +1,72 @@
+"""Eventos Socket.IO del dashboard de administración (namespace /dashboard).
+
+Cliente → servidor:
+  dashboard_suscribir {period}   entra a la sala de su sucursal y periodo
+  dashboard_latido               renueva la suscripción (cada 30 s)
+
+Servidor → cliente:
+  dashboard_snapshot {periodo, etag, snapshot}   estado completo al suscribirse
+  dashboard_delta    {periodo, etag, secciones}  solo las secciones que cambiaron
+"""
+import logging
+
+from flask import request, session
+from flask_socketio import emit, join_room, leave_room
+
+from backend.extensions import socketio
+from backend.services.dashboard import PERIODOS
+from backend.services.dashboard_tiempo_real import (
+    NAMESPACE, sala_dashboard, registrar_suscripcion, snapshot_suscriptor,
+)
+
+logger = logging.getLogger(__name__)
+
+ROLES_DASHBOARD = ('admin', 'superadmin')
+
+# sid → sala actual (las conexiones viven en el proceso que las atiende)
+_sala_por_sid = {}
+
+
+def _salir(sid):
+    sala = _sala_por_sid.pop(sid, None)
+    if sala:
+        leave_room(sala, sid=sid, namespace=NAMESPACE)
+        registrar_suscripcion(sala, sid, activa=False)
+
+
+@socketio.on('connect', namespace=NAMESPACE)
+def dashboard_conectar(auth=None):
+    if 'user_id' not in session or session.get('rol') not in ROLES_DASHBOARD:
+        logger.warning('Conexión a %s rechazada: usuario_id=%s rol=%s',
+                       NAMESPACE, session.get('user_id'), session.get('rol'))
+        return False
+    return True
+
+
+@socketio.on('dashboard_suscribir', namespace=NAMESPACE)
+def dashboard_suscribir(data=None):
+    periodo = (data or {}).get('period', 'today')
+    if periodo not in PERIODOS:
+        periodo = 'today'
+    sucursal_id = session.get('sucursal_id')
+    sala = sala_dashboard(sucursal_id, periodo)
+
+    if _sala_por_sid.get(request.sid) != sala:
+        _salir(request.sid)
+        join_room(sala)
+        _sala_por_sid[request.sid] = sala
+    registrar_suscripcion(sala, request.sid)
+
+    emit('dashboard_snapshot', snapshot_suscriptor(sucursal_id, periodo))
+
+
+@socketio.on('dashboard_latido', namespace=NAMESPACE)
+def dashboard_latido(*args):
+    sala = _sala_por_sid.get(request.sid)
+    if sala:
+        registrar_suscripcion(sala, request.sid)
+
+
+@socketio.on('disconnect', namespace=NAMESPACE)
+def dashboard_desconectar(*args):
+    _salir(request.sid)
@@ -5,9 +5,16 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from backend.utils import login_required, filtrar_por_sucursal
 from backend.extensions import db
 from backend.models.models import (
-    Ingrediente, RecetaDetalle, MovimientoInventario, Producto,
+    Ingrediente, RecetaDetalle, SubRecetaDetalle, MovimientoInventario, Producto,
 )
 from backend.services.sanitizer import sanitizar_texto
+from backend.services.cache_reportes import invalidar_reportes
+from backend.services.dashboard_tiempo_real import notificar_dashboard
+from backend.services.costos import recalcular_costos, recalcular_por_ingrediente
+from backend.services.disponibilidad import (
+    recalcular_disponibilidad, recalcular_por_ingredientes, publicar_disponibilidad,
+)
+from backend.services.subrecetas import guardar_subreceta, CicloSubreceta
 from sqlalchemy.orm import joinedload
 
 logger = logging.getLogger(__name__)
@@ -57,8 +64,14 @@ def ingrediente_editar(id):
         i.nombre = sanitizar_texto(request.form['nombre'], 100)
         i.unidad = sanitizar_texto(request.form['unidad'], 20)
         i.stock_minimo = Decimal(request.form.get('stock_minimo', '0'))
-        i.costo_unitario = Decimal(request.form.get('costo_unitario', '0'))
+        costo = Decimal(request.form.get('costo_unitario', '0'))
+        if costo != i.costo_unitario:
+            i.costo_unitario = costo
+            recalcular_por_ingrediente(i.id)
+        db.session.flush()
+        disponibilidad = recalcular_por_ingredientes([i.id])
         db.session.commit()
+        publicar_disponibilidad(disponibilidad)
         flash('Ingrediente actualizado.', 'success')
         return redirect(url_for('inventario.lista_ingredientes'))
     return render_template('admin/inventario/ingrediente_form.html', ingrediente=i)
@@ -76,8 +89,9 @@ def entrada_stock():
         costo = Decimal(request.form.get('costo', '0'))
 
         ing.stock_actual += cantidad
-        if costo > 0:
+        if costo > 0 and costo != ing.costo_unitario:
             ing.costo_unitario = costo
+            recalcular_por_ingrediente(ing.id)
 
         mov = MovimientoInventario(
             ingrediente_id=ing.id, tipo='entrada', cantidad=cantidad,
@@ -85,7 +99,11 @@ def entrada_stock():
             usuario_id=session.get('user_id'),
         )
         db.session.add(mov)
+        db.session.flush()
+        disponibilidad = recalcular_por_ingredientes([ing.id])
         db.session.commit()
+        publicar_disponibilidad(disponibilidad)
+        notificar_dashboard(ing.sucursal_id)
         flash(f'{cantidad} {ing.unidad} de {ing.nombre} registrados.', 'success')
         return redirect(url_for('inventario.lista_ingredientes'))
 
@@ -112,7 +130,12 @@ def registrar_merma():
             motivo=motivo, usuario_id=session.get('user_id'),
         )
         db.session.add(mov)
+        db.session.flush()
+        disponibilidad = recalcular_por_ingredientes([ing.id])
         db.session.commit()
+        publicar_disponibilidad(disponibilidad)
+        invalidar_reportes(ing.sucursal_id)
+        notificar_dashboard(ing.sucursal_id)
         flash(f'Merma de {cantidad} {ing.unidad} de {ing.nombre} registrada.', 'warning')
         return redirect(url_for('inventario.lista_ingredientes'))
 
@@ -156,7 +179,11 @@ def editar_receta(producto_id):
                 cantidad_por_unidad=Decimal(str(item['cantidad_por_unidad'])),
             )
             db.session.add(rd)
+        db.session.flush()
+        recalcular_costos([producto_id])
+        disponibilidad = recalcular_disponibilidad([producto_id])
         db.session.commit()
+        publicar_disponibilidad(disponibilidad)
         logger.info('Receta actualizada: producto=%s items=%d', producto_id, len(items))
         return jsonify(success=True, message='Receta guardada.')
 
@@ -167,6 +194,41 @@ def editar_receta(producto_id):
                            producto=producto, ingredientes=ingredientes)
 
 
+# =====================================================================
+# Subrecetas: ingredientes preparados
+# =====================================================================
+@inventario_bp.route('/ingrediente/<int:id>/subreceta', methods=['GET', 'POST'])
+@login_required(roles=['admin', 'superadmin'])
+def editar_subreceta(id):
+    preparado = Ingrediente.query.options(
+        joinedload(Ingrediente.subreceta).joinedload(SubRecetaDetalle.componente),
+    ).get_or_404(id)
+
+    if request.method == 'POST':
+        # Recibir JSON con items [{ingrediente_id, cantidad_por_unidad}]
+        items = request.get_json()
+        if items is None:
+            return jsonify(success=False, message='Datos inválidos.'), 400
+        try:
+            disponibilidad = guardar_subreceta(id, [
+                (int(item['ingrediente_id']), Decimal(str(item['cantidad_por_unidad'])))
+                for item in items
+            ])
+        except CicloSubreceta as e:
+            db.session.rollback()
+            return jsonify(success=False, message=str(e)), 400
+        db.session.commit()
+        publicar_disponibilidad(disponibilidad)
+        logger.info('Subreceta actualizada: preparado=%s items=%d', id, len(items))
+        return jsonify(success=True, message='Subreceta guardada.')
+
+    ingredientes = filtrar_por_sucursal(
+        Ingrediente.query.filter(Ingrediente.activo == True, Ingrediente.id != id), Ingrediente,
+    ).order_by(Ingrediente.nombre).all()
+    return render_template('admin/inventario/subreceta_form.html',
+                           preparado=preparado, ingredientes=ingredientes)
+
+
 # =====================================================================
 # Movimientos (historial)
 # =====================================================================
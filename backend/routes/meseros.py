@@ -4,14 +4,24 @@ from decimal import Decimal
 from flask import Blueprint, render_template, session, redirect, url_for, flash, request, jsonify, g, current_app
 from backend.models.models import (
     Mesa, Orden, Producto, OrdenDetalle, Sale, SaleItem, Usuario, Pago, IVA_RATE,
-    descontar_inventario_por_orden, Cliente,
 )
-from backend.extensions import db, socketio
-from backend.utils import login_required, verificar_propiedad_orden, filtrar_por_sucursal, verificar_stock_disponible, actualizar_estado_mesa
+from backend.extensions import db
+from backend.utils import login_required, verificar_propiedad_orden, filtrar_por_sucursal, verificar_stock_carrito, actualizar_estado_mesa
 from backend.services.sanitizer import sanitizar_texto
-from collections import defaultdict
-from sqlalchemy.orm import joinedload
-from datetime import datetime, date
+from backend.services.resumen_ventas import acumular_venta, acumular_pago
+from backend.services.dia_negocio import hoy_negocio
+from backend.services.exportar_csv import iterar_query, respuesta_csv
+from backend.services.cache_reportes import invalidar_reportes
+from backend.services.dashboard_tiempo_real import notificar_dashboard
+from backend.services.kds import publicar_kds, cambios_orden
+from backend.services.salas import emitir, salas_orden
+from backend.services.eta_cocina import calcular_etas, eta_orden, publicar_etas
+from backend.services.catalogo_menu import menu_json, MENU_MAX_AGE
+from backend.services.outbox import registrar_evento, despachar as despachar_outbox
+from backend.services.disponibilidad import mapa_disponibilidad, DISPONIBILIDAD_POCAS
+from backend.services.contadores_kpi import movimientos_venta, movimientos_propina, aplicar_movimientos
+from sqlalchemy.orm import joinedload, selectinload
+from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
@@ -36,8 +46,14 @@ def view_meseros():
     )
     query = filtrar_por_sucursal(query, Orden)
     ordenes_mesero = query.order_by(Orden.tiempo_registro.desc()).all()
+    try:
+        etas = calcular_etas(getattr(g, 'sucursal_id', None))
+    except Exception:
+        logger.warning('ETAs no disponibles para el panel de meseros', exc_info=True)
+        etas = {}
 
-    return render_template('meseros.html', ordenes_mesero=ordenes_mesero, now_utc=datetime.utcnow())
+    return render_template('meseros.html', ordenes_mesero=ordenes_mesero, etas=etas,
+                           now_utc=datetime.utcnow())
 
 
 # =====================================================================
@@ -59,12 +75,12 @@ def mapa_mesas():
 @meseros_bp.route('/historial')
 @login_required(roles=['mesero', 'admin', 'superadmin'])
 def historial_dia():
-    hoy = date.today()
+    hoy = hoy_negocio(getattr(g, 'sucursal_id', None))
     query = Orden.query.options(
         joinedload(Orden.mesa),
         joinedload(Orden.detalles).joinedload(OrdenDetalle.producto),
     ).filter(
-        db.func.date(Orden.tiempo_registro) == hoy,
+        Orden.fecha_negocio == hoy,
         Orden.estado.in_(['finalizada', 'pagada']),
     )
     query = filtrar_por_sucursal(query, Orden)
@@ -78,36 +94,25 @@ def historial_dia():
 @meseros_bp.route('/historial/csv')
 @login_required(roles=['mesero', 'admin', 'superadmin'])
 def historial_csv():
-    import csv
-    import io
-    from flask import Response
-
-    hoy = date.today()
+    hoy = hoy_negocio(getattr(g, 'sucursal_id', None))
     query = Orden.query.options(
         joinedload(Orden.mesa),
-        joinedload(Orden.detalles).joinedload(OrdenDetalle.producto),
+        selectinload(Orden.detalles).joinedload(OrdenDetalle.producto),
     ).filter(
-        db.func.date(Orden.tiempo_registro) == hoy,
+        Orden.fecha_negocio == hoy,
         Orden.estado.in_(['finalizada', 'pagada']),
     )
-    query = filtrar_por_sucursal(query, Orden)
-    ordenes = query.order_by(Orden.tiempo_registro.desc()).all()
+    query = filtrar_por_sucursal(query, Orden).order_by(Orden.tiempo_registro.desc())
 
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['Orden', 'Hora', 'Mesa', 'Estado', 'Productos', 'Total'])
-    for o in ordenes:
-        mesa = f'Mesa {o.mesa.numero}' if o.mesa else 'Para llevar'
-        productos = '; '.join(f'{d.producto.nombre} x{d.cantidad}' for d in o.detalles)
-        total = float(o.total or 0)
-        writer.writerow([f'#{o.id}', o.tiempo_registro.strftime('%H:%M'), mesa, o.estado, productos, f'${total:.2f}'])
-
-    output.seek(0)
-    return Response(
-        output.getvalue(),
-        mimetype='text/csv',
-        headers={'Content-Disposition': f'attachment; filename=historial_{hoy.isoformat()}.csv'},
-    )
+    def filas():
+        for o in iterar_query(query):
+            mesa = f'Mesa {o.mesa.numero}' if o.mesa else 'Para llevar'
+            productos = '; '.join(f'{d.producto.nombre} x{d.cantidad}' for d in o.detalles)
+            total = float(o.total or 0)
+            yield [f'#{o.id}', o.tiempo_registro.strftime('%H:%M'), mesa, o.estado, productos, f'${total:.2f}']
+
+    return respuesta_csv(f'historial_{hoy.isoformat()}.csv',
+                         ['Orden', 'Hora', 'Mesa', 'Estado', 'Productos', 'Total'], filas())
 
 
 # =====================================================================
@@ -188,16 +193,27 @@ def detalle_orden(orden_id):
         flash(f'Orden #{orden.id} no puede modificarse ({orden.estado}).', 'warning')
         return redirect(url_for('meseros.view_meseros'))
 
-    productos = Producto.query.options(
-        joinedload(Producto.categoria),
-    ).order_by(Producto.categoria_id, Producto.nombre).all()
+    # El catálogo no va en el HTML: la página lo pide a la URL versionada
+    # (inmutable en la tableta hasta que cambie el menú)
+    _, etag = menu_json()
+    return render_template('detalle_orden.html', orden=orden,
+                           menu_url=url_for('meseros.api_menu', v=etag),
+                           disponibilidad={p: d['unidades'] for p, d in mapa_disponibilidad().items()},
+                           disponibilidad_pocas=DISPONIBILIDAD_POCAS)
 
-    productos_por_categoria = defaultdict(list)
-    for p in productos:
-        productos_por_categoria[p.categoria.nombre].append(p.to_dict())
 
-    return render_template('detalle_orden.html', orden=orden,
-                           productos_por_categoria=productos_por_categoria)
+@meseros_bp.route('/api/menu', methods=['GET'])
+@login_required(roles='mesero')
+def api_menu():
+    """Catálogo del menú; 304 si no cambió, inmutable con ?v=<etag> vigente."""
+    cuerpo, etag = menu_json()
+    resp = current_app.response_class(cuerpo, mimetype='application/json')
+    resp.set_etag(etag)
+    if request.args.get('v') == etag:
+        resp.headers['Cache-Control'] = f'private, max-age={MENU_MAX_AGE}, immutable'
+    else:
+        resp.headers['Cache-Control'] = 'private, no-cache'
+    return resp.make_conditional(request)
 
 
 @meseros_bp.route('/ordenes/<int:orden_id>/agregar_productos', methods=['POST'])
@@ -221,44 +237,62 @@ def agregar_productos_a_orden(orden_id):
             flash('No se seleccionaron productos.', 'info')
             return redirect(url_for('meseros.detalle_orden', orden_id=orden_id))
 
+        # Carrito completo en un número fijo de consultas: productos, detalles
+        # pendientes de la orden y recetas con sus ingredientes.
+        lineas = [(int(p['id']), int(p['cantidad'])) for p in productos_sel]
+        ids = {pid for pid, _ in lineas}
+        productos = {p.id: p for p in Producto.query.filter(Producto.id.in_(ids)).all()}
+        lineas = [(pid, cant) for pid, cant in lineas if pid in productos]
+        existentes = {}
+        for d in OrdenDetalle.query.filter(
+                OrdenDetalle.orden_id == orden_id, OrdenDetalle.estado == 'pendiente',
+                OrdenDetalle.producto_id.in_(ids)).order_by(OrdenDetalle.id).all():
+            existentes.setdefault(d.producto_id, d)
+
+        # Validación de stock (Sprint 2 — 3.2), sumando ingredientes compartidos
+        if current_app.config.get('INVENTARIO_VALIDAR_STOCK'):
+            validacion = verificar_stock_carrito(lineas)
+        else:
+            validacion = [(True, [], [])] * len(lineas)
+
         nuevos = []
-        stock_warnings = []
-        for p_data in productos_sel:
-            prod = Producto.query.get(p_data['id'])
-            if not prod:
+        actualizados = []
+        stock_warnings = {}
+        enviado = datetime.utcnow() if orden_ya_enviada else None
+        for (pid, cantidad), (disponible, faltantes, warns) in zip(lineas, validacion):
+            prod = productos[pid]
+            if not disponible:
+                nombres = ', '.join(f['ingrediente'] for f in faltantes)
+                flash(f'Stock insuficiente para {prod.nombre}: faltan {nombres}', 'danger')
                 continue
-            cantidad = int(p_data['cantidad'])
-
-            # Validación de stock (Sprint 2 — 3.2)
-            if current_app.config.get('INVENTARIO_VALIDAR_STOCK'):
-                disponible, faltantes, warns = verificar_stock_disponible(prod.id, cantidad)
-                if not disponible:
-                    nombres = ', '.join(f['ingrediente'] for f in faltantes)
-                    flash(f'Stock insuficiente para {prod.nombre}: faltan {nombres}', 'danger')
-                    continue
-                stock_warnings.extend(warns)
-
-            existente = OrdenDetalle.query.filter_by(
-                orden_id=orden_id, producto_id=prod.id, estado='pendiente',
-            ).first()
+            for w in warns:
+                stock_warnings[w['ingrediente']] = w
+
+            existente = existentes.get(pid)
             if existente:
                 existente.cantidad += cantidad
+                if existente not in nuevos and existente not in actualizados:
+                    actualizados.append(existente)
             else:
                 d = OrdenDetalle(
-                    orden_id=orden_id, producto_id=prod.id,
+                    orden_id=orden_id, producto_id=pid, producto=prod,
                     cantidad=cantidad, precio_unitario=prod.precio, estado='pendiente',
+                    tiempo_enviado=enviado,
                 )
-                db.session.add(d)
+                existentes[pid] = d
                 nuevos.append(d)
+        db.session.add_all(nuevos)
 
         db.session.commit()
-        if orden_ya_enviada and nuevos:
-            socketio.emit('nueva_orden_cocina', {
+        if orden_ya_enviada and (nuevos or actualizados):
+            emitir('nueva_orden_cocina', {
                 'orden_id': orden.id,
                 'mensaje': f'Nuevos productos en orden #{orden.id}.',
-            })
+            }, salas_orden(orden, cocina=True))
+            publicar_kds([('add', d) for d in nuevos] + [('update', d) for d in actualizados])
+            publicar_etas(orden.sucursal_id)
         # Avisar warnings de stock bajo
-        for w in stock_warnings:
+        for w in stock_warnings.values():
             flash(f'⚠️ Stock bajo: {w["ingrediente"]} ({w["stock_actual"]} {w["unidad"]})', 'warning')
         flash('Productos agregados.', 'success')
     except Exception as e:
@@ -299,7 +333,13 @@ def enviar_orden_a_cocina(orden_id):
     else:
         orden.estado = 'enviado'
         db.session.commit()
-        socketio.emit('nueva_orden_cocina', {'orden_id': orden.id, 'mensaje': f'Orden #{orden.id} para cocina.'})
+        publicar_kds(cambios_orden(orden))
+        eta = eta_orden(orden.id, orden.sucursal_id)
+        emitir('nueva_orden_cocina', {
+            'orden_id': orden.id, 'mensaje': f'Orden #{orden.id} para cocina.',
+            'eta': {'segundos': eta['segundos'], 'eta_ts': eta['eta_ts']} if eta else None,
+        }, salas_orden(orden, cocina=True))
+        notificar_dashboard(orden.sucursal_id)
         # Auto-imprimir comanda si está configurado (Sprint 3 — 3.1)
         from backend.services.printer import AUTO_PRINT_COMANDA, imprimir_comanda
         if AUTO_PRINT_COMANDA:
@@ -323,11 +363,12 @@ def entregar_item(orden_id, detalle_id):
     if all(d.estado == 'entregado' for d in orden.detalles):
         if orden.estado not in ['pagada', 'finalizada', 'cancelada', 'completada']:
             orden.estado = 'completada'
-            socketio.emit('orden_actualizada_para_cobro', {
+            emitir('orden_actualizada_para_cobro', {
                 'orden_id': orden.id, 'estado_orden': 'completada',
                 'mensaje': f'Orden #{orden.id} lista para cobro.',
-            })
+            }, salas_orden(orden))
     db.session.commit()
+    notificar_dashboard(orden.sucursal_id)
     return jsonify(success=True, message="Entregado.")
 
 
@@ -340,6 +381,7 @@ def cancelar_orden(orden_id):
         return redirect(url_for('meseros.view_meseros'))
     orden.estado = 'cancelada'
     db.session.commit()
+    publicar_kds(cambios_orden(orden))
     # Liberar mesa si no quedan órdenes activas (Sprint 2 — 3.3)
     actualizar_estado_mesa(orden.mesa_id)
     db.session.commit()
@@ -493,6 +535,7 @@ def registrar_pago(orden_id):
     )
     db.session.add(pago)
     db.session.flush()
+    acumular_pago(pago, orden.sucursal_id)
 
     total_pagado = orden.total_pagado()
     saldo = orden.saldo_pendiente()
@@ -505,35 +548,12 @@ def registrar_pago(orden_id):
         orden.fecha_pago = datetime.utcnow()
         orden.estado = 'pagada'
 
-        # Crear Sale record
-        venta = Sale(mesa_id=orden.mesa_id, usuario_id=session.get('user_id'),
-                     total=orden.total, estado='cerrada',
-                     sucursal_id=getattr(g, 'sucursal_id', None))
-        db.session.add(venta)
-        db.session.flush()
-        for det in orden.detalles:
-            precio = float(det.precio_unitario) if det.precio_unitario else float(det.producto.precio)
-            db.session.add(SaleItem(
-                sale_id=venta.id, producto_id=det.producto_id,
-                cantidad=det.cantidad, precio_unitario=precio,
-                subtotal=det.cantidad * precio,
-            ))
-
-        socketio.emit('orden_pagada_notificacion', {
-            'orden_id': orden.id, 'mensaje': f'Orden #{orden.id} pagada.',
+        # Venta, inventario, cliente, mesa y avisos: services/outbox
+        registrar_evento('orden_pagada', {
+            'orden_id': orden.id,
+            'usuario_id': session.get('user_id'),
+            'sucursal_id': getattr(g, 'sucursal_id', None),
         })
-        # Descontar inventario según receta estándar
-        try:
-            descontar_inventario_por_orden(orden, session.get('user_id'))
-        except Exception:
-            logger.exception('Error descontando inventario orden %s', orden_id)
-
-        # Actualizar visitas/gasto del cliente
-        if orden.cliente_id:
-            cli = Cliente.query.get(orden.cliente_id)
-            if cli:
-                cli.visitas = (cli.visitas or 0) + 1
-                cli.total_gastado = (cli.total_gastado or 0) + orden.total
 
         logger.info('Orden #%s pagada total=$%.2f', orden_id, float(orden.total))
 
@@ -543,11 +563,11 @@ def registrar_pago(orden_id):
                         f'Pago ${float(monto):.2f} ({metodo}). Propina: ${float(propina):.2f}')
 
     db.session.commit()
-
-    # Liberar mesa si orden pagada (Sprint 2 — 3.3)
+    publicar_kds(cambios_orden(orden))
+    invalidar_reportes(orden.sucursal_id, getattr(g, 'sucursal_id', None))
+    notificar_dashboard(orden.sucursal_id, getattr(g, 'sucursal_id', None))
     if orden.estado == 'pagada':
-        actualizar_estado_mesa(orden.mesa_id)
-        db.session.commit()
+        despachar_outbox()
 
     return jsonify(
         success=True,
@@ -614,24 +634,34 @@ def cobrar_orden_post(orden_id):
                  sucursal_id=getattr(g, 'sucursal_id', None))
     db.session.add(venta)
     db.session.flush()
+    acumular_pago(pago, orden.sucursal_id)
 
+    items = []
     for det in orden.detalles:
         precio = float(det.precio_unitario) if det.precio_unitario else float(det.producto.precio)
-        db.session.add(SaleItem(
+        item = SaleItem(
             sale_id=venta.id, producto_id=det.producto_id,
             cantidad=det.cantidad, precio_unitario=precio,
             subtotal=det.cantidad * precio,
-        ))
+        )
+        db.session.add(item)
+        items.append(item)
+    acumular_venta(venta, items)
+    movs_kpi = {**movimientos_venta(venta, items), **movimientos_propina(orden)}
 
     db.session.commit()
+    aplicar_movimientos(movs_kpi)
+    publicar_kds(cambios_orden(orden))
+    invalidar_reportes(orden.sucursal_id, venta.sucursal_id)
+    notificar_dashboard(orden.sucursal_id, venta.sucursal_id)
     # Liberar mesa si no quedan órdenes activas (Sprint 2 — 3.3)
     actualizar_estado_mesa(orden.mesa_id)
     db.session.commit()
     logger.info('Orden #%s pagada (legacy). Total=$%.2f', orden_id, float(orden.total))
 
-    socketio.emit('orden_pagada_notificacion', {
+    emitir('orden_pagada_notificacion', {
         'orden_id': orden.id, 'mensaje': f'Orden #{orden.id} pagada.',
-    })
+    }, salas_orden(orden))
 
     return jsonify(
         success=True, message="Pago confirmado.",
@@ -1,7 +1,11 @@
 from flask import Blueprint, request, jsonify, session, g, current_app
-from backend.utils import login_required, verificar_orden_completa, verificar_stock_disponible
+from backend.utils import login_required, verificar_orden_completa
 from backend.models.models import Orden, OrdenDetalle, Producto
-from backend.extensions import db, socketio
+from backend.extensions import db
+from backend.services.dashboard_tiempo_real import notificar_dashboard
+from backend.services.kds import publicar_kds, cambios_orden
+from backend.services.salas import emitir, salas_orden
+from backend.services.disponibilidad import unidades_disponibles
 
 orders_bp = Blueprint('orders', __name__, url_prefix='/api')
 
@@ -17,12 +21,13 @@ def create_order():
                         sucursal_id=getattr(g, 'sucursal_id', None))
     db.session.add(nueva_orden)
     db.session.commit()
-    socketio.emit('order_created', {
+    emitir('order_created', {
         'orden_id': nueva_orden.id,
         'estado': nueva_orden.estado,
         'es_para_llevar': nueva_orden.es_para_llevar,
         'tiempo_registro': nueva_orden.tiempo_registro.isoformat()
-    })
+    }, salas_orden(nueva_orden))
+    notificar_dashboard(nueva_orden.sucursal_id)
     return jsonify({'message': 'Orden creada exitosamente.', 'orden_id': nueva_orden.id}), 201
 
 @orders_bp.route('/ordenes/<int:orden_id>/estado', methods=['PUT'])
@@ -35,10 +40,12 @@ def update_order_status(orden_id):
     orden = Orden.query.get_or_404(orden_id)
     orden.estado = nuevo_estado
     db.session.commit()
-    socketio.emit('order_updated', {
+    emitir('order_updated', {
         'orden_id': orden.id,
         'nuevo_estado': orden.estado
-    })
+    }, salas_orden(orden))
+    publicar_kds(cambios_orden(orden, 'update'))
+    notificar_dashboard(orden.sucursal_id)
     return jsonify({'message': 'Estado actualizado.', 'orden_id': orden.id}), 200
 
 @orders_bp.route('/ordenes/<int:orden_id>/detalle', methods=['POST'])
@@ -50,13 +57,13 @@ def add_product_to_order(orden_id):
     producto = Producto.query.get_or_404(producto_id)
     orden = Orden.query.get_or_404(orden_id)
 
-    # Validación de stock (Sprint 2 — 3.2)
+    # Validación de stock (Sprint 2 — 3.2): unidades producibles precalculadas
     if current_app.config.get('INVENTARIO_VALIDAR_STOCK'):
-        disponible, faltantes, warns = verificar_stock_disponible(producto_id, cantidad)
-        if not disponible:
+        unidades, _ = unidades_disponibles(producto.id)
+        if unidades is not None and unidades < int(cantidad):
             return jsonify({
-                'error': 'Stock insuficiente',
-                'faltantes': faltantes,
+                'error': 'Stock insuficiente' if unidades else 'Producto agotado',
+                'disponibles': unidades,
             }), 409
 
     detalle = OrdenDetalle(
@@ -69,7 +76,7 @@ def add_product_to_order(orden_id):
     db.session.add(detalle)
     db.session.commit()
     # Emit real-time update and check if order is now complete
-    socketio.emit('order_detail_added', {
+    emitir('order_detail_added', {
         'orden_id': orden.id,
         'detalle': {
             'id': detalle.id,
@@ -78,7 +85,8 @@ def add_product_to_order(orden_id):
             'cantidad': cantidad,
             'notas': detalle.notas
         }
-    })
+    }, salas_orden(orden, cocina=True))
+    publicar_kds([('add', detalle)])
     verificar_orden_completa(orden.id)
     return jsonify({
         'message': 'Producto agregado a la orden.',
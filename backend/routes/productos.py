@@ -3,6 +3,7 @@ from backend.models.models import Producto
 from backend.extensions import db
 from backend.forms.producto_form import ProductoForm
 from backend.utils import login_required
+from backend.services.catalogo_menu import invalidar_menu
 
 productos_bp = Blueprint('productos', __name__, url_prefix='/admin/productos')
 
@@ -24,6 +25,7 @@ def crear_producto():
             estacion=form.estacion.data
         )
         db.session.add(p); db.session.commit()
+        invalidar_menu()
         flash('Producto creado con éxito', 'success')
         return redirect(url_for('productos.listar_productos'))
     return render_template('productos/form.html', form=form, titulo='Crear Producto')
@@ -36,6 +38,7 @@ def editar_producto(id):
     if form.validate_on_submit():
         form.populate_obj(p)
         db.session.commit()
+        invalidar_menu()
         flash('Producto actualizado', 'success')
         return redirect(url_for('productos.listar_productos'))
     return render_template('productos/form.html', form=form, titulo='Editar Producto')
@@ -45,5 +48,6 @@ def editar_producto(id):
 def eliminar_producto(id):
     p = Producto.query.get_or_404(id)
     db.session.delete(p); db.session.commit()
+    invalidar_menu()
     flash('Producto eliminado', 'warning')
     return redirect(url_for('productos.listar_productos'))
\ No newline at end of file
@@ -2,19 +2,32 @@
    Sprint 4 — 6.1: JSON API endpoints para gráficas Chart.js.
    Sprint 6 — 6.2: Rentabilidad por producto.
    Sprint 6 — 6.3: Reporte delivery por canal."""
-import io
-import csv
 import logging
+from collections import namedtuple
 from datetime import date, datetime, timedelta
 from decimal import Decimal
-from flask import Blueprint, render_template, request, jsonify, Response, g
+from flask import Blueprint, render_template, request, jsonify, send_file, abort, g
+from werkzeug.utils import secure_filename
 from backend.utils import login_required, filtrar_por_sucursal
 from backend.extensions import db
 from backend.models.models import (
-    Sale, SaleItem, Producto, Pago, Orden, Usuario, Ingrediente,
-    MovimientoInventario, Categoria, RecetaDetalle, DeliveryOrden,
+    Sale, Producto, Orden, Usuario, Ingrediente,
+    MovimientoInventario, DeliveryOrden,
 )
-from sqlalchemy import func, extract, case
+from backend.services.resumen_ventas import consultar_resumen
+from backend.services.dia_negocio import hoy_negocio, a_utc, ordenes_pagadas_en
+from backend.services.exportar_csv import iterar_query, respuesta_csv
+from backend.services.cache_reportes import cache_reporte, estadisticas_cache
+from backend.services.costos import costos_productos
+from backend.services.saldos_inventario import stock_al, valuacion_inventario, cierres_mes
+from backend.services.pronostico_inventario import obtener_pronostico
+from backend.services.tiempos_cocina import (
+    estadisticas_preparacion, DIMENSIONES as DIMENSIONES_TIEMPOS, TIEMPOS_COCINA_SLA_SEG,
+)
+from backend.services.pdf_generator import (
+    encolar_pdf, respuesta_pdf, estado_pdf, error_pdf, ruta_pdf,
+)
+from sqlalchemy import func
 from sqlalchemy.orm import joinedload
 
 logger = logging.getLogger(__name__)
@@ -23,12 +36,70 @@ reportes_bp = Blueprint('reportes', __name__, url_prefix='/admin/reportes')
 
 
 def _parse_rango(args):
-    """Extrae fecha_inicio y fecha_fin de los query params."""
-    fi = args.get('fecha_inicio', date.today().replace(day=1).isoformat())
-    ff = args.get('fecha_fin', date.today().isoformat())
+    """Extrae fecha_inicio y fecha_fin (días de negocio) de los query params."""
+    hoy = hoy_negocio(getattr(g, 'sucursal_id', None))
+    fi = args.get('fecha_inicio', hoy.replace(day=1).isoformat())
+    ff = args.get('fecha_fin', hoy.isoformat())
     return date.fromisoformat(fi), date.fromisoformat(ff)
 
 
+def _rango_request():
+    return _parse_rango(request.args)
+
+
+# =====================================================================
+# Lecturas sobre el rollup diario (resumen_ventas_diarias)
+# =====================================================================
+VentaDia = namedtuple('VentaDia', 'dia total cantidad')
+VentaHora = namedtuple('VentaHora', 'hora total cantidad')
+VentaProducto = namedtuple('VentaProducto', 'id nombre cat_nombre cantidad ingreso')
+VentaMesero = namedtuple('VentaMesero', 'nombre num_ventas total_ventas')
+VentaMetodo = namedtuple('VentaMetodo', 'metodo cantidad total')
+VentaCategoria = namedtuple('VentaCategoria', 'cat_nombre ingreso')
+
+
+def _ventas_por_dia(fi, ff, suc_id):
+    return [VentaDia(r.fecha, r.total, r.num_ventas)
+            for r in consultar_resumen('total', fi, ff, suc_id, por_dia=True)]
+
+
+def _ventas_por_hora(fi, ff, suc_id):
+    filas = [VentaHora(int(r.clave), r.total, r.num_ventas)
+             for r in consultar_resumen('hora', fi, ff, suc_id)]
+    return sorted(filas, key=lambda r: r.hora)
+
+
+def _ventas_por_producto(fi, ff, suc_id):
+    """Cantidad e ingreso por producto, ordenado por cantidad desc."""
+    resumen = {int(r.clave): r for r in consultar_resumen('producto', fi, ff, suc_id)}
+    if not resumen:
+        return []
+    productos = Producto.query.options(joinedload(Producto.categoria)).filter(
+        Producto.id.in_(list(resumen)),
+    ).all()
+    filas = [
+        VentaProducto(p.id, p.nombre, p.categoria.nombre if p.categoria else None,
+                      resumen[p.id].cantidad, resumen[p.id].total)
+        for p in productos
+    ]
+    return sorted(filas, key=lambda r: r.cantidad, reverse=True)
+
+
+def _ventas_por_mesero(fi, ff, suc_id):
+    """Número de ventas y total por mesero, ordenado por total desc."""
+    resumen = {int(r.clave): r for r in consultar_resumen('mesero', fi, ff, suc_id) if r.clave}
+    if not resumen:
+        return []
+    usuarios = Usuario.query.filter(Usuario.id.in_(list(resumen))).all()
+    filas = [VentaMesero(u.nombre, resumen[u.id].num_ventas, resumen[u.id].total) for u in usuarios]
+    return sorted(filas, key=lambda r: r.total_ventas, reverse=True)
+
+
+def _ventas_por_metodo(fi, ff, suc_id):
+    return [VentaMetodo(r.clave, r.num_ventas, r.total)
+            for r in consultar_resumen('metodo', fi, ff, suc_id)]
+
+
 # =====================================================================
 # Dashboard de reportes
 # =====================================================================
@@ -46,32 +117,15 @@ def dashboard_reportes():
 @login_required(roles=['admin', 'superadmin'])
 def reporte_ventas():
     fi, ff = _parse_rango(request.args)
+    suc_id = getattr(g, 'sucursal_id', None)
 
-    ventas = filtrar_por_sucursal(
-        Sale.query.filter(
-            func.date(Sale.fecha_hora) >= fi,
-            func.date(Sale.fecha_hora) <= ff,
-        ), Sale,
-    ).order_by(Sale.fecha_hora.desc()).all()
+    # Ventas por día (rollup)
+    ventas_por_dia = _ventas_por_dia(fi, ff, suc_id)
 
-    total_ventas = sum(float(v.total) for v in ventas)
-    num_ventas = len(ventas)
+    total_ventas = sum(r.total for r in ventas_por_dia)
+    num_ventas = sum(r.cantidad for r in ventas_por_dia)
     ticket_promedio = (total_ventas / num_ventas) if num_ventas else 0
 
-    # Ventas por día
-    ventas_dia_q = db.session.query(
-        func.date(Sale.fecha_hora).label('dia'),
-        func.sum(Sale.total).label('total'),
-        func.count(Sale.id).label('cantidad'),
-    ).filter(
-        func.date(Sale.fecha_hora) >= fi,
-        func.date(Sale.fecha_hora) <= ff,
-    )
-    suc_id = getattr(g, 'sucursal_id', None)
-    if suc_id is not None:
-        ventas_dia_q = ventas_dia_q.filter(Sale.sucursal_id == suc_id)
-    ventas_por_dia = ventas_dia_q.group_by(func.date(Sale.fecha_hora)).order_by(func.date(Sale.fecha_hora)).all()
-
     return render_template('admin/reportes/ventas.html',
                            fecha_inicio=fi, fecha_fin=ff,
                            total_ventas=total_ventas, num_ventas=num_ventas,
@@ -83,96 +137,84 @@ def reporte_ventas():
 @login_required(roles=['admin', 'superadmin'])
 def export_ventas_csv():
     fi, ff = _parse_rango(request.args)
-    ventas = filtrar_por_sucursal(
-        Sale.query.options(
-            joinedload(Sale.usuario),
+    q = filtrar_por_sucursal(
+        db.session.query(
+            Sale.id, Sale.fecha_hora, Sale.mesa_id, Usuario.nombre, Sale.total, Sale.estado,
+        ).outerjoin(Usuario, Sale.usuario_id == Usuario.id
         ).filter(
-            func.date(Sale.fecha_hora) >= fi,
-            func.date(Sale.fecha_hora) <= ff,
+            Sale.fecha_negocio >= fi,
+            Sale.fecha_negocio <= ff,
         ), Sale,
-    ).order_by(Sale.fecha_hora).all()
-
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['ID', 'Fecha', 'Mesa', 'Mesero', 'Total', 'Estado'])
-    for v in ventas:
-        writer.writerow([v.id, v.fecha_hora.strftime('%Y-%m-%d %H:%M'),
-                         v.mesa_id or 'Llevar', v.usuario.nombre if v.usuario else '',
-                         float(v.total), v.estado])
-
-    return Response(
-        output.getvalue(),
-        mimetype='text/csv',
-        headers={'Content-Disposition': f'attachment;filename=ventas_{fi}_{ff}.csv'},
+    ).order_by(Sale.fecha_hora)
+
+    filas = (
+        [v_id, fecha.strftime('%Y-%m-%d %H:%M'), mesa_id or 'Llevar', mesero or '',
+         float(total), estado]
+        for v_id, fecha, mesa_id, mesero, total, estado in iterar_query(q)
     )
+    return respuesta_csv(f'ventas_{fi}_{ff}.csv',
+                         ['ID', 'Fecha', 'Mesa', 'Mesero', 'Total', 'Estado'], filas)
 
 
 @reportes_bp.route('/ventas/pdf')
 @login_required(roles=['admin', 'superadmin'])
 def export_ventas_pdf():
-    """Exporta reporte de ventas a PDF."""
+    """Exporta reporte de ventas a PDF (render en segundo plano)."""
     from datetime import datetime
-    from backend.services.pdf_generator import generar_pdf
 
     fi, ff = _parse_rango(request.args)
-    ventas_dia_q = db.session.query(
-        func.date(Sale.fecha_hora).label('dia'),
-        func.sum(Sale.total).label('total'),
-        func.count(Sale.id).label('cantidad'),
-    ).filter(
-        func.date(Sale.fecha_hora) >= fi,
-        func.date(Sale.fecha_hora) <= ff,
-    )
-    suc_id = getattr(g, 'sucursal_id', None)
-    if suc_id is not None:
-        ventas_dia_q = ventas_dia_q.filter(Sale.sucursal_id == suc_id)
-    ventas_por_dia = ventas_dia_q.group_by(func.date(Sale.fecha_hora)).order_by(func.date(Sale.fecha_hora)).all()
+    ventas_por_dia = _ventas_por_dia(fi, ff, getattr(g, 'sucursal_id', None))
 
     total_ventas = sum(float(r.total) for r in ventas_por_dia)
     num_ventas = sum(r.cantidad for r in ventas_por_dia)
     ticket_promedio = (total_ventas / num_ventas) if num_ventas else 0
 
-    pdf = generar_pdf('pdf/ventas.html',
-                      fecha_inicio=fi, fecha_fin=ff,
-                      total_ventas=total_ventas, num_ventas=num_ventas,
-                      ticket_promedio=ticket_promedio,
-                      ventas_por_dia=ventas_por_dia,
-                      now=datetime.now())
-    if pdf:
-        return Response(pdf, mimetype='application/pdf',
-                        headers={'Content-Disposition': f'attachment;filename=ventas_{fi}_{ff}.pdf'})
-    flash('Error al generar PDF. Verifique la instalación de WeasyPrint.', 'danger')
-    return redirect(url_for('reportes.reporte_ventas', fecha_inicio=fi, fecha_fin=ff))
+    clave, estado = encolar_pdf('pdf/ventas.html',
+                                fecha_inicio=fi, fecha_fin=ff,
+                                total_ventas=total_ventas, num_ventas=num_ventas,
+                                ticket_promedio=ticket_promedio,
+                                ventas_por_dia=ventas_por_dia,
+                                now=datetime.now())
+    return respuesta_pdf(clave, estado, f'ventas_{fi}_{ff}.pdf')
 
 
 @reportes_bp.route('/productos/pdf')
 @login_required(roles=['admin', 'superadmin'])
 def export_productos_pdf():
-    """Exporta reporte de productos a PDF."""
+    """Exporta reporte de productos a PDF (render en segundo plano)."""
     from datetime import datetime
-    from backend.services.pdf_generator import generar_pdf
 
     fi, ff = _parse_rango(request.args)
-    top = db.session.query(
-        Producto.nombre.label('nombre'),
-        func.sum(SaleItem.cantidad).label('cantidad'),
-        func.sum(SaleItem.subtotal).label('total'),
-    ).join(SaleItem, SaleItem.producto_id == Producto.id
-    ).join(Sale, Sale.id == SaleItem.sale_id
-    ).filter(func.date(Sale.fecha_hora) >= fi, func.date(Sale.fecha_hora) <= ff)
-    suc_id = getattr(g, 'sucursal_id', None)
-    if suc_id is not None:
-        top = top.filter(Sale.sucursal_id == suc_id)
-    productos = top.group_by(Producto.nombre).order_by(func.sum(SaleItem.subtotal).desc()).all()
+    productos = [
+        {'nombre': r.nombre, 'cantidad': r.cantidad, 'total': r.ingreso}
+        for r in sorted(_ventas_por_producto(fi, ff, getattr(g, 'sucursal_id', None)),
+                        key=lambda r: r.ingreso, reverse=True)
+    ]
+
+    clave, estado = encolar_pdf('pdf/productos.html',
+                                fecha_inicio=fi, fecha_fin=ff,
+                                productos=productos, now=datetime.now())
+    return respuesta_pdf(clave, estado, f'productos_{fi}_{ff}.pdf')
 
-    pdf = generar_pdf('pdf/productos.html',
-                      fecha_inicio=fi, fecha_fin=ff,
-                      productos=productos, now=datetime.now())
-    if pdf:
-        return Response(pdf, mimetype='application/pdf',
-                        headers={'Content-Disposition': f'attachment;filename=productos_{fi}_{ff}.pdf'})
-    flash('Error al generar PDF.', 'danger')
-    return redirect(url_for('reportes.reporte_productos', fecha_inicio=fi, fecha_fin=ff))
+
+@reportes_bp.route('/pdf/<clave>')
+@login_required(roles=['admin', 'superadmin'])
+def estado_pdf_job(clave):
+    """Estado de un PDF encolado: pendiente, listo o error."""
+    estado = estado_pdf(clave)
+    if estado is None:
+        return jsonify(estado='desconocido'), 404
+    return jsonify(estado=estado, error=error_pdf(clave) if estado == 'error' else None)
+
+
+@reportes_bp.route('/pdf/<clave>/descargar')
+@login_required(roles=['admin', 'superadmin'])
+def descargar_pdf(clave):
+    ruta = ruta_pdf(clave)
+    if ruta is None:
+        abort(404)
+    nombre = secure_filename(request.args.get('nombre', '')) or 'reporte.pdf'
+    return send_file(ruta, mimetype='application/pdf', as_attachment=True, download_name=nombre)
 
 
 # =====================================================================
@@ -182,21 +224,7 @@ def export_productos_pdf():
 @login_required(roles=['admin', 'superadmin'])
 def reporte_productos():
     fi, ff = _parse_rango(request.args)
-
-    top = db.session.query(
-        Producto.nombre,
-        func.sum(SaleItem.cantidad).label('cantidad'),
-        func.sum(SaleItem.subtotal).label('ingreso'),
-    ).join(SaleItem, SaleItem.producto_id == Producto.id
-    ).join(Sale, SaleItem.sale_id == Sale.id
-    ).filter(
-        func.date(Sale.fecha_hora) >= fi,
-        func.date(Sale.fecha_hora) <= ff,
-    )
-    suc_id = getattr(g, 'sucursal_id', None)
-    if suc_id is not None:
-        top = top.filter(Sale.sucursal_id == suc_id)
-    top = top.group_by(Producto.id).order_by(func.sum(SaleItem.cantidad).desc()).all()
+    top = _ventas_por_producto(fi, ff, getattr(g, 'sucursal_id', None))
 
     return render_template('admin/reportes/productos.html',
                            fecha_inicio=fi, fecha_fin=ff, top_productos=top)
@@ -206,31 +234,11 @@ def reporte_productos():
 @login_required(roles=['admin', 'superadmin'])
 def export_productos_csv():
     fi, ff = _parse_rango(request.args)
-    top = db.session.query(
-        Producto.nombre,
-        func.sum(SaleItem.cantidad).label('cantidad'),
-        func.sum(SaleItem.subtotal).label('ingreso'),
-    ).join(SaleItem, SaleItem.producto_id == Producto.id
-    ).join(Sale, SaleItem.sale_id == Sale.id
-    ).filter(
-        func.date(Sale.fecha_hora) >= fi,
-        func.date(Sale.fecha_hora) <= ff,
-    )
-    suc_id = getattr(g, 'sucursal_id', None)
-    if suc_id is not None:
-        top = top.filter(Sale.sucursal_id == suc_id)
-    top = top.group_by(Producto.id).order_by(func.sum(SaleItem.cantidad).desc()).all()
-
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['Producto', 'Cantidad Vendida', 'Ingreso Total'])
-    for row in top:
-        writer.writerow([row.nombre, int(row.cantidad), float(row.ingreso)])
-
-    return Response(
-        output.getvalue(), mimetype='text/csv',
-        headers={'Content-Disposition': f'attachment;filename=productos_{fi}_{ff}.csv'},
-    )
+    top = _ventas_por_producto(fi, ff, getattr(g, 'sucursal_id', None))
+
+    filas = ([row.nombre, int(row.cantidad), float(row.ingreso)] for row in top)
+    return respuesta_csv(f'productos_{fi}_{ff}.csv',
+                         ['Producto', 'Cantidad Vendida', 'Ingreso Total'], filas)
 
 
 # =====================================================================
@@ -240,20 +248,8 @@ def export_productos_csv():
 @login_required(roles=['admin', 'superadmin'])
 def reporte_meseros():
     fi, ff = _parse_rango(request.args)
-
-    datos = db.session.query(
-        Usuario.nombre,
-        func.count(Sale.id).label('num_ventas'),
-        func.sum(Sale.total).label('total_ventas'),
-    ).join(Sale, Sale.usuario_id == Usuario.id
-    ).filter(
-        func.date(Sale.fecha_hora) >= fi,
-        func.date(Sale.fecha_hora) <= ff,
-    )
     suc_id = getattr(g, 'sucursal_id', None)
-    if suc_id is not None:
-        datos = datos.filter(Sale.sucursal_id == suc_id)
-    datos = datos.group_by(Usuario.id).order_by(func.sum(Sale.total).desc()).all()
+    datos = _ventas_por_mesero(fi, ff, suc_id)
 
     # Propinas por mesero (Sprint 6 — 3.6)
     propinas_q = db.session.query(
@@ -262,8 +258,7 @@ def reporte_meseros():
     ).join(Orden, Orden.mesero_id == Usuario.id
     ).filter(
         Orden.estado == 'pagada',
-        func.date(Orden.fecha_pago) >= fi,
-        func.date(Orden.fecha_pago) <= ff,
+        Orden.id.in_(ordenes_pagadas_en(fi, ff)),
     )
     if suc_id is not None:
         propinas_q = propinas_q.filter(Orden.sucursal_id == suc_id)
@@ -281,19 +276,7 @@ def reporte_meseros():
 @login_required(roles=['admin', 'superadmin'])
 def reporte_pagos():
     fi, ff = _parse_rango(request.args)
-
-    datos = db.session.query(
-        Pago.metodo,
-        func.count(Pago.id).label('cantidad'),
-        func.sum(Pago.monto).label('total'),
-    ).filter(
-        func.date(Pago.fecha) >= fi,
-        func.date(Pago.fecha) <= ff,
-    )
-    suc_id = getattr(g, 'sucursal_id', None)
-    if suc_id is not None:
-        datos = datos.join(Orden, Pago.orden_id == Orden.id).filter(Orden.sucursal_id == suc_id)
-    datos = datos.group_by(Pago.metodo).all()
+    datos = _ventas_por_metodo(fi, ff, getattr(g, 'sucursal_id', None))
 
     return render_template('admin/reportes/pagos.html',
                            fecha_inicio=fi, fecha_fin=ff, datos_pagos=datos)
@@ -314,8 +297,8 @@ def reporte_inventario():
     ).join(MovimientoInventario, MovimientoInventario.ingrediente_id == Ingrediente.id
     ).filter(
         MovimientoInventario.tipo == 'merma',
-        func.date(MovimientoInventario.fecha) >= fi,
-        func.date(MovimientoInventario.fecha) <= ff,
+        MovimientoInventario.fecha_negocio >= fi,
+        MovimientoInventario.fecha_negocio <= ff,
     )
     suc_id = getattr(g, 'sucursal_id', None)
     if suc_id is not None:
@@ -326,43 +309,72 @@ def reporte_inventario():
                            fecha_inicio=fi, fecha_fin=ff, mermas=mermas)
 
 
+# =====================================================================
+# Valuación de inventario al cierre de mes (saldos_inventario)
+# =====================================================================
+@reportes_bp.route('/inventario/valuacion')
+@login_required(roles=['admin', 'superadmin'])
+def reporte_valuacion_inventario():
+    fecha = request.args.get('fecha')
+    fecha = date.fromisoformat(fecha) if fecha else None
+    datos = valuacion_inventario(fecha, getattr(g, 'sucursal_id', None))
+    return render_template('admin/reportes/valuacion_inventario.html',
+                           datos=datos, fecha=fecha, cierres=cierres_mes())
+
+
+@reportes_bp.route('/api/inventario/existencias')
+@login_required(roles=['admin', 'superadmin'])
+def api_existencias_inventario():
+    """Existencias por ingrediente a una fecha y hora local (?momento=YYYY-MM-DDTHH:MM)."""
+    momento = request.args.get('momento')
+    try:
+        momento = a_utc(datetime.fromisoformat(momento)) if momento else datetime.utcnow()
+    except ValueError:
+        return jsonify({'error': 'momento inválido'}), 400
+    existencias = stock_al(momento, getattr(g, 'sucursal_id', None))
+    ingredientes = Ingrediente.query.with_entities(
+        Ingrediente.id, Ingrediente.nombre, Ingrediente.unidad,
+    ).filter(Ingrediente.id.in_(list(existencias))).order_by(Ingrediente.nombre).all() if existencias else []
+    return jsonify({
+        'momento_utc': momento.isoformat(),
+        'ingredientes': [{
+            'id': i.id, 'nombre': i.nombre, 'unidad': i.unidad,
+            'existencia': float(existencias[i.id]),
+        } for i in ingredientes],
+    })
+
+
+# =====================================================================
+# Pronóstico de consumo y compras sugeridas (caché nocturna)
+# =====================================================================
+@reportes_bp.route('/inventario/compras')
+@login_required(roles=['admin', 'superadmin'])
+def reporte_compras_sugeridas():
+    datos = obtener_pronostico(getattr(g, 'sucursal_id', None))
+    return render_template('admin/reportes/compras_sugeridas.html', datos=datos)
+
+
+@reportes_bp.route('/api/inventario/pronostico')
+@login_required(roles=['admin', 'superadmin'])
+def api_pronostico_inventario():
+    """Cobertura por ingrediente y compras sugeridas de la sucursal activa."""
+    return jsonify(obtener_pronostico(getattr(g, 'sucursal_id', None)))
+
+
 # =====================================================================
 # JSON API endpoints for Chart.js (Sprint 4 — 6.1)
 # =====================================================================
 
 @reportes_bp.route('/api/ventas')
 @login_required(roles=['admin', 'superadmin'])
+@cache_reporte(_rango_request)
 def api_ventas_chart():
     """Ventas por día + ventas por hora para Chart.js."""
     fi, ff = _parse_rango(request.args)
     suc_id = getattr(g, 'sucursal_id', None)
 
-    # Ventas por día
-    q_dia = db.session.query(
-        func.date(Sale.fecha_hora).label('dia'),
-        func.sum(Sale.total).label('total'),
-        func.count(Sale.id).label('cantidad'),
-    ).filter(
-        func.date(Sale.fecha_hora) >= fi,
-        func.date(Sale.fecha_hora) <= ff,
-    )
-    if suc_id is not None:
-        q_dia = q_dia.filter(Sale.sucursal_id == suc_id)
-    por_dia = q_dia.group_by(func.date(Sale.fecha_hora)).order_by(func.date(Sale.fecha_hora)).all()
-
-    # Ventas por hora del día
-    q_hora = db.session.query(
-        extract('hour', Sale.fecha_hora).label('hora'),
-        func.sum(Sale.total).label('total'),
-        func.count(Sale.id).label('cantidad'),
-    ).filter(
-        func.date(Sale.fecha_hora) >= fi,
-        func.date(Sale.fecha_hora) <= ff,
-    )
-    if suc_id is not None:
-        q_hora = q_hora.filter(Sale.sucursal_id == suc_id)
-    por_hora = q_hora.group_by(extract('hour', Sale.fecha_hora)).order_by(
-        extract('hour', Sale.fecha_hora)).all()
+    por_dia = _ventas_por_dia(fi, ff, suc_id)
+    por_hora = _ventas_por_hora(fi, ff, suc_id)
 
     return jsonify({
         'por_dia': {
@@ -380,41 +392,21 @@ def api_ventas_chart():
 
 @reportes_bp.route('/api/productos')
 @login_required(roles=['admin', 'superadmin'])
+@cache_reporte(_rango_request)
 def api_productos_chart():
     """Top 20 productos + ingresos por categoría para Chart.js."""
     fi, ff = _parse_rango(request.args)
     suc_id = getattr(g, 'sucursal_id', None)
 
-    q = db.session.query(
-        Producto.nombre,
-        Categoria.nombre.label('cat_nombre'),
-        func.sum(SaleItem.cantidad).label('cantidad'),
-        func.sum(SaleItem.subtotal).label('ingreso'),
-    ).join(SaleItem, SaleItem.producto_id == Producto.id
-    ).join(Sale, SaleItem.sale_id == Sale.id
-    ).outerjoin(Categoria, Producto.categoria_id == Categoria.id
-    ).filter(
-        func.date(Sale.fecha_hora) >= fi,
-        func.date(Sale.fecha_hora) <= ff,
-    )
-    if suc_id is not None:
-        q = q.filter(Sale.sucursal_id == suc_id)
-    top = q.group_by(Producto.id, Categoria.nombre).order_by(func.sum(SaleItem.cantidad).desc()).limit(20).all()
+    por_producto = _ventas_por_producto(fi, ff, suc_id)
+    top = por_producto[:20]
 
     # Categorías
-    q_cat = db.session.query(
-        Categoria.nombre.label('cat_nombre'),
-        func.sum(SaleItem.subtotal).label('ingreso'),
-    ).join(Producto, Producto.categoria_id == Categoria.id
-    ).join(SaleItem, SaleItem.producto_id == Producto.id
-    ).join(Sale, SaleItem.sale_id == Sale.id
-    ).filter(
-        func.date(Sale.fecha_hora) >= fi,
-        func.date(Sale.fecha_hora) <= ff,
-    )
-    if suc_id is not None:
-        q_cat = q_cat.filter(Sale.sucursal_id == suc_id)
-    cats = q_cat.group_by(Categoria.nombre).order_by(func.sum(SaleItem.subtotal).desc()).all()
+    ingreso_cat = {}
+    for r in por_producto:
+        ingreso_cat[r.cat_nombre] = ingreso_cat.get(r.cat_nombre, 0.0) + r.ingreso
+    cats = [VentaCategoria(nombre, ingreso)
+            for nombre, ingreso in sorted(ingreso_cat.items(), key=lambda kv: kv[1], reverse=True)]
 
     return jsonify({
         'top_productos': {
@@ -431,23 +423,13 @@ def api_productos_chart():
 
 @reportes_bp.route('/api/meseros')
 @login_required(roles=['admin', 'superadmin'])
+@cache_reporte(_rango_request)
 def api_meseros_chart():
     """Rendimiento por mesero para Chart.js."""
     fi, ff = _parse_rango(request.args)
     suc_id = getattr(g, 'sucursal_id', None)
 
-    q = db.session.query(
-        Usuario.nombre,
-        func.count(Sale.id).label('num_ventas'),
-        func.sum(Sale.total).label('total_ventas'),
-    ).join(Sale, Sale.usuario_id == Usuario.id
-    ).filter(
-        func.date(Sale.fecha_hora) >= fi,
-        func.date(Sale.fecha_hora) <= ff,
-    )
-    if suc_id is not None:
-        q = q.filter(Sale.sucursal_id == suc_id)
-    datos = q.group_by(Usuario.id).order_by(func.sum(Sale.total).desc()).all()
+    datos = _ventas_por_mesero(fi, ff, suc_id)
 
     return jsonify({
         'labels': [r.nombre for r in datos],
@@ -458,22 +440,13 @@ def api_meseros_chart():
 
 @reportes_bp.route('/api/pagos')
 @login_required(roles=['admin', 'superadmin'])
+@cache_reporte(_rango_request)
 def api_pagos_chart():
     """Desglose de métodos de pago para Chart.js."""
     fi, ff = _parse_rango(request.args)
     suc_id = getattr(g, 'sucursal_id', None)
 
-    q = db.session.query(
-        Pago.metodo,
-        func.count(Pago.id).label('cantidad'),
-        func.sum(Pago.monto).label('total'),
-    ).filter(
-        func.date(Pago.fecha) >= fi,
-        func.date(Pago.fecha) <= ff,
-    )
-    if suc_id is not None:
-        q = q.join(Orden, Pago.orden_id == Orden.id).filter(Orden.sucursal_id == suc_id)
-    datos = q.group_by(Pago.metodo).all()
+    datos = _ventas_por_metodo(fi, ff, suc_id)
 
     return jsonify({
         'labels': [r.metodo.capitalize() for r in datos],
@@ -482,8 +455,27 @@ def api_pagos_chart():
     })
 
 
+@reportes_bp.route('/api/tiempos-cocina', defaults={'dimension': 'producto'})
+@reportes_bp.route('/api/tiempos-cocina/<dimension>')
+@login_required(roles=['admin', 'superadmin'])
+@cache_reporte(_rango_request)
+def api_tiempos_cocina(dimension):
+    """p50/p90 de preparación (segundos) por producto, estación u hora."""
+    fi, ff = _parse_rango(request.args)
+    suc_id = getattr(g, 'sucursal_id', None)
+    if dimension not in DIMENSIONES_TIEMPOS:
+        return jsonify({'error': f'dimension debe ser una de {", ".join(DIMENSIONES_TIEMPOS)}'}), 400
+
+    return jsonify({
+        'dimension': dimension,
+        'sla_seg': TIEMPOS_COCINA_SLA_SEG,
+        'filas': estadisticas_preparacion(dimension, fi, ff, suc_id),
+    })
+
+
 @reportes_bp.route('/api/inventario')
 @login_required(roles=['admin', 'superadmin'])
+@cache_reporte(_rango_request)
 def api_inventario_chart():
     """Mermas de inventario para Chart.js."""
     fi, ff = _parse_rango(request.args)
@@ -496,8 +488,8 @@ def api_inventario_chart():
     ).join(MovimientoInventario, MovimientoInventario.ingrediente_id == Ingrediente.id
     ).filter(
         MovimientoInventario.tipo == 'merma',
-        func.date(MovimientoInventario.fecha) >= fi,
-        func.date(MovimientoInventario.fecha) <= ff,
+        MovimientoInventario.fecha_negocio >= fi,
+        MovimientoInventario.fecha_negocio <= ff,
     )
     if suc_id is not None:
         q = q.filter(Ingrediente.sucursal_id == suc_id)
@@ -512,59 +504,31 @@ def api_inventario_chart():
 # =====================================================================
 # Reporte de rentabilidad por producto (Sprint 6 — 6.2)
 # =====================================================================
-@reportes_bp.route('/rentabilidad')
-@login_required(roles=['admin', 'superadmin'])
-def reporte_rentabilidad():
-    fi, ff = _parse_rango(request.args)
-    suc_id = getattr(g, 'sucursal_id', None)
-
-    # Cantidad vendida por producto en el rango
-    q_ventas = db.session.query(
-        SaleItem.producto_id,
-        func.sum(SaleItem.cantidad).label('cantidad_vendida'),
-        func.sum(SaleItem.subtotal).label('ingreso_total'),
-    ).join(Sale, SaleItem.sale_id == Sale.id
-    ).filter(
-        func.date(Sale.fecha_hora) >= fi,
-        func.date(Sale.fecha_hora) <= ff,
-    )
-    if suc_id is not None:
-        q_ventas = q_ventas.filter(Sale.sucursal_id == suc_id)
-    ventas_map = {
-        r.producto_id: {'cantidad': int(r.cantidad_vendida), 'ingreso': float(r.ingreso_total)}
-        for r in q_ventas.group_by(SaleItem.producto_id).all()
+def _ventas_producto_map(fi, ff, suc_id):
+    """producto_id -> {'cantidad', 'ingreso'} en el rango (rollup)."""
+    return {
+        int(r.clave): {'cantidad': r.cantidad, 'ingreso': r.total}
+        for r in consultar_resumen('producto', fi, ff, suc_id)
     }
 
-    # Todos los productos con su receta y costo
-    productos = Producto.query.options(
-        joinedload(Producto.receta_items).joinedload(RecetaDetalle.ingrediente),
-    ).all()
 
-    rows = []
+def _filas_rentabilidad(productos, ventas_map):
+    """Margen y utilidad por producto a partir de filas (id, nombre, precio, costo)."""
     for p in productos:
         vendidos = ventas_map.get(p.id, {})
         cantidad = vendidos.get('cantidad', 0)
         ingreso = vendidos.get('ingreso', 0.0)
         precio_venta = float(p.precio)
+        costo = float(p.costo) if p.costo is not None else None
 
-        if p.receta_items:
-            costo = sum(
-                float(r.cantidad_por_unidad) * float(r.ingrediente.costo_unitario or 0)
-                for r in p.receta_items
-            )
-        else:
-            costo = None
-
-        if costo is not None and precio_venta > 0:
-            margen_pct = ((precio_venta - costo) / precio_venta) * 100
+        if costo is not None:
             margen_abs = precio_venta - costo
+            margen_pct = (margen_abs / precio_venta * 100) if precio_venta > 0 else None
             utilidad_total = margen_abs * cantidad
         else:
-            margen_pct = None
-            margen_abs = None
-            utilidad_total = None
+            margen_abs = margen_pct = utilidad_total = None
 
-        rows.append({
+        yield {
             'nombre': p.nombre,
             'precio_venta': precio_venta,
             'costo': costo,
@@ -573,8 +537,16 @@ def reporte_rentabilidad():
             'cantidad': cantidad,
             'ingreso': ingreso,
             'utilidad_total': utilidad_total,
-        })
+        }
+
 
+@reportes_bp.route('/rentabilidad')
+@login_required(roles=['admin', 'superadmin'])
+def reporte_rentabilidad():
+    fi, ff = _parse_rango(request.args)
+    ventas_map = _ventas_producto_map(fi, ff, getattr(g, 'sucursal_id', None))
+
+    rows = list(_filas_rentabilidad(costos_productos(), ventas_map))
     # Sort by utilidad_total desc (None at end)
     rows.sort(key=lambda r: r['utilidad_total'] if r['utilidad_total'] is not None else -1, reverse=True)
 
@@ -586,84 +558,38 @@ def reporte_rentabilidad():
 @login_required(roles=['admin', 'superadmin'])
 def export_rentabilidad_csv():
     fi, ff = _parse_rango(request.args)
-    suc_id = getattr(g, 'sucursal_id', None)
+    ventas_map = _ventas_producto_map(fi, ff, getattr(g, 'sucursal_id', None))
 
-    q_ventas = db.session.query(
-        SaleItem.producto_id,
-        func.sum(SaleItem.cantidad).label('cantidad_vendida'),
-        func.sum(SaleItem.subtotal).label('ingreso_total'),
-    ).join(Sale, SaleItem.sale_id == Sale.id
-    ).filter(
-        func.date(Sale.fecha_hora) >= fi,
-        func.date(Sale.fecha_hora) <= ff,
-    )
-    if suc_id is not None:
-        q_ventas = q_ventas.filter(Sale.sucursal_id == suc_id)
-    ventas_map = {
-        r.producto_id: {'cantidad': int(r.cantidad_vendida), 'ingreso': float(r.ingreso_total)}
-        for r in q_ventas.group_by(SaleItem.producto_id).all()
-    }
+    def _fmt(valor, patron='{:.2f}'):
+        return 'N/A' if valor is None else patron.format(valor)
 
-    productos = Producto.query.options(
-        joinedload(Producto.receta_items).joinedload(RecetaDetalle.ingrediente),
-    ).all()
+    filas = (
+        [r['nombre'], f"{r['precio_venta']:.2f}", _fmt(r['costo']), _fmt(r['margen_abs']),
+         _fmt(r['margen_pct'], '{:.1f}'), r['cantidad'], f"{r['ingreso']:.2f}",
+         _fmt(r['utilidad_total'])]
+        for r in _filas_rentabilidad(iterar_query(costos_productos()), ventas_map)
+    )
+    return respuesta_csv(f'rentabilidad_{fi}_{ff}.csv',
+                         ['Producto', 'Precio Venta', 'Costo', 'Margen $', 'Margen %',
+                          'Cantidad Vendida', 'Ingreso Total', 'Utilidad Total'], filas)
 
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['Producto', 'Precio Venta', 'Costo', 'Margen $', 'Margen %',
-                      'Cantidad Vendida', 'Ingreso Total', 'Utilidad Total'])
-    for p in productos:
-        vendidos = ventas_map.get(p.id, {})
-        cantidad = vendidos.get('cantidad', 0)
-        ingreso = vendidos.get('ingreso', 0.0)
-        precio_venta = float(p.precio)
 
-        if p.receta_items:
-            costo = sum(float(r.cantidad_por_unidad) * float(r.ingrediente.costo_unitario or 0)
-                        for r in p.receta_items)
-            margen_abs = precio_venta - costo
-            margen_pct = ((precio_venta - costo) / precio_venta * 100) if precio_venta > 0 else 0
-            utilidad_total = margen_abs * cantidad
-        else:
-            costo = 'N/A'
-            margen_abs = 'N/A'
-            margen_pct = 'N/A'
-            utilidad_total = 'N/A'
-
-        writer.writerow([p.nombre, f'{precio_venta:.2f}',
-                         f'{costo:.2f}' if isinstance(costo, float) else costo,
-                         f'{margen_abs:.2f}' if isinstance(margen_abs, float) else margen_abs,
-                         f'{margen_pct:.1f}' if isinstance(margen_pct, float) else margen_pct,
-                         cantidad, f'{ingreso:.2f}',
-                         f'{utilidad_total:.2f}' if isinstance(utilidad_total, float) else utilidad_total])
-
-    return Response(
-        output.getvalue(), mimetype='text/csv',
-        headers={'Content-Disposition': f'attachment;filename=rentabilidad_{fi}_{ff}.csv'},
-    )
+@reportes_bp.route('/api/cache')
+@login_required(roles=['superadmin'])
+def api_cache_stats():
+    """Contadores hit/miss de la caché de reportes, para ajustar TTLs."""
+    return jsonify(estadisticas_cache())
 
 
 @reportes_bp.route('/api/rentabilidad')
 @login_required(roles=['admin', 'superadmin'])
 def api_rentabilidad_chart():
     """Scatter: precio venta vs margen % para Chart.js."""
-    fi, ff = _parse_rango(request.args)
-
-    productos = Producto.query.options(
-        joinedload(Producto.receta_items).joinedload(RecetaDetalle.ingrediente),
-    ).all()
-
-    points = []
-    for p in productos:
-        if not p.receta_items:
-            continue
-        precio = float(p.precio)
-        costo = sum(float(r.cantidad_por_unidad) * float(r.ingrediente.costo_unitario or 0)
-                     for r in p.receta_items)
-        margen = ((precio - costo) / precio * 100) if precio > 0 else 0
-        points.append({'nombre': p.nombre, 'precio': precio, 'margen': round(margen, 1),
-                       'costo': round(costo, 2)})
-
+    points = [
+        {'nombre': r['nombre'], 'precio': r['precio_venta'],
+         'margen': round(r['margen_pct'] or 0, 1), 'costo': round(r['costo'], 2)}
+        for r in _filas_rentabilidad(costos_productos(solo_con_receta=True), {})
+    ]
     return jsonify({'productos': points})
 
 
@@ -683,8 +609,7 @@ def reporte_delivery():
         func.sum(Orden.total).label('total_ventas'),
     ).filter(
         Orden.estado == 'pagada',
-        func.date(Orden.fecha_pago) >= fi,
-        func.date(Orden.fecha_pago) <= ff,
+        Orden.id.in_(ordenes_pagadas_en(fi, ff)),
     )
     if suc_id is not None:
         q = q.filter(Orden.sucursal_id == suc_id)
@@ -747,29 +672,24 @@ def export_delivery_csv():
         func.sum(Orden.total).label('total_ventas'),
     ).filter(
         Orden.estado == 'pagada',
-        func.date(Orden.fecha_pago) >= fi,
-        func.date(Orden.fecha_pago) <= ff,
+        Orden.id.in_(ordenes_pagadas_en(fi, ff)),
     )
     if suc_id is not None:
         q = q.filter(Orden.sucursal_id == suc_id)
-    por_canal = q.group_by(Orden.canal).all()
-
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['Canal', 'Órdenes', 'Ventas Total', 'Ticket Promedio'])
-    for canal, num, total in por_canal:
-        total_val = float(total or 0)
-        ticket = total_val / num if num else 0
-        writer.writerow([canal or 'local', num, f'{total_val:.2f}', f'{ticket:.2f}'])
+    por_canal = q.group_by(Orden.canal)
 
-    return Response(
-        output.getvalue(), mimetype='text/csv',
-        headers={'Content-Disposition': f'attachment;filename=delivery_{fi}_{ff}.csv'},
+    filas = (
+        [canal or 'local', num, f'{float(total or 0):.2f}',
+         f'{(float(total or 0) / num if num else 0):.2f}']
+        for canal, num, total in iterar_query(por_canal)
     )
+    return respuesta_csv(f'delivery_{fi}_{ff}.csv',
+                         ['Canal', 'Órdenes', 'Ventas Total', 'Ticket Promedio'], filas)
 
 
 @reportes_bp.route('/api/delivery')
 @login_required(roles=['admin', 'superadmin'])
+@cache_reporte(_rango_request)
 def api_delivery_chart():
     """Ventas por canal para Chart.js (stacked bar)."""
     fi, ff = _parse_rango(request.args)
@@ -781,8 +701,7 @@ def api_delivery_chart():
         func.sum(Orden.total).label('total'),
     ).filter(
         Orden.estado == 'pagada',
-        func.date(Orden.fecha_pago) >= fi,
-        func.date(Orden.fecha_pago) <= ff,
+        Orden.id.in_(ordenes_pagadas_en(fi, ff)),
     )
     if suc_id is not None:
         q = q.filter(Orden.sucursal_id == suc_id)
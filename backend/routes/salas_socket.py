@@ -0,0 +1,39 @@
+"""Conexión al namespace principal de Socket.IO y asignación de salas.
+
+Solo usuarios con sesión. Cada conexión entra a su sala de usuario y a la de
+su sucursal activa. Las pantallas KDS mandan auth={estacion: <taqueros|comal|
+bebidas>} y entran además a la sala de esa estación si su rol puede verla.
+Ver backend/services/salas.py.
+"""
+import logging
+
+from flask import session
+from flask_socketio import join_room
+
+from backend.extensions import socketio
+from backend.routes.cocina import STATION_CONFIG
+from backend.services.salas import sala_usuario, sala_sucursal, sala_estacion
+
+logger = logging.getLogger(__name__)
+
+
+@socketio.on('connect')
+def conectar(auth=None):
+    usuario_id = session.get('user_id')
+    if usuario_id is None:
+        logger.warning('Conexión Socket.IO sin sesión rechazada')
+        return False
+
+    sucursal_id = session.get('sucursal_id')
+    join_room(sala_usuario(usuario_id))
+    join_room(sala_sucursal(sucursal_id))
+
+    station = (auth or {}).get('estacion') if isinstance(auth, dict) else None
+    if station:
+        cfg = STATION_CONFIG.get(station)
+        rol = session.get('rol')
+        if cfg is None or (rol != 'superadmin' and rol not in cfg['roles_view']):
+            logger.warning('Estación %s no permitida para rol=%s', station, rol)
+            return False
+        join_room(sala_estacion(cfg['estacion_db'], sucursal_id))
+    return True
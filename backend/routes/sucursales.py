@@ -4,6 +4,7 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from backend.utils import login_required
 from backend.extensions import db
 from backend.models.models import Sucursal, Usuario
+from backend.services.dia_negocio import invalidar_horas_corte
 from flask_login import current_user
 
 logger = logging.getLogger(__name__)
@@ -11,6 +12,14 @@ logger = logging.getLogger(__name__)
 sucursales_bp = Blueprint('sucursales', __name__, url_prefix='/admin/sucursales')
 
 
+def _hora_corte_form():
+    """Hora de corte (0-23) del formulario; None usa el default global."""
+    valor = request.form.get('hora_corte', type=int)
+    if valor is None or not 0 <= valor <= 23:
+        return None
+    return valor
+
+
 @sucursales_bp.route('/')
 @login_required(roles=['superadmin'])
 def lista_sucursales():
@@ -26,9 +35,11 @@ def nueva_sucursal():
             nombre=request.form['nombre'],
             direccion=request.form.get('direccion', ''),
             telefono=request.form.get('telefono', ''),
+            hora_corte=_hora_corte_form(),
         )
         db.session.add(s)
         db.session.commit()
+        invalidar_horas_corte()
         flash('Sucursal creada.', 'success')
         return redirect(url_for('sucursales.lista_sucursales'))
     return render_template('admin/sucursales/form.html')
@@ -43,7 +54,9 @@ def editar_sucursal(id):
         s.direccion = request.form.get('direccion', '')
         s.telefono = request.form.get('telefono', '')
         s.activa = 'activa' in request.form
+        s.hora_corte = _hora_corte_form()
         db.session.commit()
+        invalidar_horas_corte()
         flash('Sucursal actualizada.', 'success')
         return redirect(url_for('sucursales.lista_sucursales'))
     return render_template('admin/sucursales/form.html', sucursal=s)
@@ -2,6 +2,9 @@ from flask import Blueprint, request, jsonify, g
 from flask_login import login_required, current_user
 from backend.extensions import db
 from backend.models.models import Sale, SaleItem, Producto, Mesa
+from backend.services.resumen_ventas import acumular_venta, acumular_item
+from backend.services.cache_reportes import invalidar_reportes
+from backend.services.contadores_kpi import movimientos_venta, movimientos_item, aplicar_movimientos
 
 ventas_bp = Blueprint('ventas', __name__, url_prefix='/ventas')
 
@@ -35,13 +38,27 @@ def agregar_item(sale_id):
     sale = Sale.query.get_or_404(sale_id)
     sale.total += item.subtotal
     db.session.add(item)
+    movs_kpi = {}
+    if sale.estado == 'cerrada':
+        # Ya está en el rollup diario y en los contadores: sumar solo esta partida
+        acumular_item(sale, item)
+        db.session.flush()
+        movs_kpi = movimientos_item(sale, item)
     db.session.commit()
+    if sale.estado == 'cerrada':
+        aplicar_movimientos(movs_kpi)
+        invalidar_reportes(sale.sucursal_id, fecha=sale.fecha_negocio)
     return jsonify({'item_id': item.id, 'nuevo_total': float(sale.total)}), 201
 
 @ventas_bp.route('/<int:sale_id>/cerrar', methods=['POST'])
 @login_required
 def cerrar_venta(sale_id):
     sale = Sale.query.get_or_404(sale_id)
-    sale.estado = 'cerrada'
-    db.session.commit()
+    if sale.estado != 'cerrada':
+        sale.estado = 'cerrada'
+        acumular_venta(sale, sale.items)
+        movs_kpi = movimientos_venta(sale, sale.items)
+        db.session.commit()
+        aplicar_movimientos(movs_kpi)
+        invalidar_reportes(sale.sucursal_id)
     return jsonify({'estado': sale.estado, 'total': float(sale.total)})
@@ -0,0 +1,151 @@
+"""Caché de resultados JSON de reportes y dashboard (Redis vía Flask-Caching).
+
+Clave: (endpoint, argumentos de la ruta, fecha_inicio, fecha_fin, sucursal_id).
+
+- Rangos cerrados (terminan antes del día de negocio en curso) casi no
+  cambian: se guardan con TTL largo y llevan en la clave una generación
+  global de cerrados. Se incrementa cuando un evento cae en un día de
+  negocio ya cerrado (pago procesado por el outbox después del corte,
+  partida agregada a una venta de ayer) y al reconstruir el histórico
+  (flask reconstruir-resumen-ventas).
+- Rangos que incluyen hoy llevan en la clave un número de generación por
+  sucursal. Un pago, merma u orden delivery de esa sucursal incrementa la
+  generación (invalidar_reportes) y las entradas anteriores quedan huérfanas
+  hasta expirar. La vista "todas las sucursales" tiene su propia generación,
+  que se incrementa con cualquier evento.
+
+Los contadores hit/miss por endpoint viven en la misma caché para que se
+sumen entre workers; se consultan con estadisticas_cache().
+
+Configurable via env vars:
+  REPORTES_CACHE_TTL_CERRADO=604800   (segundos, rangos históricos)
+  REPORTES_CACHE_TTL_ABIERTO=300      (segundos, red de seguridad para hoy)
+"""
+import os
+import logging
+from functools import wraps
+
+from flask import request, jsonify, g, current_app
+
+from backend.extensions import cache
+from backend.services.dia_negocio import hoy_negocio
+
+logger = logging.getLogger(__name__)
+
+REPORTES_CACHE_TTL_CERRADO = int(os.getenv('REPORTES_CACHE_TTL_CERRADO', str(7 * 24 * 3600)))
+REPORTES_CACHE_TTL_ABIERTO = int(os.getenv('REPORTES_CACHE_TTL_ABIERTO', '300'))
+
+PREFIJO = 'reportes'
+
+
+def _sufijo_sucursal(sucursal_id):
+    return 'todas' if sucursal_id is None else str(sucursal_id)
+
+
+def _clave_generacion(sucursal_id):
+    return f'{PREFIJO}:gen:{_sufijo_sucursal(sucursal_id)}'
+
+
+def _clave_cerrados():
+    return f'{PREFIJO}:gen:cerrados'
+
+
+def _contar(endpoint, evento):
+    try:
+        cache.cache.inc(f'{PREFIJO}:stats:{endpoint}:{evento}')
+    except Exception:
+        logger.debug('No se pudo actualizar contador de caché %s', endpoint, exc_info=True)
+
+
+def _incrementar(generaciones):
+    for clave in generaciones:
+        try:
+            cache.cache.inc(clave)  # INCR atómico en Redis
+        except Exception:
+            logger.warning('No se pudo invalidar caché de reportes (%s)', clave, exc_info=True)
+
+
+def invalidar_reportes(*sucursal_ids, fecha=None):
+    """Invalida los resultados cacheados que incluyen el día en curso.
+
+    Llamar después del commit de un pago, merma u orden delivery. Si
+    `fecha` (día de negocio del evento) ya cerró, invalida también los
+    rangos cerrados.
+    """
+    generaciones = {_clave_generacion(s) for s in sucursal_ids if s is not None}
+    generaciones.add(_clave_generacion(None))
+    if fecha is not None and any(fecha < hoy_negocio(s) for s in set(sucursal_ids) | {None}):
+        generaciones.add(_clave_cerrados())
+    _incrementar(generaciones)
+
+
+def invalidar_reportes_cerrados():
+    """Invalida todos los rangos cerrados (reconstrucción del histórico)."""
+    _incrementar([_clave_cerrados()])
+
+
+def cache_reporte(rango):
+    """Decorador para endpoints JSON de reportes.
+
+    Args:
+        rango: callable sin argumentos que regresa (fecha_inicio, fecha_fin)
+               del request actual.
+    """
+    def decorador(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            endpoint = request.endpoint
+            fi, ff = rango()
+            suc_id = getattr(g, 'sucursal_id', None)
+            ruta = ''.join(f'{k}={v}:' for k, v in sorted(kwargs.items()))
+            clave = f'{PREFIJO}:{endpoint}:{ruta}{fi}:{ff}:{_sufijo_sucursal(suc_id)}'
+            abierto = ff >= hoy_negocio(suc_id)
+
+            try:
+                if abierto:
+                    clave += f':g{cache.get(_clave_generacion(suc_id)) or 0}'
+                else:
+                    clave += f':c{cache.get(_clave_cerrados()) or 0}'
+                datos = cache.get(clave)
+            except Exception:
+                logger.warning('Caché de reportes no disponible', exc_info=True)
+                return f(*args, **kwargs)
+
+            if datos is not None:
+                _contar(endpoint, 'hits')
+                return jsonify(datos)
+
+            _contar(endpoint, 'misses')
+            resp = f(*args, **kwargs)
+            if getattr(resp, 'status_code', None) == 200 and resp.is_json:
+                ttl = REPORTES_CACHE_TTL_ABIERTO if abierto else REPORTES_CACHE_TTL_CERRADO
+                try:
+                    cache.set(clave, resp.get_json(), timeout=ttl)
+                except Exception:
+                    logger.warning('No se pudo guardar en caché %s', clave, exc_info=True)
+            return resp
+
+        wrapper.cache_reporte = True
+        return wrapper
+    return decorador
+
+
+def estadisticas_cache():
+    """Hits/misses acumulados por cada endpoint con @cache_reporte.
+
+    Returns:
+        dict endpoint -> {'hits', 'misses', 'hit_ratio'}
+    """
+    endpoints = [nombre for nombre, vista in current_app.view_functions.items()
+                 if getattr(vista, 'cache_reporte', False)]
+    resultado = {}
+    for endpoint in sorted(endpoints):
+        hits = int(cache.get(f'{PREFIJO}:stats:{endpoint}:hits') or 0)
+        misses = int(cache.get(f'{PREFIJO}:stats:{endpoint}:misses') or 0)
+        total = hits + misses
+        resultado[endpoint] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / total, 3) if total else None,
+        }
+    return resultado
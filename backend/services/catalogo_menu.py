@@ -0,0 +1,140 @@
+"""Catálogo del menú versionado para las tabletas de meseros.
+
+El menú (productos agrupados por categoría, con estación) cambia unas
+cuantas veces al mes y se leía completo en cada vista de detalle de orden.
+Ahora se arma una vez por versión:
+
+- Versión: contador en la caché de Redis (menu:version). invalidar_menu()
+  lo incrementa; llamar después del commit de cualquier alta, edición o baja
+  de productos, categorías o estaciones (admin_routes, productos.py).
+- Catálogo: JSON compacto guardado en Redis bajo su versión
+  (menu:catalogo:<version>) para que un solo worker lo arme desde SQL, y en
+  memoria del proceso junto con su ETag (hash del JSON).
+
+Cada lectura cuesta un GET de la versión. Si Redis no responde se usa la
+copia del proceso hasta MENU_SIN_REDIS_SEG y después se rearma desde SQL.
+
+GET /meseros/api/menu sirve el JSON con ETag (304 si no cambió). Con
+?v=<etag> vigente la respuesta es inmutable y la tableta la guarda
+MENU_MAX_AGE. La página de la orden no lleva el menú en el HTML: lo carga
+desde esa URL, así que solo se descarga de nuevo cuando cambia la versión.
+
+Configurable via env vars:
+  MENU_CACHE_TTL=86400        (segundos del catálogo compartido en Redis)
+  MENU_SIN_REDIS_SEG=60
+  MENU_MAX_AGE=31536000
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+
+from backend.extensions import cache
+
+logger = logging.getLogger(__name__)
+
+MENU_CACHE_TTL = int(os.getenv('MENU_CACHE_TTL', '86400'))
+MENU_SIN_REDIS_SEG = int(os.getenv('MENU_SIN_REDIS_SEG', '60'))
+MENU_MAX_AGE = int(os.getenv('MENU_MAX_AGE', str(365 * 24 * 3600)))
+
+PREFIJO = 'menu'
+CLAVE_VERSION = f'{PREFIJO}:version'
+
+_local = {}   # version, cuerpo, etag, armado (monotonic)
+_lock = threading.Lock()
+
+
+def invalidar_menu():
+    """Publica una nueva versión del menú. Llamar después del commit."""
+    try:
+        cache.cache.inc(CLAVE_VERSION)  # INCR atómico en Redis
+    except Exception:
+        logger.warning('No se pudo invalidar el catálogo del menú', exc_info=True)
+    with _lock:
+        _local.clear()
+
+
+def _version():
+    """Versión vigente (0 si nunca se invalidó), o None si Redis no responde."""
+    try:
+        return int(cache.get(CLAVE_VERSION) or 0)
+    except Exception:
+        logger.warning('Versión del menú no disponible', exc_info=True)
+        return None
+
+
+def _armar():
+    """JSON compacto del menú desde SQL (una consulta)."""
+    from sqlalchemy.orm import joinedload
+    from backend.models.models import Producto
+
+    productos = Producto.query.options(
+        joinedload(Producto.categoria),
+        joinedload(Producto.estacion),
+    ).order_by(Producto.categoria_id, Producto.nombre).all()
+
+    categorias = {}
+    for p in productos:
+        categoria = categorias.setdefault(p.categoria_id, {
+            'id': p.categoria_id,
+            'nombre': p.categoria.nombre if p.categoria else None,
+            'productos': [],
+        })
+        categoria['productos'].append({
+            'id': p.id,
+            'nombre': p.nombre,
+            'precio': float(p.precio),
+            'unidad': p.unidad,
+            'descripcion': p.descripcion,
+            'estacion': p.estacion.nombre if p.estacion else None,
+        })
+    return json.dumps({'categorias': list(categorias.values())},
+                      ensure_ascii=False, separators=(',', ':'))
+
+
+def _guardar_local(version, cuerpo):
+    entrada = {
+        'version': version,
+        'cuerpo': cuerpo,
+        'etag': hashlib.sha256(cuerpo.encode('utf-8')).hexdigest()[:32],
+        'armado': time.monotonic(),
+    }
+    with _lock:
+        _local.clear()
+        _local.update(entrada)
+    return entrada
+
+
+def _vigente():
+    version = _version()
+    with _lock:
+        entrada = dict(_local)
+    if entrada:
+        if version is not None and entrada['version'] == version:
+            return entrada
+        if version is None and time.monotonic() - entrada['armado'] < MENU_SIN_REDIS_SEG:
+            return entrada
+
+    clave = f'{PREFIJO}:catalogo:{version}'
+    cuerpo = None
+    if version is not None:
+        try:
+            cuerpo = cache.get(clave)
+        except Exception:
+            logger.warning('Catálogo compartido del menú no disponible', exc_info=True)
+    if cuerpo is None:
+        cuerpo = _armar()
+        if version is not None:
+            try:
+                cache.set(clave, cuerpo, timeout=MENU_CACHE_TTL)
+            except Exception:
+                logger.warning('No se pudo compartir el catálogo del menú', exc_info=True)
+    return _guardar_local(version, cuerpo)
+
+
+def menu_json():
+    """(cuerpo JSON, etag) de la versión vigente."""
+    entrada = _vigente()
+    return entrada['cuerpo'], entrada['etag']
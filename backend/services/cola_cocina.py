@@ -0,0 +1,261 @@
+"""Cola de cocina: items pendientes por estación sin consultar la base.
+
+Las pantallas KDS (página, fragmento y snapshot) leen de aquí. Cada item es
+el mismo dict que viaja en los kds_delta (kds.item_kds) más su sucursal_id.
+
+Modos (COLA_COCINA_MODO):
+  redis  compartida por todos los workers (default)
+             cola:<estacion>   hash: detalle_id → JSON del item, _ok
+  local  dict en el proceso (un solo worker / desarrollo)
+  off    sin cola: las pantallas consultan la base
+
+Escritura write-through: kds.emitir_kds() aplica aquí cada cambio que
+publica (add/update = upsert, remove = borrar) antes de subir la versión de
+la sala. Así la cubren todos los puntos que ya publican deltas: envío a
+cocina, productos agregados, delivery, marcar listo, cancelación y pago.
+
+El campo _ok lo escribe solo la carga completa desde SQL; si falta (Redis
+reiniciado, estación nueva) la primera lectura carga la estación.
+verificar_cola() compara contra la base y publica como deltas las
+correcciones, así se corrigen a la vez la cola y las pantallas. Corre cada
+COLA_COCINA_VERIFICAR_SEG en segundo plano (un worker a la vez) y por CLI
+(flask verificar-cola-cocina).
+
+Si Redis no responde, las lecturas regresan None y el llamador usa SQL.
+
+Configurable via env vars:
+  COLA_COCINA_MODO=redis
+  COLA_COCINA_REDIS_URL=redis://localhost:6379/5   (default: REDIS_URL con la base 5)
+  COLA_COCINA_VERIFICAR_SEG=60    (0 = sin verificación periódica)
+"""
+import os
+import json
+import logging
+import threading
+
+from backend.extensions import url_redis_db
+
+logger = logging.getLogger(__name__)
+
+COLA_COCINA_MODO = os.getenv('COLA_COCINA_MODO', 'redis')
+COLA_COCINA_REDIS_URL = os.getenv('COLA_COCINA_REDIS_URL') or url_redis_db(5)
+COLA_COCINA_VERIFICAR_SEG = int(os.getenv('COLA_COCINA_VERIFICAR_SEG', '60'))
+
+PREFIJO = 'cola'
+MARCA = '_ok'
+
+_cliente = None
+_local = {}          # estacion → {detalle_id: item}
+_lock = threading.Lock()
+_verificador_activo = False
+
+
+def _redis():
+    global _cliente
+    if _cliente is None:
+        import redis
+        _cliente = redis.Redis.from_url(
+            COLA_COCINA_REDIS_URL, decode_responses=True,
+            socket_connect_timeout=0.5, socket_timeout=0.5,
+        )
+    return _cliente
+
+
+def _clave(estacion):
+    return f'{PREFIJO}:{estacion}'
+
+
+def _ordenar(items):
+    return sorted(items, key=lambda i: (i['tiempo_registro'], i['id']))
+
+
+# =====================================================================
+# Carga desde SQL
+# =====================================================================
+
+def _desde_sql(estacion):
+    """{detalle_id: item} de la estación según la base (todas las sucursales)."""
+    from backend.services.kds import consulta_pendientes, item_kds
+
+    return {
+        d.id: dict(item_kds(d), sucursal_id=d.orden.sucursal_id)
+        for d in consulta_pendientes(estacion).all()
+    }
+
+
+def _guardar(estacion, items):
+    """Reemplaza la estación completa y la marca como cargada."""
+    if COLA_COCINA_MODO == 'local':
+        with _lock:
+            _local[estacion] = dict(items)
+        return
+    mapeo = {str(i): json.dumps(item) for i, item in items.items()}
+    mapeo[MARCA] = '1'
+    pipe = _redis().pipeline(transaction=True)
+    pipe.delete(_clave(estacion))
+    pipe.hset(_clave(estacion), mapping=mapeo)
+    pipe.execute()
+
+
+def _leer(estacion):
+    """{detalle_id: item} de la cola, o None si la estación no está cargada."""
+    if COLA_COCINA_MODO == 'local':
+        with _lock:
+            items = _local.get(estacion)
+            return dict(items) if items is not None else None
+    crudo = _redis().hgetall(_clave(estacion))
+    if MARCA not in crudo:
+        return None
+    crudo.pop(MARCA)
+    return {int(k): json.loads(v) for k, v in crudo.items()}
+
+
+# =====================================================================
+# Escritura (write-through desde kds.emitir_kds)
+# =====================================================================
+
+def aplicar(entradas):
+    """Aplica (estacion, sucursal_id, op, item) a la cola. Nunca lanza."""
+    if COLA_COCINA_MODO == 'off' or not entradas:
+        return
+    try:
+        if COLA_COCINA_MODO == 'local':
+            with _lock:
+                for estacion, sucursal_id, op, item in entradas:
+                    cola = _local.get(estacion)
+                    if cola is None:
+                        continue  # se cargará completa en la primera lectura
+                    if op == 'remove':
+                        cola.pop(item['id'], None)
+                    else:
+                        cola[item['id']] = dict(item, sucursal_id=sucursal_id)
+            return
+        pipe = _redis().pipeline(transaction=True)
+        for estacion, sucursal_id, op, item in entradas:
+            if op == 'remove':
+                pipe.hdel(_clave(estacion), str(item['id']))
+            else:
+                pipe.hset(_clave(estacion), str(item['id']), json.dumps(dict(item, sucursal_id=sucursal_id)))
+        pipe.execute()
+    except Exception:
+        logger.warning('No se pudo actualizar la cola de cocina', exc_info=True)
+
+
+# =====================================================================
+# Lectura
+# =====================================================================
+
+def pendientes(estacion, sucursal_id=None):
+    """Items pendientes de la estación ordenados por llegada.
+
+    Args:
+        sucursal_id: None = todas las sucursales.
+    Returns:
+        lista de items, o None si la cola no está disponible (usar SQL).
+    """
+    if COLA_COCINA_MODO == 'off':
+        return None
+    try:
+        items = _leer(estacion)
+        if items is None:
+            items = _desde_sql(estacion)
+            _guardar(estacion, items)
+            logger.info('Cola de cocina %s cargada desde SQL: %d items', estacion, len(items))
+    except Exception:
+        logger.warning('Cola de cocina no disponible (%s)', estacion, exc_info=True)
+        return None
+    valores = items.values()
+    if sucursal_id is not None:
+        valores = [i for i in valores if i['sucursal_id'] == sucursal_id]
+    return _ordenar(valores)
+
+
+# =====================================================================
+# Verificación contra la base
+# =====================================================================
+
+def verificar_cola(estaciones=None):
+    """Compara la cola con la base y publica las correcciones como deltas.
+
+    La cola se lee antes que la base: lo que cambie entre ambas lecturas se
+    corrige hacia el estado más reciente.
+
+    Returns:
+        lista de {estacion, detalle_id, tipo: faltante|sobrante|distinto}
+    """
+    from backend.models.models import Estacion
+    from backend.services.kds import emitir_kds
+
+    if COLA_COCINA_MODO == 'off':
+        return []
+    if estaciones is None:
+        estaciones = [e for (e,) in Estacion.query.with_entities(Estacion.nombre).all()]
+
+    diferencias, entradas = [], []
+    for estacion in estaciones:
+        cola = _leer(estacion)
+        sql = _desde_sql(estacion)
+        if cola is None:
+            _guardar(estacion, sql)  # sin carga previa no hay nada que comparar
+            continue
+        for detalle_id in sql.keys() | cola.keys():
+            en_sql, en_cola = sql.get(detalle_id), cola.get(detalle_id)
+            if en_sql == en_cola:
+                continue
+            if en_cola is None:
+                tipo, op, item = 'faltante', 'add', en_sql
+            elif en_sql is None:
+                tipo, op, item = 'sobrante', 'remove', en_cola
+            else:
+                tipo, op, item = 'distinto', 'update', en_sql
+            diferencias.append({'estacion': estacion, 'detalle_id': detalle_id, 'tipo': tipo})
+            datos = {k: v for k, v in item.items() if k != 'sucursal_id'}
+            if op == 'remove':
+                datos = {'id': datos['id'], 'orden_id': datos['orden_id']}
+            entradas.append((estacion, item['sucursal_id'], op, datos))
+
+    if entradas:
+        logger.warning('Cola de cocina corregida: %d diferencias', len(entradas))
+        emitir_kds(entradas)
+    return diferencias
+
+
+def _tomar_turno():
+    """Un solo worker verifica por periodo (cerrojo con expiración en Redis)."""
+    if COLA_COCINA_MODO != 'redis':
+        return True
+    try:
+        return bool(_redis().set(f'{PREFIJO}:_verificando', '1', nx=True,
+                                 ex=max(COLA_COCINA_VERIFICAR_SEG - 1, 1)))
+    except Exception:
+        return False
+
+
+def _ciclo(app):
+    from backend.extensions import socketio, db
+
+    while True:
+        socketio.sleep(COLA_COCINA_VERIFICAR_SEG)
+        if not _tomar_turno():
+            continue
+        with app.app_context():
+            try:
+                verificar_cola()
+            except Exception:
+                logger.exception('Error verificando la cola de cocina')
+                db.session.rollback()
+            finally:
+                db.session.remove()
+
+
+def programar_verificacion(app):
+    """Arranca la verificación periódica en este proceso (una sola vez)."""
+    global _verificador_activo
+    if COLA_COCINA_MODO == 'off' or COLA_COCINA_VERIFICAR_SEG <= 0:
+        return
+    with _lock:
+        if _verificador_activo:
+            return
+        _verificador_activo = True
+    from backend.extensions import socketio
+    socketio.start_background_task(_ciclo, app)
@@ -0,0 +1,442 @@
+"""Contadores de KPIs del día en Redis (ventas, órdenes, propinas, rankings).
+
+Por sucursal y día de negocio (y para "todas" las sucursales):
+
+    kpi:<sucursal|todas>:<fecha>            hash: ventas, ordenes, propinas,
+                                                  ventas:HH, ordenes:HH, _ok
+    kpi:<sucursal|todas>:<fecha>:productos  zset: producto_id → unidades
+    kpi:<sucursal|todas>:<fecha>:meseros    zset: usuario_id → ventas
+    kpi:<sucursal|todas>:<fecha>:eventos    hash: evento → incrementos (JSON)
+
+El flujo de pago arma los incrementos antes del commit (movimientos_venta,
+movimientos_propina) y los aplica en un pipeline MULTI después del commit
+(aplicar_movimientos). Las lecturas son O(1) (HGETALL / ZREVRANGE).
+
+Cada grupo de incrementos lleva un id de evento ('v<sale_id>' para una
+venta, 'v<sale_id>:<item_id>' para una partida agregada a una venta ya
+cerrada, 'p<orden_id>' para la propina de una orden pagada) que se anota en
+:eventos en el mismo MULTI. Así la reconstrucción y los incrementos no se
+pisan: aplicar_movimientos() hace WATCH de :eventos y omite un evento ya
+anotado; la reconstrucción también hace WATCH, marca como aplicados los
+eventos que ya vio en SQL y vuelve a aplicar los anotados que SQL todavía no
+veía (confirmados después de su consulta). Ningún pago cuenta doble ni se
+pierde.
+
+El campo _ok lo escribe solo la reconstrucción desde SQL. Si falta (Redis
+reiniciado, llave expirada) la primera lectura reconstruye el día desde
+sales/ordenes. reconciliar_kpis() recalcula y reporta cualquier diferencia
+entre Redis y la base (CLI: flask reconciliar-kpis).
+
+Si Redis no responde, las lecturas regresan None y el llamador usa SQL.
+
+Configurable via env vars:
+  KPI_REDIS_URL=redis://localhost:6379/3   (default: REDIS_URL con la base 3)
+  KPI_TTL_DIAS=3     (días que se conservan los contadores)
+"""
+import os
+import json
+import logging
+from datetime import datetime, time
+
+from sqlalchemy import func, extract
+
+from backend.extensions import url_redis_db
+from backend.services.dia_negocio import dia_negocio, hoy_negocio, a_hora_local, ordenes_pagadas_en
+
+logger = logging.getLogger(__name__)
+
+KPI_REDIS_URL = os.getenv('KPI_REDIS_URL') or url_redis_db(3)
+KPI_TTL_DIAS = int(os.getenv('KPI_TTL_DIAS', '3'))
+
+PREFIJO = 'kpi'
+MARCA = '_ok'
+TOLERANCIA = 0.005
+REINTENTOS = 5
+
+_cliente = None
+
+
+def _redis():
+    global _cliente
+    if _cliente is None:
+        import redis
+        _cliente = redis.Redis.from_url(
+            KPI_REDIS_URL, decode_responses=True,
+            socket_connect_timeout=0.5, socket_timeout=0.5,
+        )
+    return _cliente
+
+
+def _base(sucursal_id, fecha):
+    return f'{PREFIJO}:{"todas" if sucursal_id is None else sucursal_id}:{fecha.isoformat()}'
+
+
+def _base_de(llave):
+    """kpi:<sucursal>:<fecha>[:ranking] → kpi:<sucursal>:<fecha>."""
+    return ':'.join(llave.split(':')[:3])
+
+
+def _ambitos(sucursal_id):
+    """Cada evento cuenta en su sucursal y en la vista "todas"."""
+    return (None,) if sucursal_id is None else (sucursal_id, None)
+
+
+# =====================================================================
+# Escritura incremental (flujo de pago)
+# =====================================================================
+
+def _movimientos(venta, total, ordenes, items):
+    momento = venta.fecha_hora or datetime.utcnow()
+    fecha = venta.fecha_negocio or dia_negocio(momento, venta.sucursal_id)
+    hora = a_hora_local(momento).hour
+    movs = []
+    for suc in _ambitos(venta.sucursal_id):
+        base = _base(suc, fecha)
+        movs += [
+            ('hincrbyfloat', base, 'ventas', total),
+            ('hincrbyfloat', base, f'ventas:{hora:02d}', total),
+            ('zincrby', f'{base}:meseros', total, str(venta.usuario_id)),
+        ]
+        if ordenes:
+            movs += [
+                ('hincrby', base, 'ordenes', ordenes),
+                ('hincrby', base, f'ordenes:{hora:02d}', ordenes),
+            ]
+        for item in items:
+            movs.append(('zincrby', f'{base}:productos', int(item.cantidad), str(item.producto_id)))
+    return movs
+
+
+def movimientos_venta(venta, items):
+    """Incrementos de una venta cerrada: {'v<sale_id>': [...]}.
+
+    Llamar después del flush (id y fecha_negocio ya asignados) y antes del
+    commit; aplicar con aplicar_movimientos() una vez confirmada la
+    transacción.
+    """
+    return {f'v{venta.id}': _movimientos(venta, float(venta.total or 0), 1, items)}
+
+
+def movimientos_item(venta, item):
+    """Partida agregada a una venta ya cerrada: {'v<sale_id>:<item_id>': [...]}.
+
+    Suma su subtotal y unidades en el día y la hora de la venta, sin contar
+    otra orden (igual que resumen_ventas.acumular_item).
+    """
+    return {f'v{venta.id}:{item.id}': _movimientos(venta, float(item.subtotal or 0), 0, [item])}
+
+
+def movimientos_propina(orden):
+    """Propina de una orden pagada: {'p<orden_id>': [...]}, o {} sin propina.
+
+    Cuenta completa en el día de negocio en que se liquidó la orden, igual
+    que la reconstrucción desde SQL.
+    """
+    propina = float(orden.propina or 0)
+    if propina <= 0:
+        return {}
+    fecha = dia_negocio(orden.fecha_pago or datetime.utcnow(), orden.sucursal_id)
+    return {f'p{orden.id}': [('hincrbyfloat', _base(suc, fecha), 'propinas', propina)
+                             for suc in _ambitos(orden.sucursal_id)]}
+
+
+def _aplicar_evento(pipe, base, evento, movs):
+    """Aplica los incrementos de un evento en `base` si no están anotados."""
+    import redis
+
+    diario = f'{base}:eventos'
+    ttl = KPI_TTL_DIAS * 86400
+    for _ in range(REINTENTOS):
+        try:
+            pipe.watch(diario)
+            if pipe.hexists(diario, evento):
+                pipe.unwatch()
+                return
+            pipe.multi()
+            llaves = {diario}
+            for metodo, llave, *args in movs:
+                getattr(pipe, metodo)(llave, *args)
+                llaves.add(llave)
+            pipe.hset(diario, evento, json.dumps(movs))
+            for llave in llaves:
+                pipe.expire(llave, ttl)
+            pipe.execute()
+            return
+        except redis.WatchError:
+            continue
+    raise RuntimeError(f'{diario}: demasiados reintentos para {evento}')
+
+
+def aplicar_movimientos(eventos):
+    """Aplica {evento: incrementos} una sola vez por evento. Nunca lanza excepción."""
+    for evento, movs in (eventos or {}).items():
+        por_base = {}
+        for mov in movs:
+            por_base.setdefault(_base_de(mov[1]), []).append(mov)
+        try:
+            with _redis().pipeline(transaction=True) as pipe:
+                for base, movs_base in por_base.items():
+                    _aplicar_evento(pipe, base, evento, movs_base)
+        except Exception:
+            logger.warning('No se pudieron actualizar contadores KPI (%s); se corregirán al reconciliar',
+                           evento, exc_info=True)
+
+
+# =====================================================================
+# Reconstrucción desde SQL
+# =====================================================================
+
+def _calcular_sql(sucursal_id, fecha):
+    """Valores del día calculados desde sales / sale_items / ordenes."""
+    from backend.extensions import db
+    from backend.models.models import Sale, SaleItem, Orden
+
+    def por_sucursal(q, columna):
+        return q if sucursal_id is None else q.filter(columna == sucursal_id)
+
+    offset = a_hora_local(datetime.combine(fecha, time(12))).utcoffset()
+    offset_horas = int(offset.total_seconds() // 3600)
+
+    por_hora = {}
+    ventas, ordenes = 0.0, 0
+    filas = por_sucursal(
+        db.session.query(extract('hour', Sale.fecha_hora), func.sum(Sale.total), func.count(Sale.id))
+        .filter(Sale.fecha_negocio == fecha, Sale.estado == 'cerrada'), Sale.sucursal_id,
+    ).group_by(extract('hour', Sale.fecha_hora)).all()
+    for hora_utc, total, num in filas:
+        hora = (int(hora_utc) + offset_horas) % 24
+        v, n = por_hora.get(hora, (0.0, 0))
+        por_hora[hora] = (v + float(total or 0), n + num)
+        ventas += float(total or 0)
+        ordenes += num
+
+    productos = dict(por_sucursal(
+        db.session.query(SaleItem.producto_id, func.sum(SaleItem.cantidad))
+        .join(Sale, SaleItem.sale_id == Sale.id)
+        .filter(Sale.fecha_negocio == fecha, Sale.estado == 'cerrada'), Sale.sucursal_id,
+    ).group_by(SaleItem.producto_id).all())
+
+    meseros = dict(por_sucursal(
+        db.session.query(Sale.usuario_id, func.sum(Sale.total))
+        .filter(Sale.fecha_negocio == fecha, Sale.estado == 'cerrada'), Sale.sucursal_id,
+    ).group_by(Sale.usuario_id).all())
+
+    # Eventos ya incluidos: cada venta y cada partida (las agregadas después
+    # de cerrar llegan como 'v<sale_id>:<item_id>')
+    ventas_ids = por_sucursal(
+        db.session.query(Sale.id).filter(Sale.fecha_negocio == fecha, Sale.estado == 'cerrada'),
+        Sale.sucursal_id,
+    ).all()
+    items_ids = por_sucursal(
+        db.session.query(SaleItem.sale_id, SaleItem.id)
+        .join(Sale, SaleItem.sale_id == Sale.id)
+        .filter(Sale.fecha_negocio == fecha, Sale.estado == 'cerrada'), Sale.sucursal_id,
+    ).all()
+
+    con_propina = por_sucursal(
+        db.session.query(Orden.id, Orden.propina)
+        .filter(Orden.id.in_(ordenes_pagadas_en(fecha, fecha)),
+                Orden.estado == 'pagada', Orden.propina > 0), Orden.sucursal_id,
+    ).all()
+    propinas = sum(float(p or 0) for _, p in con_propina)
+
+    return {
+        'ventas': round(ventas, 2),
+        'ordenes': ordenes,
+        'propinas': round(propinas, 2),
+        'por_hora': {h: (round(v, 2), n) for h, (v, n) in sorted(por_hora.items())},
+        'productos': {str(k): int(v or 0) for k, v in productos.items()},
+        'meseros': {str(k): round(float(v or 0), 2) for k, v in meseros.items()},
+        'eventos': ({f'v{i}' for (i,) in ventas_ids} | {f'v{v}:{i}' for v, i in items_ids}
+                    | {f'p{i}' for i, _ in con_propina}),
+    }
+
+
+def _escribir(sucursal_id, fecha, valores):
+    """Reemplaza los contadores con los valores de SQL.
+
+    Los eventos anotados en :eventos que SQL no vio (confirmados después de
+    la consulta) se vuelven a aplicar encima en el mismo MULTI; si un
+    incremento entra entre la lectura y el EXEC, el WATCH reintenta.
+    """
+    import redis
+
+    base = _base(sucursal_id, fecha)
+    diario = f'{base}:eventos'
+    campos = {
+        'ventas': valores['ventas'], 'ordenes': valores['ordenes'],
+        'propinas': valores['propinas'], MARCA: 1,
+    }
+    for hora, (v, n) in valores['por_hora'].items():
+        campos[f'ventas:{hora:02d}'] = v
+        campos[f'ordenes:{hora:02d}'] = n
+
+    with _redis().pipeline(transaction=True) as pipe:
+        for _ in range(REINTENTOS):
+            try:
+                pipe.watch(diario)
+                pendientes = {evento: movs for evento, movs in pipe.hgetall(diario).items()
+                              if evento not in valores['eventos']}
+                pipe.multi()
+                pipe.delete(base, f'{base}:productos', f'{base}:meseros', diario)
+                pipe.hset(base, mapping=campos)
+                if valores['productos']:
+                    pipe.zadd(f'{base}:productos', valores['productos'])
+                if valores['meseros']:
+                    pipe.zadd(f'{base}:meseros', valores['meseros'])
+                for movs in pendientes.values():
+                    for metodo, llave, *args in json.loads(movs):
+                        getattr(pipe, metodo)(llave, *args)
+                anotados = dict.fromkeys(valores['eventos'], '[]')
+                anotados.update(pendientes)
+                if anotados:
+                    pipe.hset(diario, mapping=anotados)
+                for llave in (base, f'{base}:productos', f'{base}:meseros', diario):
+                    pipe.expire(llave, KPI_TTL_DIAS * 86400)
+                pipe.execute()
+                return
+            except redis.WatchError:
+                continue
+    raise RuntimeError(f'{base}: demasiados reintentos al reconstruir')
+
+
+def _leer(sucursal_id, fecha):
+    """Valores guardados en Redis, o None si el día no está inicializado."""
+    base = _base(sucursal_id, fecha)
+    pipe = _redis().pipeline(transaction=False)
+    pipe.hgetall(base)
+    pipe.zrange(f'{base}:productos', 0, -1, withscores=True)
+    pipe.zrange(f'{base}:meseros', 0, -1, withscores=True)
+    campos, productos, meseros = pipe.execute()
+    if MARCA not in campos:
+        return None
+
+    por_hora = {}
+    for campo, valor in campos.items():
+        if campo.startswith('ventas:'):
+            hora = int(campo.split(':')[1])
+            por_hora[hora] = (round(float(valor), 2), int(campos.get(f'ordenes:{hora:02d}', 0)))
+    return {
+        'ventas': round(float(campos.get('ventas', 0)), 2),
+        'ordenes': int(campos.get('ordenes', 0)),
+        'propinas': round(float(campos.get('propinas', 0)), 2),
+        'por_hora': dict(sorted(por_hora.items())),
+        'productos': {k: int(v) for k, v in productos},
+        'meseros': {k: round(v, 2) for k, v in meseros},
+    }
+
+
+def reconstruir_kpis(sucursal_id, fecha):
+    """Recalcula el día desde SQL y reemplaza los contadores. Returns: valores."""
+    valores = _calcular_sql(sucursal_id, fecha)
+    _escribir(sucursal_id, fecha, valores)
+    logger.info('Contadores KPI reconstruidos %s', _base(sucursal_id, fecha))
+    return valores
+
+
+def _diferencias(guardado, esperado):
+    """Lista de (campo, valor_redis, valor_sql) que no coinciden."""
+    difs = []
+    for campo in ('ventas', 'ordenes', 'propinas'):
+        if abs(guardado[campo] - esperado[campo]) > TOLERANCIA:
+            difs.append((campo, guardado[campo], esperado[campo]))
+    for ranking in ('productos', 'meseros'):
+        for clave in sorted(set(guardado[ranking]) | set(esperado[ranking])):
+            a, b = guardado[ranking].get(clave, 0), esperado[ranking].get(clave, 0)
+            if abs(a - b) > TOLERANCIA:
+                difs.append((f'{ranking}:{clave}', a, b))
+    return difs
+
+
+def reconciliar_kpis(fecha=None, sucursal_ids=None):
+    """Compara Redis contra SQL, reporta diferencias y reescribe los contadores.
+
+    Args:
+        fecha: día de negocio (default: hoy).
+        sucursal_ids: sucursales a revisar (default: todas las activas);
+                      la vista "todas" siempre se incluye.
+
+    Returns:
+        list de dicts {sucursal_id, fecha, campo, redis, sql}. Un día sin
+        contadores en Redis se reporta con campo '*'.
+    """
+    from backend.models.models import Sucursal
+
+    fecha = fecha or hoy_negocio()
+    if sucursal_ids is None:
+        sucursal_ids = [s.id for s in Sucursal.query.with_entities(Sucursal.id)]
+
+    reporte = []
+    for suc in list(sucursal_ids) + [None]:
+        guardado = _leer(suc, fecha)
+        esperado = reconstruir_kpis(suc, fecha)
+        if guardado is None:
+            difs = [('*', None, 'reconstruido')]
+        else:
+            difs = _diferencias(guardado, esperado)
+        for campo, en_redis, en_sql in difs:
+            reporte.append({'sucursal_id': suc, 'fecha': fecha.isoformat(),
+                            'campo': campo, 'redis': en_redis, 'sql': en_sql})
+            logger.warning('Drift KPI %s %s: redis=%s sql=%s', _base(suc, fecha), campo, en_redis, en_sql)
+    return reporte
+
+
+# =====================================================================
+# Lectura O(1) para el dashboard
+# =====================================================================
+
+def _asegurar(sucursal_id, fecha):
+    valores = _leer(sucursal_id, fecha)
+    if valores is None:
+        valores = reconstruir_kpis(sucursal_id, fecha)
+    return valores
+
+
+def kpis_dia(sucursal_id, fecha=None):
+    """{'ventas', 'ordenes', 'propinas', 'ticket', 'por_hora'} del día.
+
+    Returns None si Redis no está disponible (el llamador consulta SQL).
+    """
+    fecha = fecha or hoy_negocio(sucursal_id)
+    try:
+        valores = _asegurar(sucursal_id, fecha)
+    except Exception:
+        logger.warning('Contadores KPI no disponibles', exc_info=True)
+        return None
+    ordenes = valores['ordenes']
+    return {
+        'ventas': valores['ventas'],
+        'ordenes': ordenes,
+        'propinas': valores['propinas'],
+        'ticket': round(valores['ventas'] / ordenes, 2) if ordenes else 0,
+        'por_hora': valores['por_hora'],
+    }
+
+
+def _ranking(sucursal_id, fecha, nombre, n):
+    from backend.extensions import db
+    from backend.models.models import Producto, Usuario
+
+    fecha = fecha or hoy_negocio(sucursal_id)
+    try:
+        _asegurar(sucursal_id, fecha)
+        top = _redis().zrevrange(f'{_base(sucursal_id, fecha)}:{nombre}', 0, n - 1, withscores=True)
+    except Exception:
+        logger.warning('Ranking KPI %s no disponible', nombre, exc_info=True)
+        return None
+    modelo = Producto if nombre == 'productos' else Usuario
+    ids = [int(miembro) for miembro, _ in top]
+    nombres = dict(db.session.query(modelo.id, modelo.nombre).filter(modelo.id.in_(ids)).all()) if ids else {}
+    return [(nombres.get(int(miembro), '—'), puntos) for miembro, puntos in top]
+
+
+def top_productos_dia(sucursal_id, fecha=None, n=5):
+    """[(nombre, unidades)] más vendidos del día, o None sin Redis."""
+    top = _ranking(sucursal_id, fecha, 'productos', n)
+    return None if top is None else [(nombre, int(unidades)) for nombre, unidades in top]
+
+
+def top_meseros_dia(sucursal_id, fecha=None, n=5):
+    """[(nombre, ventas)] de los meseros con más ventas del día, o None sin Redis."""
+    top = _ranking(sucursal_id, fecha, 'meseros', n)
+    return None if top is None else [(nombre, round(total, 2)) for nombre, total in top]
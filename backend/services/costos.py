@@ -0,0 +1,89 @@
+"""Costo de receta materializado por producto (tabla costos_producto).
+
+El costo de un producto es Σ(cantidad_por_unidad × costo_unitario) sobre su
+receta aplanada a ingredientes base (services/subrecetas). En lugar de recalcularlo en Python en cada reporte, se guarda por
+producto y se actualiza de forma incremental:
+
+- al guardar una receta            → recalcular_costos([producto_id])
+- al cambiar el costo unitario de
+  un ingrediente                   → recalcular_por_ingrediente(ingrediente_id)
+- al guardar una subreceta         → subrecetas.guardar_subreceta()
+
+Los reportes de rentabilidad leen con una sola consulta
+Producto ⟕ costos_producto (costos_productos()).
+"""
+import logging
+from datetime import datetime
+
+from sqlalchemy import func
+
+logger = logging.getLogger(__name__)
+
+
+def recalcular_costos(producto_ids=None):
+    """Recalcula costos_producto para los productos dados (todos si None).
+
+    Dos sentencias set-based: DELETE de las filas afectadas e
+    INSERT ... SELECT agregando receta_explotada() ⋈ ingredientes. No hace commit;
+    debe ir en la misma transacción que el cambio que lo provoca.
+    """
+    from backend.extensions import db
+    from backend.models.models import CostoProducto, Ingrediente
+    from backend.services.subrecetas import receta_explotada
+
+    if producto_ids is not None:
+        producto_ids = sorted(set(producto_ids))
+        if not producto_ids:
+            return
+
+    receta = receta_explotada()
+    borrar = db.delete(CostoProducto)
+    origen = db.select(
+        receta.c.producto_id,
+        func.sum(receta.c.cantidad_por_unidad * func.coalesce(Ingrediente.costo_unitario, 0)),
+        func.count(receta.c.linea_id.distinct()),
+        db.literal(datetime.utcnow(), db.DateTime),
+    ).select_from(receta).join(Ingrediente, receta.c.ingrediente_id == Ingrediente.id
+    ).group_by(receta.c.producto_id)
+    if producto_ids is not None:
+        borrar = borrar.where(CostoProducto.producto_id.in_(producto_ids))
+        origen = origen.where(receta.c.producto_id.in_(producto_ids))
+
+    db.session.execute(borrar)
+    db.session.execute(db.insert(CostoProducto).from_select(
+        ['producto_id', 'costo', 'num_ingredientes', 'actualizado'], origen,
+    ))
+    logger.debug('Costos recalculados: %s', 'todos' if producto_ids is None else producto_ids)
+
+
+def recalcular_por_ingrediente(ingrediente_id):
+    """Recalcula el costo de los productos y preparados que usan el ingrediente.
+
+    Incluye los que lo usan a través de un preparado (explosión).
+    """
+    from backend.extensions import db
+    from backend.services.subrecetas import (
+        receta_explotada, preparados_con, actualizar_costo_preparados,
+    )
+
+    actualizar_costo_preparados(preparados_con([ingrediente_id]))
+    receta = receta_explotada()
+    producto_ids = db.session.execute(
+        db.select(receta.c.producto_id).distinct().where(receta.c.ingrediente_id == ingrediente_id)
+    ).scalars().all()
+    recalcular_costos(producto_ids)
+
+
+def costos_productos(solo_con_receta=False):
+    """Query de (id, nombre, precio, costo) por producto; costo es None sin receta."""
+    from backend.extensions import db
+    from backend.models.models import Producto, CostoProducto
+
+    q = db.session.query(
+        Producto.id, Producto.nombre, Producto.precio, CostoProducto.costo,
+    )
+    if solo_con_receta:
+        q = q.join(CostoProducto, CostoProducto.producto_id == Producto.id)
+    else:
+        q = q.outerjoin(CostoProducto, CostoProducto.producto_id == Producto.id)
+    return q.order_by(Producto.id)
@@ -0,0 +1,273 @@
+"""Snapshot del dashboard de administración en una sola respuesta.
+
+snapshot_dashboard() reúne los KPIs que antes servían once endpoints
+/admin/api/dashboard/* por separado. Cada bloque es una consulta agregada en
+SQL:
+
+- ventas: Sale agrupado por fecha_negocio sobre la unión del periodo y los
+  últimos 7 días → total, órdenes y ticket del periodo + serie de 7 días
+- top_productos: SaleItem ⋈ Sale ⋈ Producto del periodo, limit 5
+- propinas del periodo
+- cocina: órdenes activas y el instante promedio de registro, con agregados
+  condicionales
+- mesas: total / ocupadas / reservadas con agregados condicionales
+- alertas de stock, último corte y actividad reciente
+
+Para el día en curso los KPIs, el ranking y el punto de hoy de la serie
+salen de los contadores Redis (contadores_kpi); entonces solo se consultan
+los seis días cerrados de la serie y no corren las consultas de KPIs,
+propinas ni ranking.
+
+El resultado no depende de la hora exacta de la consulta (el timer de cocina
+se manda como instante promedio de registro, no como minutos transcurridos),
+así que el ETag solo cambia cuando cambian los datos.
+"""
+import json
+import hashlib
+import logging
+from datetime import timedelta
+
+from sqlalchemy import func, case
+
+logger = logging.getLogger(__name__)
+
+ESTADOS_COCINA = ('pendiente', 'en_preparacion')
+PERIODOS = ('today', 'yesterday', 'week', 'month')
+
+
+def rango_periodo(periodo, hoy):
+    """(inicio, fin) en días de negocio para today/yesterday/week/month."""
+    if periodo == 'yesterday':
+        return hoy - timedelta(days=1), hoy - timedelta(days=1)
+    elif periodo == 'week':
+        return hoy - timedelta(days=6), hoy
+    elif periodo == 'month':
+        return hoy - timedelta(days=29), hoy
+    return hoy, hoy  # today
+
+
+def _por_sucursal(query, columna, sucursal_id):
+    return query if sucursal_id is None else query.filter(columna == sucursal_id)
+
+
+def _ventas_por_dia(desde, hasta, sucursal_id):
+    """{'AAAA-MM-DD': (total, órdenes)} de Sale por día de negocio."""
+    from backend.extensions import db
+    from backend.models.models import Sale
+
+    filas = _por_sucursal(
+        db.session.query(
+            Sale.fecha_negocio, func.sum(Sale.total), func.count(Sale.id),
+        ).filter(
+            Sale.fecha_negocio >= desde,
+            Sale.fecha_negocio <= hasta,
+        ), Sale.sucursal_id, sucursal_id,
+    ).group_by(Sale.fecha_negocio).all()
+    return {str(dia): (float(total or 0), num) for dia, total, num in filas}
+
+
+def _kpis_ventas(por_dia, inicio, fin):
+    total = sum(t for dia, (t, _) in por_dia.items() if str(inicio) <= dia <= str(fin))
+    num = sum(n for dia, (_, n) in por_dia.items() if str(inicio) <= dia <= str(fin))
+    return {
+        'ventasHoy': round(total, 2),
+        'ordenesHoy': num,
+        'ticketPromedio': round(total / num, 2) if num else 0,
+    }
+
+
+def _serie_7dias(por_dia, hoy):
+    dias = [hoy - timedelta(days=6 - i) for i in range(7)]
+    return {
+        'labels': [d.strftime('%d/%m') for d in dias],
+        'data': [por_dia.get(str(d), (0, 0))[0] for d in dias],
+    }
+
+
+def _top_productos(inicio, fin, sucursal_id):
+    from backend.extensions import db
+    from backend.models.models import Sale, SaleItem, Producto
+
+    cantidad = func.sum(SaleItem.cantidad).label('cantidad')
+    filas = _por_sucursal(
+        db.session.query(Producto.nombre, cantidad)
+        .join(SaleItem, SaleItem.producto_id == Producto.id)
+        .join(Sale, SaleItem.sale_id == Sale.id)
+        .filter(Sale.fecha_negocio >= inicio, Sale.fecha_negocio <= fin),
+        Sale.sucursal_id, sucursal_id,
+    ).group_by(Producto.id, Producto.nombre).order_by(cantidad.desc(), Producto.id).limit(5).all()
+    return {'labels': [f[0] for f in filas], 'data': [int(f[1]) for f in filas]}
+
+
+def _propinas(inicio, fin, sucursal_id):
+    from backend.extensions import db
+    from backend.models.models import Orden
+    from backend.services.dia_negocio import ordenes_pagadas_en
+
+    propinas = _por_sucursal(
+        db.session.query(func.sum(Orden.propina))
+        .filter(Orden.id.in_(ordenes_pagadas_en(inicio, fin)), Orden.propina > 0),
+        Orden.sucursal_id, sucursal_id,
+    ).scalar()
+    return float(propinas or 0)
+
+
+def _cocina(sucursal_id):
+    from backend.extensions import db
+    from backend.models.models import Orden
+
+    activa = Orden.estado.in_(ESTADOS_COCINA)
+    pendientes, registro = _por_sucursal(
+        db.session.query(
+            func.count(case((activa, Orden.id))),
+            func.avg(case((activa, func.extract('epoch', Orden.tiempo_registro)))),
+        ), Orden.sucursal_id, sucursal_id,
+    ).one()
+    return {
+        'pendientes': pendientes or 0,
+        # epoch UTC promedio; el cliente calcula los minutos transcurridos
+        'registro_promedio': round(float(registro)) if registro is not None else None,
+    }
+
+
+def _mesas(sucursal_id):
+    from backend.extensions import db
+    from backend.models.models import Mesa
+
+    total, ocupadas, reservadas = _por_sucursal(
+        db.session.query(
+            func.count(Mesa.id),
+            func.count(case((Mesa.estado == 'ocupada', Mesa.id))),
+            func.count(case((Mesa.estado == 'reservada', Mesa.id))),
+        ), Mesa.sucursal_id, sucursal_id,
+    ).one()
+    return {'total': total, 'ocupadas': ocupadas, 'reservadas': reservadas}
+
+
+def _alertas_stock(sucursal_id):
+    from backend.models.models import Ingrediente
+
+    alertas = _por_sucursal(
+        Ingrediente.query.with_entities(
+            Ingrediente.nombre, Ingrediente.stock_actual, Ingrediente.stock_minimo, Ingrediente.unidad,
+        ).filter(
+            Ingrediente.activo == True,
+            Ingrediente.stock_actual <= Ingrediente.stock_minimo,
+        ), Ingrediente.sucursal_id, sucursal_id,
+    ).order_by(Ingrediente.stock_actual.asc(), Ingrediente.id).limit(10).all()
+    return {
+        'count': len(alertas),
+        'items': [
+            {'nombre': a.nombre, 'stock': float(a.stock_actual), 'minimo': float(a.stock_minimo), 'unidad': a.unidad}
+            for a in alertas
+        ],
+    }
+
+
+def _compras_sugeridas(sucursal_id):
+    from backend.services.pronostico_inventario import obtener_pronostico
+
+    # Solo la caché nocturna: el snapshot nunca dispara el pronóstico
+    datos = obtener_pronostico(sucursal_id, calcular=False)
+    if datos is None:
+        return {'disponible': False}
+    return {
+        'disponible': True,
+        'count': len(datos['compras']),
+        'total': datos['total_compra'],
+        'items': [
+            {'nombre': c['nombre'], 'sugerido': c['sugerido'], 'unidad': c['unidad'],
+             'dias_cobertura': c['dias_cobertura']}
+            for c in datos['compras'][:8]
+        ],
+    }
+
+
+def _ultimo_corte(sucursal_id):
+    from backend.extensions import db
+    from backend.models.models import CorteCaja, Usuario
+
+    corte = _por_sucursal(
+        db.session.query(
+            CorteCaja.fecha, CorteCaja.total_ingresos, CorteCaja.diferencia, Usuario.nombre,
+        ).outerjoin(Usuario, CorteCaja.usuario_id == Usuario.id),
+        CorteCaja.sucursal_id, sucursal_id,
+    ).order_by(CorteCaja.fecha.desc(), CorteCaja.id.desc()).first()
+    if not corte:
+        return {'exists': False}
+    return {
+        'exists': True,
+        'fecha': corte.fecha.isoformat(),
+        'total_ingresos': float(corte.total_ingresos),
+        'diferencia': float(corte.diferencia or 0),
+        'usuario': corte.nombre or '—',
+    }
+
+
+def _actividad_reciente(sucursal_id):
+    from backend.extensions import db
+    from backend.models.models import Orden, Mesa, Usuario
+
+    # El filtro por sucursal va antes del limit
+    filas = _por_sucursal(
+        db.session.query(
+            Orden.id, Orden.estado, Orden.total, Orden.tiempo_registro, Mesa.numero, Usuario.nombre,
+        ).outerjoin(Mesa, Orden.mesa_id == Mesa.id)
+        .outerjoin(Usuario, Orden.mesero_id == Usuario.id),
+        Orden.sucursal_id, sucursal_id,
+    ).order_by(Orden.tiempo_registro.desc(), Orden.id.desc()).limit(8).all()
+    return {'items': [
+        {
+            'id': f.id,
+            'estado': f.estado,
+            'mesa': f.numero or 'P/LL',
+            'mesero': f.nombre or '—',
+            'total': float(f.total) if f.total else 0,
+            'hora': f.tiempo_registro.strftime('%H:%M'),
+        }
+        for f in filas
+    ]}
+
+
+def snapshot_dashboard(inicio, fin, hoy, sucursal_id=None):
+    """Todos los KPIs del dashboard para el periodo [inicio, fin].
+
+    Args:
+        inicio, fin: días de negocio del periodo seleccionado.
+        hoy: día de negocio en curso (fin de la serie de 7 días).
+        sucursal_id: None = todas las sucursales.
+    """
+    from backend.services.contadores_kpi import kpis_dia, top_productos_dia
+
+    contadores = kpis_dia(sucursal_id, hoy) if inicio == fin == hoy else None
+    if contadores is not None:
+        # Día en curso: KPIs, ranking y el punto de hoy desde los contadores Redis
+        kpis = {'ventasHoy': contadores['ventas'], 'ordenesHoy': contadores['ordenes'],
+                'ticketPromedio': contadores['ticket'], 'propinas': contadores['propinas']}
+        por_dia = _ventas_por_dia(hoy - timedelta(days=6), hoy - timedelta(days=1), sucursal_id)
+        por_dia[str(hoy)] = (contadores['ventas'], contadores['ordenes'])
+        top = top_productos_dia(sucursal_id, hoy)
+    else:
+        por_dia = _ventas_por_dia(min(inicio, hoy - timedelta(days=6)), max(fin, hoy), sucursal_id)
+        kpis = _kpis_ventas(por_dia, inicio, fin)
+        kpis['propinas'] = _propinas(inicio, fin, sucursal_id)
+        top = None
+    return {
+        'periodo': {'inicio': inicio.isoformat(), 'fin': fin.isoformat(), 'sucursal_id': sucursal_id},
+        'kpis': kpis,
+        'mesas': _mesas(sucursal_id),
+        'cocina': _cocina(sucursal_id),
+        'alertas_stock': _alertas_stock(sucursal_id),
+        'compras_sugeridas': _compras_sugeridas(sucursal_id),
+        'ultimo_corte': _ultimo_corte(sucursal_id),
+        'ventas_7dias': _serie_7dias(por_dia, hoy),
+        'top_productos': ({'labels': [t[0] for t in top], 'data': [t[1] for t in top]}
+                          if top is not None else _top_productos(inicio, fin, sucursal_id)),
+        'actividad_reciente': _actividad_reciente(sucursal_id),
+    }
+
+
+def etag_snapshot(snapshot):
+    """ETag fuerte: hash del JSON canónico del snapshot."""
+    contenido = json.dumps(snapshot, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()[:32]
@@ -0,0 +1,208 @@
+"""Dashboard de administración en tiempo real (Socket.IO, namespace /dashboard).
+
+Los admins se suscriben a una sala por sucursal y periodo:
+
+    dashboard:<sucursal_id|todas>:<today|yesterday|week|month>
+
+Al suscribirse reciben el snapshot completo ('dashboard_snapshot'). Después
+solo reciben 'dashboard_delta' con las secciones que cambiaron.
+
+Los suscriptores de cada sala viven en un zset de Redis, sid → instante en
+que vence la suscripción. Suscribirse y cada latido del cliente
+('dashboard_latido') lo renuevan por DASHBOARD_SUSCRIPCION_TTL; salir lo
+quita. Un worker que muere sin desconectar a sus clientes deja entradas que
+vencen solas, y si Redis se reinicia los latidos vuelven a anotar a los
+clientes conectados.
+
+Los eventos de negocio (pagos, cambios de mesa, cocina, mermas) llaman a
+notificar_dashboard(sucursal_id). Las notificaciones se acumulan durante
+DASHBOARD_DEBOUNCE_SEG y se procesan juntas en una tarea de fondo: un
+snapshot por sala con suscriptores, comparado sección por sección contra el
+último estado publicado (guardado en la caché para que lo compartan los
+workers). Sin eventos no hay consultas ni mensajes.
+
+Configurable via env vars:
+  DASHBOARD_DEBOUNCE_SEG=2    (ventana para agrupar eventos)
+  DASHBOARD_ESTADO_TTL=300    (vida del último estado publicado por sala)
+  DASHBOARD_REDIS_URL=redis://localhost:6379/2
+  DASHBOARD_SUSCRIPCION_TTL=120   (vida de una suscripción sin latido)
+"""
+import os
+import time
+import logging
+import threading
+
+from flask import current_app
+
+from backend.extensions import socketio, cache
+
+logger = logging.getLogger(__name__)
+
+DASHBOARD_DEBOUNCE_SEG = float(os.getenv('DASHBOARD_DEBOUNCE_SEG', '2'))
+DASHBOARD_ESTADO_TTL = int(os.getenv('DASHBOARD_ESTADO_TTL', '300'))
+DASHBOARD_REDIS_URL = os.getenv('DASHBOARD_REDIS_URL', os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/2'))
+DASHBOARD_SUSCRIPCION_TTL = int(os.getenv('DASHBOARD_SUSCRIPCION_TTL', '120'))
+
+NAMESPACE = '/dashboard'
+PREFIJO = 'dashboard'
+
+_cliente = None
+_pendientes = set()
+_programado = False
+_lock = threading.Lock()
+
+
+def _redis():
+    global _cliente
+    if _cliente is None:
+        import redis
+        _cliente = redis.Redis.from_url(
+            DASHBOARD_REDIS_URL, decode_responses=True,
+            socket_connect_timeout=0.5, socket_timeout=0.5,
+        )
+    return _cliente
+
+
+def sala_dashboard(sucursal_id, periodo):
+    return f'{PREFIJO}:{"todas" if sucursal_id is None else sucursal_id}:{periodo}'
+
+
+def _clave_suscriptores(sala):
+    return f'{PREFIJO}:subs:{sala}'
+
+
+def _clave_estado(sala):
+    return f'{PREFIJO}:estado:{sala}'
+
+
+def registrar_suscripcion(sala, sid, activa=True):
+    """Anota el sid en la sala con vencimiento renovado, o lo quita (activa=False).
+
+    Llamar al suscribirse, en cada latido del cliente y al salir.
+    """
+    clave = _clave_suscriptores(sala)
+    try:
+        pipe = _redis().pipeline(transaction=False)
+        if activa:
+            ahora = time.time()
+            pipe.zremrangebyscore(clave, '-inf', ahora)
+            pipe.zadd(clave, {sid: ahora + DASHBOARD_SUSCRIPCION_TTL})
+            pipe.expire(clave, DASHBOARD_SUSCRIPCION_TTL)
+        else:
+            pipe.zrem(clave, sid)
+        pipe.execute()
+    except Exception:
+        logger.debug('No se pudo actualizar suscriptores de %s', sala, exc_info=True)
+
+
+def _tiene_suscriptores(sala):
+    try:
+        return _redis().zcount(_clave_suscriptores(sala), time.time(), '+inf') > 0
+    except Exception:
+        return True  # sin Redis no se puede saber; publicar de todos modos
+
+
+def _calcular(sucursal_id, periodo):
+    from backend.services.dashboard import snapshot_dashboard, rango_periodo
+    from backend.services.dia_negocio import hoy_negocio
+
+    hoy = hoy_negocio(sucursal_id)
+    inicio, fin = rango_periodo(periodo, hoy)
+    return snapshot_dashboard(inicio, fin, hoy, sucursal_id)
+
+
+def _guardar_estado(sala, snapshot):
+    try:
+        cache.set(_clave_estado(sala), snapshot, timeout=DASHBOARD_ESTADO_TTL)
+    except Exception:
+        logger.warning('No se pudo guardar estado del dashboard %s', sala, exc_info=True)
+
+
+def snapshot_suscriptor(sucursal_id, periodo):
+    """Snapshot completo para un cliente que se acaba de suscribir.
+
+    Usa el último estado publicado si sigue vigente; si no, lo calcula.
+    """
+    from backend.services.dashboard import etag_snapshot
+
+    sala = sala_dashboard(sucursal_id, periodo)
+    try:
+        snapshot = cache.get(_clave_estado(sala))
+    except Exception:
+        snapshot = None
+    if snapshot is None:
+        snapshot = _calcular(sucursal_id, periodo)
+        _guardar_estado(sala, snapshot)
+    return {'periodo': periodo, 'etag': etag_snapshot(snapshot), 'snapshot': snapshot}
+
+
+def publicar_sala(sucursal_id, periodo):
+    """Recalcula una sala y emite solo las secciones que cambiaron.
+
+    Returns:
+        lista de secciones emitidas (vacía si nada cambió).
+    """
+    from backend.services.dashboard import etag_snapshot
+
+    sala = sala_dashboard(sucursal_id, periodo)
+    snapshot = _calcular(sucursal_id, periodo)
+    try:
+        anterior = cache.get(_clave_estado(sala)) or {}
+    except Exception:
+        anterior = {}
+    _guardar_estado(sala, snapshot)
+
+    secciones = {k: v for k, v in snapshot.items() if anterior.get(k) != v}
+    if secciones:
+        socketio.emit('dashboard_delta', {
+            'periodo': periodo,
+            'etag': etag_snapshot(snapshot),
+            'secciones': secciones,
+        }, to=sala, namespace=NAMESPACE)
+    return sorted(secciones)
+
+
+def _despachar(app):
+    global _programado
+    socketio.sleep(DASHBOARD_DEBOUNCE_SEG)
+    with _lock:
+        sucursales = set(_pendientes)
+        _pendientes.clear()
+        _programado = False
+
+    from backend.services.dashboard import PERIODOS
+
+    # Cada evento de una sucursal afecta también la vista "todas"
+    salas = {(s, p) for s in sucursales | {None} for p in PERIODOS}
+    with app.app_context():
+        from backend.extensions import db
+        try:
+            for sucursal_id, periodo in sorted(salas, key=str):
+                if not _tiene_suscriptores(sala_dashboard(sucursal_id, periodo)):
+                    continue
+                try:
+                    publicar_sala(sucursal_id, periodo)
+                except Exception:
+                    logger.exception('Error publicando dashboard sucursal=%s periodo=%s', sucursal_id, periodo)
+                    db.session.rollback()
+        finally:
+            db.session.remove()
+
+
+def notificar_dashboard(*sucursal_ids):
+    """Marca sucursales con cambios; se publican agrupadas tras el debounce.
+
+    Llamar después del commit del evento. Es barato: no consulta la BD.
+    """
+    global _programado
+    with _lock:
+        _pendientes.update(s for s in sucursal_ids if s is not None)
+        if _programado:
+            return
+        _programado = True
+    try:
+        socketio.start_background_task(_despachar, current_app._get_current_object())
+    except Exception:
+        with _lock:
+            _programado = False
+        logger.warning('No se pudo programar la publicación del dashboard', exc_info=True)
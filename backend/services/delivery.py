@@ -84,12 +84,20 @@ def procesar_orden_delivery(plataforma, payload, db_session, socketio=None):
     db_session.add(delivery)
     db_session.commit()
 
+    from backend.services.cache_reportes import invalidar_reportes
+    from backend.services.dashboard_tiempo_real import notificar_dashboard
+    invalidar_reportes(orden.sucursal_id)
+    notificar_dashboard(orden.sucursal_id)
+
     # Notificar cocina
     if socketio:
-        socketio.emit('nueva_orden_cocina', {
+        from backend.services.salas import emitir, salas_orden
+        from backend.services.kds import publicar_kds, cambios_orden
+        emitir('nueva_orden_cocina', {
             'orden_id': orden.id,
             'mensaje': f'Nueva orden de {plataforma} #{data["external_id"]}',
-        })
+        }, salas_orden(orden, cocina=True))
+        publicar_kds(cambios_orden(orden))
 
     logger.info('Orden delivery procesada: plataforma=%s ext_id=%s orden=%s',
                 plataforma, data['external_id'], orden.id)
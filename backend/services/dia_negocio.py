@@ -0,0 +1,120 @@
+"""Día de negocio (business date) por sucursal.
+
+Los timestamps se guardan en UTC (datetime.utcnow). Un turno nocturno en
+Ciudad de México cruza la medianoche UTC y, con func.date(), quedaba partido
+en dos días. El día de negocio se calcula en hora local y se corre por la hora
+de corte de la sucursal: con hora_corte=4, una venta a las 02:30 locales
+pertenece al día anterior.
+
+La hora de corte de cada sucursal se guarda en memoria del proceso. Al
+editar una sucursal, invalidar_horas_corte() limpia la del worker que
+atendió la edición e incrementa una versión en la caché compartida; los
+demás workers la revisan cada HORA_CORTE_CACHE_SEG y, si cambió, vuelven a
+leer la base. Sin caché compartida las entradas simplemente duran ese
+tiempo.
+
+Configurable via env vars:
+  ZONA_HORARIA=America/Mexico_City
+  HORA_CORTE_DIA=4   (default si la sucursal no define hora_corte)
+  HORA_CORTE_CACHE_SEG=30
+"""
+import os
+import time
+import logging
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+logger = logging.getLogger(__name__)
+
+ZONA_HORARIA = ZoneInfo(os.getenv('ZONA_HORARIA', 'America/Mexico_City'))
+HORA_CORTE_DIA = int(os.getenv('HORA_CORTE_DIA', '4'))
+HORA_CORTE_CACHE_SEG = int(os.getenv('HORA_CORTE_CACHE_SEG', '30'))
+
+CLAVE_VERSION = 'dia_negocio:horas_corte:version'
+
+# sucursal_id -> hora de corte; válido mientras no cambie la versión compartida
+_horas_corte = {}
+_vigencia = {'hasta': 0.0, 'version': None}
+
+
+def _version_compartida():
+    from backend.extensions import cache
+    try:
+        return cache.get(CLAVE_VERSION) or 0
+    except Exception:
+        return None
+
+
+def invalidar_horas_corte():
+    """Llamar después de crear o editar una sucursal."""
+    from backend.extensions import cache
+
+    _horas_corte.clear()
+    try:
+        cache.cache.inc(CLAVE_VERSION)  # INCR atómico: avisa a los demás workers
+    except Exception:
+        logger.warning('No se pudo publicar el cambio de hora de corte', exc_info=True)
+
+
+def _revisar_vigencia():
+    ahora = time.monotonic()
+    if ahora < _vigencia['hasta']:
+        return
+    version = _version_compartida()
+    if version is None or version != _vigencia['version']:
+        _horas_corte.clear()
+    _vigencia.update(hasta=ahora + HORA_CORTE_CACHE_SEG, version=version)
+
+
+def hora_corte(sucursal_id, connection=None):
+    """Hora local (0-23) en que cierra el día de negocio de la sucursal."""
+    if sucursal_id is None:
+        return HORA_CORTE_DIA
+    _revisar_vigencia()
+    if sucursal_id not in _horas_corte:
+        from sqlalchemy import select
+        from backend.models.models import Sucursal
+
+        stmt = select(Sucursal.hora_corte).where(Sucursal.id == sucursal_id)
+        if connection is not None:
+            valor = connection.execute(stmt).scalar()
+        else:
+            from backend.extensions import db
+            valor = db.session.execute(stmt).scalar()
+        _horas_corte[sucursal_id] = HORA_CORTE_DIA if valor is None else int(valor)
+    return _horas_corte[sucursal_id]
+
+
+def a_hora_local(momento_utc):
+    """Convierte un datetime naive UTC a hora local de la zona configurada."""
+    return momento_utc.replace(tzinfo=timezone.utc).astimezone(ZONA_HORARIA)
+
+
+def a_utc(momento_local):
+    """Convierte un datetime naive en hora local a naive UTC."""
+    return momento_local.replace(tzinfo=ZONA_HORARIA).astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def dia_negocio(momento_utc=None, sucursal_id=None, connection=None):
+    """Día de negocio al que pertenece un timestamp UTC."""
+    momento = a_hora_local(momento_utc or datetime.utcnow())
+    return (momento - timedelta(hours=hora_corte(sucursal_id, connection))).date()
+
+
+def hoy_negocio(sucursal_id=None):
+    """Día de negocio en curso para la sucursal."""
+    return dia_negocio(None, sucursal_id)
+
+
+def ordenes_pagadas_en(desde, hasta):
+    """Subconsulta de ids de orden pagadas en los días de negocio desde..hasta.
+
+    Orden.fecha_negocio es el día en que se abrió la orden; una orden abierta
+    antes del corte y cobrada después pertenece, para caja, propinas y
+    ventas por canal, al día de su pago. Se toma el último pago de la orden.
+    """
+    from sqlalchemy import select, func
+    from backend.models.models import Pago
+
+    return select(Pago.orden_id).where(Pago.fecha_negocio >= desde) \
+        .group_by(Pago.orden_id).having(func.max(Pago.fecha_negocio) <= hasta)
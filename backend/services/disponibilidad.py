@@ -0,0 +1,191 @@
+"""Unidades producibles por producto (tabla disponibilidad_productos).
+
+unidades = mín sobre la receta de ⌊stock_actual / cantidad_por_unidad⌋
+(0 si un ingrediente no tiene stock). La receta se toma aplanada a
+ingredientes base (subrecetas.receta_explotada). Se guarda por producto y se
+recalcula solo para los productos afectados, en la misma transacción que
+el cambio:
+
+- entrada, merma o stock mínimo de un
+  ingrediente                          → recalcular_por_ingredientes([id])
+- venta (outbox, descuento de
+  inventario)                          → recalcular_por_productos(vendidos)
+- receta guardada                      → recalcular_disponibilidad([producto_id])
+- subreceta guardada                   → subrecetas.guardar_subreceta()
+
+Ingrediente → productos se resuelve con los índices inversos
+ix_receta_ingrediente_producto e ix_explosion_ingrediente. Después del commit,
+publicar_disponibilidad() manda los valores nuevos a las tabletas
+('disponibilidad_productos'), que marcan como agotados ("86") los
+productos con 0 unidades sin recargar la página.
+
+La validación al agregar un producto (INVENTARIO_VALIDAR_STOCK) es una
+lectura por llave primaria: unidades_disponibles(). Las unidades son por
+producto y no descuentan lo pedido en órdenes abiertas (el inventario se
+descuenta al pagar).
+
+Configurable via env vars:
+  DISPONIBILIDAD_POCAS=5   (las tabletas muestran las unidades restantes)
+"""
+import os
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+DISPONIBILIDAD_POCAS = int(os.getenv('DISPONIBILIDAD_POCAS', '5'))
+
+
+def _guardar(tabla, filas):
+    """INSERT … ON CONFLICT (producto_id) DO UPDATE en PostgreSQL y SQLite."""
+    from backend.extensions import db
+
+    dialecto = db.session.get_bind().dialect.name
+    if dialecto == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialecto == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        db.session.execute(tabla.delete().where(tabla.c.producto_id.in_([f['producto_id'] for f in filas])))
+        db.session.execute(tabla.insert(), filas)
+        return
+    stmt = insert(tabla)
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=[tabla.c.producto_id],
+        set_={c: stmt.excluded[c] for c in ('unidades', 'stock_bajo', 'actualizado')},
+    ), filas)
+
+
+def recalcular_disponibilidad(producto_ids=None):
+    """Recalcula disponibilidad_productos para los productos dados (todos si None).
+
+    No hace commit. Regresa {producto_id: {'unidades', 'bajo'} | None} de los
+    productos recalculados (None = sin límite: sin receta).
+    """
+    from backend.extensions import db
+    from sqlalchemy import func
+    from backend.models.models import DisponibilidadProducto, Ingrediente
+    from backend.services.subrecetas import receta_explotada
+
+    if producto_ids is not None:
+        producto_ids = sorted(set(producto_ids))
+        if not producto_ids:
+            return {}
+
+    receta = receta_explotada()
+    q = db.session.query(
+        receta.c.producto_id, func.sum(receta.c.cantidad_por_unidad),
+        Ingrediente.stock_actual, Ingrediente.stock_minimo,
+    ).select_from(receta).join(Ingrediente, receta.c.ingrediente_id == Ingrediente.id) \
+        .group_by(receta.c.producto_id, Ingrediente.id, Ingrediente.stock_actual, Ingrediente.stock_minimo)
+    if producto_ids is not None:
+        q = q.filter(receta.c.producto_id.in_(producto_ids))
+
+    calculo = {}
+    for producto_id, por_unidad, stock, minimo in q.all():
+        if not por_unidad or por_unidad <= 0:
+            continue  # línea que no consume
+        stock = stock or 0
+        posibles = int(stock // por_unidad) if stock > 0 else 0
+        actual = calculo.get(producto_id)
+        bajo = stock <= (minimo or 0)
+        calculo[producto_id] = (posibles, bajo) if actual is None else \
+            (min(actual[0], posibles), actual[1] or bajo)
+
+    # Upsert (no DELETE + INSERT): dos transacciones que recalculan el mismo
+    # producto a la vez (pagos en workers distintos) no chocan en la llave.
+    borrar = db.delete(DisponibilidadProducto)
+    if producto_ids is not None:
+        borrar = borrar.where(DisponibilidadProducto.producto_id.in_(
+            [p for p in producto_ids if p not in calculo]))
+    else:
+        borrar = borrar.where(DisponibilidadProducto.producto_id.notin_(list(calculo)))
+    db.session.execute(borrar)
+    if calculo:
+        ahora = datetime.utcnow()
+        _guardar(DisponibilidadProducto.__table__, [
+            {'producto_id': p, 'unidades': u, 'stock_bajo': b, 'actualizado': ahora}
+            for p, (u, b) in sorted(calculo.items())
+        ])
+
+    resultado = {p: None for p in producto_ids or ()}
+    resultado.update({p: {'unidades': u, 'bajo': b} for p, (u, b) in calculo.items()})
+    return resultado
+
+
+def recalcular_por_ingredientes(ingrediente_ids):
+    """Recalcula los productos cuya receta usa alguno de los ingredientes (o un preparado que los lleva)."""
+    from backend.extensions import db
+    from backend.services.subrecetas import receta_explotada
+
+    ingrediente_ids = set(ingrediente_ids)
+    if not ingrediente_ids:
+        return {}
+    receta = receta_explotada()
+    producto_ids = db.session.execute(
+        db.select(receta.c.producto_id).distinct()
+        .where(receta.c.ingrediente_id.in_(ingrediente_ids))
+    ).scalars().all()
+    return recalcular_disponibilidad(producto_ids)
+
+
+def recalcular_por_productos(producto_ids):
+    """Recalcula los productos que comparten algún ingrediente base con producto_ids."""
+    from backend.extensions import db
+    from backend.services.subrecetas import receta_explotada
+
+    producto_ids = set(producto_ids)
+    if not producto_ids:
+        return {}
+    usados, otros = receta_explotada(), receta_explotada()
+    ingredientes = db.select(usados.c.ingrediente_id) \
+        .where(usados.c.producto_id.in_(producto_ids))
+    afectados = db.session.execute(
+        db.select(otros.c.producto_id).distinct()
+        .where(otros.c.ingrediente_id.in_(ingredientes))
+    ).scalars().all()
+    return recalcular_disponibilidad(afectados)
+
+
+def unidades_disponibles(producto_id):
+    """(unidades, stock_bajo) del producto; (None, False) si no tiene límite."""
+    from backend.extensions import db
+    from backend.models.models import DisponibilidadProducto
+
+    fila = db.session.get(DisponibilidadProducto, producto_id)
+    if fila is None:
+        return None, False
+    return fila.unidades, fila.stock_bajo
+
+
+def mapa_disponibilidad():
+    """{producto_id: {'unidades', 'bajo'}} de los productos con límite."""
+    from backend.extensions import db
+    from backend.models.models import DisponibilidadProducto
+
+    return {
+        p: {'unidades': u, 'bajo': b}
+        for p, u, b in db.session.query(
+            DisponibilidadProducto.producto_id,
+            DisponibilidadProducto.unidades,
+            DisponibilidadProducto.stock_bajo,
+        ).all()
+    }
+
+
+def publicar_disponibilidad(cambios):
+    """Emite 'disponibilidad_productos' a todas las sucursales. Llamar después del commit."""
+    from backend.models.models import Sucursal
+    from backend.services.salas import emitir, salas_sucursal
+
+    if not cambios:
+        return
+    try:
+        salas = salas_sucursal(None)
+        for (suc_id,) in Sucursal.query.with_entities(Sucursal.id).all():
+            salas += salas_sucursal(suc_id)
+        emitir('disponibilidad_productos', {
+            'productos': {str(p): v for p, v in cambios.items()},
+        }, salas)
+    except Exception:
+        logger.warning('No se pudo publicar la disponibilidad de productos', exc_info=True)
@@ -0,0 +1,194 @@
+"""ETA de órdenes en cocina a partir del ritmo histórico de cada estación.
+
+Para cada estación con items pendientes de la orden:
+
+    espera   = piezas por delante en la cola × segundos por pieza
+    cocción  = p50 histórico del producto más lento de la orden
+    segundos = espera + max(cocción - transcurrido desde el envío, ETA_MINIMO_SEG)
+
+La orden está lista cuando termina su estación más lenta.
+
+- Piezas por delante: items de la misma sucursal que llegaron antes, leídos
+  de la cola de cocina (services/cola_cocina), sin consultar la base.
+- Segundos por pieza: tiempo ocupado / piezas marcadas listas en los
+  últimos ETA_VENTANA_MIN. Tiempo ocupado = suma de los huecos entre marcas
+  consecutivas (lag()) de hasta ETA_HUECO_MAX_SEG; los mayores son ocio.
+  Con menos de ETA_MIN_PIEZAS se usa ETA_SEG_POR_PIEZA.
+- p50 por producto: últimos TIEMPOS_COCINA_DIAS_P90 días (tiempos_cocina);
+  producto sin historial = ETA_COCCION_DEFAULT_SEG.
+
+Las estadísticas de cada (estación, sucursal) salen de dos consultas de
+conjunto y se guardan en memoria del proceso ETA_CACHE_SEG; el cálculo de
+todas las órdenes de una sucursal es una pasada por la cola.
+
+publicar_etas() emite 'eta_ordenes' a la sala de la sucursal después de
+marcar items listos o agregar productos; el envío a cocina lleva la ETA en
+'nueva_orden_cocina'.
+
+Configurable via env vars:
+  ETA_CACHE_SEG=120
+  ETA_VENTANA_MIN=60
+  ETA_MIN_PIEZAS=5
+  ETA_HUECO_MAX_SEG=300
+  ETA_SEG_POR_PIEZA=45
+  ETA_COCCION_DEFAULT_SEG=480
+  ETA_MINIMO_SEG=60
+"""
+import os
+import time
+import logging
+import calendar
+import threading
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+ETA_CACHE_SEG = int(os.getenv('ETA_CACHE_SEG', '120'))
+ETA_VENTANA_MIN = int(os.getenv('ETA_VENTANA_MIN', '60'))
+ETA_MIN_PIEZAS = int(os.getenv('ETA_MIN_PIEZAS', '5'))
+ETA_HUECO_MAX_SEG = float(os.getenv('ETA_HUECO_MAX_SEG', '300'))
+ETA_SEG_POR_PIEZA = float(os.getenv('ETA_SEG_POR_PIEZA', '45'))
+ETA_COCCION_DEFAULT_SEG = float(os.getenv('ETA_COCCION_DEFAULT_SEG', '480'))
+ETA_MINIMO_SEG = float(os.getenv('ETA_MINIMO_SEG', '60'))
+
+_cache = {}      # (estacion, sucursal_id) → (expira, p50 por producto, seg por pieza)
+_estaciones = []  # [expira, nombres]
+_lock = threading.Lock()
+
+
+def _nombres_estaciones():
+    with _lock:
+        if _estaciones and _estaciones[0] > time.monotonic():
+            return _estaciones[1]
+    from backend.models.models import Estacion
+    nombres = [n for (n,) in Estacion.query.with_entities(Estacion.nombre).all()]
+    with _lock:
+        _estaciones[:] = [time.monotonic() + ETA_CACHE_SEG, nombres]
+    return nombres
+
+
+def _estadisticas(estacion, sucursal_id):
+    """(p50 por producto, segundos por pieza) de la estación, cacheado."""
+    clave = (estacion, sucursal_id)
+    with _lock:
+        guardado = _cache.get(clave)
+    if guardado and guardado[0] > time.monotonic():
+        return guardado[1], guardado[2]
+
+    from sqlalchemy import func, case, extract
+    from backend.extensions import db
+    from backend.models.models import Orden, OrdenDetalle, Producto, Estacion
+    from backend.services.tiempos_cocina import percentiles, TIEMPOS_COCINA_DIAS_P90
+
+    ahora = datetime.utcnow()
+    p50 = {
+        int(producto_id): float(mediana)
+        for producto_id, _n, mediana, _p90, _prom, _fuera in percentiles(
+            [Producto.id.label('clave')],
+            [Estacion.nombre == estacion,
+             OrdenDetalle.tiempo_listo >= ahora - timedelta(days=TIEMPOS_COCINA_DIAS_P90)],
+            sucursal_id,
+        )
+    }
+    # Ritmo en ocupado: huecos entre marcas "listo" consecutivas de la
+    # estación; los huecos mayores a ETA_HUECO_MAX_SEG son tiempo ocioso.
+    seg = extract('epoch', OrdenDetalle.tiempo_listo)
+    q = db.session.query(
+        OrdenDetalle.cantidad.label('cantidad'),
+        (seg - func.lag(seg).over(order_by=OrdenDetalle.tiempo_listo)).label('hueco'),
+    ).join(Orden, OrdenDetalle.orden_id == Orden.id) \
+        .join(Producto, OrdenDetalle.producto_id == Producto.id) \
+        .join(Estacion, Producto.estacion_id == Estacion.id) \
+        .filter(Estacion.nombre == estacion,
+                OrdenDetalle.tiempo_listo >= ahora - timedelta(minutes=ETA_VENTANA_MIN))
+    if sucursal_id is not None:
+        q = q.filter(Orden.sucursal_id == sucursal_id)
+    sub = q.subquery()
+    piezas, ocupado = db.session.query(
+        func.coalesce(func.sum(sub.c.cantidad), 0),
+        func.coalesce(func.sum(case((sub.c.hueco <= ETA_HUECO_MAX_SEG, sub.c.hueco))), 0),
+    ).one()
+    piezas, ocupado = int(piezas or 0), float(ocupado or 0)
+    por_pieza = ocupado / piezas if piezas >= ETA_MIN_PIEZAS and ocupado > 0 else ETA_SEG_POR_PIEZA
+
+    with _lock:
+        _cache[clave] = (time.monotonic() + ETA_CACHE_SEG, p50, por_pieza)
+    return p50, por_pieza
+
+
+def _items_estacion(estacion, sucursal_id):
+    from backend.services.cola_cocina import pendientes
+    items = pendientes(estacion, sucursal_id)
+    if items is None:  # cola apagada o Redis caído
+        from backend.services.kds import consulta_pendientes, item_kds
+        from backend.models.models import Orden, OrdenDetalle
+        q = consulta_pendientes(estacion)
+        if sucursal_id is not None:
+            q = q.filter(Orden.sucursal_id == sucursal_id)
+        items = [dict(item_kds(d), sucursal_id=d.orden.sucursal_id)
+                 for d in q.order_by(Orden.tiempo_registro, OrdenDetalle.id).all()]
+    return items
+
+
+def _desde(item):
+    return datetime.fromisoformat(item.get('tiempo_enviado') or item['tiempo_registro'])
+
+
+def calcular_etas(sucursal_id=None):
+    """ETA de cada orden con items pendientes en cocina.
+
+    Returns:
+        {orden_id: {'segundos': int, 'eta_ts': epoch ms, 'estaciones': {estacion: segundos}}}
+    """
+    ahora = datetime.utcnow()
+    etas = {}
+    for estacion in _nombres_estaciones():
+        items = _items_estacion(estacion, sucursal_id)
+        if not items:
+            continue
+        # piezas por delante se cuentan por sucursal (cada una tiene su cocina)
+        por_sucursal = {}
+        for item in items:
+            por_sucursal.setdefault(item['sucursal_id'], {}).setdefault(item['orden_id'], []).append(item)
+        for suc, ordenes in por_sucursal.items():
+            p50, por_pieza = _estadisticas(estacion, suc)
+            delante = 0
+            for orden_id, suyos in ordenes.items():  # ya en orden de llegada
+                coccion = max(p50.get(i.get('producto_id'), ETA_COCCION_DEFAULT_SEG) for i in suyos)
+                transcurrido = (ahora - min(_desde(i) for i in suyos)).total_seconds()
+                segundos = round(delante * por_pieza + max(coccion - transcurrido, ETA_MINIMO_SEG))
+                eta = etas.setdefault(orden_id, {'segundos': 0, 'estaciones': {}})
+                eta['estaciones'][estacion] = segundos
+                eta['segundos'] = max(eta['segundos'], segundos)
+                delante += sum(i['cantidad'] for i in suyos)
+
+    base_ms = calendar.timegm(ahora.timetuple()) * 1000
+    for eta in etas.values():
+        eta['eta_ts'] = base_ms + eta['segundos'] * 1000
+    return etas
+
+
+def eta_orden(orden_id, sucursal_id=None):
+    """ETA de una orden (None si no tiene items pendientes). Nunca lanza."""
+    try:
+        return calcular_etas(sucursal_id).get(orden_id)
+    except Exception:
+        logger.warning('No se pudo calcular la ETA de la orden %s', orden_id, exc_info=True)
+        return None
+
+
+def publicar_etas(sucursal_id):
+    """Emite 'eta_ordenes' con la ETA vigente de las órdenes de la sucursal.
+
+    Llamar después del commit.
+    """
+    from backend.services.salas import emitir, salas_sucursal
+    try:
+        etas = calcular_etas(sucursal_id)
+    except Exception:
+        logger.warning('No se pudieron calcular las ETAs (sucursal %s)', sucursal_id, exc_info=True)
+        return
+    emitir('eta_ordenes', {
+        'sucursal_id': sucursal_id,
+        'etas': {str(k): {'segundos': v['segundos'], 'eta_ts': v['eta_ts']} for k, v in etas.items()},
+    }, salas_sucursal(sucursal_id))
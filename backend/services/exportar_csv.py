@@ -0,0 +1,64 @@
+"""Exportación CSV en streaming para reportes e historial.
+
+Las filas se leen con cursor del servidor (yield_per → stream_results) y se
+escriben al cliente en bloques mediante un generador, con transferencia
+chunked. La memoria del worker queda acotada por el tamaño del lote, no por
+el rango de fechas exportado.
+
+Configurable via env var:
+  CSV_LOTE_FILAS=1000   (filas por lote de cursor y por bloque enviado)
+"""
+import io
+import csv
+import os
+import logging
+
+from flask import Response, stream_with_context
+
+logger = logging.getLogger(__name__)
+
+CSV_LOTE_FILAS = int(os.getenv('CSV_LOTE_FILAS', '1000'))
+
+
+def iterar_query(query, lote=None):
+    """Itera un query ORM lote a lote con cursor del servidor.
+
+    Las relaciones de colección deben cargarse con selectinload; joinedload
+    sobre colecciones no es compatible con yield_per.
+    """
+    return query.yield_per(lote or CSV_LOTE_FILAS)
+
+
+def generar_csv(encabezados, filas, lote=None):
+    """Generador de bloques de texto CSV; vacía el buffer cada `lote` filas."""
+    lote = lote or CSV_LOTE_FILAS
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(encabezados)
+    pendientes = 0
+    for fila in filas:
+        writer.writerow(fila)
+        pendientes += 1
+        if pendientes >= lote:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pendientes = 0
+    yield buffer.getvalue()
+
+
+def respuesta_csv(nombre_archivo, encabezados, filas):
+    """Response de Flask que transmite el CSV conforme se generan las filas.
+
+    `filas` debe ser un iterable perezoso (generador sobre iterar_query) para
+    que la lectura de la BD ocurra mientras se envía la respuesta. El contexto
+    de request se conserva con stream_with_context.
+    """
+    return Response(
+        stream_with_context(generar_csv(encabezados, filas)),
+        mimetype='text/csv',
+        headers={
+            'Content-Disposition': f'attachment;filename={nombre_archivo}',
+            'X-Accel-Buffering': 'no',  # nginx: no acumular la respuesta
+        },
+    )
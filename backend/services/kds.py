@@ -0,0 +1,159 @@
+"""Actualizaciones incrementales del KDS por estación.
+
+Cada sala de estación (estacion:<sucursal|todas>:<estacion>, ver
+services/salas.py) tiene una versión monótona en la caché compartida (INCR
+atómico). Cada cambio visible en su pantalla se publica a esa sala como
+evento 'kds_delta':
+
+    {estacion, version, cambios: [{op: add|update|remove, item: {...}}]}
+
+Los clientes aplican el delta si version == la suya + 1. Si detectan un
+hueco (o reconectan) piden /cocina/<station>/snapshot, que regresa la
+versión vigente y la lista completa de items pendientes. La versión del
+snapshot se lee antes de la consulta. Un delta que ya esté reflejado se
+vuelve a aplicar sin efecto: add/update son upsert y remove es idempotente.
+
+Los mismos cambios se escriben en la cola de cocina (services/cola_cocina.py)
+antes de subir la versión, así que las pantallas se sirven sin consultar la
+base.
+"""
+import logging
+from collections import defaultdict
+
+from backend.extensions import socketio, cache
+from backend.services.salas import salas_estacion, sala_estacion
+
+logger = logging.getLogger(__name__)
+
+PREFIJO = 'kds'
+ESTADOS_ORDEN_KDS = ('enviado', 'en_preparacion', 'recibido', 'lista_para_entregar')
+OPERACIONES = ('add', 'update', 'remove')
+
+
+def _clave_version(sala):
+    return f'{PREFIJO}:version:{sala}'
+
+
+def version_kds(estacion, sucursal_id=None):
+    """Versión vigente de la sala de la estación (0 si nunca ha cambiado)."""
+    sala = sala_estacion(estacion, sucursal_id)
+    try:
+        return int(cache.get(_clave_version(sala)) or 0)
+    except Exception:
+        logger.warning('Versión KDS no disponible (%s)', sala, exc_info=True)
+        return 0
+
+
+def consulta_pendientes(estacion_nombre):
+    """Query de OrdenDetalle visibles en una estación (todas las sucursales)."""
+    from sqlalchemy.orm import contains_eager
+    from backend.models.models import Orden, OrdenDetalle, Producto, Estacion
+
+    return OrdenDetalle.query \
+        .join(Orden, OrdenDetalle.orden_id == Orden.id) \
+        .join(Producto, OrdenDetalle.producto_id == Producto.id) \
+        .join(Estacion, Producto.estacion_id == Estacion.id) \
+        .options(
+            contains_eager(OrdenDetalle.orden).joinedload(Orden.mesa),
+            contains_eager(OrdenDetalle.producto),
+        ) \
+        .filter(
+            Estacion.nombre == estacion_nombre,
+            OrdenDetalle.estado == 'pendiente',
+            Orden.estado.in_(ESTADOS_ORDEN_KDS),
+        )
+
+
+def estacion_de(detalle):
+    producto = detalle.producto
+    return producto.estacion.nombre if producto and producto.estacion else None
+
+
+def visible_en_kds(detalle):
+    """True si el detalle aparece en la pantalla de su estación."""
+    return detalle.estado == 'pendiente' and detalle.orden.estado in ESTADOS_ORDEN_KDS
+
+
+def item_kds(detalle):
+    orden = detalle.orden
+    return {
+        'id': detalle.id,
+        'orden_id': orden.id,
+        'producto_id': detalle.producto_id,
+        'producto': detalle.producto.nombre,
+        'cantidad': detalle.cantidad,
+        'notas': detalle.notas or '',
+        'mesa': orden.mesa.numero if orden.mesa else None,
+        'para_llevar': bool(orden.es_para_llevar),
+        'tiempo_registro': orden.tiempo_registro.isoformat(),
+        'tiempo_enviado': detalle.tiempo_enviado.isoformat() if detalle.tiempo_enviado else None,
+    }
+
+
+def cambios_orden(orden, op_visible='add'):
+    """(op, detalle) para todos los detalles de una orden según su visibilidad.
+
+    Útil cuando cambia el estado de la orden: lo visible se publica con
+    `op_visible` y lo demás como remove.
+    """
+    return [(op_visible if visible_en_kds(d) else 'remove', d) for d in orden.detalles]
+
+
+def preparar_kds(cambios):
+    """Convierte cambios de detalles en entradas listas para emitir.
+
+    Permite armar los deltas antes del commit (con los objetos aún cargados)
+    y publicarlos después con emitir_kds().
+
+    Args:
+        cambios: iterable de (op, OrdenDetalle) con op en add/update/remove.
+                 add/update de un detalle que ya no es visible se publica
+                 como remove.
+    Returns:
+        lista de (estacion, sucursal_id, op, item)
+    """
+    entradas = []
+    for op, detalle in cambios:
+        estacion = estacion_de(detalle)
+        if estacion is None:
+            continue
+        if op != 'remove' and not visible_en_kds(detalle):
+            op = 'remove'
+        if op == 'remove':
+            item = {'id': detalle.id, 'orden_id': detalle.orden_id}
+        else:
+            item = item_kds(detalle)
+        entradas.append((estacion, detalle.orden.sucursal_id, op, item))
+    return entradas
+
+
+def emitir_kds(entradas):
+    """Escribe las entradas en la cola de cocina y emite un kds_delta por
+    sala con su siguiente versión. Llamar después del commit."""
+    if not entradas:
+        return
+    from backend.services.cola_cocina import aplicar
+    aplicar(entradas)  # antes de la versión: un snapshot nunca queda atrás
+
+    por_sala = defaultdict(list)
+    for estacion, sucursal_id, op, item in entradas:
+        for sala in salas_estacion(estacion, sucursal_id):
+            por_sala[(sala, estacion)].append({'op': op, 'item': item})
+
+    for (sala, estacion), lista in por_sala.items():
+        try:
+            version = cache.cache.inc(_clave_version(sala))
+        except Exception:
+            logger.warning('No se pudo incrementar versión KDS (%s)', sala, exc_info=True)
+            version = None  # el cliente pedirá snapshot
+        socketio.emit('kds_delta', {'estacion': estacion, 'version': version, 'cambios': lista}, to=sala)
+        logger.debug('KDS %s v%s: %d cambios', sala, version, len(lista))
+
+
+def publicar_kds(cambios):
+    """Publica cambios de items a las salas de sus estaciones.
+
+    Cada sala (sucursal de la orden y "todas") lleva su propia versión.
+    Llamar después del commit; ver preparar_kds() para los argumentos.
+    """
+    emitir_kds(preparar_kds(cambios))
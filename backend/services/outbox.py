@@ -0,0 +1,286 @@
+"""Outbox transaccional: efectos del pago fuera del request.
+
+El request de pago confirma solo el pago y un EventoOutbox en la misma
+transacción. Un procesador en segundo plano aplica después los efectos:
+
+  orden_pagada  Sale + SaleItems y rollup de ventas, descuento de
+                inventario y disponibilidad, visitas/gasto del cliente,
+                estado de la mesa; después del commit: contadores KPI,
+                caché de reportes, dashboard y avisos
+                'orden_pagada_notificacion' y 'disponibilidad_productos'.
+
+Idempotencia: el procesador toma el evento con un UPDATE condicionado
+(estado='pendiente' → 'procesado') dentro de la misma transacción que
+aplica los efectos. Si algo falla, el rollback deja el evento pendiente;
+si otro worker lo tomó primero, el UPDATE afecta 0 filas y se salta. Los
+efectos en la base ocurren exactamente una vez; los avisos posteriores al
+commit, como mucho una vez por evento procesado.
+
+Reintentos: cada fallo suma un intento y pospone el evento
+OUTBOX_REINTENTO_SEG × 2^(intentos-1) (máximo una hora); al llegar a
+OUTBOX_MAX_INTENTOS queda en 'error' (flask procesar-outbox
+--reintentar-errores lo regresa a la cola).
+
+Lag: estado_outbox() regresa pendientes, errores y la antigüedad del
+pendiente más viejo; se publica en /health.
+
+Modos (OUTBOX_MODO):
+  worker  procesador en segundo plano por proceso (default); arranca con el
+          worker (gunicorn post_worker_init, o el servidor de desarrollo) y
+          revisa cada OUTBOX_INTERVALO_SEG, así que los eventos pendientes de
+          antes de un deploy o caída se procesan sin esperar otro pago
+  inline  se procesa al final del mismo request, después del commit
+          (desarrollo / pruebas)
+
+Configurable via env vars:
+  OUTBOX_MODO=worker
+  OUTBOX_INTERVALO_SEG=1
+  OUTBOX_LOTE=50
+  OUTBOX_MAX_INTENTOS=8
+  OUTBOX_REINTENTO_SEG=5
+"""
+import os
+import json
+import logging
+import threading
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_MODO = os.getenv('OUTBOX_MODO', 'worker')
+OUTBOX_INTERVALO_SEG = float(os.getenv('OUTBOX_INTERVALO_SEG', '1'))
+OUTBOX_LOTE = int(os.getenv('OUTBOX_LOTE', '50'))
+OUTBOX_MAX_INTENTOS = int(os.getenv('OUTBOX_MAX_INTENTOS', '8'))
+OUTBOX_REINTENTO_SEG = float(os.getenv('OUTBOX_REINTENTO_SEG', '5'))
+
+_lock = threading.Lock()
+_procesador_activo = False
+
+
+# =====================================================================
+# Registro (dentro de la transacción del request)
+# =====================================================================
+
+def registrar_evento(tipo, datos):
+    """Agrega un evento a la sesión; se confirma con el commit del llamador."""
+    from backend.extensions import db
+    from backend.models.models import EventoOutbox
+
+    evento = EventoOutbox(tipo=tipo, datos=json.dumps(datos))
+    db.session.add(evento)
+    return evento
+
+
+def despachar():
+    """Llamar después del commit que registró eventos.
+
+    En modo worker solo asegura que el procesador de este proceso esté
+    corriendo (ya arrancó con el worker)."""
+    from flask import current_app
+
+    if OUTBOX_MODO == 'inline':
+        procesar_pendientes()
+    else:
+        programar_procesador(current_app._get_current_object())
+
+
+# =====================================================================
+# Manejadores
+# =====================================================================
+
+def _orden_pagada(datos):
+    """Efectos de una orden pagada. Regresa los avisos para después del commit."""
+    from sqlalchemy.orm import joinedload
+    from backend.extensions import db
+    from backend.models.models import (
+        Orden, OrdenDetalle, Sale, SaleItem, Cliente, descontar_inventario_por_ordenes,
+    )
+    from backend.utils import actualizar_estado_mesa
+    from backend.services.resumen_ventas import acumular_venta
+    from backend.services.contadores_kpi import movimientos_venta, movimientos_propina, aplicar_movimientos
+    from backend.services.cache_reportes import invalidar_reportes
+    from backend.services.dashboard_tiempo_real import notificar_dashboard
+    from backend.services.salas import emitir, salas_orden
+    from backend.services.disponibilidad import recalcular_por_productos, publicar_disponibilidad
+
+    orden = Orden.query.options(
+        joinedload(Orden.detalles).joinedload(OrdenDetalle.producto),
+    ).filter(Orden.id == datos['orden_id']).first()
+    if orden is None:
+        logger.warning('Outbox: orden %s ya no existe', datos['orden_id'])
+        return []
+
+    venta = Sale(mesa_id=orden.mesa_id, usuario_id=datos['usuario_id'],
+                 total=orden.total, estado='cerrada', sucursal_id=datos.get('sucursal_id'),
+                 fecha_hora=orden.fecha_pago or datetime.utcnow())
+    db.session.add(venta)
+    db.session.flush()
+    items = []
+    for det in orden.detalles:
+        precio = float(det.precio_unitario) if det.precio_unitario else float(det.producto.precio)
+        item = SaleItem(
+            sale_id=venta.id, producto_id=det.producto_id,
+            cantidad=det.cantidad, precio_unitario=precio,
+            subtotal=det.cantidad * precio,
+        )
+        db.session.add(item)
+        items.append(item)
+    acumular_venta(venta, items)
+    movs_kpi = {**movimientos_venta(venta, items), **movimientos_propina(orden)}
+
+    # Descontar inventario según receta estándar
+    descontar_inventario_por_ordenes([orden.id], datos['usuario_id'], venta.fecha_hora)
+    disponibilidad = recalcular_por_productos({det.producto_id for det in orden.detalles})
+
+    # Actualizar visitas/gasto del cliente
+    if orden.cliente_id:
+        cli = db.session.get(Cliente, orden.cliente_id)
+        if cli:
+            cli.visitas = (cli.visitas or 0) + 1
+            cli.total_gastado = (cli.total_gastado or 0) + orden.total
+
+    # Liberar mesa (Sprint 2 — 3.3)
+    actualizar_estado_mesa(orden.mesa_id)
+
+    sucursales = (orden.sucursal_id, venta.sucursal_id)
+    fecha = venta.fecha_negocio
+    salas = salas_orden(orden)
+    aviso = {'orden_id': orden.id, 'mensaje': f'Orden #{orden.id} pagada.'}
+    return [
+        lambda: aplicar_movimientos(movs_kpi),
+        lambda: invalidar_reportes(*sucursales, fecha=fecha),
+        lambda: notificar_dashboard(*sucursales),
+        lambda: emitir('orden_pagada_notificacion', aviso, salas),
+        lambda: publicar_disponibilidad(disponibilidad),
+    ]
+
+
+_MANEJADORES = {
+    'orden_pagada': _orden_pagada,
+}
+
+
+# =====================================================================
+# Procesamiento
+# =====================================================================
+
+def _fallo(evento_id, error):
+    from backend.extensions import db
+    from backend.models.models import EventoOutbox
+
+    try:
+        evento = db.session.get(EventoOutbox, evento_id)
+        evento.intentos += 1
+        evento.ultimo_error = f'{type(error).__name__}: {error}'[:2000]
+        if evento.intentos >= OUTBOX_MAX_INTENTOS:
+            evento.estado = 'error'
+            logger.error('Outbox: evento %s (%s) en error tras %d intentos',
+                         evento_id, evento.tipo, evento.intentos)
+        else:
+            espera = min(OUTBOX_REINTENTO_SEG * 2 ** (evento.intentos - 1), 3600)
+            evento.disponible = datetime.utcnow() + timedelta(seconds=espera)
+        db.session.commit()
+    except Exception:
+        logger.exception('Outbox: no se pudo registrar el fallo del evento %s', evento_id)
+        db.session.rollback()
+
+
+def procesar_evento(evento_id):
+    """Aplica un evento si sigue pendiente. Regresa True si lo procesó."""
+    from backend.extensions import db
+    from backend.models.models import EventoOutbox
+
+    tomado = EventoOutbox.query.filter(
+        EventoOutbox.id == evento_id, EventoOutbox.estado == 'pendiente',
+    ).update({'estado': 'procesado', 'procesado': datetime.utcnow()}, synchronize_session=False)
+    if not tomado:
+        db.session.rollback()
+        return False
+
+    evento = db.session.get(EventoOutbox, evento_id)
+    try:
+        posteriores = _MANEJADORES[evento.tipo](json.loads(evento.datos))
+        db.session.commit()
+    except Exception as e:
+        logger.warning('Outbox: falló el evento %s', evento_id, exc_info=True)
+        db.session.rollback()
+        _fallo(evento_id, e)
+        return False
+
+    for aviso in posteriores:
+        try:
+            aviso()
+        except Exception:
+            logger.warning('Outbox: aviso posterior del evento %s falló', evento_id, exc_info=True)
+    return True
+
+
+def procesar_pendientes(limite=None):
+    """Procesa hasta `limite` eventos pendientes vencidos. Regresa cuántos."""
+    from backend.extensions import db
+    from backend.models.models import EventoOutbox
+
+    ids = [i for (i,) in db.session.query(EventoOutbox.id).filter(
+        EventoOutbox.estado == 'pendiente', EventoOutbox.disponible <= datetime.utcnow(),
+    ).order_by(EventoOutbox.id).limit(limite or OUTBOX_LOTE).all()]
+    db.session.rollback()
+    return sum(1 for i in ids if procesar_evento(i))
+
+
+def reintentar_errores():
+    """Regresa a la cola los eventos en 'error'. Regresa cuántos."""
+    from backend.extensions import db
+    from backend.models.models import EventoOutbox
+
+    n = EventoOutbox.query.filter(EventoOutbox.estado == 'error').update(
+        {'estado': 'pendiente', 'intentos': 0, 'disponible': datetime.utcnow()},
+        synchronize_session=False)
+    db.session.commit()
+    return n
+
+
+def estado_outbox():
+    """{pendientes, errores, lag_seg}: lag = antigüedad del pendiente más viejo."""
+    from sqlalchemy import func
+    from backend.extensions import db
+    from backend.models.models import EventoOutbox
+
+    por_estado = dict(db.session.query(EventoOutbox.estado, func.count(EventoOutbox.id)).filter(
+        EventoOutbox.estado.in_(('pendiente', 'error'))).group_by(EventoOutbox.estado).all())
+    mas_viejo = db.session.query(func.min(EventoOutbox.creado)).filter(
+        EventoOutbox.estado == 'pendiente').scalar()
+    lag = (datetime.utcnow() - mas_viejo).total_seconds() if mas_viejo else 0.0
+    return {'pendientes': por_estado.get('pendiente', 0), 'errores': por_estado.get('error', 0),
+            'lag_seg': round(max(lag, 0.0), 1)}
+
+
+# =====================================================================
+# Procesador en segundo plano
+# =====================================================================
+
+def _ciclo(app):
+    from backend.extensions import socketio, db
+
+    while True:
+        socketio.sleep(OUTBOX_INTERVALO_SEG)
+        with app.app_context():
+            try:
+                procesar_pendientes()
+            except Exception:
+                logger.exception('Error procesando el outbox')
+                db.session.rollback()
+            finally:
+                db.session.remove()
+
+
+def programar_procesador(app):
+    """Arranca el procesador en este proceso (una sola vez)."""
+    global _procesador_activo
+    if OUTBOX_MODO != 'worker':
+        return
+    with _lock:
+        if _procesador_activo:
+            return
+        _procesador_activo = True
+    from backend.extensions import socketio
+    socketio.start_background_task(_ciclo, app)
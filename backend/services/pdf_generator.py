@@ -1,13 +1,59 @@
-"""Sprint 6 — Item 6.4: Generador de PDF para reportes con WeasyPrint."""
+"""Sprint 6 — Item 6.4: Generador de PDF para reportes con WeasyPrint.
+
+La conversión HTML → PDF no corre dentro del request: encolar_pdf() renderiza
+el template (barato) y manda el HTML a un pool de procesos local. El PDF
+terminado se guarda en un caché direccionado por contenido:
+
+    <PDF_CACHE_DIR>/<sha256(template + datos)>.pdf
+
+Repetir la exportación de un periodo cerrado encuentra el archivo y se
+descarga de inmediato. El estado de un trabajo se deduce de los archivos
+(.pdf listo, .error fallido, .pendiente en proceso), así que cualquier worker
+de gunicorn puede responder por trabajos lanzados en otro.
+
+Configurable via env vars:
+  PDF_CACHE_DIR=/tmp/casaleones_pdf
+  PDF_WORKERS=2          (procesos de render)
+  PDF_CACHE_DIAS=30      (antigüedad máxima de archivos en caché)
+  PDF_TIMEOUT=300        (segundos antes de considerar perdido un trabajo)
+"""
+import os
+import re
+import json
+import time
+import hashlib
 import logging
-from io import BytesIO
-from flask import render_template
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from flask import render_template, request, jsonify, send_file, url_for
 
 logger = logging.getLogger(__name__)
 
+PDF_CACHE_DIR = os.getenv('PDF_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'casaleones_pdf'))
+PDF_WORKERS = int(os.getenv('PDF_WORKERS', '2'))
+PDF_CACHE_DIAS = int(os.getenv('PDF_CACHE_DIAS', '30'))
+PDF_TIMEOUT = int(os.getenv('PDF_TIMEOUT', '300'))
+
+# Variables de contexto que no forman parte del contenido (p.ej. el pie "Generado ...")
+CONTEXTO_VOLATIL = ('now',)
+
+_CLAVE_VALIDA = re.compile(r'^[0-9a-f]{64}$')
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _html_a_pdf(html_string):
+    from weasyprint import HTML
+    return HTML(string=html_string).write_pdf()
+
 
 def generar_pdf(template_name, **context):
-    """Renderiza un template HTML y lo convierte a PDF con WeasyPrint.
+    """Renderiza un template HTML y lo convierte a PDF con WeasyPrint (síncrono).
 
     Args:
         template_name: Ruta del template Jinja2 (e.g. 'pdf/ventas.html').
@@ -17,15 +63,152 @@ def generar_pdf(template_name, **context):
         bytes del PDF generado, o None si hay error.
     """
     try:
-        from weasyprint import HTML
+        import weasyprint  # noqa: F401
     except ImportError:
         logger.error('WeasyPrint no está instalado. Instale con: pip install WeasyPrint>=60.0')
         return None
 
     try:
-        html_string = render_template(template_name, **context)
-        pdf_bytes = HTML(string=html_string).write_pdf()
-        return pdf_bytes
+        return _html_a_pdf(render_template(template_name, **context))
     except Exception as e:
         logger.exception('Error al generar PDF con template=%s: %s', template_name, e)
         return None
+
+
+# =====================================================================
+# Cola de render en segundo plano
+# =====================================================================
+
+def _ruta(clave, extension):
+    return os.path.join(PDF_CACHE_DIR, f'{clave}.{extension}')
+
+
+def _renderizar_a_archivo(html_string, clave, cache_dir):
+    """Corre en el proceso del pool. Escribe el PDF de forma atómica."""
+    destino = os.path.join(cache_dir, f'{clave}.pdf')
+    try:
+        pdf_bytes = _html_a_pdf(html_string)
+        fd, tmp = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(pdf_bytes)
+        os.replace(tmp, destino)
+    except Exception as e:
+        with open(os.path.join(cache_dir, f'{clave}.error'), 'w') as f:
+            f.write(f'{type(e).__name__}: {e}')
+    finally:
+        try:
+            os.remove(os.path.join(cache_dir, f'{clave}.pendiente'))
+        except OSError:
+            pass
+
+
+def _obtener_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: el hijo no hereda conexiones de BD ni hilos del worker web
+            _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS,
+                                        mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def _reiniciar_pool():
+    global _pool
+    with _pool_lock:
+        _pool = None
+
+
+def clave_pdf(template_name, context):
+    """Hash del template + datos; el contexto volátil no cuenta."""
+    datos = {k: v for k, v in context.items() if k not in CONTEXTO_VOLATIL}
+    contenido = json.dumps([template_name, datos], sort_keys=True, default=str)
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+
+def _limpiar_cache():
+    limite = time.time() - PDF_CACHE_DIAS * 86400
+    for nombre in os.listdir(PDF_CACHE_DIR):
+        ruta = os.path.join(PDF_CACHE_DIR, nombre)
+        try:
+            if os.path.getmtime(ruta) < limite:
+                os.remove(ruta)
+        except OSError:
+            pass
+
+
+def estado_pdf(clave):
+    """'listo', 'error', 'pendiente' o None si la clave no existe."""
+    if not _CLAVE_VALIDA.match(clave or ''):
+        return None
+    if os.path.exists(_ruta(clave, 'pdf')):
+        return 'listo'
+    if os.path.exists(_ruta(clave, 'error')):
+        return 'error'
+    try:
+        if time.time() - os.path.getmtime(_ruta(clave, 'pendiente')) < PDF_TIMEOUT:
+            return 'pendiente'
+    except OSError:
+        pass
+    return None
+
+
+def ruta_pdf(clave):
+    """Ruta del PDF terminado, o None si no está listo."""
+    return _ruta(clave, 'pdf') if estado_pdf(clave) == 'listo' else None
+
+
+def error_pdf(clave):
+    try:
+        with open(_ruta(clave, 'error')) as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def encolar_pdf(template_name, **context):
+    """Encola el render de un PDF; regresa (clave, estado).
+
+    Si el mismo template con los mismos datos ya se generó, regresa 'listo'
+    sin renderizar. Un trabajo pendiente igual no se duplica.
+    """
+    os.makedirs(PDF_CACHE_DIR, exist_ok=True)
+    clave = clave_pdf(template_name, context)
+    estado = estado_pdf(clave)
+    if estado in ('listo', 'pendiente'):
+        return clave, estado
+
+    _limpiar_cache()
+    try:
+        os.remove(_ruta(clave, 'error'))
+    except OSError:
+        pass
+
+    html_string = render_template(template_name, **context)
+    with open(_ruta(clave, 'pendiente'), 'w') as f:
+        f.write(template_name)
+    try:
+        _obtener_pool().submit(_renderizar_a_archivo, html_string, clave, PDF_CACHE_DIR)
+    except BrokenProcessPool:
+        logger.warning('Pool de PDF roto; se recrea')
+        _reiniciar_pool()
+        _obtener_pool().submit(_renderizar_a_archivo, html_string, clave, PDF_CACHE_DIR)
+    logger.info('PDF encolado template=%s clave=%s', template_name, clave[:12])
+    return clave, 'pendiente'
+
+
+def respuesta_pdf(clave, estado, nombre_archivo):
+    """Descarga inmediata si el PDF ya está en caché; si no, página de espera.
+
+    Los clientes que piden JSON reciben 202 con la URL de estado.
+    """
+    if estado == 'listo':
+        return send_file(_ruta(clave, 'pdf'), mimetype='application/pdf',
+                         as_attachment=True, download_name=nombre_archivo)
+
+    url_estado = url_for('reportes.estado_pdf_job', clave=clave)
+    url_descarga = url_for('reportes.descargar_pdf', clave=clave, nombre=nombre_archivo)
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify(clave=clave, estado=estado, url_estado=url_estado,
+                       url_descarga=url_descarga), 202
+    return render_template('admin/reportes/pdf_espera.html', nombre_archivo=nombre_archivo,
+                           url_estado=url_estado, url_descarga=url_descarga), 202
@@ -0,0 +1,184 @@
+"""Pronóstico de consumo de ingredientes y compras sugeridas por sucursal.
+
+Consumo de un día = salidas por venta + mermas de ese día de negocio
+(movimientos_inventario). Con los últimos PRONOSTICO_DIAS días terminados:
+
+- tasa diaria      consumo promedio por día (los días sin movimientos
+                   cuentan como cero).
+- factor por día   promedio de cada día de la semana / tasa; el viernes
+  de la semana     de una taquería no consume lo mismo que el lunes.
+- pronóstico       tasa × factor de cada uno de los próximos
+                   PRONOSTICO_HORIZONTE_DIAS días, empezando hoy.
+- cobertura        días que alcanza stock_actual consumiendo el pronóstico
+                   (con fracción); 0.0 sin existencias; None si dura más
+                   que el horizonte o no hay consumo.
+- compra sugerida  consumo pronosticado de los próximos
+                   PRONOSTICO_COBERTURA_DIAS días + stock_minimo −
+                   stock_actual, si es positivo. Los preparados (con
+                   subreceta) no se compran y se omiten.
+
+El historial se lee con una sola consulta agregada por (ingrediente, día)
+(_consumos) que queda en un dict {ingrediente: {día: cantidad}}; luego, por
+cada ingrediente activo, ciclos de Python sacan la serie de PRONOSTICO_DIAS
+valores, la tasa y los factores (_factores), el pronóstico del horizonte y
+la cobertura (_cobertura). No se consulta la base dentro del ciclo.
+calcular_pronostico() es caro y lo corre flask pronosticar-inventario
+(cron nocturno, después de cerrar-inventario); guarda en la caché un
+resultado por sucursal y otro para todas. obtener_pronostico() solo lee la
+caché, así que el dashboard no consulta el historial.
+
+Configurable via env vars:
+  PRONOSTICO_DIAS=28              (historial; múltiplo de 7 = mismas semanas)
+  PRONOSTICO_HORIZONTE_DIAS=14
+  PRONOSTICO_COBERTURA_DIAS=7     (días que debe cubrir la compra)
+  PRONOSTICO_CACHE_TTL=93600      (26 h: sobrevive a un cron que se atrasa)
+"""
+import os
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+from backend.extensions import cache
+
+logger = logging.getLogger(__name__)
+
+PRONOSTICO_DIAS = int(os.getenv('PRONOSTICO_DIAS', '28'))
+PRONOSTICO_HORIZONTE_DIAS = int(os.getenv('PRONOSTICO_HORIZONTE_DIAS', '14'))
+PRONOSTICO_COBERTURA_DIAS = int(os.getenv('PRONOSTICO_COBERTURA_DIAS', '7'))
+PRONOSTICO_CACHE_TTL = int(os.getenv('PRONOSTICO_CACHE_TTL', '93600'))
+
+PREFIJO = 'pronostico_inventario'
+CONSUMOS = ('salida_venta', 'merma')
+
+
+def _clave(sucursal_id):
+    return f'{PREFIJO}:{"todas" if sucursal_id is None else sucursal_id}'
+
+
+def _consumos(desde, hasta):
+    """{ingrediente_id: {fecha_negocio: cantidad}} de salidas y mermas (una consulta)."""
+    from backend.extensions import db
+    from backend.models.models import MovimientoInventario as M
+
+    matriz = {}
+    for ingrediente_id, fecha, cantidad in db.session.query(
+        M.ingrediente_id, M.fecha_negocio, func.sum(M.cantidad),
+    ).filter(
+        M.tipo.in_(CONSUMOS), M.fecha_negocio >= desde, M.fecha_negocio <= hasta,
+    ).group_by(M.ingrediente_id, M.fecha_negocio).all():
+        matriz.setdefault(ingrediente_id, {})[fecha] = float(cantidad or 0)
+    return matriz
+
+
+def _factores(serie, dias):
+    """Factor por día de la semana (0 = lunes) de una serie diaria."""
+    tasa = sum(serie) / len(serie)
+    factores = [1.0] * 7
+    if tasa <= 0:
+        return tasa, factores
+    por_dia = [[] for _ in range(7)]
+    for dia, valor in zip(dias, serie):
+        por_dia[dia.weekday()].append(valor)
+    for d, valores in enumerate(por_dia):
+        if valores:
+            factores[d] = (sum(valores) / len(valores)) / tasa
+    return tasa, factores
+
+
+def _cobertura(stock, pronostico):
+    """Días (con fracción) que alcanza `stock`; None si pasa del horizonte.
+
+    Sin existencias (stock en cero o negativo por ventas sin entrada
+    registrada) la cobertura es 0.0, nunca una fracción negativa.
+    """
+    if stock <= 0:
+        return 0.0
+    restante = stock
+    for k, consumo in enumerate(pronostico):
+        if consumo >= restante:
+            return round(k + (restante / consumo if consumo > 0 else 0), 1)
+        restante -= consumo
+    return None
+
+
+def calcular_pronostico(hoy=None):
+    """Pronóstico de todos los ingredientes activos y compras sugeridas.
+
+    Returns:
+        {sucursal_id (None = todas): {'generado', 'desde', 'hasta',
+        'ingredientes': [...], 'compras': [...], 'total_compra'}}
+    """
+    from backend.extensions import db
+    from backend.models.models import Ingrediente, SubRecetaDetalle
+    from backend.services.dia_negocio import hoy_negocio
+
+    hoy = hoy or hoy_negocio()
+    hasta = hoy - timedelta(days=1)
+    desde = hoy - timedelta(days=PRONOSTICO_DIAS)
+    dias = [desde + timedelta(days=i) for i in range(PRONOSTICO_DIAS)]
+    futuros = [(hoy + timedelta(days=i)).weekday() for i in range(PRONOSTICO_HORIZONTE_DIAS)]
+    matriz = _consumos(desde, hasta)
+    preparados = {p for (p,) in db.session.query(SubRecetaDetalle.preparado_id).distinct().all()}
+
+    generado = datetime.utcnow().isoformat()
+    resultado = {}
+    for ing in db.session.query(
+        Ingrediente.id, Ingrediente.nombre, Ingrediente.unidad, Ingrediente.sucursal_id,
+        Ingrediente.stock_actual, Ingrediente.stock_minimo, Ingrediente.costo_unitario,
+    ).filter(Ingrediente.activo == True).order_by(Ingrediente.nombre).all():
+        if ing.id in preparados:
+            continue
+        consumos = matriz.get(ing.id, {})
+        tasa, factores = _factores([consumos.get(d, 0.0) for d in dias], dias)
+        pronostico = [tasa * factores[d] for d in futuros]
+        stock = float(ing.stock_actual or 0)
+        sugerido = round(max(0.0, sum(pronostico[:PRONOSTICO_COBERTURA_DIAS])
+                             + float(ing.stock_minimo or 0) - stock), 3)
+        fila = {
+            'id': ing.id, 'nombre': ing.nombre, 'unidad': ing.unidad,
+            'sucursal_id': ing.sucursal_id, 'stock': stock,
+            'tasa_diaria': round(tasa, 3),
+            'dias_cobertura': _cobertura(stock, pronostico) if tasa > 0 else None,
+            'sugerido': sugerido,
+            'costo_estimado': round(sugerido * float(ing.costo_unitario or 0), 2),
+        }
+        for suc in {None, ing.sucursal_id}:
+            resultado.setdefault(suc, {
+                'generado': generado, 'desde': desde.isoformat(), 'hasta': hasta.isoformat(),
+                'ingredientes': [], 'compras': [], 'total_compra': 0.0,
+            })['ingredientes'].append(fila)
+
+    for datos in resultado.values():
+        # Primero lo que se acaba antes; sin consumo al final
+        datos['ingredientes'].sort(key=lambda f: (f['dias_cobertura'] is None, f['dias_cobertura'] or 0))
+        datos['compras'] = [f for f in datos['ingredientes'] if f['sugerido'] > 0]
+        datos['total_compra'] = round(sum(f['costo_estimado'] for f in datos['compras']), 2)
+    return resultado
+
+
+def refrescar_pronostico(hoy=None):
+    """Recalcula y guarda en la caché. Regresa el número de ingredientes."""
+    resultado = calcular_pronostico(hoy)
+    for sucursal_id, datos in resultado.items():
+        cache.set(_clave(sucursal_id), datos, timeout=PRONOSTICO_CACHE_TTL)
+    total = len(resultado.get(None, {}).get('ingredientes', []))
+    logger.info('Pronóstico de inventario: %d ingredientes, %d sucursales',
+                total, len([s for s in resultado if s is not None]))
+    return total
+
+
+def obtener_pronostico(sucursal_id=None, calcular=True):
+    """Pronóstico en caché de la sucursal (None = todas).
+
+    Sin caché lo calcula y lo guarda si calcular=True; si no, regresa None
+    (el dashboard no dispara el cálculo).
+    """
+    datos = cache.get(_clave(sucursal_id))
+    if datos is None and calcular:
+        refrescar_pronostico()
+        datos = cache.get(_clave(sucursal_id))
+        if datos is None:  # sucursal sin ingredientes activos
+            datos = {'generado': datetime.utcnow().isoformat(), 'ingredientes': [],
+                     'compras': [], 'total_compra': 0.0}
+    return datos
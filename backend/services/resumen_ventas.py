@@ -0,0 +1,271 @@
+"""Rollup diario de ventas para reportes.
+
+Mantiene la tabla resumen_ventas_diarias (sucursal × día × dimensión) de forma
+incremental en el flujo de pago, y permite reconstruirla desde el histórico de
+sales / sale_items / pagos. Los reportes leen días cerrados del rollup y solo
+consultan filas crudas para el día en curso.
+"""
+import logging
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import func, extract, literal_column
+
+from backend.services.dia_negocio import dia_negocio, hoy_negocio, a_hora_local
+
+logger = logging.getLogger(__name__)
+
+DIMENSIONES = ('total', 'producto', 'mesero', 'hora', 'metodo')
+
+FilaResumen = namedtuple('FilaResumen', 'fecha clave num_ventas cantidad total')
+
+
+def _como_fecha(valor):
+    """Normaliza fechas que algunos drivers regresan como str o datetime."""
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    return date.fromisoformat(str(valor))
+
+
+def _dia_abierto(sucursal_id=None):
+    """Primer día de negocio que todavía se lee de filas crudas (día en curso)."""
+    return hoy_negocio(sucursal_id)
+
+
+def _hora_local(hora_utc, fecha):
+    """Traduce una hora UTC agregada en SQL a hora local del día de negocio."""
+    offset = a_hora_local(datetime.combine(fecha, datetime.min.time()) + timedelta(hours=12)).utcoffset()
+    return (int(hora_utc) + int(offset.total_seconds() // 3600)) % 24
+
+
+# =====================================================================
+# Actualización incremental (flujo de pago)
+# =====================================================================
+
+def _incrementar(fecha, sucursal_id, dimension, clave, num_ventas=1, cantidad=0, total=0):
+    """Suma a la fila del día con un upsert atómico.
+
+    La llave única uq_resumen_dia_clave (fecha, sucursal, dimensión, clave)
+    evita que dos pagos concurrentes creen la misma fila dos veces.
+    """
+    from backend.extensions import db
+    from backend.models.models import ResumenVentaDiaria as R
+
+    fila = {
+        'fecha': fecha, 'sucursal_id': sucursal_id, 'dimension': dimension, 'clave': str(clave),
+        'num_ventas': num_ventas, 'cantidad': cantidad, 'total': Decimal(str(total)),
+    }
+    dialecto = db.session.get_bind().dialect.name
+    if dialecto in ('postgresql', 'sqlite'):
+        if dialecto == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(R.__table__).values(**fila)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[R.fecha, func.coalesce(R.sucursal_id, literal_column('0')), R.dimension, R.clave],
+            set_={
+                'num_ventas': R.num_ventas + stmt.excluded.num_ventas,
+                'cantidad': R.cantidad + stmt.excluded.cantidad,
+                'total': R.total + stmt.excluded.total,
+            },
+        ))
+        return
+
+    q = db.session.query(R).filter(R.fecha == fecha, R.dimension == dimension, R.clave == str(clave))
+    q = q.filter(R.sucursal_id == sucursal_id) if sucursal_id is not None else q.filter(R.sucursal_id.is_(None))
+    actualizadas = q.update({
+        R.num_ventas: R.num_ventas + num_ventas,
+        R.cantidad: R.cantidad + cantidad,
+        R.total: R.total + fila['total'],
+    }, synchronize_session=False)
+    if not actualizadas:
+        db.session.add(R(**fila))
+
+
+def acumular_venta(venta, items):
+    """Suma una venta cerrada (Sale + SaleItems) al rollup del día.
+
+    Debe llamarse dentro de la misma transacción que crea la venta.
+    """
+    momento = venta.fecha_hora or datetime.utcnow()
+    suc = venta.sucursal_id
+    fecha = venta.fecha_negocio or dia_negocio(momento, suc)
+    total = venta.total or Decimal('0')
+
+    _incrementar(fecha, suc, 'total', '', total=total)
+    _incrementar(fecha, suc, 'mesero', venta.usuario_id, total=total)
+    _incrementar(fecha, suc, 'hora', a_hora_local(momento).hour, total=total)
+    for item in items:
+        _incrementar(fecha, suc, 'producto', item.producto_id,
+                     cantidad=item.cantidad, total=item.subtotal)
+
+
+def acumular_item(venta, item):
+    """Suma una partida agregada a una venta que ya estaba cerrada (routes/ventas)."""
+    momento = venta.fecha_hora or datetime.utcnow()
+    suc = venta.sucursal_id
+    fecha = venta.fecha_negocio or dia_negocio(momento, suc)
+
+    _incrementar(fecha, suc, 'total', '', num_ventas=0, total=item.subtotal)
+    _incrementar(fecha, suc, 'mesero', venta.usuario_id, num_ventas=0, total=item.subtotal)
+    _incrementar(fecha, suc, 'hora', a_hora_local(momento).hour, num_ventas=0, total=item.subtotal)
+    _incrementar(fecha, suc, 'producto', item.producto_id,
+                 cantidad=item.cantidad, total=item.subtotal)
+
+
+def acumular_pago(pago, sucursal_id):
+    """Suma un pago (parcial o total) al desglose por método del día."""
+    fecha = pago.fecha_negocio or dia_negocio(pago.fecha, sucursal_id)
+    _incrementar(fecha, sucursal_id, 'metodo', pago.metodo, total=pago.monto)
+
+
+# =====================================================================
+# Agregados crudos (día en curso y reconstrucción)
+# =====================================================================
+
+def _agregados_crudos(dimension, fi, ff, sucursal_id=None):
+    """Agrega filas crudas de sales/pagos para el rango de días de negocio [fi, ff].
+
+    Returns:
+        list de (fecha, sucursal_id, clave, num_ventas, cantidad, total)
+    """
+    from backend.extensions import db
+    from backend.models.models import Sale, SaleItem, Pago, Orden
+
+    if dimension == 'metodo':
+        dia = Pago.fecha_negocio
+        q = db.session.query(
+            dia, Orden.sucursal_id, Pago.metodo,
+            func.count(Pago.id), db.literal(0), func.sum(Pago.monto),
+        ).join(Orden, Pago.orden_id == Orden.id
+        ).filter(dia >= fi, dia <= ff)
+        if sucursal_id is not None:
+            q = q.filter(Orden.sucursal_id == sucursal_id)
+        return q.group_by(dia, Orden.sucursal_id, Pago.metodo).all()
+
+    dia = Sale.fecha_negocio
+    if dimension == 'producto':
+        q = db.session.query(
+            dia, Sale.sucursal_id, SaleItem.producto_id,
+            func.count(SaleItem.id), func.sum(SaleItem.cantidad), func.sum(SaleItem.subtotal),
+        ).join(Sale, SaleItem.sale_id == Sale.id)
+        grupo = SaleItem.producto_id
+    else:
+        grupo = {
+            'total': db.literal(''),
+            'mesero': Sale.usuario_id,
+            'hora': extract('hour', Sale.fecha_hora),
+        }[dimension]
+        q = db.session.query(
+            dia, Sale.sucursal_id, grupo,
+            func.count(Sale.id), db.literal(0), func.sum(Sale.total),
+        )
+
+    # Solo ventas cerradas: las abiertas (routes/ventas) entran al rollup al cerrarse
+    q = q.filter(dia >= fi, dia <= ff, Sale.estado == 'cerrada')
+    if sucursal_id is not None:
+        q = q.filter(Sale.sucursal_id == sucursal_id)
+    if dimension == 'total':
+        return q.group_by(dia, Sale.sucursal_id).all()
+    filas = q.group_by(dia, Sale.sucursal_id, grupo).all()
+    if dimension == 'hora':
+        filas = [(f, suc, _hora_local(h, _como_fecha(f)), n, c, t) for f, suc, h, n, c, t in filas]
+    return filas
+
+
+def _clave(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return str(valor)
+
+
+def reconstruir_resumen(fi=None, ff=None):
+    """Borra y recalcula el rollup para [fi, ff] a partir del histórico.
+
+    Sin fechas, reconstruye todo. Returns: número de filas insertadas.
+    """
+    from backend.extensions import db
+    from backend.models.models import Sale, Pago, ResumenVentaDiaria as R
+
+    if fi is None:
+        primeras = [
+            db.session.query(func.min(Sale.fecha_negocio)).scalar(),
+            db.session.query(func.min(Pago.fecha_negocio)).scalar(),
+        ]
+        primeras = [_como_fecha(p) for p in primeras if p is not None]
+        if not primeras:
+            return 0
+        fi = min(primeras)
+    ff = ff or _dia_abierto()
+
+    db.session.query(R).filter(R.fecha >= fi, R.fecha <= ff).delete(synchronize_session=False)
+
+    filas = []
+    for dimension in DIMENSIONES:
+        for fecha, suc, clave, num, cant, total in _agregados_crudos(dimension, fi, ff):
+            filas.append({
+                'fecha': _como_fecha(fecha), 'sucursal_id': suc,
+                'dimension': dimension, 'clave': _clave(clave),
+                'num_ventas': int(num or 0), 'cantidad': int(cant or 0),
+                'total': total or Decimal('0'),
+            })
+    if filas:
+        db.session.bulk_insert_mappings(R, filas)
+    db.session.commit()
+    logger.info('Resumen de ventas reconstruido %s..%s: %d filas', fi, ff, len(filas))
+    return len(filas)
+
+
+# =====================================================================
+# Lectura para reportes
+# =====================================================================
+
+def consultar_resumen(dimension, fi, ff, sucursal_id=None, por_dia=False):
+    """Totales de una dimensión en [fi, ff].
+
+    Días cerrados salen del rollup; el día en curso se agrega de filas crudas.
+
+    Returns:
+        list[FilaResumen] — con por_dia=False, fecha es None y hay una fila por clave.
+    """
+    from backend.extensions import db
+    from backend.models.models import ResumenVentaDiaria as R
+
+    acumulado = {}
+
+    def _sumar(fecha, clave, num, cant, total):
+        key = (fecha if por_dia else None, clave)
+        prev = acumulado.get(key, (0, 0, 0.0))
+        acumulado[key] = (prev[0] + int(num or 0), prev[1] + int(cant or 0),
+                          prev[2] + float(total or 0))
+
+    abierto = _dia_abierto(sucursal_id)
+    hasta_cerrado = min(ff, abierto - timedelta(days=1))
+    if fi <= hasta_cerrado:
+        q = db.session.query(
+            R.fecha, R.clave,
+            func.sum(R.num_ventas), func.sum(R.cantidad), func.sum(R.total),
+        ).filter(
+            R.dimension == dimension,
+            R.fecha >= fi,
+            R.fecha <= hasta_cerrado,
+        )
+        if sucursal_id is not None:
+            q = q.filter(R.sucursal_id == sucursal_id)
+        for fecha, clave, num, cant, total in q.group_by(R.fecha, R.clave).all():
+            _sumar(_como_fecha(fecha), clave, num, cant, total)
+
+    if ff >= abierto:
+        for fecha, _suc, clave, num, cant, total in _agregados_crudos(
+                dimension, max(fi, abierto), ff, sucursal_id):
+            _sumar(_como_fecha(fecha), _clave(clave), num, cant, total)
+
+    filas = [FilaResumen(f, c, n, q, t) for (f, c), (n, q, t) in acumulado.items()]
+    filas.sort(key=lambda r: (r.fecha or date.min, r.clave))
+    return filas
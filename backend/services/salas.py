@@ -0,0 +1,67 @@
+"""Salas Socket.IO del namespace principal.
+
+Al conectarse, cada cliente entra a:
+
+    usuario:<id>                       avisos de sus propias órdenes
+    sucursal:<id|todas>                mesas y eventos generales de la sucursal
+    estacion:<id|todas>:<estacion>     solo pantallas KDS (auth={estacion})
+
+Los emisores mandan cada evento únicamente a las salas afectadas en lugar de
+difundirlo a todas las tablets de todas las sucursales. Los eventos de una
+orden van a su mesero y a su sucursal (cajeros y admins los necesitan, y
+las órdenes de delivery o para llevar no tienen mesero). Un evento de una
+sucursal se manda también a la sala "todas" (admins sin sucursal activa).
+"""
+import logging
+
+from backend.extensions import socketio
+
+logger = logging.getLogger(__name__)
+
+
+def _suc(sucursal_id):
+    return 'todas' if sucursal_id is None else sucursal_id
+
+
+def sala_usuario(usuario_id):
+    return f'usuario:{usuario_id}'
+
+
+def sala_sucursal(sucursal_id):
+    return f'sucursal:{_suc(sucursal_id)}'
+
+
+def sala_estacion(estacion, sucursal_id):
+    return f'estacion:{_suc(sucursal_id)}:{estacion}'
+
+
+def salas_sucursal(sucursal_id):
+    """La sala de la sucursal y la de "todas"."""
+    return list(dict.fromkeys([sala_sucursal(sucursal_id), sala_sucursal(None)]))
+
+
+def salas_estacion(estacion, sucursal_id):
+    return list(dict.fromkeys([sala_estacion(estacion, sucursal_id), sala_estacion(estacion, None)]))
+
+
+def salas_orden(orden, cocina=False):
+    """Salas interesadas en una orden: su mesero, la sucursal (cajeros,
+    admins y órdenes sin mesero: delivery, para llevar) y, con cocina=True,
+    las estaciones de sus productos."""
+    salas = [sala_usuario(orden.mesero_id)] if orden.mesero_id else []
+    salas += salas_sucursal(orden.sucursal_id)
+    if cocina:
+        estaciones = {d.producto.estacion.nombre for d in orden.detalles
+                      if d.producto and d.producto.estacion}
+        for estacion in sorted(estaciones):
+            salas += salas_estacion(estacion, orden.sucursal_id)
+    return salas
+
+
+def emitir(evento, datos, salas):
+    """Emite `evento` solo a `salas` (cada cliente lo recibe una vez)."""
+    salas = list(dict.fromkeys(salas))
+    if not salas:
+        logger.debug('Evento %s sin salas destino', evento)
+        return
+    socketio.emit(evento, datos, to=salas)
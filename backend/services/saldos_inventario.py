@@ -0,0 +1,240 @@
+"""Saldos de inventario por día de negocio: existencias a cualquier fecha.
+
+movimientos_inventario crece sin límite y Ingrediente.stock_actual solo
+sabe el "ahora". Para no sumar todo el historial se guardan cierres por
+ingrediente (tabla saldos_inventario):
+
+- cerrar_dias()  saldo al cierre de cada día de negocio terminado. Se
+                 calcula hacia atrás desde stock_actual restando el neto de
+                 los movimientos posteriores (una consulta agregada para
+                 todo el rango). El último día de cada mes queda marcado
+                 cierre_mes y no se depura; los diarios se borran después
+                 de SALDOS_DIAS_RETENCION. Se corre con
+                 flask cerrar-inventario (cron, después del corte). Un día
+                 está terminado cuando ya pasó el corte de todas las
+                 sucursales con ingredientes (cada una tiene su hora_corte).
+- stock_al(t)    existencias al timestamp t: cierre anterior más vecino +
+                 movimientos desde ese cierre. Sin cierre anterior, hacia
+                 atrás desde stock_actual.
+- valuacion_inventario()
+                 cantidad × costo al cierre de mes, leída solo de los
+                 saldos de ese día: no depende del tamaño del historial.
+
+Neto de un movimiento: entrada y ajuste suman su cantidad (el ajuste
+guarda el signo); salida_venta y merma la restan.
+
+Ventas cobradas antes del corte pero procesadas por el outbox después del
+cierre llegan con fecha de negocio ya cerrada: descontar_inventario_por_ordenes
+llama a ajustar_saldos() en la misma transacción para corregir esos
+cierres.
+
+Configurable via env vars:
+  SALDOS_DIAS_RETENCION=90
+"""
+import os
+import logging
+from decimal import Decimal
+from datetime import timedelta
+
+from sqlalchemy import func, case
+
+logger = logging.getLogger(__name__)
+
+SALDOS_DIAS_RETENCION = int(os.getenv('SALDOS_DIAS_RETENCION', '90'))
+
+SALIDAS = ('salida_venta', 'merma')
+CENTAVO = Decimal('0.01')
+
+
+def _neto():
+    from backend.models.models import MovimientoInventario as M
+    return case((M.tipo.in_(SALIDAS), -M.cantidad), else_=M.cantidad)
+
+
+def _decimal(valor):
+    return Decimal(str(valor or 0))
+
+
+def _valor(cantidad, costo):
+    return (cantidad * costo).quantize(CENTAVO)
+
+
+# =====================================================================
+# Cierres
+# =====================================================================
+
+def _hoy_mas_atrasado():
+    """Día de negocio en curso de la sucursal que va más atrás (corte más tarde)."""
+    from backend.extensions import db
+    from backend.models.models import Ingrediente
+    from backend.services.dia_negocio import hoy_negocio
+
+    sucursales = {s for (s,) in db.session.query(Ingrediente.sucursal_id).distinct().all()}
+    return min(hoy_negocio(s) for s in sucursales | {None})
+
+
+def cerrar_dias(hasta=None, desde=None):
+    """Genera (o regenera) los saldos al cierre de cada día desde..hasta.
+
+    Args:
+        hasta: último día a cerrar (default: ayer de la sucursal con el
+               corte más tarde); debe estar terminado en todas.
+        desde: default: el día siguiente al último cierre (o `hasta`).
+    Returns:
+        número de saldos insertados
+    """
+    from backend.extensions import db
+    from backend.models.models import Ingrediente, MovimientoInventario as M, SaldoInventario as S
+
+    hoy = _hoy_mas_atrasado()
+    hasta = hasta or hoy - timedelta(days=1)
+    if hasta >= hoy:
+        raise ValueError('Solo se pueden cerrar días de negocio terminados')
+    if desde is None:
+        ultimo = db.session.query(func.max(S.fecha)).scalar()
+        desde = ultimo + timedelta(days=1) if ultimo else hasta
+    if desde > hasta:
+        return 0
+
+    # Neto por (ingrediente, día) de todo lo posterior a `desde`
+    netos = {}
+    for ingrediente_id, fecha, neto in db.session.query(
+        M.ingrediente_id, M.fecha_negocio, func.sum(_neto()),
+    ).filter(M.fecha_negocio > desde).group_by(M.ingrediente_id, M.fecha_negocio).all():
+        netos.setdefault(ingrediente_id, {})[fecha] = _decimal(neto)
+
+    filas = []
+    for ingrediente_id, sucursal_id, stock, costo in db.session.query(
+        Ingrediente.id, Ingrediente.sucursal_id, Ingrediente.stock_actual, Ingrediente.costo_unitario,
+    ).all():
+        movs = netos.get(ingrediente_id, {})
+        costo = _decimal(costo)
+        saldo = _decimal(stock) - sum((v for f, v in movs.items() if f > hasta), Decimal(0))
+        dia = hasta
+        while dia >= desde:
+            filas.append({
+                'ingrediente_id': ingrediente_id, 'fecha': dia, 'sucursal_id': sucursal_id,
+                'cantidad': saldo, 'costo_unitario': costo, 'valor': _valor(saldo, costo),
+                'cierre_mes': (dia + timedelta(days=1)).day == 1,
+            })
+            saldo -= movs.get(dia, 0)  # saldo al cierre del día anterior
+            dia -= timedelta(days=1)
+
+    db.session.query(S).filter(S.fecha >= desde, S.fecha <= hasta).delete(synchronize_session=False)
+    if filas:
+        db.session.execute(S.__table__.insert(), filas)
+    db.session.query(S).filter(
+        S.fecha < hasta - timedelta(days=SALDOS_DIAS_RETENCION), S.cierre_mes == False,
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    logger.info('Inventario cerrado %s..%s: %d saldos', desde, hasta, len(filas))
+    return len(filas)
+
+
+def ajustar_saldos(netos):
+    """Suma movimientos con fecha de negocio ya cerrada a los saldos afectados.
+
+    Args:
+        netos: {(ingrediente_id, fecha_negocio): cantidad con signo}
+    No hace commit; va en la transacción que registra los movimientos.
+    """
+    from sqlalchemy import bindparam
+    from backend.extensions import db
+    from backend.models.models import SaldoInventario
+
+    if not netos:
+        return
+    ultimo = db.session.query(func.max(SaldoInventario.fecha)).scalar()
+    if ultimo is None or min(f for _, f in netos) > ultimo:
+        return  # caso normal: movimientos de un día todavía abierto
+    saldos = SaldoInventario.__table__
+    nuevo = saldos.c.cantidad + bindparam('b_neto')
+    db.session.execute(
+        saldos.update()
+        .where(saldos.c.ingrediente_id == bindparam('b_id'), saldos.c.fecha >= bindparam('b_fecha'))
+        .values(cantidad=nuevo, valor=nuevo * saldos.c.costo_unitario),
+        [{'b_id': i, 'b_fecha': f, 'b_neto': n}
+         for (i, f), n in sorted(netos.items()) if f <= ultimo],
+    )
+    logger.info('Saldos de inventario ajustados por movimientos atrasados: %d', len(netos))
+
+
+# =====================================================================
+# Consultas
+# =====================================================================
+
+def stock_al(momento, sucursal_id=None):
+    """{ingrediente_id: existencia} al timestamp UTC `momento`."""
+    from backend.extensions import db
+    from backend.models.models import Ingrediente, MovimientoInventario as M, SaldoInventario as S
+    from backend.services.dia_negocio import dia_negocio
+
+    q = db.session.query(Ingrediente.id, Ingrediente.sucursal_id, Ingrediente.stock_actual)
+    if sucursal_id is not None:
+        q = q.filter(Ingrediente.sucursal_id == sucursal_id)
+    grupos = {}
+    actuales = {}
+    for ingrediente_id, suc, stock in q.all():
+        grupos.setdefault(suc, []).append(ingrediente_id)
+        actuales[ingrediente_id] = _decimal(stock)
+
+    resultado = {}
+    for suc, ids in grupos.items():
+        # Cierre más reciente antes del día de `momento` (hora de corte de la sucursal)
+        ancla = db.session.query(func.max(S.fecha)).filter(
+            S.ingrediente_id.in_(ids), S.fecha < dia_negocio(momento, suc)).scalar()
+        if ancla is not None:
+            base = {i: _decimal(c) for i, c in db.session.query(S.ingrediente_id, S.cantidad)
+                    .filter(S.fecha == ancla, S.ingrediente_id.in_(ids)).all()}
+            if base:
+                desde_cierre = dict(db.session.query(M.ingrediente_id, func.sum(_neto())).filter(
+                    M.ingrediente_id.in_(list(base)), M.fecha_negocio > ancla, M.fecha <= momento,
+                ).group_by(M.ingrediente_id).all())
+                for i, cantidad in base.items():
+                    resultado[i] = cantidad + _decimal(desde_cierre.get(i))
+        resto = [i for i in ids if i not in resultado]
+        if resto:  # sin cierre anterior: hacia atrás desde el stock actual
+            posteriores = dict(db.session.query(M.ingrediente_id, func.sum(_neto())).filter(
+                M.ingrediente_id.in_(resto), M.fecha > momento,
+            ).group_by(M.ingrediente_id).all())
+            for i in resto:
+                resultado[i] = actuales[i] - _decimal(posteriores.get(i))
+    return resultado
+
+
+def cierres_mes(limite=24):
+    """Fechas de cierre de mes disponibles, de la más reciente a la más vieja."""
+    from backend.extensions import db
+    from backend.models.models import SaldoInventario as S
+
+    return [f for (f,) in db.session.query(S.fecha).filter(S.cierre_mes == True)
+            .distinct().order_by(S.fecha.desc()).limit(limite).all()]
+
+
+def valuacion_inventario(fecha=None, sucursal_id=None):
+    """Valuación del inventario al cierre de `fecha` (default: último cierre de mes).
+
+    Returns:
+        {'fecha', 'filas': [{nombre, unidad, cantidad, costo_unitario, valor}],
+        'total'}, o None si ese día no tiene cierre.
+    """
+    from backend.extensions import db
+    from backend.models.models import Ingrediente, SaldoInventario as S
+
+    if fecha is None:
+        recientes = cierres_mes(1)
+        if not recientes:
+            return None
+        fecha = recientes[0]
+    q = db.session.query(
+        Ingrediente.nombre, Ingrediente.unidad, S.cantidad, S.costo_unitario, S.valor,
+    ).join(Ingrediente, Ingrediente.id == S.ingrediente_id).filter(S.fecha == fecha)
+    if sucursal_id is not None:
+        q = q.filter(S.sucursal_id == sucursal_id)
+    filas = [{
+        'nombre': nombre, 'unidad': unidad, 'cantidad': float(cantidad),
+        'costo_unitario': float(costo), 'valor': float(valor),
+    } for nombre, unidad, cantidad, costo, valor in q.order_by(S.valor.desc(), Ingrediente.nombre).all()]
+    if not filas:
+        return None
+    return {'fecha': fecha, 'filas': filas, 'total': round(sum(f['valor'] for f in filas), 2)}
@@ -0,0 +1,237 @@
+"""Subrecetas: ingredientes preparados hechos de otros ingredientes.
+
+Un ingrediente es preparado si tiene subreceta (subreceta_detalle:
+preparado → componente, cantidad por unidad del preparado). Un componente
+puede ser a su vez preparado; el conjunto es un DAG y guardar_subreceta()
+rechaza cualquier cambio que forme un ciclo (CicloSubreceta).
+
+Explosión: cada preparado se aplana a ingredientes base y se guarda en
+explosion_preparados. El aplanado es un DFS memoizado (cada nodo se evalúa
+una vez por recálculo) y solo se recalculan los nodos afectados: el
+preparado que cambió y sus ancestros, con el índice inverso
+componente → preparado. Los demás preparados se leen ya aplanados.
+
+receta_explotada() es la receta de cada producto en ingredientes base
+(receta_detalle ⟕ explosion_preparados); un producto sin preparados queda
+igual. La usan el costo materializado (services/costos), el descuento de
+inventario, la disponibilidad y la validación de stock del carrito, así
+que vender un producto descuenta los ingredientes base de sus preparados;
+el stock del preparado no se usa.
+
+costo_unitario de un preparado = Σ cantidad base × costo base. Se
+actualiza al guardar su subreceta y, vía costos.recalcular_por_ingrediente,
+al cambiar el costo de un ingrediente que contiene.
+"""
+import logging
+from decimal import Decimal
+
+from sqlalchemy import func
+
+logger = logging.getLogger(__name__)
+
+CENTAVO = Decimal('0.01')
+
+
+class CicloSubreceta(ValueError):
+    """La subreceta haría que un preparado se contenga a sí mismo."""
+
+
+def _grafo():
+    """{preparado_id: [(componente_id, cantidad_por_unidad)]} (una consulta)."""
+    from backend.extensions import db
+    from backend.models.models import SubRecetaDetalle
+
+    grafo = {}
+    for preparado, componente, cantidad in db.session.query(
+        SubRecetaDetalle.preparado_id, SubRecetaDetalle.componente_id,
+        SubRecetaDetalle.cantidad_por_unidad,
+    ).all():
+        grafo.setdefault(preparado, []).append((componente, cantidad))
+    return grafo
+
+
+def _ancestros(ids, grafo):
+    """Preparados que contienen, directa o indirectamente, alguno de ids."""
+    padres = {}
+    for preparado, componentes in grafo.items():
+        for componente, _ in componentes:
+            padres.setdefault(componente, set()).add(preparado)
+    vistos = set()
+    pendientes = list(ids)
+    while pendientes:
+        for padre in padres.get(pendientes.pop(), ()):
+            if padre not in vistos:
+                vistos.add(padre)
+                pendientes.append(padre)
+    return vistos
+
+
+def _ciclo(camino):
+    from backend.models.models import Ingrediente
+
+    nombres = dict(Ingrediente.query.with_entities(Ingrediente.id, Ingrediente.nombre)
+                   .filter(Ingrediente.id.in_(set(camino))).all())
+    return CicloSubreceta('Ciclo en subrecetas: ' + ' → '.join(nombres.get(i, str(i)) for i in camino))
+
+
+def _aplanar(nodo, grafo, memo, camino):
+    """{ingrediente base: cantidad} por unidad de nodo (DFS memoizado)."""
+    if nodo not in grafo:
+        return {nodo: Decimal(1)}
+    if nodo in memo:
+        return memo[nodo]
+    if nodo in camino:
+        raise _ciclo(camino[camino.index(nodo):] + [nodo])
+    camino.append(nodo)
+    plano = {}
+    for componente, cantidad in grafo[nodo]:
+        for base, por_unidad in _aplanar(componente, grafo, memo, camino).items():
+            plano[base] = plano.get(base, 0) + cantidad * por_unidad
+    camino.pop()
+    memo[nodo] = plano
+    return plano
+
+
+def recalcular_preparados(ingrediente_ids):
+    """Vuelve a aplanar los preparados dados y sus ancestros. No hace commit.
+
+    Regresa los ids recalculados (incluye los que se quedaron sin subreceta).
+    """
+    from backend.extensions import db
+    from backend.models.models import ExplosionPreparado
+
+    grafo = _grafo()
+    ids = set(ingrediente_ids)
+    afectados = ids | _ancestros(ids, grafo)
+    if not afectados:
+        return afectados
+
+    # Memo inicial: componentes preparados no afectados, ya aplanados en la tabla
+    memo = {}
+    vecinos = {c for n in afectados for c, _ in grafo.get(n, ()) if c in grafo} - afectados
+    if vecinos:
+        for preparado, base, cantidad in db.session.query(
+            ExplosionPreparado.preparado_id, ExplosionPreparado.ingrediente_id,
+            ExplosionPreparado.cantidad_por_unidad,
+        ).filter(ExplosionPreparado.preparado_id.in_(vecinos)).all():
+            memo.setdefault(preparado, {})[base] = cantidad
+
+    filas = [
+        {'preparado_id': nodo, 'ingrediente_id': base, 'cantidad_por_unidad': cantidad}
+        for nodo in sorted(afectados) if nodo in grafo
+        for base, cantidad in _aplanar(nodo, grafo, memo, []).items()
+    ]
+    db.session.execute(db.delete(ExplosionPreparado)
+                       .where(ExplosionPreparado.preparado_id.in_(afectados)))
+    if filas:
+        db.session.execute(ExplosionPreparado.__table__.insert(), filas)
+    actualizar_costo_preparados(afectados & grafo.keys())
+    logger.debug('Preparados recalculados: %s', sorted(afectados))
+    return afectados
+
+
+def preparados_con(ingrediente_ids):
+    """Preparados cuya explosión usa alguno de los ingredientes."""
+    from backend.extensions import db
+    from backend.models.models import ExplosionPreparado
+
+    ingrediente_ids = set(ingrediente_ids)
+    if not ingrediente_ids:
+        return set()
+    return set(db.session.execute(
+        db.select(ExplosionPreparado.preparado_id).distinct()
+        .where(ExplosionPreparado.ingrediente_id.in_(ingrediente_ids))
+    ).scalars().all())
+
+
+def actualizar_costo_preparados(preparado_ids):
+    """costo_unitario de cada preparado desde su explosión. No hace commit."""
+    from sqlalchemy import bindparam
+    from sqlalchemy.orm import aliased
+    from backend.extensions import db
+    from backend.models.models import ExplosionPreparado, Ingrediente
+
+    preparado_ids = set(preparado_ids)
+    if not preparado_ids:
+        return
+    base = aliased(Ingrediente)
+    costos = db.session.query(
+        ExplosionPreparado.preparado_id,
+        func.sum(ExplosionPreparado.cantidad_por_unidad * func.coalesce(base.costo_unitario, 0)),
+    ).join(base, base.id == ExplosionPreparado.ingrediente_id) \
+        .filter(ExplosionPreparado.preparado_id.in_(preparado_ids)) \
+        .group_by(ExplosionPreparado.preparado_id).all()
+    if not costos:
+        return
+    ingredientes = Ingrediente.__table__
+    db.session.execute(
+        ingredientes.update().where(ingredientes.c.id == bindparam('b_id'))
+        .values(costo_unitario=bindparam('b_costo')),
+        [{'b_id': p, 'b_costo': Decimal(str(c or 0)).quantize(CENTAVO)} for p, c in sorted(costos)],
+    )
+    for obj in list(db.session.identity_map.values()):
+        if isinstance(obj, Ingrediente) and obj.id in preparado_ids:
+            db.session.expire(obj, ['costo_unitario'])
+
+
+def receta_explotada():
+    """Subconsulta (producto_id, ingrediente_id, cantidad_por_unidad, linea_id).
+
+    La receta de cada producto en ingredientes base; linea_id es el
+    receta_detalle de origen. Un producto puede repetir ingrediente base
+    si llega por dos preparados: agregar con sum().
+    """
+    from backend.extensions import db
+    from backend.models.models import RecetaDetalle, ExplosionPreparado
+
+    return db.select(
+        RecetaDetalle.producto_id.label('producto_id'),
+        func.coalesce(ExplosionPreparado.ingrediente_id, RecetaDetalle.ingrediente_id).label('ingrediente_id'),
+        (RecetaDetalle.cantidad_por_unidad
+         * func.coalesce(ExplosionPreparado.cantidad_por_unidad, 1)).label('cantidad_por_unidad'),
+        RecetaDetalle.id.label('linea_id'),
+    ).outerjoin(ExplosionPreparado, ExplosionPreparado.preparado_id == RecetaDetalle.ingrediente_id) \
+        .subquery('receta_explotada')
+
+
+def guardar_subreceta(preparado_id, componentes):
+    """Reemplaza la subreceta del preparado y recalcula lo afectado. No hace commit.
+
+    Args:
+        componentes: lista de (componente_id, cantidad_por_unidad); una
+                     lista vacía convierte al preparado en ingrediente base.
+    Returns:
+        cambios de disponibilidad, para publicar_disponibilidad() después
+        del commit.
+    Raises:
+        CicloSubreceta si el preparado terminaría conteniéndose.
+    """
+    from backend.extensions import db
+    from backend.models.models import SubRecetaDetalle, RecetaDetalle
+    from backend.services.costos import recalcular_costos
+    from backend.services.disponibilidad import recalcular_disponibilidad
+
+    por_componente = {}
+    for componente_id, cantidad in componentes:
+        por_componente[componente_id] = por_componente.get(componente_id, 0) + cantidad
+
+    grafo = _grafo()
+    grafo.pop(preparado_id, None)
+    if por_componente:
+        grafo[preparado_id] = list(por_componente.items())
+        _aplanar(preparado_id, grafo, {}, [])  # valida: lanza CicloSubreceta
+
+    SubRecetaDetalle.query.filter_by(preparado_id=preparado_id).delete()
+    db.session.add_all([
+        SubRecetaDetalle(preparado_id=preparado_id, componente_id=c, cantidad_por_unidad=q)
+        for c, q in por_componente.items()
+    ])
+    db.session.flush()
+
+    afectados = recalcular_preparados([preparado_id])
+    producto_ids = db.session.execute(
+        db.select(RecetaDetalle.producto_id).distinct()
+        .where(RecetaDetalle.ingrediente_id.in_(afectados))
+    ).scalars().all()
+    recalcular_costos(producto_ids)
+    return recalcular_disponibilidad(producto_ids)
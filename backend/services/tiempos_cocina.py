@@ -0,0 +1,188 @@
+"""Tiempos de preparación en cocina: percentiles y SLA.
+
+Cada OrdenDetalle guarda sus transiciones (models: tiempo_enviado,
+tiempo_listo, tiempo_entregado). El tiempo de preparación es
+tiempo_listo - tiempo_enviado, en segundos.
+
+Los percentiles se calculan en SQL con funciones de ventana: row_number()
+y count() por grupo, y el p-ésimo percentil es el primer valor con
+fila >= p * n (nearest-rank). Funciona igual en PostgreSQL y SQLite.
+
+Las pantallas KDS marcan los items que ya pasaron el p90 histórico de su
+producto (umbrales_p90, cacheado por sucursal).
+
+Configurable via env vars:
+  TIEMPOS_COCINA_SLA_SEG=900        (meta de preparación; 15 min = rojo en el KDS)
+  TIEMPOS_COCINA_DIAS_P90=14        (historial para los umbrales del KDS)
+  TIEMPOS_COCINA_MIN_MUESTRAS=10    (menos muestras = sin umbral)
+  TIEMPOS_COCINA_P90_TTL=600        (segundos en caché de los umbrales)
+"""
+import os
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, case, extract
+
+from backend.extensions import cache
+from backend.services.dia_negocio import a_hora_local
+
+logger = logging.getLogger(__name__)
+
+TIEMPOS_COCINA_SLA_SEG = int(os.getenv('TIEMPOS_COCINA_SLA_SEG', '900'))
+TIEMPOS_COCINA_DIAS_P90 = int(os.getenv('TIEMPOS_COCINA_DIAS_P90', '14'))
+TIEMPOS_COCINA_MIN_MUESTRAS = int(os.getenv('TIEMPOS_COCINA_MIN_MUESTRAS', '10'))
+TIEMPOS_COCINA_P90_TTL = int(os.getenv('TIEMPOS_COCINA_P90_TTL', '600'))
+
+PREFIJO = 'tiempos_cocina'
+DIMENSIONES = ('producto', 'estacion', 'hora')
+
+
+def _segundos():
+    from backend.models.models import OrdenDetalle
+    return extract('epoch', OrdenDetalle.tiempo_listo) - extract('epoch', OrdenDetalle.tiempo_enviado)
+
+
+def _base(columnas, sucursal_id):
+    """Detalles con tiempo de preparación medible, unidos a orden/producto/estación."""
+    from backend.extensions import db
+    from backend.models.models import Orden, OrdenDetalle, Producto, Estacion
+
+    q = db.session.query(*columnas) \
+        .select_from(OrdenDetalle) \
+        .join(Orden, OrdenDetalle.orden_id == Orden.id) \
+        .join(Producto, OrdenDetalle.producto_id == Producto.id) \
+        .outerjoin(Estacion, Producto.estacion_id == Estacion.id) \
+        .filter(OrdenDetalle.tiempo_enviado.isnot(None), OrdenDetalle.tiempo_listo.isnot(None))
+    if sucursal_id is not None:
+        q = q.filter(Orden.sucursal_id == sucursal_id)
+    return q
+
+
+def percentiles(grupo, filtros, sucursal_id=None):
+    """Filas (clave..., n, p50, p90, promedio, fuera_sla) por grupo.
+
+    Args:
+        grupo: lista de expresiones etiquetadas (Producto, Estacion,
+               OrdenDetalle u Orden); definen la partición.
+        filtros: condiciones adicionales sobre la consulta base.
+    """
+    from backend.extensions import db
+
+    segundos = _segundos()
+    sub = _base([
+        *grupo,
+        segundos.label('seg'),
+        func.row_number().over(partition_by=grupo, order_by=segundos).label('fila'),
+        func.count().over(partition_by=grupo).label('n'),
+    ], sucursal_id).filter(*filtros).subquery()
+
+    def percentil(p):
+        return func.min(case((sub.c.fila >= sub.c.n * p, sub.c.seg)))
+
+    claves = [sub.c[c.name] for c in grupo]
+    return db.session.query(
+        *claves,
+        func.max(sub.c.n),
+        percentil(0.5),
+        percentil(0.9),
+        func.avg(sub.c.seg),
+        func.count(case((sub.c.seg > TIEMPOS_COCINA_SLA_SEG, 1))),
+    ).group_by(*claves).all()
+
+
+def _grupo(dimension):
+    from backend.models.models import OrdenDetalle, Producto, Estacion
+
+    return {
+        'producto': [Producto.id.label('clave'), Producto.nombre.label('nombre')],
+        'estacion': [func.coalesce(Estacion.nombre, 'sin_estacion').label('clave')],
+        'hora': [extract('hour', OrdenDetalle.tiempo_enviado).label('clave')],
+    }[dimension]
+
+
+def _hora_local(hora_utc, fecha):
+    offset = a_hora_local(datetime.combine(fecha, datetime.min.time()) + timedelta(hours=12)).utcoffset()
+    return (int(hora_utc) + int(offset.total_seconds() // 3600)) % 24
+
+
+def estadisticas_preparacion(dimension, fecha_inicio, fecha_fin, sucursal_id=None):
+    """Percentiles de preparación por producto, estación u hora.
+
+    Args:
+        dimension: 'producto' | 'estacion' | 'hora' (hora local de envío)
+        fecha_inicio, fecha_fin: días de negocio de la orden (inclusive)
+    Returns:
+        lista de dicts {clave, nombre, muestras, p50, p90, promedio,
+        fuera_sla, pct_fuera_sla}, segundos, ordenada por p90 descendente
+        (por hora: ascendente por hora).
+    """
+    from backend.models.models import Orden
+
+    if dimension not in DIMENSIONES:
+        raise ValueError(f'Dimensión inválida: {dimension}')
+    filtros = [Orden.fecha_negocio >= fecha_inicio, Orden.fecha_negocio <= fecha_fin]
+
+    resultado = []
+    for fila in percentiles(_grupo(dimension), filtros, sucursal_id):
+        if dimension == 'producto':
+            clave, nombre, *valores = fila
+        else:
+            clave, *valores = fila
+            nombre = None
+        n, p50, p90, promedio, fuera_sla = valores
+        if dimension == 'hora':
+            clave = _hora_local(clave, fecha_fin)
+            nombre = f'{clave:02d}:00'
+        elif dimension == 'estacion':
+            nombre = clave
+        resultado.append({
+            'clave': clave,
+            'nombre': nombre,
+            'muestras': int(n),
+            'p50': float(p50),
+            'p90': float(p90),
+            'promedio': round(float(promedio), 1),
+            'fuera_sla': int(fuera_sla),
+            'pct_fuera_sla': round(100.0 * int(fuera_sla) / int(n), 1),
+        })
+    if dimension == 'hora':
+        resultado.sort(key=lambda r: r['clave'])
+    else:
+        resultado.sort(key=lambda r: (-r['p90'], str(r['clave'])))
+    return resultado
+
+
+def _clave_umbrales(sucursal_id):
+    return f'{PREFIJO}:p90:{"todas" if sucursal_id is None else sucursal_id}'
+
+
+def umbrales_p90(sucursal_id=None):
+    """{producto_id: p90 en segundos} de los últimos TIEMPOS_COCINA_DIAS_P90.
+
+    Solo productos con al menos TIEMPOS_COCINA_MIN_MUESTRAS. Cacheado por
+    sucursal; si falla la consulta regresa {} (el KDS simplemente no marca).
+    """
+    clave = _clave_umbrales(sucursal_id)
+    try:
+        datos = cache.get(clave)
+    except Exception:
+        logger.warning('Caché de umbrales p90 no disponible', exc_info=True)
+        datos = None
+    if datos is not None:
+        return {int(k): v for k, v in datos.items()}
+
+    from backend.models.models import OrdenDetalle, Producto
+
+    desde = datetime.utcnow() - timedelta(days=TIEMPOS_COCINA_DIAS_P90)
+    try:
+        filas = percentiles([Producto.id.label('clave')], [OrdenDetalle.tiempo_listo >= desde], sucursal_id)
+    except Exception:
+        logger.exception('No se pudieron calcular los umbrales p90 de cocina')
+        return {}
+    umbrales = {int(clave): float(p90) for clave, n, _p50, p90, _prom, _fuera in filas
+                if n >= TIEMPOS_COCINA_MIN_MUESTRAS}
+    try:
+        cache.set(clave, {str(k): v for k, v in umbrales.items()}, timeout=TIEMPOS_COCINA_P90_TTL)
+    except Exception:
+        logger.warning('No se pudieron cachear los umbrales p90', exc_info=True)
+    return umbrales
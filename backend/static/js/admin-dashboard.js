@@ -1,7 +1,11 @@
 /**
  * Admin Dashboard — Sprint 10 (period selector + trends)
- * Fetches 9 API endpoints with period filter, renders 8 KPI widgets,
- * 2 charts, stock alerts, activity feed. Auto-refreshes every 30s.
+ * Subscribes to the /dashboard Socket.IO namespace (room per sucursal+period):
+ * receives a full snapshot on subscribe and coalesced section deltas after
+ * payments, table and kitchen events. Renders 8 KPI widgets, 2 charts,
+ * stock alerts, activity feed.
+ * While the socket is down it falls back to polling the ETag'd snapshot
+ * endpoint (/admin/api/dashboard/snapshot) every 30s.
  */
 (function() {
   'use strict';
@@ -18,12 +22,40 @@
   let chart7Dias = null;
   let chartTop = null;
   let currentPeriod = 'today';
+  let snapshotEtag = null;
+  let snapshotPeriod = null;
+  let snapshot = null;
+  let socket = null;
+  let pollTimer = null;
 
   // Currency formatter
   const currency = v => '$' + Number(v).toLocaleString('es-MX', { minimumFractionDigits: 2, maximumFractionDigits: 2 });
 
-  // Fetch helper — appends period query param
-  const api = endpoint => fetch(`/admin/api/dashboard/${endpoint}?period=${currentPeriod}`).then(r => r.json());
+  // Snapshot fetch — resolves to null when the server answers 304 (sin cambios)
+  async function fetchSnapshot() {
+    const headers = {};
+    if (snapshotEtag && snapshotPeriod === currentPeriod) headers['If-None-Match'] = snapshotEtag;
+    const r = await fetch(`/admin/api/dashboard/snapshot?period=${currentPeriod}`, { headers, cache: 'no-store' });
+    const serverNow = Date.parse(r.headers.get('Date')) || Date.now();
+    if (r.status === 304) return { data: null, serverNow };
+    if (!r.ok) throw new Error(`HTTP ${r.status}`);
+    snapshotEtag = r.headers.get('ETag');
+    snapshotPeriod = currentPeriod;
+    return { data: await r.json(), serverNow };
+  }
+
+  // Kitchen timer is derived locally so it keeps moving while the snapshot is unchanged
+  let registroPromedio = null;
+  function renderTimer(serverNow) {
+    const timerEl = document.getElementById('timerCocina');
+    if (!timerEl) return;
+    if (registroPromedio === null) {
+      timerEl.textContent = 'Sin órdenes activas';
+      return;
+    }
+    const min = Math.max(0, (serverNow / 1000 - registroPromedio) / 60);
+    timerEl.textContent = `~${min.toFixed(1)} min promedio`;
+  }
 
   // Estado badge helper
   function estadoBadge(estado) {
@@ -44,23 +76,14 @@
   }
 
   // ---- KPI Updates ----
-  async function refreshKPIs() {
+  function renderKPIs(snap) {
     try {
-      const [ventas, ordenes, ticket, propinas, mesas, cocina, stock, corte] = await Promise.all([
-        api('ventas_hoy'),
-        api('ordenes_hoy'),
-        api('ticket_promedio'),
-        api('propinas_hoy'),
-        api('mesas_activas'),
-        api('ordenes_cocina'),
-        api('alertas_stock'),
-        api('ultimo_corte'),
-      ]);
-
-      document.getElementById('ventasHoy').textContent = currency(ventas.ventasHoy);
-      document.getElementById('ordenesHoy').textContent = ordenes.ordenesHoy;
-      document.getElementById('ticketPromedio').textContent = currency(ticket.ticketPromedio);
-      document.getElementById('propinasHoy').textContent = currency(propinas.propinas);
+      const { kpis, mesas, cocina, alertas_stock: stock, ultimo_corte: corte } = snap;
+
+      document.getElementById('ventasHoy').textContent = currency(kpis.ventasHoy);
+      document.getElementById('ordenesHoy').textContent = kpis.ordenesHoy;
+      document.getElementById('ticketPromedio').textContent = currency(kpis.ticketPromedio);
+      document.getElementById('propinasHoy').textContent = currency(kpis.propinas);
 
       // Mesas
       document.getElementById('mesasActivas').textContent = `${mesas.ocupadas}/${mesas.total}`;
@@ -69,10 +92,7 @@
 
       // Cocina
       document.getElementById('ordenesCocina').textContent = cocina.pendientes;
-      const timerEl = document.getElementById('timerCocina');
-      if (timerEl) timerEl.textContent = cocina.timer_promedio_min > 0
-        ? `~${cocina.timer_promedio_min} min promedio`
-        : 'Sin órdenes activas';
+      registroPromedio = cocina.registro_promedio;
 
       // Stock alerts count
       const countEl = document.getElementById('alertasStockCount');
@@ -115,17 +135,14 @@
       }
 
     } catch (err) {
-      console.error('Error refreshing KPIs:', err);
+      console.error('Error rendering KPIs:', err);
     }
   }
 
   // ---- Charts ----
-  async function refreshCharts() {
+  function renderCharts(snap) {
     try {
-      const [ventas7, top] = await Promise.all([
-        api('ventas_7dias'),
-        api('top_productos'),
-      ]);
+      const { ventas_7dias: ventas7, top_productos: top } = snap;
 
       // 7-day sales line chart
       const ctx7 = document.getElementById('chart7Dias');
@@ -189,14 +206,14 @@
         });
       }
     } catch (err) {
-      console.error('Error refreshing charts:', err);
+      console.error('Error rendering charts:', err);
     }
   }
 
   // ---- Activity Feed ----
-  async function refreshActivity() {
+  function renderActivity(snap) {
     try {
-      const data = await api('actividad_reciente');
+      const data = snap.actividad_reciente;
       const feed = document.getElementById('activityFeed');
       if (!data.items.length) {
         feed.innerHTML = '<p class="text-muted text-center">Sin actividad reciente.</p>';
@@ -214,7 +231,7 @@
           </div>
         </div>`).join('');
     } catch (err) {
-      console.error('Error refreshing activity:', err);
+      console.error('Error rendering activity:', err);
     }
   }
 
@@ -228,21 +245,104 @@
       container.querySelectorAll('.cl-period-pill').forEach(p => p.classList.remove('cl-period-pill--active'));
       pill.classList.add('cl-period-pill--active');
       currentPeriod = pill.dataset.period;
-      refreshAll();
+      subscribe();
     });
   }
 
-  // ---- Auto-refresh ----
-  function refreshAll() {
-    refreshKPIs();
-    refreshCharts();
-    refreshActivity();
+  // ---- Compras sugeridas (pronóstico nocturno) ----
+  function renderCompras(snap) {
+    const el = document.getElementById('comprasSugeridasList');
+    const compras = snap.compras_sugeridas;
+    if (!el || !compras) return;
+    if (!compras.disponible) {
+      el.innerHTML = '<p class="text-muted text-center mb-0">El pronóstico se calcula cada noche (flask pronosticar-inventario)</p>';
+    } else if (compras.count === 0) {
+      el.innerHTML = '<p class="text-muted text-center mb-0">Sin compras pendientes 👍</p>';
+    } else {
+      el.innerHTML = compras.items.map(item => {
+        const dias = item.dias_cobertura === null ? '—' : `${item.dias_cobertura} días`;
+        const cls = item.dias_cobertura !== null && item.dias_cobertura < 3 ? 'text-danger fw-bold' : 'text-muted';
+        return `
+          <div class="d-flex justify-content-between align-items-center mb-2">
+            <div><strong>${item.nombre}</strong> <small class="${cls}">${dias}</small></div>
+            <span class="text-end">${item.sugerido} ${item.unidad}</span>
+          </div>`;
+      }).join('') + `<div class="text-end fw-bold">Total estimado: ${currency(compras.total)}</div>`;
+    }
+  }
+
+  // ---- Render by section ----
+  const KPI_SECTIONS = ['kpis', 'mesas', 'cocina', 'alertas_stock', 'ultimo_corte'];
+  const CHART_SECTIONS = ['ventas_7dias', 'top_productos'];
+
+  function render(sections) {
+    if (sections.some(s => KPI_SECTIONS.includes(s))) renderKPIs(snapshot);
+    if (sections.some(s => CHART_SECTIONS.includes(s))) renderCharts(snapshot);
+    if (sections.includes('actividad_reciente')) renderActivity(snapshot);
+    if (sections.includes('compras_sugeridas')) renderCompras(snapshot);
+    renderTimer(Date.now());
+  }
+
+  // ---- Polling (fallback while the socket is disconnected) ----
+  async function refreshAll() {
+    try {
+      const { data, serverNow } = await fetchSnapshot();
+      if (data) {
+        snapshot = data;
+        render(Object.keys(data));
+      }
+      renderTimer(serverNow);
+    } catch (err) {
+      console.error('Error refreshing dashboard:', err);
+    }
+  }
+
+  function startPolling() {
+    if (pollTimer) return;
+    refreshAll();
+    pollTimer = setInterval(refreshAll, REFRESH_MS);
+  }
+
+  function stopPolling() {
+    clearInterval(pollTimer);
+    pollTimer = null;
+  }
+
+  // ---- Socket.IO push ----
+  function subscribe() {
+    if (socket && socket.connected) socket.emit('dashboard_suscribir', { period: currentPeriod });
+    else refreshAll();
+  }
+
+  function initSocket() {
+    if (typeof io === 'undefined') return false;
+    socket = io('/dashboard');
+    socket.on('connect', () => {
+      stopPolling();
+      subscribe();
+    });
+    socket.on('disconnect', startPolling);
+    socket.on('connect_error', startPolling);
+    socket.on('dashboard_snapshot', msg => {
+      if (msg.periodo !== currentPeriod) return;
+      snapshot = msg.snapshot;
+      render(Object.keys(snapshot));
+    });
+    socket.on('dashboard_delta', msg => {
+      if (msg.periodo !== currentPeriod || !snapshot) return;
+      Object.assign(snapshot, msg.secciones);
+      render(Object.keys(msg.secciones));
+    });
+    // Heartbeat: keeps the server-side subscription alive (it expires without it)
+    setInterval(() => { if (socket.connected) socket.emit('dashboard_latido'); }, REFRESH_MS);
+    return true;
   }
 
   document.addEventListener('DOMContentLoaded', () => {
     initPeriodSelector();
-    refreshAll();
-    setInterval(refreshAll, REFRESH_MS);
+    if (!initSocket()) startPolling();
+    // Kitchen timer ticks locally; no request involved
+    setInterval(() => { if (snapshot) renderTimer(Date.now()); }, REFRESH_MS);
   });
 
 })();
\ No newline at end of file
@@ -2,6 +2,8 @@
  * Cocina Timers — KDS v6
  * Timer + urgency gradient for KDS cards.
  * Thresholds: 0-5min green, 5-10min yellow, 10-15min red, 15+ urgent pulse.
+ * Items with data-p90 (historical p90 prep time of their product, seconds)
+ * get .kds-item--lento once the time since data-tiempo-enviado exceeds it.
  * Exports window.initKdsTimers() for re-init after AJAX refresh.
  */
 (function() {
@@ -47,6 +49,15 @@
                 else badge.classList.add('bg-success');
             }
         });
+
+        document.querySelectorAll('.kds-item[data-p90]').forEach(function(row) {
+            const card = row.closest('.orden-timer-card');
+            const iso = row.getAttribute('data-tiempo-enviado') ||
+                (card && card.getAttribute('data-tiempo-registro'));
+            if (!iso) return;
+            const diffSec = (Date.now() - new Date(iso).getTime()) / 1000;
+            row.classList.toggle('kds-item--lento', diffSec > Number(row.getAttribute('data-p90')));
+        });
     }
 
     function init() {
@@ -0,0 +1,60 @@
+/**
+ * Disponibilidad de productos en la pantalla de la orden.
+ * Tiles with 0 producible units are marked sold out ("86") and ignore
+ * clicks; with few units left (<= data-pocas) they show the count.
+ * Initial values come from data-disponibilidad on the grid
+ * ({producto_id: unidades}, products without a limit are absent); the tiles
+ * are rendered from the menu catalog and painted on 'menu-cargado'.
+ * Updates arrive as 'disponibilidad_productos' socket events:
+ *   {productos: {producto_id: {unidades, bajo} | null}}   null = no limit
+ */
+(function() {
+    'use strict';
+
+    const grid = document.getElementById('productGrid');
+    if (!grid) return;
+
+    const POCAS = Number(grid.dataset.pocas) || 5;
+
+    function pintar(tile, unidades) {
+        const agotado = unidades === 0;
+        tile.dataset.disponibles = unidades === null ? '' : String(unidades);
+        tile.classList.toggle('cl-product-tile--agotado', agotado);
+        tile.setAttribute('aria-disabled', agotado ? 'true' : 'false');
+        const etiqueta = tile.querySelector('.cl-product-tile__disp');
+        if (!etiqueta) return;
+        if (agotado) etiqueta.textContent = 'Agotado';
+        else if (unidades !== null && unidades <= POCAS) etiqueta.textContent = 'Quedan ' + unidades;
+        else etiqueta.textContent = '';
+    }
+
+    // producto_id -> unidades (null = sin límite); también guarda los
+    // avisos que llegan antes de que el menú termine de cargar
+    let estado = {};
+    try {
+        estado = JSON.parse(grid.dataset.disponibilidad || '{}');
+    } catch (err) {
+        console.error('data-disponibilidad inválido:', err);
+    }
+
+    function pintarTodo() {
+        grid.querySelectorAll('.cl-product-tile').forEach(function(tile) {
+            const valor = estado[tile.dataset.productoId];
+            pintar(tile, valor === undefined || valor === null ? null : Number(valor));
+        });
+    }
+
+    grid.addEventListener('menu-cargado', pintarTodo);
+    pintarTodo();
+
+    if (typeof io !== 'function') return;
+    const socket = io();
+    socket.on('disponibilidad_productos', function(data) {
+        Object.keys(data.productos || {}).forEach(function(id) {
+            const info = data.productos[id];
+            estado[id] = info ? Number(info.unidades) : null;
+            const tile = grid.querySelector('.cl-product-tile[data-producto-id="' + id + '"]');
+            if (tile) pintar(tile, estado[id]);
+        });
+    });
+})();
@@ -0,0 +1,126 @@
+/**
+ * KDS Todo el día — pending quantity per product across all orders, plus
+ * batch suggestions ("🔥 14 Barbacoa · 12 min").
+ * Counters are updated incrementally by the same upserts/removes the
+ * station applies from kds_delta (kds_station.html); the grid is scanned
+ * only once, to seed from the server-rendered cards.
+ * A product is suggested when it has >= data-lote-minimo pieces in 2+
+ * orders; suggestions are ordered by their oldest ticket.
+ * Exports window.KdsTodoDia = { upsert(item), remove(id), seed(root) }.
+ */
+(function() {
+    'use strict';
+
+    const panel = document.getElementById('kdsTodoDia');
+    if (!panel) return;
+
+    const LOTE_MINIMO = Number(panel.dataset.loteMinimo) || 3;
+    const MAX_SUGERENCIAS = 3;
+    const chips = panel.querySelector('.kds-todo__chips');
+    const lotes = panel.querySelector('.kds-todo__lotes');
+
+    // clave → {nombre, total, items: Map(itemId → {cantidad, orden, desde})}
+    const productos = new Map();
+    const indice = new Map();   // itemId → clave
+    let programado = false;
+
+    function remove(id) {
+        id = String(id);
+        const clave = indice.get(id);
+        if (clave === undefined) return;
+        indice.delete(id);
+        const p = productos.get(clave);
+        p.total -= p.items.get(id).cantidad;
+        p.items.delete(id);
+        if (!p.items.size) productos.delete(clave);
+        programar();
+    }
+
+    function upsert(item) {
+        const id = String(item.id);
+        remove(id);
+        const clave = String(item.producto_id || item.producto);
+        let p = productos.get(clave);
+        if (!p) {
+            p = { nombre: item.producto, total: 0, items: new Map() };
+            productos.set(clave, p);
+        }
+        const cantidad = Number(item.cantidad) || 0;
+        p.items.set(id, {
+            cantidad: cantidad,
+            orden: String(item.orden_id),
+            desde: new Date(item.tiempo_enviado || item.tiempo_registro).getTime(),
+        });
+        p.total += cantidad;
+        indice.set(id, clave);
+        programar();
+    }
+
+    function seed(root) {
+        root.querySelectorAll('.kds-item').forEach(function(row) {
+            const card = row.closest('.orden-timer-card');
+            const nombre = row.querySelector('.kds-item__name');
+            upsert({
+                id: row.dataset.itemId,
+                producto_id: row.dataset.productoId,
+                producto: nombre ? nombre.textContent : '',
+                cantidad: row.dataset.cantidad,
+                orden_id: card ? card.dataset.ordenId : row.dataset.itemId,
+                tiempo_enviado: row.dataset.tiempoEnviado,
+                tiempo_registro: card ? card.dataset.tiempoRegistro : null,
+            });
+        });
+    }
+
+    function programar() {
+        if (programado) return;
+        programado = true;
+        window.requestAnimationFrame(render);
+    }
+
+    function span(className, text) {
+        const node = document.createElement('span');
+        node.className = className;
+        node.textContent = text;
+        return node;
+    }
+
+    function render() {
+        programado = false;
+        const ahora = Date.now();
+        const resumen = Array.from(productos.values()).map(function(p) {
+            const ordenes = new Set();
+            let desde = Infinity;
+            p.items.forEach(function(i) {
+                ordenes.add(i.orden);
+                if (i.desde < desde) desde = i.desde;
+            });
+            return { nombre: p.nombre, total: p.total, ordenes: ordenes.size, desde: desde };
+        });
+
+        chips.replaceChildren();
+        resumen.slice().sort(function(a, b) { return b.total - a.total; }).forEach(function(r) {
+            const chip = span('kds-todo__chip', r.nombre + ' ');
+            chip.appendChild(span('kds-todo__qty', String(r.total)));
+            chips.appendChild(chip);
+        });
+
+        lotes.replaceChildren();
+        resumen
+            .filter(function(r) { return r.total >= LOTE_MINIMO && r.ordenes >= 2; })
+            .sort(function(a, b) { return a.desde - b.desde; })
+            .slice(0, MAX_SUGERENCIAS)
+            .forEach(function(r) {
+                const mins = Math.max(0, Math.floor((ahora - r.desde) / 60000));
+                lotes.appendChild(span('kds-todo__lote',
+                    '🔥 ' + r.total + ' ' + r.nombre + ' · ' + r.ordenes + ' órdenes · ' + mins + ' min'));
+            });
+
+        panel.hidden = productos.size === 0;
+    }
+
+    window.KdsTodoDia = { upsert: upsert, remove: remove, seed: seed };
+
+    // Ticket ages in the suggestions move even without deltas
+    setInterval(programar, 30000);
+})();
@@ -254,9 +254,29 @@
     });
   });
 
+  // ─── Polling (only while the socket is down) ───────────────
+  let pollTimer = null;
+  function startPolling() {
+    if (pollTimer) return;
+    pollTimer = setInterval(fetchMesas, 30000);
+  }
+  function stopPolling() {
+    clearInterval(pollTimer);
+    pollTimer = null;
+  }
+
   // ─── Socket.IO real-time ───────────────────────────────────
+  let socket = null;
   if (typeof io !== 'undefined') {
-    const socket = io.connect(location.protocol + '//' + document.domain + ':' + location.port);
+    socket = io.connect(location.protocol + '//' + document.domain + ':' + location.port);
+
+    socket.on('connect', function() {
+      // Resync once after (re)connecting, then rely on pushed events
+      if (pollTimer) fetchMesas();
+      stopPolling();
+    });
+    socket.on('disconnect', startPolling);
+    socket.on('connect_error', startPolling);
 
     socket.on('mesa_estado_actualizado', function(data) {
       const el = document.querySelector(`.mesa-item[data-mesa-id="${data.mesa_id}"]`);
@@ -275,7 +295,6 @@
 
   // ─── Init ──────────────────────────────────────────────────
   fetchMesas();
-  // Auto-refresh every 30s
-  setInterval(fetchMesas, 30000);
+  if (!socket) startPolling();
 
 })();
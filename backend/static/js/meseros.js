@@ -46,28 +46,66 @@ $(document).ready(function() {
     if (typeof io !== 'undefined') {
         const socket = io.connect(location.protocol + '//' + document.domain + ':' + location.port);
 
+        // ETA de cocina (services/eta_cocina.py): epoch ms, se recalcula al marcar items
+        function mostrarEta(ordenId, eta) {
+            var el = $('#orden-eta-' + ordenId);
+            if (!el.length) return;
+            if (!eta) { el.hide().attr('data-eta-ts', ''); return; }
+            el.attr('data-eta-ts', eta.eta_ts).show();
+            actualizarEta(el);
+        }
+
+        function actualizarEta(el) {
+            var ts = Number(el.attr('data-eta-ts'));
+            if (!ts) return;
+            var mins = Math.max(1, Math.ceil((ts - Date.now()) / 60000));
+            el.find('.orden-eta__texto').text('~' + mins + ' min');
+        }
+
+        setInterval(function() { $('.orden-eta').each(function() { actualizarEta($(this)); }); }, 30000);
+
         socket.on('nueva_orden_cocina', function(data) {
-            showToast(`Orden #${data.orden_id} enviada a cocina.`, 'info');
+            var texto = `Orden #${data.orden_id} enviada a cocina.`;
+            if (data.eta) texto += ` Lista en ~${Math.max(1, Math.ceil(data.eta.segundos / 60))} min.`;
+            showToast(texto, 'info');
+            if (data.eta) mostrarEta(data.orden_id, data.eta);
+        });
+
+        socket.on('eta_ordenes', function(data) {
+            $.each(data.etas, function(ordenId, eta) { mostrarEta(ordenId, eta); });
         });
 
+        function marcarFilaLista(ordenId, itemId) {
+            var row = $('#product-item-' + itemId);
+            if (!row.length) return false;
+            // Update badge in card layout
+            row.find('.estado-producto-texto').html('<span class="cl-badge cl-badge--success cl-badge--pill" style="font-size:10px;">Listo</span>');
+            // Legacy accordion support
+            row.find('.accion-producto').html(
+                `<button class="btn btn-sm btn-primary btn-entregar-item"
+                         data-detalle-id="${itemId}" data-orden-id="${ordenId}">Entregar</button>`
+            );
+            row.removeClass('detalle-pendiente-cocina detalle-entregado').addClass('detalle-listo-cocina');
+            return true;
+        }
+
         socket.on('item_listo_notificacion', function(data) {
             showToast(`¡${data.producto_nombre} de orden #${data.orden_id} listo!`, 'success');
-            var row = $('#product-item-' + data.item_id);
-            if (row.length) {
-                // Update badge in card layout
-                row.find('.estado-producto-texto').html('<span class="cl-badge cl-badge--success cl-badge--pill" style="font-size:10px;">Listo</span>');
-                // Legacy accordion support
-                row.find('.accion-producto').html(
-                    `<button class="btn btn-sm btn-primary btn-entregar-item"
-                             data-detalle-id="${data.item_id}" data-orden-id="${data.orden_id}">Entregar</button>`
-                );
-                row.removeClass('detalle-pendiente-cocina detalle-entregado').addClass('detalle-listo-cocina');
-                verificarEstadoParaCobro(data.orden_id);
-            }
+            if (marcarFilaLista(data.orden_id, data.item_id)) verificarEstadoParaCobro(data.orden_id);
+        });
+
+        // Lote de una estación: un solo aviso por orden
+        socket.on('items_listos_notificacion', function(data) {
+            showToast(data.mensaje, 'success');
+            var cambio = false;
+            data.items.forEach(function(it) { cambio = marcarFilaLista(data.orden_id, it.item_id) || cambio; });
+            if (cambio) verificarEstadoParaCobro(data.orden_id);
+            if (data.orden_completa) mostrarEta(data.orden_id, null);
         });
 
         socket.on('orden_completa_lista', function(data) {
             showToast(`¡Orden #${data.orden_id} lista en cocina!`, 'success');
+            mostrarEta(data.orden_id, null);
         });
 
         socket.on('orden_actualizada_para_cobro', function(data) {
@@ -2,8 +2,10 @@ import logging
 from functools import wraps
 from decimal import Decimal
 from flask import session, redirect, url_for, flash, request, jsonify, g, current_app
-from backend.models.models import Orden, OrdenDetalle, Producto, RecetaDetalle, Mesa
-from backend.extensions import db, socketio
+from backend.models.models import Orden, OrdenDetalle, Producto, Ingrediente, Mesa
+from backend.extensions import db
+from backend.services.dashboard_tiempo_real import notificar_dashboard
+from backend.services.salas import emitir, salas_orden, salas_sucursal
 
 logger = logging.getLogger(__name__)
 
@@ -36,39 +38,68 @@ def verificar_stock_disponible(producto_id, cantidad):
         - faltantes: ingredientes con stock 0 o negativo
         - warnings: ingredientes con stock bajo (<= stock_minimo)
     """
-    receta = RecetaDetalle.query.filter_by(producto_id=producto_id).all()
-    if not receta:
-        return True, [], []  # Sin receta, no se valida
-
-    faltantes = []
-    warnings = []
-    for item in receta:
-        ing = item.ingrediente
-        requerido = item.cantidad_por_unidad * cantidad
-        if ing.stock_actual <= 0:
-            faltantes.append({
-                'ingrediente': ing.nombre,
-                'unidad': ing.unidad,
-                'stock_actual': float(ing.stock_actual),
-                'requerido': float(requerido),
-            })
-        elif ing.stock_actual < requerido:
-            faltantes.append({
-                'ingrediente': ing.nombre,
-                'unidad': ing.unidad,
-                'stock_actual': float(ing.stock_actual),
-                'requerido': float(requerido),
-            })
-        elif ing.stock_actual <= ing.stock_minimo:
-            warnings.append({
-                'ingrediente': ing.nombre,
-                'unidad': ing.unidad,
-                'stock_actual': float(ing.stock_actual),
-                'stock_minimo': float(ing.stock_minimo),
-            })
-
-    disponible = len(faltantes) == 0
-    return disponible, faltantes, warnings
+    return verificar_stock_carrito([(producto_id, cantidad)])[0]
+
+
+def verificar_stock_carrito(lineas):
+    """Verifica el stock de un carrito completo con una sola consulta.
+
+    Las líneas se revisan en orden y cada línea aceptada aparta lo que
+    consume, así dos productos que comparten ingrediente no pasan ambos
+    si juntos exceden el stock. Una línea rechazada no aparta nada.
+
+    Args:
+        lineas: lista de (producto_id, cantidad)
+    Returns:
+        lista paralela de (disponible, faltantes, warnings) con el mismo
+        formato que verificar_stock_disponible.
+    """
+    from sqlalchemy import func
+    from backend.services.subrecetas import receta_explotada
+
+    recetas = {}  # producto_id → [(ingrediente base, cantidad por unidad)]
+    if lineas:
+        explotada = receta_explotada()
+        for producto_id, ing, por_unidad in db.session.query(
+            explotada.c.producto_id, Ingrediente, func.sum(explotada.c.cantidad_por_unidad),
+        ).join(Ingrediente, Ingrediente.id == explotada.c.ingrediente_id) \
+                .filter(explotada.c.producto_id.in_({pid for pid, _ in lineas})) \
+                .group_by(explotada.c.producto_id, Ingrediente.id).all():
+            recetas.setdefault(producto_id, []).append((ing, por_unidad))
+
+    apartado = {}  # ingrediente_id → cantidad ya comprometida por líneas anteriores
+    resultados = []
+    for producto_id, cantidad in lineas:
+        receta = recetas.get(producto_id)
+        if not receta:
+            resultados.append((True, [], []))  # Sin receta, no se valida
+            continue
+
+        faltantes = []
+        warnings = []
+        for ing, por_unidad in receta:
+            requerido = por_unidad * cantidad
+            restante = ing.stock_actual - apartado.get(ing.id, 0)
+            if restante <= 0 or restante < requerido:
+                faltantes.append({
+                    'ingrediente': ing.nombre,
+                    'unidad': ing.unidad,
+                    'stock_actual': float(restante),
+                    'requerido': float(requerido),
+                })
+            elif restante <= ing.stock_minimo:
+                warnings.append({
+                    'ingrediente': ing.nombre,
+                    'unidad': ing.unidad,
+                    'stock_actual': float(restante),
+                    'stock_minimo': float(ing.stock_minimo),
+                })
+
+        if not faltantes:
+            for ing, por_unidad in receta:
+                apartado[ing.id] = apartado.get(ing.id, 0) + por_unidad * cantidad
+        resultados.append((not faltantes, faltantes, warnings))
+    return resultados
 
 
 # =====================================================================
@@ -110,12 +141,13 @@ def actualizar_estado_mesa(mesa_id, nuevo_estado=None):
     mesa.estado = nuevo_estado
     db.session.flush()
 
-    socketio.emit('mesa_estado_actualizado', {
+    emitir('mesa_estado_actualizado', {
         'mesa_id': mesa.id,
         'numero': mesa.numero,
         'estado_anterior': estado_anterior,
         'estado': nuevo_estado,
-    })
+    }, salas_sucursal(mesa.sucursal_id))
+    notificar_dashboard(mesa.sucursal_id)
     logger.info('Mesa %s: %s → %s', mesa.numero, estado_anterior, nuevo_estado)
     return nuevo_estado
 
@@ -131,11 +163,12 @@ def verificar_orden_completa(orden_id):
             if orden.estado not in ['finalizada', 'pagada', 'lista_para_entregar']:
                 orden.estado = 'lista_para_entregar'
                 db.session.commit()
-                socketio.emit('orden_completa_lista', {
+                emitir('orden_completa_lista', {
                     'orden_id': orden.id,
                     'mesa_nombre': orden.mesa.numero if orden.mesa else 'Para Llevar',
                     'mensaje': f'¡Toda la orden {orden.id} está lista para entregar!'
-                })
+                }, salas_orden(orden))
+                notificar_dashboard(orden.sucursal_id)
                 logger.info('Orden %s marcada como lista_para_entregar', orden_id)
             return True
     except AttributeError:
@@ -0,0 +1,139 @@
+"""Prueba de carga del fan-out de Socket.IO entre workers.
+
+Inicia sesión una vez, conecta --clientes clientes Socket.IO repartidos en
+round-robin entre las URLs dadas (una por worker, o el balanceador) y
+publica --eventos mensajes en la cola de Socket.IO igual que lo hace un
+worker al emitir. Cada cliente debe recibir todos los eventos sin importar
+a qué proceso está conectado.
+
+Ejemplo con dos workers locales:
+
+    SOCKETIO_MESSAGE_QUEUE=redis://localhost:6379/4 GUNICORN_BIND=0.0.0.0:5006 gunicorn -c gunicorn.conf.py backend.app:app
+    SOCKETIO_MESSAGE_QUEUE=redis://localhost:6379/4 GUNICORN_BIND=0.0.0.0:5007 gunicorn -c gunicorn.conf.py backend.app:app
+    python carga_socketio.py --url http://localhost:5006 --url http://localhost:5007 \\
+        --cola redis://localhost:6379/4 --email admin@casaleones.mx --password ... --clientes 200
+
+El evento de prueba ('prueba_carga') no lo escucha ninguna pantalla.
+Sale con código 1 si algún cliente no recibió todos los eventos.
+"""
+import re
+import sys
+import time
+import argparse
+import threading
+from collections import Counter
+from itertools import cycle
+
+import requests
+import socketio
+
+
+def iniciar_sesion(url, email, password):
+    """Login por el formulario (con CSRF); regresa el header Cookie."""
+    http = requests.Session()
+    pagina = http.get(f'{url}/login', timeout=10)
+    token = re.search(r'name="csrf_token" value="([^"]+)"', pagina.text)
+    resp = http.post(f'{url}/login', data={
+        'email': email, 'password': password, 'csrf_token': token.group(1) if token else '',
+    }, allow_redirects=False, timeout=10)
+    if resp.status_code != 302 or resp.headers.get('Location', '').endswith('/login'):
+        raise SystemExit(f'Login fallido en {url} (HTTP {resp.status_code})')
+    return '; '.join(f'{k}={v}' for k, v in http.cookies.items())
+
+
+class Cliente:
+    def __init__(self, indice, url, cookie):
+        self.indice = indice
+        self.url = url
+        self.cookie = cookie
+        self.recibidos = set()
+        self.latencias = []
+        self.sio = socketio.Client(reconnection=False)
+        self.sio.on('prueba_carga', self._recibir)
+
+    def _recibir(self, datos):
+        self.latencias.append(time.time() - datos['t'])
+        self.recibidos.add(datos['seq'])
+
+    def conectar(self):
+        self.sio.connect(self.url, headers={'Cookie': self.cookie}, wait_timeout=10)
+
+    def cerrar(self):
+        if self.sio.connected:
+            self.sio.disconnect()
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(round(p / 100 * (len(valores) - 1))))]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', action='append', required=True,
+                        help='URL de un worker o del balanceador (repetible)')
+    parser.add_argument('--cola', required=True, help='SOCKETIO_MESSAGE_QUEUE de los workers')
+    parser.add_argument('--email', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--clientes', type=int, default=50)
+    parser.add_argument('--eventos', type=int, default=20)
+    parser.add_argument('--intervalo', type=float, default=0.05, help='segundos entre eventos')
+    parser.add_argument('--espera', type=float, default=10, help='segundos máximos para recibir')
+    args = parser.parse_args(argv)
+
+    # La sesión vive en Redis: la misma cookie sirve en todos los workers
+    cookie = iniciar_sesion(args.url[0], args.email, args.password)
+
+    urls = cycle(args.url)
+    clientes = [Cliente(i, next(urls), cookie) for i in range(args.clientes)]
+    errores = []
+
+    def conectar(c):
+        try:
+            c.conectar()
+        except Exception as e:
+            errores.append((c.url, e))
+
+    hilos = [threading.Thread(target=conectar, args=(c,)) for c in clientes]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    conectados = [c for c in clientes if c.sio.connected]
+    print(f'Conectados: {len(conectados)}/{len(clientes)}',
+          dict(Counter(c.url for c in conectados)))
+    for url, e in errores[:5]:
+        print(f'  error {url}: {e}')
+
+    # Mismo canal que usa Flask-SocketIO (el default de RedisManager es otro)
+    emisor = socketio.RedisManager(args.cola, channel='flask-socketio', write_only=True)
+    inicio = time.time()
+    for seq in range(args.eventos):
+        emisor.emit('prueba_carga', {'seq': seq, 't': time.time()}, namespace='/')
+        time.sleep(args.intervalo)
+
+    limite = time.time() + args.espera
+    while time.time() < limite and any(len(c.recibidos) < args.eventos for c in conectados):
+        time.sleep(0.1)
+    duracion = time.time() - inicio
+
+    incompletos = [c for c in conectados if len(c.recibidos) < args.eventos]
+    latencias = [lat for c in conectados for lat in c.latencias]
+    esperados = len(conectados) * args.eventos
+    print(f'Entregas: {len(latencias)}/{esperados} en {duracion:.1f}s')
+    print(f'Latencia ms: p50={percentil(latencias, 50) * 1000:.1f} '
+          f'p95={percentil(latencias, 95) * 1000:.1f} max={max(latencias, default=0) * 1000:.1f}')
+    for url in args.url:
+        del_url = [c for c in conectados if c.url == url]
+        ok = sum(1 for c in del_url if len(c.recibidos) == args.eventos)
+        print(f'  {url}: {ok}/{len(del_url)} clientes completos')
+
+    for c in clientes:
+        c.cerrar()
+    return 1 if incompletos or errores else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,6 +2,8 @@
 import os
 import secrets
 
+from backend.extensions import url_redis_db
+
 basedir = os.path.abspath(os.path.dirname(__file__))
 
 
@@ -32,10 +34,16 @@ class Config:
     }
 
     # Bump this whenever any static asset (CSS/JS) changes, to force browser reload
-    VERSION = '5.5.0'
+    VERSION = '5.5.10'
 
     # --- Redis ---
     REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379')
+    # Cola de Socket.IO entre procesos (p.ej. redis://redis:6379/4). Vacía = un solo proceso
+    SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE', '')
+    # Modo async de Socket.IO; vacío = autodetectar. gunicorn.conf.py lo fija según el worker
+    SOCKETIO_ASYNC_MODE = os.getenv('SOCKETIO_ASYNC_MODE', '')
+    # Proxies delante de la app (nginx = 1): X-Forwarded-For/Proto confiables
+    PROXIES_CONFIABLES = int(os.getenv('PROXIES_CONFIABLES', '0'))
 
     # Flask-Session (server-side sessions via Redis)
     SESSION_TYPE = 'redis'
@@ -46,6 +54,56 @@ class Config:
     CACHE_TYPE = 'RedisCache'
     CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/2')
     CACHE_DEFAULT_TIMEOUT = 300
+    # Caché de reportes: TTL para rangos cerrados / rangos que incluyen hoy
+    REPORTES_CACHE_TTL_CERRADO = int(os.getenv('REPORTES_CACHE_TTL_CERRADO', str(7 * 24 * 3600)))
+    REPORTES_CACHE_TTL_ABIERTO = int(os.getenv('REPORTES_CACHE_TTL_ABIERTO', '300'))
+    # Dashboard en tiempo real: ventana de agrupación de eventos, vida del estado publicado
+    # y de una suscripción sin latido del cliente
+    DASHBOARD_DEBOUNCE_SEG = float(os.getenv('DASHBOARD_DEBOUNCE_SEG', '2'))
+    DASHBOARD_ESTADO_TTL = int(os.getenv('DASHBOARD_ESTADO_TTL', '300'))
+    DASHBOARD_REDIS_URL = os.getenv('DASHBOARD_REDIS_URL', os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/2'))
+    DASHBOARD_SUSCRIPCION_TTL = int(os.getenv('DASHBOARD_SUSCRIPCION_TTL', '120'))
+    # Contadores KPI del día en Redis (ventas, propinas, rankings)
+    KPI_REDIS_URL = os.getenv('KPI_REDIS_URL') or url_redis_db(3)
+    KPI_TTL_DIAS = int(os.getenv('KPI_TTL_DIAS', '3'))
+    # Cola de cocina: items pendientes por estación para las pantallas KDS (redis | local | off)
+    COLA_COCINA_MODO = os.getenv('COLA_COCINA_MODO', 'redis')
+    COLA_COCINA_REDIS_URL = os.getenv('COLA_COCINA_REDIS_URL') or url_redis_db(5)
+    COLA_COCINA_VERIFICAR_SEG = int(os.getenv('COLA_COCINA_VERIFICAR_SEG', '60'))
+    # Tiempos de preparación: meta SLA y umbrales p90 que marca el KDS
+    TIEMPOS_COCINA_SLA_SEG = int(os.getenv('TIEMPOS_COCINA_SLA_SEG', '900'))
+    TIEMPOS_COCINA_DIAS_P90 = int(os.getenv('TIEMPOS_COCINA_DIAS_P90', '14'))
+    TIEMPOS_COCINA_MIN_MUESTRAS = int(os.getenv('TIEMPOS_COCINA_MIN_MUESTRAS', '10'))
+    TIEMPOS_COCINA_P90_TTL = int(os.getenv('TIEMPOS_COCINA_P90_TTL', '600'))
+    # KDS "todo el día": piezas mínimas de un producto (en 2+ órdenes) para sugerir lote
+    KDS_LOTE_MINIMO = int(os.getenv('KDS_LOTE_MINIMO', '3'))
+    # ETA de órdenes en cocina (services/eta_cocina)
+    ETA_CACHE_SEG = int(os.getenv('ETA_CACHE_SEG', '120'))
+    ETA_VENTANA_MIN = int(os.getenv('ETA_VENTANA_MIN', '60'))
+    ETA_MIN_PIEZAS = int(os.getenv('ETA_MIN_PIEZAS', '5'))
+    ETA_HUECO_MAX_SEG = float(os.getenv('ETA_HUECO_MAX_SEG', '300'))
+    ETA_SEG_POR_PIEZA = float(os.getenv('ETA_SEG_POR_PIEZA', '45'))
+    ETA_COCCION_DEFAULT_SEG = float(os.getenv('ETA_COCCION_DEFAULT_SEG', '480'))
+    ETA_MINIMO_SEG = float(os.getenv('ETA_MINIMO_SEG', '60'))
+    # Catálogo del menú versionado (services/catalogo_menu)
+    MENU_CACHE_TTL = int(os.getenv('MENU_CACHE_TTL', '86400'))
+    MENU_SIN_REDIS_SEG = int(os.getenv('MENU_SIN_REDIS_SEG', '60'))
+    MENU_MAX_AGE = int(os.getenv('MENU_MAX_AGE', str(365 * 24 * 3600)))
+    # Outbox de efectos posteriores al pago (services/outbox): worker | inline
+    OUTBOX_MODO = os.getenv('OUTBOX_MODO', 'worker')
+    OUTBOX_INTERVALO_SEG = float(os.getenv('OUTBOX_INTERVALO_SEG', '1'))
+    OUTBOX_LOTE = int(os.getenv('OUTBOX_LOTE', '50'))
+    OUTBOX_MAX_INTENTOS = int(os.getenv('OUTBOX_MAX_INTENTOS', '8'))
+    OUTBOX_REINTENTO_SEG = float(os.getenv('OUTBOX_REINTENTO_SEG', '5'))
+    # Unidades producibles por producto (services/disponibilidad): las tabletas muestran "Quedan N"
+    DISPONIBILIDAD_POCAS = int(os.getenv('DISPONIBILIDAD_POCAS', '5'))
+    # Saldos de inventario por día (services/saldos_inventario): días que se guardan los cierres diarios
+    SALDOS_DIAS_RETENCION = int(os.getenv('SALDOS_DIAS_RETENCION', '90'))
+    # Pronóstico de consumo y compras sugeridas (services/pronostico_inventario), refrescado de noche
+    PRONOSTICO_DIAS = int(os.getenv('PRONOSTICO_DIAS', '28'))
+    PRONOSTICO_HORIZONTE_DIAS = int(os.getenv('PRONOSTICO_HORIZONTE_DIAS', '14'))
+    PRONOSTICO_COBERTURA_DIAS = int(os.getenv('PRONOSTICO_COBERTURA_DIAS', '7'))
+    PRONOSTICO_CACHE_TTL = int(os.getenv('PRONOSTICO_CACHE_TTL', '93600'))
 
     # CORS — dominios permitidos (separados por coma en producción)
     CORS_ORIGINS = os.getenv('CORS_ORIGINS', 'http://localhost:5005').split(',')
@@ -58,12 +116,26 @@ class Config:
     # Validación de stock al agregar productos
     INVENTARIO_VALIDAR_STOCK = os.getenv('INVENTARIO_VALIDAR_STOCK', 'false').lower() == 'true'
 
+    # Día de negocio: zona horaria local, hora de corte por defecto y cada cuánto
+    # revisa un worker si otro editó la hora de corte de una sucursal
+    ZONA_HORARIA = os.getenv('ZONA_HORARIA', 'America/Mexico_City')
+    HORA_CORTE_DIA = int(os.getenv('HORA_CORTE_DIA', '4'))
+    HORA_CORTE_CACHE_SEG = int(os.getenv('HORA_CORTE_CACHE_SEG', '30'))
+
+    # Exportación CSV en streaming: filas por lote de cursor
+    CSV_LOTE_FILAS = int(os.getenv('CSV_LOTE_FILAS', '1000'))
+
     # Sprint 3 — Impresión ESC/POS
     PRINTER_TYPE = os.getenv('PRINTER_TYPE', 'none')  # none, usb, network
     PRINTER_HOST = os.getenv('PRINTER_HOST', '192.168.1.100')
     PRINTER_PORT = int(os.getenv('PRINTER_PORT', '9100'))
     AUTO_PRINT_COMANDA = os.getenv('AUTO_PRINT_COMANDA', 'false').lower() == 'true'
 
+    # PDF de reportes: pool de procesos y caché por contenido
+    PDF_CACHE_DIR = os.getenv('PDF_CACHE_DIR', '/tmp/casaleones_pdf')
+    PDF_WORKERS = int(os.getenv('PDF_WORKERS', '2'))
+    PDF_CACHE_DIAS = int(os.getenv('PDF_CACHE_DIAS', '30'))
+
     # Sprint 3 — Facturapi CFDI
     FACTURAPI_KEY = os.getenv('FACTURAPI_KEY', '')
     FACTURAPI_URL = os.getenv('FACTURAPI_URL', 'https://www.facturapi.io/v2')
@@ -0,0 +1,60 @@
+"""Configuración de gunicorn (gunicorn -c gunicorn.conf.py backend.app:app).
+
+Socket.IO necesita un worker cooperativo y afinidad de sesión: con
+long-polling todas las peticiones de un cliente deben llegar al mismo
+proceso, y gunicorn no reparte conexiones con afinidad. Por eso cada
+contenedor corre UN worker gevent (miles de conexiones concurrentes) y se
+escala con réplicas detrás de nginx (deploy/nginx.conf, hash por cookie de
+sesión). Los emits cruzan procesos por SOCKETIO_MESSAGE_QUEUE (Redis).
+
+Configurable via env vars:
+  GUNICORN_BIND=0.0.0.0:5005
+  GUNICORN_WORKER_CLASS=gevent        (gevent | gthread | sync)
+  GUNICORN_WORKERS=1                  (>1 solo con gthread/sync sin Socket.IO)
+  GUNICORN_THREADS=4                  (solo gthread)
+  GUNICORN_WORKER_CONNECTIONS=1000    (solo gevent)
+  GUNICORN_TIMEOUT=120
+"""
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5005')
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gevent')
+workers = int(os.getenv('GUNICORN_WORKERS', '1'))
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '1000'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+accesslog = '-'
+errorlog = '-'
+
+# Socket.IO debe usar el mismo modelo de concurrencia que el worker
+# (eventlet también está instalado para el servidor de desarrollo)
+os.environ.setdefault('SOCKETIO_ASYNC_MODE', 'gevent' if worker_class == 'gevent' else 'threading')
+
+
+def when_ready(server):
+    if worker_class == 'gevent' and workers > 1:
+        server.log.warning(
+            'GUNICORN_WORKERS=%s con gevent: gunicorn no da afinidad de sesión y el '
+            'long-polling de Socket.IO fallará. Usa 1 worker por réplica.', workers)
+    if not os.getenv('SOCKETIO_MESSAGE_QUEUE'):
+        server.log.info('SOCKETIO_MESSAGE_QUEUE vacío: los emits solo llegan a este proceso.')
+
+
+def _parchar_psycopg(worker):
+    """psycopg2 cede el control al hub de gevent mientras espera a Postgres."""
+    try:
+        from psycogreen.gevent import patch_psycopg
+    except ImportError:
+        worker.log.warning('psycogreen no instalado: las consultas bloquearán el worker gevent')
+        return
+    patch_psycopg()
+
+
+def post_worker_init(worker):
+    if worker_class == 'gevent':
+        _parchar_psycopg(worker)
+    # El outbox arranca con el worker: los eventos pendientes o pospuestos de
+    # antes de un deploy o caída no esperan al siguiente pago en esta réplica
+    from backend.app import app
+    from backend.services.outbox import programar_procesador
+    programar_procesador(app)
@@ -0,0 +1,37 @@
+"""Reportes: tabla resumen_ventas_diarias (rollup sucursal × día × dimensión).
+
+Revision ID: c007
+Revises: c006
+Create Date: 2026-10-17
+
+Después de aplicar, poblar con: flask reconstruir-resumen-ventas
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = 'c007'
+down_revision = 'c006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'resumen_ventas_diarias',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('fecha', sa.Date, nullable=False),
+        sa.Column('sucursal_id', sa.Integer, sa.ForeignKey('sucursales.id'), nullable=True),
+        sa.Column('dimension', sa.String(20), nullable=False),
+        sa.Column('clave', sa.String(50), nullable=False, server_default=''),
+        sa.Column('num_ventas', sa.Integer, nullable=False, server_default='0'),
+        sa.Column('cantidad', sa.Integer, nullable=False, server_default='0'),
+        sa.Column('total', sa.Numeric(12, 2), nullable=False, server_default='0'),
+    )
+    op.create_index('ix_resumen_dim_fecha_suc', 'resumen_ventas_diarias',
+                    ['dimension', 'fecha', 'sucursal_id'])
+
+
+def downgrade():
+    op.drop_index('ix_resumen_dim_fecha_suc', table_name='resumen_ventas_diarias')
+    op.drop_table('resumen_ventas_diarias')
@@ -0,0 +1,95 @@
+"""Día de negocio: columna fecha_negocio indexada y hora_corte por sucursal.
+
+Revision ID: c008
+Revises: c007
+Create Date: 2026-10-17
+
+fecha_negocio = día local (ZONA_HORARIA) del timestamp UTC, corrido por la
+hora de corte de la sucursal (HORA_CORTE_DIA si no la define).
+
+Después de aplicar, recalcular el rollup con: flask reconstruir-resumen-ventas
+"""
+import os
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = 'c008'
+down_revision = 'c007'
+branch_labels = None
+depends_on = None
+
+ZONA_HORARIA = os.getenv('ZONA_HORARIA', 'America/Mexico_City')
+HORA_CORTE_DIA = int(os.getenv('HORA_CORTE_DIA', '4'))
+
+# tabla -> (columna timestamp, SQL que resuelve sucursal_id desde la fila `t`)
+TABLAS = {
+    'orden': ('tiempo_registro', 't.sucursal_id'),
+    'sales': ('fecha_hora', 't.sucursal_id'),
+    'pagos': ('fecha', '(SELECT o.sucursal_id FROM orden o WHERE o.id = t.orden_id)'),
+    'movimientos_inventario': ('fecha', '(SELECT i.sucursal_id FROM ingredientes i WHERE i.id = t.ingrediente_id)'),
+    'audit_log': ('fecha', 'NULL'),
+}
+
+
+def _hora_corte_sql(sucursal_sql):
+    return (f'COALESCE((SELECT s.hora_corte FROM sucursales s WHERE s.id = {sucursal_sql}), '
+            f'{HORA_CORTE_DIA})')
+
+
+def _backfill_postgresql(bind, tabla, columna, sucursal_sql):
+    bind.execute(sa.text(
+        f"UPDATE {tabla} t SET fecha_negocio = "
+        f"(({columna} AT TIME ZONE 'UTC') AT TIME ZONE :tz "
+        f" - make_interval(hours => {_hora_corte_sql(sucursal_sql)}))::date "
+        f"WHERE fecha_negocio IS NULL AND {columna} IS NOT NULL"
+    ), {'tz': ZONA_HORARIA})
+
+
+def _backfill_generico(bind, tabla, columna, sucursal_sql, lote=5000):
+    zona = ZoneInfo(ZONA_HORARIA)
+    cortes = {r[0]: r[1] for r in bind.execute(sa.text('SELECT id, hora_corte FROM sucursales'))}
+    while True:
+        filas = bind.execute(sa.text(
+            f'SELECT t.id, t.{columna}, {sucursal_sql} FROM {tabla} t '
+            f'WHERE t.fecha_negocio IS NULL AND t.{columna} IS NOT NULL LIMIT {lote}'
+        )).fetchall()
+        if not filas:
+            break
+        for id_, momento, suc in filas:
+            if isinstance(momento, str):  # SQLite regresa texto
+                momento = datetime.fromisoformat(momento)
+            corte = cortes.get(suc)
+            corte = HORA_CORTE_DIA if corte is None else corte
+            local = momento.replace(tzinfo=timezone.utc).astimezone(zona)
+            bind.execute(sa.text(f'UPDATE {tabla} SET fecha_negocio = :f WHERE id = :id'),
+                         {'f': (local - timedelta(hours=corte)).date(), 'id': id_})
+
+
+def upgrade():
+    op.add_column('sucursales', sa.Column('hora_corte', sa.Integer, nullable=True))
+
+    for tabla in TABLAS:
+        op.add_column(tabla, sa.Column('fecha_negocio', sa.Date, nullable=True))
+
+    bind = op.get_bind()
+    for tabla, (columna, sucursal_sql) in TABLAS.items():
+        if bind.dialect.name == 'postgresql':
+            _backfill_postgresql(bind, tabla, columna, sucursal_sql)
+        else:
+            _backfill_generico(bind, tabla, columna, sucursal_sql)
+
+    for tabla in TABLAS:
+        op.create_index(f'ix_{tabla}_fecha_negocio', tabla, ['fecha_negocio'])
+    op.create_index('ix_sales_sucursal_fecha_negocio', 'sales', ['sucursal_id', 'fecha_negocio'])
+
+
+def downgrade():
+    op.drop_index('ix_sales_sucursal_fecha_negocio', table_name='sales')
+    for tabla in TABLAS:
+        op.drop_index(f'ix_{tabla}_fecha_negocio', table_name=tabla)
+        op.drop_column(tabla, 'fecha_negocio')
+    op.drop_column('sucursales', 'hora_corte')
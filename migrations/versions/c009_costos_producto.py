@@ -0,0 +1,37 @@
+"""Rentabilidad: tabla costos_producto (costo de receta materializado).
+
+Revision ID: c009
+Revises: c008
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = 'c009'
+down_revision = 'c008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'costos_producto',
+        sa.Column('producto_id', sa.Integer, sa.ForeignKey('producto.id'), primary_key=True),
+        sa.Column('costo', sa.Numeric(12, 4), nullable=False, server_default='0'),
+        sa.Column('num_ingredientes', sa.Integer, nullable=False, server_default='0'),
+        sa.Column('actualizado', sa.DateTime, server_default=sa.func.now()),
+    )
+
+    # Poblar con los costos actuales
+    op.execute(
+        'INSERT INTO costos_producto (producto_id, costo, num_ingredientes, actualizado) '
+        'SELECT r.producto_id, SUM(r.cantidad_por_unidad * COALESCE(i.costo_unitario, 0)), '
+        '       COUNT(r.id), CURRENT_TIMESTAMP '
+        'FROM receta_detalle r JOIN ingredientes i ON i.id = r.ingrediente_id '
+        'GROUP BY r.producto_id'
+    )
+
+
+def downgrade():
+    op.drop_table('costos_producto')
@@ -0,0 +1,34 @@
+"""Tiempos de cocina: transiciones por detalle (enviado, listo, entregado).
+
+Revision ID: c010
+Revises: c009
+Create Date: 2026-10-17
+
+Los detalles anteriores quedan sin tiempos: no hay historial del que
+derivarlos y las estadísticas (services/tiempos_cocina) solo cuentan
+detalles con tiempo_enviado y tiempo_listo.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = 'c010'
+down_revision = 'c009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('orden_detalle', sa.Column('tiempo_enviado', sa.DateTime, nullable=True))
+    op.add_column('orden_detalle', sa.Column('tiempo_listo', sa.DateTime, nullable=True))
+    op.add_column('orden_detalle', sa.Column('tiempo_entregado', sa.DateTime, nullable=True))
+    op.create_index('ix_orden_detalle_listo_producto', 'orden_detalle', ['tiempo_listo', 'producto_id'])
+    op.create_index('ix_orden_detalle_orden_id', 'orden_detalle', ['orden_id'])
+
+
+def downgrade():
+    op.drop_index('ix_orden_detalle_orden_id', table_name='orden_detalle')
+    op.drop_index('ix_orden_detalle_listo_producto', table_name='orden_detalle')
+    op.drop_column('orden_detalle', 'tiempo_entregado')
+    op.drop_column('orden_detalle', 'tiempo_listo')
+    op.drop_column('orden_detalle', 'tiempo_enviado')
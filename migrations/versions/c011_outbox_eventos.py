@@ -0,0 +1,35 @@
+"""Outbox: tabla outbox_eventos (efectos del pago fuera del request).
+
+Revision ID: c011
+Revises: c010
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = 'c011'
+down_revision = 'c010'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'outbox_eventos',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('tipo', sa.String(50), nullable=False),
+        sa.Column('datos', sa.Text, nullable=False),
+        sa.Column('estado', sa.String(20), nullable=False, server_default='pendiente'),
+        sa.Column('intentos', sa.Integer, nullable=False, server_default='0'),
+        sa.Column('ultimo_error', sa.Text, nullable=True),
+        sa.Column('creado', sa.DateTime, nullable=False, server_default=sa.func.now()),
+        sa.Column('disponible', sa.DateTime, nullable=False, server_default=sa.func.now()),
+        sa.Column('procesado', sa.DateTime, nullable=True),
+    )
+    op.create_index('ix_outbox_estado_disponible', 'outbox_eventos', ['estado', 'disponible'])
+
+
+def downgrade():
+    op.drop_index('ix_outbox_estado_disponible', table_name='outbox_eventos')
+    op.drop_table('outbox_eventos')
@@ -0,0 +1,56 @@
+"""Disponibilidad: tabla disponibilidad_productos e índice inverso de recetas.
+
+Revision ID: c012
+Revises: c011
+Create Date: 2026-10-17
+
+Se puebla con el stock actual. El piso de stock / cantidad se calcula en
+Python para no depender de floor() en SQLite.
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = 'c012'
+down_revision = 'c011'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_receta_ingrediente_producto', 'receta_detalle', ['ingrediente_id', 'producto_id'])
+    tabla = op.create_table(
+        'disponibilidad_productos',
+        sa.Column('producto_id', sa.Integer, sa.ForeignKey('producto.id'), primary_key=True),
+        sa.Column('unidades', sa.Integer, nullable=False, server_default='0'),
+        sa.Column('stock_bajo', sa.Boolean, nullable=False, server_default=sa.false()),
+        sa.Column('actualizado', sa.DateTime, server_default=sa.func.now()),
+    )
+
+    # Poblar con el stock actual
+    calculo = {}
+    for producto_id, por_unidad, stock, minimo in op.get_bind().execute(sa.text(
+        'SELECT r.producto_id, r.cantidad_por_unidad, i.stock_actual, i.stock_minimo '
+        'FROM receta_detalle r JOIN ingredientes i ON i.id = r.ingrediente_id'
+    )):
+        if not por_unidad or por_unidad <= 0:
+            continue
+        stock = stock or 0
+        posibles = int(stock // por_unidad) if stock > 0 else 0
+        bajo = stock <= (minimo or 0)
+        actual = calculo.get(producto_id)
+        calculo[producto_id] = (posibles, bajo) if actual is None else \
+            (min(actual[0], posibles), actual[1] or bajo)
+    if calculo:
+        ahora = datetime.utcnow()
+        op.bulk_insert(tabla, [
+            {'producto_id': p, 'unidades': u, 'stock_bajo': b, 'actualizado': ahora}
+            for p, (u, b) in calculo.items()
+        ])
+
+
+def downgrade():
+    op.drop_table('disponibilidad_productos')
+    op.drop_index('ix_receta_ingrediente_producto', table_name='receta_detalle')
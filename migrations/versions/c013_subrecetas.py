@@ -0,0 +1,45 @@
+"""Subrecetas: tablas subreceta_detalle y explosion_preparados.
+
+Revision ID: c013
+Revises: c012
+Create Date: 2026-10-17
+
+Ambas empiezan vacías: sin preparados, la receta explotada de cada
+producto es su receta_detalle y los costos y la disponibilidad ya
+materializados siguen vigentes.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = 'c013'
+down_revision = 'c012'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'subreceta_detalle',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('preparado_id', sa.Integer, sa.ForeignKey('ingredientes.id'), nullable=False),
+        sa.Column('componente_id', sa.Integer, sa.ForeignKey('ingredientes.id'), nullable=False),
+        sa.Column('cantidad_por_unidad', sa.Numeric(12, 4), nullable=False),
+        sa.UniqueConstraint('preparado_id', 'componente_id', name='uq_subreceta_prep_comp'),
+    )
+    op.create_index('ix_subreceta_componente_preparado', 'subreceta_detalle',
+                    ['componente_id', 'preparado_id'])
+    op.create_table(
+        'explosion_preparados',
+        sa.Column('preparado_id', sa.Integer, sa.ForeignKey('ingredientes.id'), primary_key=True),
+        sa.Column('ingrediente_id', sa.Integer, sa.ForeignKey('ingredientes.id'), primary_key=True),
+        sa.Column('cantidad_por_unidad', sa.Numeric(14, 6), nullable=False),
+    )
+    op.create_index('ix_explosion_ingrediente', 'explosion_preparados', ['ingrediente_id'])
+
+
+def downgrade():
+    op.drop_index('ix_explosion_ingrediente', table_name='explosion_preparados')
+    op.drop_table('explosion_preparados')
+    op.drop_index('ix_subreceta_componente_preparado', table_name='subreceta_detalle')
+    op.drop_table('subreceta_detalle')
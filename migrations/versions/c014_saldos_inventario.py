@@ -0,0 +1,39 @@
+"""Saldos de inventario: tabla saldos_inventario e índice por fecha de movimientos.
+
+Revision ID: c014
+Revises: c013
+Create Date: 2026-10-17
+
+La tabla empieza vacía; el primer cierre se genera con
+flask cerrar-inventario (--desde para reconstruir días anteriores).
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = 'c014'
+down_revision = 'c013'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_movimientos_fecha', 'movimientos_inventario', ['fecha'])
+    op.create_table(
+        'saldos_inventario',
+        sa.Column('ingrediente_id', sa.Integer, sa.ForeignKey('ingredientes.id'), primary_key=True),
+        sa.Column('fecha', sa.Date, primary_key=True),
+        sa.Column('sucursal_id', sa.Integer, sa.ForeignKey('sucursales.id'), nullable=True),
+        sa.Column('cantidad', sa.Numeric(14, 4), nullable=False, server_default='0'),
+        sa.Column('costo_unitario', sa.Numeric(10, 2), nullable=False, server_default='0'),
+        sa.Column('valor', sa.Numeric(14, 2), nullable=False, server_default='0'),
+        sa.Column('cierre_mes', sa.Boolean, nullable=False, server_default=sa.false()),
+        sa.Column('creado', sa.DateTime, server_default=sa.func.now()),
+    )
+    op.create_index('ix_saldos_fecha', 'saldos_inventario', ['fecha', 'sucursal_id'])
+
+
+def downgrade():
+    op.drop_index('ix_saldos_fecha', table_name='saldos_inventario')
+    op.drop_table('saldos_inventario')
+    op.drop_index('ix_movimientos_fecha', table_name='movimientos_inventario')
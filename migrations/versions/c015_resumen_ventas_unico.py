@@ -0,0 +1,44 @@
+"""Rollup de ventas: llave única (fecha, sucursal, dimensión, clave).
+
+Revision ID: c015
+Revises: c014
+Create Date: 2026-10-17
+
+Los pagos concurrentes podían insertar dos filas para la misma clave del
+día. Antes de crear el índice se funden los duplicados en la fila de id
+más bajo (sumando num_ventas, cantidad y total). sucursal_id NULL se indexa
+como 0 para que también sea única; _incrementar() hace upsert sobre esta
+llave.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = 'c015'
+down_revision = 'c014'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    duplicados = bind.execute(sa.text(
+        'SELECT MIN(id), SUM(num_ventas), SUM(cantidad), SUM(total), '
+        'fecha, COALESCE(sucursal_id, 0), dimension, clave '
+        'FROM resumen_ventas_diarias '
+        'GROUP BY fecha, COALESCE(sucursal_id, 0), dimension, clave HAVING COUNT(*) > 1'
+    )).fetchall()
+    for id_, num, cantidad, total, fecha, suc, dimension, clave in duplicados:
+        bind.execute(sa.text(
+            'UPDATE resumen_ventas_diarias SET num_ventas = :num, cantidad = :cantidad, total = :total '
+            'WHERE id = :id'), {'num': num, 'cantidad': cantidad, 'total': total, 'id': id_})
+        bind.execute(sa.text(
+            'DELETE FROM resumen_ventas_diarias WHERE id <> :id AND fecha = :fecha '
+            'AND COALESCE(sucursal_id, 0) = :suc AND dimension = :dimension AND clave = :clave'),
+            {'id': id_, 'fecha': fecha, 'suc': suc, 'dimension': dimension, 'clave': clave})
+    op.create_index('uq_resumen_dia_clave', 'resumen_ventas_diarias',
+                    ['fecha', sa.text('COALESCE(sucursal_id, 0)'), 'dimension', 'clave'], unique=True)
+
+
+def downgrade():
+    op.drop_index('uq_resumen_dia_clave', table_name='resumen_ventas_diarias')
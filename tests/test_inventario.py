@@ -92,3 +92,334 @@ class TestStockAlerts:
         ).all()
         assert len(low_stock) >= 1
         assert ing in low_stock
+
+
+class TestCostosProducto:
+    def _receta(self, db):
+        from backend.models.models import Categoria, Producto, Ingrediente, RecetaDetalle
+
+        cat = Categoria(nombre='Tacos')
+        db.session.add(cat)
+        db.session.flush()
+        prod = Producto(nombre='Taco de pastor', precio=Decimal('25.00'), categoria_id=cat.id)
+        carne = Ingrediente(nombre='Pastor', unidad='kg', costo_unitario=Decimal('100.00'))
+        tortilla = Ingrediente(nombre='Tortilla', unidad='pieza', costo_unitario=Decimal('1.50'))
+        db.session.add_all([prod, carne, tortilla])
+        db.session.flush()
+        db.session.add_all([
+            RecetaDetalle(producto_id=prod.id, ingrediente_id=carne.id, cantidad_por_unidad=Decimal('0.08')),
+            RecetaDetalle(producto_id=prod.id, ingrediente_id=tortilla.id, cantidad_por_unidad=Decimal('2')),
+        ])
+        db.session.flush()
+        return prod, carne
+
+    def test_recalculo_incremental(self, db):
+        """El costo materializado sigue a la receta y al costo de los ingredientes."""
+        from backend.models.models import CostoProducto
+        from backend.services.costos import recalcular_costos, recalcular_por_ingrediente, costos_productos
+
+        prod, carne = self._receta(db)
+        recalcular_costos([prod.id])
+        db.session.commit()
+        assert float(db.session.get(CostoProducto, prod.id).costo) == 11.0
+
+        carne.costo_unitario = Decimal('150.00')
+        recalcular_por_ingrediente(carne.id)
+        db.session.commit()
+
+        fila = costos_productos().first()
+        assert fila.id == prod.id
+        assert float(fila.costo) == 15.0
+
+
+class TestDescuentoInventario:
+    def test_lote_de_ordenes(self, db):
+        """Un descuento en bloque suma por ingrediente y deja un movimiento por orden."""
+        from backend.models.models import (
+            Usuario, Categoria, Producto, Ingrediente, RecetaDetalle, Orden, OrdenDetalle,
+            MovimientoInventario, descontar_inventario_por_ordenes,
+        )
+
+        cajero = Usuario(nombre='Cajero', email='cajero.inv@test.mx', rol='admin')
+        cajero.set_password('Test1234!')
+        cat = Categoria(nombre='Tacos')
+        carne = Ingrediente(nombre='Pastor', unidad='kg', stock_actual=Decimal('10'))
+        tortilla = Ingrediente(nombre='Tortilla', unidad='pieza', stock_actual=Decimal('100'))
+        db.session.add_all([cajero, cat, carne, tortilla])
+        db.session.flush()
+        taco = Producto(nombre='Taco', precio=Decimal('25'), categoria_id=cat.id)
+        gringa = Producto(nombre='Gringa', precio=Decimal('60'), categoria_id=cat.id)
+        db.session.add_all([taco, gringa])
+        db.session.flush()
+        db.session.add_all([
+            RecetaDetalle(producto_id=taco.id, ingrediente_id=carne.id, cantidad_por_unidad=Decimal('0.1')),
+            RecetaDetalle(producto_id=taco.id, ingrediente_id=tortilla.id, cantidad_por_unidad=Decimal('1')),
+            RecetaDetalle(producto_id=gringa.id, ingrediente_id=carne.id, cantidad_por_unidad=Decimal('0.2')),
+        ])
+        ordenes = [Orden(estado='pagada', es_para_llevar=True) for _ in range(2)]
+        db.session.add_all(ordenes)
+        db.session.flush()
+        db.session.add_all([
+            OrdenDetalle(orden_id=ordenes[0].id, producto_id=taco.id, cantidad=3, precio_unitario=Decimal('25')),
+            OrdenDetalle(orden_id=ordenes[0].id, producto_id=taco.id, cantidad=2, precio_unitario=Decimal('25')),
+            OrdenDetalle(orden_id=ordenes[1].id, producto_id=gringa.id, cantidad=4, precio_unitario=Decimal('60')),
+        ])
+        db.session.commit()
+
+        assert descontar_inventario_por_ordenes([o.id for o in ordenes], cajero.id) == 3
+        db.session.commit()
+
+        assert carne.stock_actual == Decimal('8.7')  # 10 - 5×0.1 - 4×0.2
+        assert tortilla.stock_actual == Decimal('95')
+        movs = {(m.orden_id, m.ingrediente_id): m for m in MovimientoInventario.query.all()}
+        assert float(movs[(ordenes[0].id, carne.id)].cantidad) == 0.5
+        assert float(movs[(ordenes[1].id, carne.id)].cantidad) == 0.8
+        assert all(m.fecha_negocio is not None for m in movs.values())
+
+
+class TestDisponibilidad:
+    def test_recalculo_por_ingrediente_y_agotado(self, app, db, monkeypatch):
+        """Mover un ingrediente recalcula los productos que lo usan; 0 unidades = 409."""
+        from backend.models.models import (
+            Usuario, Categoria, Producto, Ingrediente, RecetaDetalle, Orden,
+        )
+        from backend.services.disponibilidad import (
+            recalcular_disponibilidad, recalcular_por_ingredientes, unidades_disponibles,
+        )
+
+        mesero = Usuario(nombre='Mesero', email='mesero.disp@test.mx', rol='mesero')
+        mesero.set_password('Test1234!')
+        cat = Categoria(nombre='Tacos')
+        carne = Ingrediente(nombre='Pastor', unidad='kg', stock_actual=Decimal('1'), stock_minimo=Decimal('0.5'))
+        tortilla = Ingrediente(nombre='Tortilla', unidad='pieza', stock_actual=Decimal('30'))
+        db.session.add_all([mesero, cat, carne, tortilla])
+        db.session.flush()
+        taco = Producto(nombre='Taco', precio=Decimal('25'), categoria_id=cat.id)
+        gringa = Producto(nombre='Gringa', precio=Decimal('60'), categoria_id=cat.id)
+        agua = Producto(nombre='Agua', precio=Decimal('20'), categoria_id=cat.id)
+        db.session.add_all([taco, gringa, agua])
+        db.session.flush()
+        db.session.add_all([
+            RecetaDetalle(producto_id=taco.id, ingrediente_id=carne.id, cantidad_por_unidad=Decimal('0.1')),
+            RecetaDetalle(producto_id=taco.id, ingrediente_id=tortilla.id, cantidad_por_unidad=Decimal('1')),
+            RecetaDetalle(producto_id=gringa.id, ingrediente_id=carne.id, cantidad_por_unidad=Decimal('0.3')),
+        ])
+        orden = Orden(estado='pendiente', es_para_llevar=True, mesero_id=mesero.id)
+        db.session.add(orden)
+        db.session.flush()
+        recalcular_disponibilidad()
+        db.session.commit()
+        assert unidades_disponibles(taco.id) == (10, False)
+        assert unidades_disponibles(gringa.id) == (3, False)
+        assert unidades_disponibles(agua.id) == (None, False)
+
+        carne.stock_actual = Decimal('0.25')
+        cambios = recalcular_por_ingredientes([carne.id])
+        db.session.commit()
+        assert set(cambios) == {taco.id, gringa.id}
+        assert unidades_disponibles(taco.id) == (2, True)
+        assert unidades_disponibles(gringa.id) == (0, True)
+
+        app.config['INVENTARIO_VALIDAR_STOCK'] = True
+        try:
+            with app.test_client() as client:
+                with client.session_transaction() as sess:
+                    sess['user_id'], sess['rol'] = mesero.id, 'mesero'
+                agotado = client.post(f'/api/ordenes/{orden.id}/detalle', json={'producto_id': gringa.id})
+                disponible = client.post(f'/api/ordenes/{orden.id}/detalle', json={'producto_id': taco.id})
+        finally:
+            app.config['INVENTARIO_VALIDAR_STOCK'] = False
+        assert agotado.status_code == 409
+        assert agotado.get_json()['disponibles'] == 0
+        assert disponible.status_code == 201
+
+
+class TestSubrecetas:
+    def test_costo_y_descuento_por_ingredientes_base(self, db):
+        """Un preparado anidado se aplana a ingredientes base para costo y descuento."""
+        from backend.models.models import (
+            Usuario, Categoria, Producto, Ingrediente, RecetaDetalle, Orden, OrdenDetalle,
+            CostoProducto, descontar_inventario_por_ordenes,
+        )
+        from backend.services.costos import recalcular_costos, recalcular_por_ingrediente
+        from backend.services.subrecetas import guardar_subreceta, CicloSubreceta
+
+        cajero = Usuario(nombre='Cajero', email='cajero.sub@test.mx', rol='admin')
+        cajero.set_password('Test1234!')
+        cat = Categoria(nombre='Tacos')
+        chile = Ingrediente(nombre='Chile', unidad='kg', stock_actual=Decimal('2'), costo_unitario=Decimal('40'))
+        tomate = Ingrediente(nombre='Tomate', unidad='kg', stock_actual=Decimal('5'), costo_unitario=Decimal('20'))
+        tortilla = Ingrediente(nombre='Tortilla', unidad='pieza', stock_actual=Decimal('100'),
+                               costo_unitario=Decimal('1'))
+        base = Ingrediente(nombre='Base de chiles', unidad='kg')
+        salsa = Ingrediente(nombre='Salsa roja', unidad='kg')
+        db.session.add_all([cajero, cat, chile, tomate, tortilla, base, salsa])
+        db.session.flush()
+        taco = Producto(nombre='Taco', precio=Decimal('25'), categoria_id=cat.id)
+        db.session.add(taco)
+        db.session.flush()
+        db.session.add_all([
+            RecetaDetalle(producto_id=taco.id, ingrediente_id=salsa.id, cantidad_por_unidad=Decimal('0.05')),
+            RecetaDetalle(producto_id=taco.id, ingrediente_id=tortilla.id, cantidad_por_unidad=Decimal('1')),
+        ])
+        db.session.flush()
+        recalcular_costos([taco.id])
+
+        # salsa = 0.8 base + 0.2 tomate; base = 0.5 chile + 0.5 tomate
+        guardar_subreceta(salsa.id, [(base.id, Decimal('0.8')), (tomate.id, Decimal('0.2'))])
+        guardar_subreceta(base.id, [(chile.id, Decimal('0.5')), (tomate.id, Decimal('0.5'))])
+        db.session.commit()
+        assert float(base.costo_unitario) == 30.0
+        assert float(salsa.costo_unitario) == 28.0          # 0.4×40 + 0.6×20
+        assert float(db.session.get(CostoProducto, taco.id).costo) == pytest.approx(2.4)
+
+        chile.costo_unitario = Decimal('50')
+        recalcular_por_ingrediente(chile.id)
+        db.session.commit()
+        assert float(salsa.costo_unitario) == 32.0
+        assert float(db.session.get(CostoProducto, taco.id).costo) == pytest.approx(2.6)
+
+        with pytest.raises(CicloSubreceta):
+            guardar_subreceta(base.id, [(salsa.id, Decimal('1'))])
+        db.session.rollback()
+
+        orden = Orden(estado='pagada', es_para_llevar=True)
+        db.session.add(orden)
+        db.session.flush()
+        db.session.add(OrdenDetalle(orden_id=orden.id, producto_id=taco.id, cantidad=10,
+                                    precio_unitario=Decimal('25')))
+        db.session.commit()
+        assert descontar_inventario_por_ordenes([orden.id], cajero.id) == 3
+        db.session.commit()
+        assert float(chile.stock_actual) == pytest.approx(1.8)    # 10 × 0.05 × 0.4
+        assert float(tomate.stock_actual) == pytest.approx(4.7)   # 10 × 0.05 × 0.6
+        assert float(tortilla.stock_actual) == pytest.approx(90)
+        assert float(salsa.stock_actual or 0) == 0
+
+
+class TestSaldosInventario:
+    def test_cierres_stock_al_y_valuacion(self, db):
+        """Los cierres salen hacia atrás desde el stock actual y anclan stock_al."""
+        from datetime import datetime, timedelta
+        from backend.models.models import Usuario, Ingrediente, MovimientoInventario, SaldoInventario
+        from backend.services.dia_negocio import hoy_negocio
+        from backend.services.saldos_inventario import (
+            cerrar_dias, stock_al, valuacion_inventario, ajustar_saldos,
+        )
+
+        admin = Usuario(nombre='Admin', email='admin.saldos@test.mx', rol='admin')
+        admin.set_password('Test1234!')
+        carne = Ingrediente(nombre='Barbacoa', unidad='kg', stock_actual=Decimal('12'),
+                            costo_unitario=Decimal('200'))
+        db.session.add_all([admin, carne])
+        db.session.flush()
+        hoy = hoy_negocio()
+        ahora = datetime.utcnow()
+        # hace 3 días entraron 10 kg, hace 2 días se vendieron 4, hoy entraron 6 → 12
+        for dias, tipo, cantidad in ((3, 'entrada', '10'), (2, 'salida_venta', '4'), (0, 'entrada', '6')):
+            db.session.add(MovimientoInventario(
+                ingrediente_id=carne.id, tipo=tipo, cantidad=Decimal(cantidad), usuario_id=admin.id,
+                fecha=ahora - timedelta(days=dias), fecha_negocio=hoy - timedelta(days=dias)))
+        db.session.commit()
+
+        assert cerrar_dias(desde=hoy - timedelta(days=3)) == 3
+        saldos = {s.fecha: float(s.cantidad) for s in SaldoInventario.query.all()}
+        assert saldos == {hoy - timedelta(days=3): 10.0, hoy - timedelta(days=2): 6.0,
+                          hoy - timedelta(days=1): 6.0}
+        with pytest.raises(ValueError):
+            cerrar_dias(hasta=hoy)
+
+        assert float(stock_al(ahora - timedelta(days=1))[carne.id]) == 6.0
+        assert float(stock_al(ahora)[carne.id]) == 12.0
+        assert float(stock_al(ahora - timedelta(days=5))[carne.id]) == 0.0
+
+        # venta de hace dos días procesada después del cierre
+        ajustar_saldos({(carne.id, hoy - timedelta(days=2)): Decimal('-1')})
+        db.session.commit()
+        assert float(db.session.get(SaldoInventario, (carne.id, hoy - timedelta(days=1))).cantidad) == 5.0
+        assert float(db.session.get(SaldoInventario, (carne.id, hoy - timedelta(days=3))).cantidad) == 10.0
+
+        valuacion = valuacion_inventario(hoy - timedelta(days=1))
+        assert valuacion['total'] == 1000.0
+        assert valuacion['filas'][0]['nombre'] == 'Barbacoa'
+
+
+    def test_cierre_respeta_corte_de_cada_sucursal(self, db, monkeypatch):
+        """Un día sigue abierto mientras alguna sucursal no haya pasado su corte."""
+        from datetime import date
+        from backend.models.models import Sucursal, Ingrediente, SaldoInventario
+        from backend.services import dia_negocio
+        from backend.services.saldos_inventario import cerrar_dias
+
+        tarde = Sucursal(nombre='Corte tarde', hora_corte=8)
+        db.session.add(tarde)
+        db.session.flush()
+        db.session.add(Ingrediente(nombre='Cebolla', unidad='kg', stock_actual=Decimal('4'),
+                                   costo_unitario=Decimal('15'), sucursal_id=tarde.id))
+        db.session.commit()
+        # entre los dos cortes: el default ya cambió de día, la sucursal todavía no
+        monkeypatch.setattr(dia_negocio, 'hoy_negocio',
+                            lambda s=None: date(2026, 3, 10) if s == tarde.id else date(2026, 3, 11))
+
+        with pytest.raises(ValueError):
+            cerrar_dias(hasta=date(2026, 3, 10))
+        assert cerrar_dias() == 1
+        assert [s.fecha for s in SaldoInventario.query.all()] == [date(2026, 3, 9)]
+
+
+class TestPronosticoInventario:
+    def test_tasa_estacionalidad_cobertura_y_compra(self, db):
+        """El consumo por día de la semana proyecta la cobertura y la compra sugerida."""
+        from datetime import datetime, timedelta
+        from backend.models.models import Usuario, Ingrediente, MovimientoInventario
+        from backend.services.dia_negocio import hoy_negocio
+        from backend.services.pronostico_inventario import (
+            calcular_pronostico, PRONOSTICO_DIAS, PRONOSTICO_COBERTURA_DIAS,
+        )
+
+        admin = Usuario(nombre='Admin', email='admin.pronostico@test.mx', rol='admin')
+        admin.set_password('Test1234!')
+        tortilla = Ingrediente(nombre='Tortilla Maíz', unidad='kg', stock_actual=Decimal('10'),
+                               stock_minimo=Decimal('5'), costo_unitario=Decimal('20'))
+        sal = Ingrediente(nombre='Sal', unidad='kg', stock_actual=Decimal('3'),
+                          stock_minimo=Decimal('1'), costo_unitario=Decimal('10'))
+        db.session.add_all([admin, tortilla, sal])
+        db.session.flush()
+        hoy = hoy_negocio()
+        # 2 kg diarios, el doble en sábado (ventas) + 1 kg de merma el sábado
+        for n in range(1, PRONOSTICO_DIAS + 1):
+            dia = hoy - timedelta(days=n)
+            movs = [('salida_venta', '4' if dia.weekday() == 5 else '2')]
+            if dia.weekday() == 5:
+                movs.append(('merma', '1'))
+            for tipo, cantidad in movs:
+                db.session.add(MovimientoInventario(
+                    ingrediente_id=tortilla.id, tipo=tipo, cantidad=Decimal(cantidad),
+                    usuario_id=admin.id, fecha=datetime.utcnow() - timedelta(days=n), fecha_negocio=dia))
+        db.session.commit()
+
+        datos = calcular_pronostico(hoy)[None]
+        filas = {f['nombre']: f for f in datos['ingredientes']}
+        t = filas['Tortilla Maíz']
+        assert t['tasa_diaria'] == round(17 / 7, 3)
+        futuro = [5.0 if (hoy + timedelta(days=i)).weekday() == 5 else 2.0
+                  for i in range(PRONOSTICO_COBERTURA_DIAS)]
+        assert t['sugerido'] == round(sum(futuro) + 5 - 10, 3)
+        assert t['costo_estimado'] == round(t['sugerido'] * 20, 2)
+        assert 2 <= t['dias_cobertura'] <= 5
+        # sin consumo: no se acaba, y está arriba del mínimo
+        assert filas['Sal']['dias_cobertura'] is None
+        assert filas['Sal']['sugerido'] == 0
+        assert [c['nombre'] for c in datos['compras']] == ['Tortilla Maíz']
+        assert datos['ingredientes'][0]['nombre'] == 'Tortilla Maíz'
+
+    def test_cobertura_sin_existencias(self):
+        """Stock en cero o negativo da cobertura 0.0, no días negativos."""
+        from backend.services.pronostico_inventario import _cobertura
+
+        pronostico = [2.0, 2.0, 5.0]
+        assert _cobertura(0, pronostico) == 0.0
+        assert _cobertura(-3, pronostico) == 0.0
+        assert _cobertura(-3, [0.0, 0.0]) == 0.0
+        assert _cobertura(3, pronostico) == 1.5
+        assert _cobertura(100, pronostico) is None
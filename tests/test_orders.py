@@ -74,3 +74,295 @@ class TestPayment:
         assert pago.id is not None
         assert pago.metodo == 'efectivo'
         assert float(pago.monto) == float(orden.total)
+
+
+class TestKdsDeltas:
+    def test_delta_por_estacion(self, app, monkeypatch):
+        """Un detalle que ya no está pendiente se publica como remove."""
+        from datetime import datetime
+        from types import SimpleNamespace
+        from backend.services import kds
+
+        emitidos = []
+        monkeypatch.setattr(kds.socketio, 'emit', lambda evento, datos, **kw: emitidos.append(dict(datos, sala=kw['to'])))
+
+        orden = SimpleNamespace(id=9, estado='enviado', sucursal_id=None, mesa=SimpleNamespace(numero='4'),
+                                es_para_llevar=False, tiempo_registro=datetime(2026, 3, 10, 14))
+
+        def detalle(id, estacion, estado):
+            producto = SimpleNamespace(nombre=f'P{id}', estacion=SimpleNamespace(nombre=estacion))
+            return SimpleNamespace(id=id, orden=orden, orden_id=orden.id, producto=producto, producto_id=id,
+                                   cantidad=2, notas=None, estado=estado, tiempo_enviado=None)
+
+        with app.app_context():
+            kds.publicar_kds([
+                ('add', detalle(1, 'taquero', 'pendiente')),
+                ('update', detalle(2, 'taquero', 'listo')),
+                ('add', detalle(3, 'bebidas', 'pendiente')),
+            ])
+
+        por_estacion = {e['estacion']: e['cambios'] for e in emitidos}
+        assert sorted(por_estacion) == ['bebidas', 'taquero']
+        assert {e['sala'] for e in emitidos} == {'estacion:todas:bebidas', 'estacion:todas:taquero'}
+        assert por_estacion['taquero'][0]['item']['mesa'] == '4'
+        assert por_estacion['taquero'][1] == {'op': 'remove', 'item': {'id': 2, 'orden_id': 9}}
+        assert por_estacion['bebidas'][0]['op'] == 'add'
+
+    def test_marcar_orden_lista_en_lote(self, app, db, monkeypatch):
+        """Un POST marca todos los items de la estación y avisa una sola vez."""
+        from decimal import Decimal
+        from backend.models.models import Usuario, Estacion, Categoria, Producto, Orden, OrdenDetalle
+        from backend.routes import cocina
+
+        avisos = []
+        monkeypatch.setattr(cocina, 'emitir_kds', lambda deltas: None)
+        monkeypatch.setattr(cocina, 'emitir', lambda evento, datos, salas: avisos.append((evento, datos)))
+
+        taquero = Usuario(nombre='Taquero', email='taquero@test.mx', rol='taquero')
+        taquero.set_password('Test1234!')
+        estacion, categoria = Estacion(nombre='taquero'), Categoria(nombre='Tacos')
+        db.session.add_all([taquero, estacion, categoria])
+        db.session.flush()
+        taco = Producto(nombre='Taco', precio=Decimal('20'), categoria_id=categoria.id, estacion_id=estacion.id)
+        db.session.add(taco)
+        db.session.flush()
+        orden = Orden(estado='enviado', es_para_llevar=True)
+        db.session.add(orden)
+        db.session.flush()
+        db.session.add_all([OrdenDetalle(orden_id=orden.id, producto_id=taco.id, cantidad=1,
+                                         precio_unitario=Decimal('20'), estado='pendiente') for _ in range(3)])
+        db.session.commit()
+
+        with app.test_client() as client:
+            with client.session_transaction() as sess:
+                sess['user_id'], sess['rol'] = taquero.id, 'taquero'
+            resp = client.post(f'/cocina/taqueros/marcar/{orden.id}', json={})
+
+        assert resp.status_code == 200
+        assert len(resp.get_json()['marcados']) == 3
+        assert resp.get_json()['orden_completa'] is True
+        assert OrdenDetalle.query.filter_by(orden_id=orden.id, estado='listo').count() == 3
+        assert db.session.get(Orden, orden.id).estado == 'lista_para_entregar'
+        assert [(e, len(d['items'])) for e, d in avisos] == [('items_listos_notificacion', 3)]
+
+    def test_cola_cocina_local(self, app, monkeypatch):
+        """La cola se carga una vez, se actualiza con los deltas y la verificación corrige."""
+        from backend.services import cola_cocina, kds
+
+        def item(id, sucursal_id=1, cantidad=1):
+            return {'id': id, 'orden_id': 7, 'producto': 'Taco', 'cantidad': cantidad, 'notas': '',
+                    'mesa': '3', 'para_llevar': False, 'tiempo_registro': f'2026-03-10T14:00:0{id}',
+                    'sucursal_id': sucursal_id}
+
+        base = {1: item(1), 2: item(2, sucursal_id=2)}
+        cargas, publicadas = [], []
+        monkeypatch.setattr(cola_cocina, 'COLA_COCINA_MODO', 'local')
+        monkeypatch.setattr(cola_cocina, '_local', {})
+        monkeypatch.setattr(cola_cocina, '_desde_sql', lambda est: cargas.append(est) or dict(base))
+        monkeypatch.setattr(kds, 'emitir_kds', lambda entradas: publicadas.extend(entradas))
+
+        assert [i['id'] for i in cola_cocina.pendientes('taquero')] == [1, 2]
+        assert [i['id'] for i in cola_cocina.pendientes('taquero', 2)] == [2]
+
+        nuevo = {k: v for k, v in item(3).items() if k != 'sucursal_id'}
+        cola_cocina.aplicar([('taquero', 1, 'add', nuevo), ('taquero', 1, 'remove', {'id': 1, 'orden_id': 7})])
+        assert [i['id'] for i in cola_cocina.pendientes('taquero')] == [2, 3]
+        assert cargas == ['taquero']
+
+        # La base dice: 1 sigue pendiente, 3 nunca existió, 2 cambió de cantidad
+        base[2] = item(2, sucursal_id=2, cantidad=5)
+        with app.app_context():
+            diferencias = cola_cocina.verificar_cola(['taquero'])
+        assert sorted((d['detalle_id'], d['tipo']) for d in diferencias) == [
+            (1, 'faltante'), (2, 'distinto'), (3, 'sobrante')]
+        assert sorted((e[3]['id'], e[2]) for e in publicadas) == [(1, 'add'), (2, 'update'), (3, 'remove')]
+        assert all('sucursal_id' not in e[3] for e in publicadas)
+
+
+class TestSalasOrden:
+    def test_orden_sin_mesero_llega_a_la_sucursal(self, db):
+        """Delivery / para llevar: sin mesero, los avisos van a la sucursal."""
+        from backend.models.models import Orden
+        from backend.services.salas import salas_orden
+
+        assert salas_orden(Orden(mesero_id=None, sucursal_id=3)) == ['sucursal:3', 'sucursal:todas']
+        assert salas_orden(Orden(mesero_id=7, sucursal_id=None)) == ['usuario:7', 'sucursal:todas']
+
+
+class TestStockCarrito:
+    def test_ingrediente_compartido_entre_lineas(self, db):
+        """Dos productos con el mismo ingrediente no pasan si juntos exceden el stock."""
+        from decimal import Decimal
+        from backend.models.models import Categoria, Producto, Ingrediente, RecetaDetalle
+        from backend.utils import verificar_stock_carrito
+
+        categoria = Categoria(nombre='Tacos')
+        tortilla = Ingrediente(nombre='Tortilla', unidad='pieza', stock_actual=Decimal('5'), stock_minimo=Decimal('2'))
+        db.session.add_all([categoria, tortilla])
+        db.session.flush()
+        taco = Producto(nombre='Taco', precio=Decimal('20'), categoria_id=categoria.id)
+        gringa = Producto(nombre='Gringa', precio=Decimal('45'), categoria_id=categoria.id)
+        db.session.add_all([taco, gringa])
+        db.session.flush()
+        db.session.add_all([
+            RecetaDetalle(producto_id=taco.id, ingrediente_id=tortilla.id, cantidad_por_unidad=Decimal('1')),
+            RecetaDetalle(producto_id=gringa.id, ingrediente_id=tortilla.id, cantidad_por_unidad=Decimal('2')),
+        ])
+        db.session.commit()
+
+        resultados = verificar_stock_carrito([(taco.id, 3), (gringa.id, 2), (gringa.id, 1)])
+
+        assert [disponible for disponible, _, _ in resultados] == [True, False, True]
+        assert resultados[1][1][0]['stock_actual'] == 2.0  # lo que dejó la primera línea
+        assert resultados[2][2][0]['stock_actual'] == 2.0  # stock bajo tras apartar
+
+
+class TestCatalogoMenu:
+    def test_etag_y_nueva_version(self, app, db):
+        """El menú se sirve con ETag; solo cambia al invalidar la versión."""
+        from decimal import Decimal
+        from backend.extensions import cache
+        from backend.models.models import Usuario, Categoria, Producto, Orden
+        from backend.services.catalogo_menu import invalidar_menu
+
+        cache.clear()
+        invalidar_menu()
+        mesero = Usuario(nombre='Mesero', email='mesero.menu@test.mx', rol='mesero')
+        mesero.set_password('Test1234!')
+        categoria = Categoria(nombre='Tacos')
+        db.session.add_all([mesero, categoria])
+        db.session.flush()
+        taco = Producto(nombre='Taco', precio=Decimal('20'), categoria_id=categoria.id)
+        db.session.add(taco)
+        db.session.commit()
+
+        with app.test_client() as client:
+            with client.session_transaction() as sess:
+                sess['user_id'], sess['rol'] = mesero.id, 'mesero'
+            resp = client.get('/meseros/api/menu')
+            etag = resp.headers['ETag']
+            assert resp.get_json()['categorias'][0]['productos'][0]['precio'] == 20.0
+            assert client.get('/meseros/api/menu', headers={'If-None-Match': etag}).status_code == 304
+
+            taco.precio = Decimal('25')
+            db.session.commit()
+            # sin invalidar se sigue sirviendo la versión en caché
+            assert client.get('/meseros/api/menu', headers={'If-None-Match': etag}).status_code == 304
+
+            invalidar_menu()
+            resp = client.get('/meseros/api/menu', headers={'If-None-Match': etag})
+            assert resp.status_code == 200
+            assert resp.get_json()['categorias'][0]['productos'][0]['precio'] == 25.0
+            v = resp.headers['ETag'].strip('"')
+            assert 'immutable' in client.get(f'/meseros/api/menu?v={v}').headers['Cache-Control']
+
+            # la pantalla de la orden carga el catálogo desde la URL versionada
+            orden = Orden(mesero_id=mesero.id, estado='pendiente')
+            db.session.add(orden)
+            db.session.commit()
+            html = client.get(f'/meseros/ordenes/{orden.id}/detalle_orden').get_data(as_text=True)
+            assert f'data-menu-url="/meseros/api/menu?v={v}"' in html
+            assert 'Taco' not in html
+
+
+class TestOutboxPago:
+    def test_pago_total_difiere_efectos(self, app, db, monkeypatch):
+        """El pago confirma solo pago + evento; el outbox aplica la venta una vez."""
+        from decimal import Decimal
+        from backend.models.models import (
+            Usuario, Categoria, Producto, Orden, OrdenDetalle, Ingrediente, RecetaDetalle,
+            Cliente, Sale, EventoOutbox,
+        )
+        from backend.services import outbox
+
+        monkeypatch.setattr(outbox, 'OUTBOX_MODO', 'worker')
+        monkeypatch.setattr(outbox, 'programar_procesador', lambda app: None)
+
+        mesero = Usuario(nombre='Mesero', email='mesero.outbox@test.mx', rol='mesero')
+        mesero.set_password('Test1234!')
+        categoria = Categoria(nombre='Tacos')
+        carne = Ingrediente(nombre='Carne', unidad='kg', stock_actual=Decimal('10'))
+        cliente = Cliente(nombre='Cliente Frecuente')
+        db.session.add_all([mesero, categoria, carne, cliente])
+        db.session.flush()
+        taco = Producto(nombre='Taco', precio=Decimal('20'), categoria_id=categoria.id)
+        db.session.add(taco)
+        db.session.flush()
+        db.session.add(RecetaDetalle(producto_id=taco.id, ingrediente_id=carne.id,
+                                     cantidad_por_unidad=Decimal('0.1')))
+        orden = Orden(estado='lista_para_entregar', es_para_llevar=True,
+                      mesero_id=mesero.id, cliente_id=cliente.id)
+        db.session.add(orden)
+        db.session.flush()
+        db.session.add(OrdenDetalle(orden_id=orden.id, producto_id=taco.id, cantidad=3,
+                                    precio_unitario=Decimal('20'), estado='listo'))
+        db.session.commit()
+
+        with app.test_client() as client:
+            with client.session_transaction() as sess:
+                sess['user_id'], sess['rol'] = mesero.id, 'mesero'
+            resp = client.post(f'/meseros/ordenes/{orden.id}/pago', json={'metodo': 'tarjeta', 'monto': 1000})
+
+        assert resp.get_json()['orden_pagada'] is True
+        assert Sale.query.count() == 0
+        assert outbox.estado_outbox()['pendientes'] == 1
+
+        assert outbox.procesar_pendientes() == 1
+        assert outbox.procesar_pendientes() == 0
+        assert Sale.query.count() == 1
+        assert db.session.get(Ingrediente, carne.id).stock_actual == Decimal('9.7')
+        assert db.session.get(Cliente, cliente.id).visitas == 1
+        assert EventoOutbox.query.one().estado == 'procesado'
+        from backend.services.disponibilidad import unidades_disponibles
+        assert unidades_disponibles(taco.id) == (97, False)
+
+    def test_fallo_reintenta_despues(self, app, db, monkeypatch):
+        """Un manejador que falla deja el evento pendiente, pospuesto y sin efectos."""
+        from backend.models.models import EventoOutbox
+        from backend.services import outbox
+
+        def falla(datos):
+            raise RuntimeError('sin conexión')
+
+        monkeypatch.setitem(outbox._MANEJADORES, 'prueba', falla)
+        outbox.registrar_evento('prueba', {})
+        db.session.commit()
+
+        assert outbox.procesar_pendientes() == 0
+        evento = EventoOutbox.query.one()
+        assert (evento.estado, evento.intentos) == ('pendiente', 1)
+        assert 'sin conexión' in evento.ultimo_error
+        assert outbox.procesar_pendientes() == 0  # pospuesto: aún no vence
+        assert EventoOutbox.query.one().intentos == 1
+
+
+class TestEtaCocina:
+    def test_eta_por_cola_y_estacion_mas_lenta(self, app, monkeypatch):
+        """Cada orden espera las piezas de delante y termina con su estación más lenta."""
+        from datetime import datetime, timedelta
+        from backend.services import eta_cocina
+
+        ahora = datetime.utcnow()
+
+        def item(id, orden_id, producto_id, cantidad, hace_seg):
+            momento = (ahora - timedelta(seconds=hace_seg)).isoformat()
+            return {'id': id, 'orden_id': orden_id, 'producto_id': producto_id, 'cantidad': cantidad,
+                    'sucursal_id': 1, 'tiempo_registro': momento, 'tiempo_enviado': momento}
+
+        colas = {
+            'taquero': [item(1, 10, 1, 4, 100), item(2, 11, 1, 2, 0)],
+            'bebidas': [item(3, 11, 2, 1, 0)],
+        }
+        monkeypatch.setattr(eta_cocina, '_nombres_estaciones', lambda: list(colas))
+        monkeypatch.setattr(eta_cocina, '_items_estacion', lambda est, suc: colas[est])
+        monkeypatch.setattr(eta_cocina, '_estadisticas', lambda est, suc: (
+            {1: 400.0} if est == 'taquero' else {}, 30.0))
+        monkeypatch.setattr(eta_cocina, 'ETA_COCCION_DEFAULT_SEG', 120.0)
+
+        with app.app_context():
+            etas = eta_cocina.calcular_etas(1)
+
+        assert etas[10]['segundos'] == 300                       # 400 - 100 transcurridos
+        assert etas[11]['estaciones'] == {'taquero': 4 * 30 + 400, 'bebidas': 120}
+        assert etas[11]['segundos'] == 520
+        assert etas[11]['eta_ts'] - etas[10]['eta_ts'] == 220 * 1000
@@ -65,3 +65,486 @@ class TestAuditLog:
         login(client, 'super_test', 'Test1234!')
         resp = client.get('/admin/auditoria/')
         assert resp.status_code == 200
+
+
+class TestResumenVentas:
+    def _venta(self, db, usuario_id, producto_id, fecha_hora, cantidad=2, precio=Decimal('50.00')):
+        from backend.models.models import Sale, SaleItem
+
+        venta = Sale(usuario_id=usuario_id, total=precio * cantidad,
+                     estado='cerrada', fecha_hora=fecha_hora)
+        db.session.add(venta)
+        db.session.flush()
+        item = SaleItem(sale_id=venta.id, producto_id=producto_id, cantidad=cantidad,
+                        precio_unitario=precio, subtotal=precio * cantidad)
+        db.session.add(item)
+        db.session.flush()
+        return venta, [item]
+
+    def _usuario(self, db):
+        from backend.models.models import Usuario
+
+        user = Usuario(nombre='Mesero Rollup', email='rollup@test.mx', rol='mesero')
+        user.set_password('Test1234!')
+        db.session.add(user)
+        db.session.flush()
+        return user
+
+    def _producto(self, db):
+        from backend.models.models import Categoria, Producto
+
+        cat = Categoria(nombre='Tacos')
+        db.session.add(cat)
+        db.session.flush()
+        prod = Producto(nombre='Taco de barbacoa', precio=Decimal('50.00'), categoria_id=cat.id)
+        db.session.add(prod)
+        db.session.flush()
+        return prod
+
+    def test_reconstruir_y_consultar(self, db):
+        """El rollup reconstruido coincide con las ventas crudas."""
+        from datetime import date, datetime
+        from backend.services.resumen_ventas import reconstruir_resumen, consultar_resumen
+
+        admin_user = self._usuario(db)
+        prod = self._producto(db)
+        # 20:00 y 21:00 UTC = 14:00 y 15:00 en Ciudad de México
+        self._venta(db, admin_user.id, prod.id, datetime(2026, 3, 10, 20))
+        self._venta(db, admin_user.id, prod.id, datetime(2026, 3, 10, 21), cantidad=1)
+        db.session.commit()
+
+        assert reconstruir_resumen() > 0
+        dia = date(2026, 3, 10)
+        total = consultar_resumen('total', dia, dia)
+        assert len(total) == 1
+        assert total[0].num_ventas == 2
+        assert total[0].total == 150.0
+
+        productos = consultar_resumen('producto', dia, dia)
+        assert productos[0].clave == str(prod.id)
+        assert productos[0].cantidad == 3
+
+        horas = sorted(int(r.clave) for r in consultar_resumen('hora', dia, dia))
+        assert horas == [14, 15]
+
+    def test_acumular_venta_incremental(self, db):
+        """acumular_venta suma sobre la fila existente del día."""
+        from datetime import datetime
+        from backend.models.models import ResumenVentaDiaria
+        from backend.services.resumen_ventas import acumular_venta, consultar_resumen
+
+        admin_user = self._usuario(db)
+        prod = self._producto(db)
+        ayer = datetime(2026, 3, 10, 20)
+        for _ in range(2):
+            venta, items = self._venta(db, admin_user.id, prod.id, ayer)
+            acumular_venta(venta, items)
+        db.session.commit()
+
+        filas = ResumenVentaDiaria.query.filter_by(dimension='total').all()
+        assert len(filas) == 1
+        assert filas[0].num_ventas == 2
+
+        meseros = consultar_resumen('mesero', ayer.date(), ayer.date())
+        assert meseros[0].clave == str(admin_user.id)
+        assert meseros[0].total == 200.0
+
+    def test_venta_abierta_entra_al_cerrarse(self, db):
+        """Ventas abiertas (routes/ventas) no cuentan hasta cerrarse; partidas posteriores se suman."""
+        from datetime import datetime
+        from backend.models.models import SaleItem
+        from backend.services.resumen_ventas import (
+            reconstruir_resumen, acumular_venta, acumular_item, consultar_resumen,
+        )
+
+        admin_user = self._usuario(db)
+        prod = self._producto(db)
+        dia = datetime(2026, 3, 10, 20)
+        self._venta(db, admin_user.id, prod.id, dia)
+        abierta, items = self._venta(db, admin_user.id, prod.id, dia, cantidad=1)
+        abierta.estado = 'abierta'
+        db.session.commit()
+
+        reconstruir_resumen()
+        assert consultar_resumen('total', dia.date(), dia.date())[0].num_ventas == 1
+
+        abierta.estado = 'cerrada'
+        acumular_venta(abierta, items)
+        extra = SaleItem(sale_id=abierta.id, producto_id=prod.id, cantidad=1,
+                         precio_unitario=Decimal('50.00'), subtotal=Decimal('50.00'))
+        db.session.add(extra)
+        abierta.total += extra.subtotal
+        acumular_item(abierta, extra)
+        db.session.commit()
+
+        total = consultar_resumen('total', dia.date(), dia.date())[0]
+        assert (total.num_ventas, total.total) == (2, 200.0)
+        assert consultar_resumen('producto', dia.date(), dia.date())[0].cantidad == 4
+        reconstruir_resumen()
+        assert consultar_resumen('total', dia.date(), dia.date())[0].total == 200.0
+
+
+class TestDiaNegocio:
+    def test_corte_nocturno(self, app):
+        """Antes de la hora de corte local, el timestamp cuenta al día anterior."""
+        from datetime import date, datetime
+        from backend.services.dia_negocio import dia_negocio
+
+        with app.app_context():
+            # 08:30 UTC = 02:30 en Ciudad de México; corte default a las 04:00
+            assert dia_negocio(datetime(2026, 3, 11, 8, 30)) == date(2026, 3, 10)
+            assert dia_negocio(datetime(2026, 3, 11, 10, 30)) == date(2026, 3, 11)
+
+    def test_fecha_negocio_al_insertar(self, db):
+        """Sale y Pago reciben fecha_negocio con la hora de corte de su sucursal."""
+        from datetime import date, datetime
+        from backend.models.models import Sucursal, Sale, Orden, Pago, Usuario
+        from backend.services.dia_negocio import invalidar_horas_corte
+
+        suc = Sucursal(nombre='Centro', hora_corte=2)
+        cajero = Usuario(nombre='Cajero', email='cajero@test.mx', rol='mesero')
+        cajero.set_password('Test1234!')
+        db.session.add_all([suc, cajero])
+        db.session.flush()
+        invalidar_horas_corte()
+
+        momento = datetime(2026, 3, 11, 8, 30)  # 02:30 local
+        venta = Sale(usuario_id=cajero.id, total=Decimal('10.00'), estado='cerrada',
+                     fecha_hora=momento, sucursal_id=suc.id)
+        orden = Orden(sucursal_id=suc.id, estado='pagada')
+        db.session.add_all([venta, orden])
+        db.session.flush()
+        pago = Pago(orden_id=orden.id, metodo='efectivo', monto=Decimal('10.00'), fecha=momento,
+                    registrado_por=cajero.id)
+        db.session.add(pago)
+        db.session.commit()
+
+        assert venta.fecha_negocio == date(2026, 3, 11)
+        assert pago.fecha_negocio == date(2026, 3, 11)
+        assert orden.fecha_negocio is not None
+
+    def test_hora_corte_editada_en_otro_worker(self, db, monkeypatch):
+        """Un cambio publicado por otro worker se ve al vencer la vigencia local."""
+        from backend.extensions import cache
+        from backend.models.models import Sucursal
+        from backend.services import dia_negocio
+
+        suc = Sucursal(nombre='Norte', hora_corte=2)
+        db.session.add(suc)
+        db.session.commit()
+        dia_negocio.invalidar_horas_corte()
+        assert dia_negocio.hora_corte(suc.id) == 2
+
+        # otro worker edita la sucursal: cambia la base y la versión compartida
+        suc.hora_corte = 6
+        db.session.commit()
+        cache.cache.inc(dia_negocio.CLAVE_VERSION)
+        assert dia_negocio.hora_corte(suc.id) == 2  # todavía vigente en este proceso
+
+        monkeypatch.setitem(dia_negocio._vigencia, 'hasta', 0.0)
+        assert dia_negocio.hora_corte(suc.id) == 6
+
+    def test_orden_cuenta_el_dia_de_su_pago(self, db):
+        """Orden abierta antes del corte y cobrada después: cuenta al día del pago."""
+        from datetime import date, datetime
+        from backend.models.models import Orden, Pago, Usuario
+        from backend.services.dia_negocio import ordenes_pagadas_en
+
+        cajero = Usuario(nombre='Cajero', email='cajero.pago@test.mx', rol='mesero')
+        cajero.set_password('Test1234!')
+        orden = Orden(estado='pagada', propina=Decimal('20.00'),
+                      tiempo_registro=datetime(2026, 3, 11, 9, 30))  # 03:30 local → día 10
+        db.session.add_all([cajero, orden])
+        db.session.flush()
+        db.session.add(Pago(orden_id=orden.id, metodo='efectivo', monto=Decimal('100.00'),
+                            fecha=datetime(2026, 3, 11, 10, 30), registrado_por=cajero.id))
+        db.session.commit()
+
+        assert orden.fecha_negocio == date(2026, 3, 10)
+        pagadas = lambda d: [i for (i,) in db.session.execute(ordenes_pagadas_en(d, d)).all()]
+        assert pagadas(date(2026, 3, 11)) == [orden.id]
+        assert pagadas(date(2026, 3, 10)) == []
+
+
+class TestExportarCsv:
+    def test_generar_csv_por_bloques(self):
+        """El generador vacía el buffer cada lote y no pierde filas."""
+        from backend.services.exportar_csv import generar_csv
+
+        filas = ([i, f'prod {i}'] for i in range(5))
+        bloques = list(generar_csv(['id', 'nombre'], filas, lote=2))
+        assert len(bloques) == 3
+        lineas = ''.join(bloques).splitlines()
+        assert lineas[0] == 'id,nombre'
+        assert lineas[-1] == '4,prod 4'
+        assert len(lineas) == 6
+
+
+class TestCacheReportes:
+    def test_invalidacion_solo_rango_abierto(self, app):
+        """Un evento de hoy invalida el rango abierto; uno de un día cerrado, también los cerrados."""
+        from datetime import timedelta
+        from flask import jsonify
+        from backend.extensions import cache
+        from backend.services.cache_reportes import cache_reporte, invalidar_reportes, invalidar_reportes_cerrados
+        from backend.services.dia_negocio import hoy_negocio
+
+        with app.test_request_context('/admin/reportes/api/ventas'):
+            cache.clear()
+            hoy = hoy_negocio()
+            llamadas = {'abierto': 0, 'cerrado': 0}
+
+            @cache_reporte(lambda: (hoy, hoy))
+            def abierto():
+                llamadas['abierto'] += 1
+                return jsonify(n=llamadas['abierto'])
+
+            @cache_reporte(lambda: (hoy - timedelta(days=7), hoy - timedelta(days=1)))
+            def cerrado():
+                llamadas['cerrado'] += 1
+                return jsonify(n=llamadas['cerrado'])
+
+            for _ in range(2):
+                abierto()
+                cerrado()
+            assert llamadas == {'abierto': 1, 'cerrado': 1}
+
+            invalidar_reportes(None)
+            assert abierto().get_json() == {'n': 2}
+            assert cerrado().get_json() == {'n': 1}
+
+            # un evento con fecha de un día ya cerrado sí invalida los cerrados
+            invalidar_reportes(None, fecha=hoy - timedelta(days=2))
+            assert abierto().get_json() == {'n': 3}
+            assert cerrado().get_json() == {'n': 2}
+
+            invalidar_reportes_cerrados()
+            assert abierto().get_json() == {'n': 3}
+            assert cerrado().get_json() == {'n': 3}
+
+
+class TestColaPdf:
+    def test_clave_ignora_contexto_volatil(self):
+        """La clave depende del template y los datos, no de la hora de generación."""
+        from datetime import datetime
+        from backend.services.pdf_generator import clave_pdf
+
+        a = clave_pdf('pdf/ventas.html', {'total': 10, 'now': datetime(2026, 1, 1)})
+        b = clave_pdf('pdf/ventas.html', {'total': 10, 'now': datetime(2026, 2, 1)})
+        assert a == b
+        assert a != clave_pdf('pdf/ventas.html', {'total': 11})
+        assert a != clave_pdf('pdf/productos.html', {'total': 10})
+
+    def test_pdf_en_cache_no_se_encola(self, app, tmp_path, monkeypatch):
+        """Un PDF ya generado se regresa como listo sin tocar el pool."""
+        from backend.services import pdf_generator
+
+        monkeypatch.setattr(pdf_generator, 'PDF_CACHE_DIR', str(tmp_path))
+        clave = pdf_generator.clave_pdf('pdf/ventas.html', {'total': 10})
+        (tmp_path / f'{clave}.pdf').write_bytes(b'%PDF')
+
+        with app.test_request_context():
+            assert pdf_generator.encolar_pdf('pdf/ventas.html', total=10) == (clave, 'listo')
+        assert pdf_generator.ruta_pdf(clave) == str(tmp_path / f'{clave}.pdf')
+        assert pdf_generator.estado_pdf('../../etc/passwd') is None
+
+
+class TestDashboardSnapshot:
+    def test_kpis_y_etag(self, db, monkeypatch):
+        """Agregados del periodo en SQL; el ETag solo cambia si cambian los datos."""
+        from datetime import datetime, timedelta
+        from backend.models.models import Sale, Usuario
+        from backend.services import contadores_kpi
+        from backend.services.dashboard import snapshot_dashboard, etag_snapshot
+        from backend.services.dia_negocio import dia_negocio
+
+        monkeypatch.setattr(contadores_kpi, 'kpis_dia', lambda *a, **k: None)
+
+        cajero = Usuario(nombre='Cajero', email='cajero@test.mx', rol='mesero')
+        cajero.set_password('Test1234!')
+        db.session.add(cajero)
+        db.session.flush()
+        momento = datetime(2026, 3, 10, 20)  # 14:00 local
+        hoy = dia_negocio(momento)
+        for total, dias in ((Decimal('100.00'), 0), (Decimal('50.00'), 0), (Decimal('30.00'), 1)):
+            db.session.add(Sale(usuario_id=cajero.id, total=total, estado='cerrada',
+                                fecha_hora=momento - timedelta(days=dias)))
+        db.session.commit()
+
+        snap = snapshot_dashboard(hoy, hoy, hoy)
+        assert snap['kpis']['ventasHoy'] == 150.0
+        assert snap['kpis']['ordenesHoy'] == 2
+        assert snap['kpis']['ticketPromedio'] == 75.0
+        assert snap['ventas_7dias']['data'][-2:] == [30.0, 150.0]
+        assert etag_snapshot(snap) == etag_snapshot(snapshot_dashboard(hoy, hoy, hoy))
+
+        db.session.add(Sale(usuario_id=cajero.id, total=Decimal('5.00'), estado='cerrada', fecha_hora=momento))
+        db.session.commit()
+        assert etag_snapshot(snap) != etag_snapshot(snapshot_dashboard(hoy, hoy, hoy))
+
+    def test_hoy_desde_contadores(self, db, monkeypatch):
+        """Con contadores del día no corren las consultas de KPIs ni propinas."""
+        from datetime import datetime, timedelta
+        from backend.models.models import Sale, Usuario
+        from backend.services import contadores_kpi, dashboard
+        from backend.services.dia_negocio import dia_negocio
+
+        monkeypatch.setattr(contadores_kpi, 'kpis_dia', lambda *a, **k: {
+            'ventas': 200.0, 'ordenes': 4, 'ticket': 50.0, 'propinas': 12.0, 'por_hora': {}})
+        monkeypatch.setattr(contadores_kpi, 'top_productos_dia', lambda *a, **k: [('Pastor', 9)])
+        monkeypatch.setattr(dashboard, '_propinas', lambda *a: pytest.fail('consultó propinas'))
+        monkeypatch.setattr(dashboard, '_top_productos', lambda *a: pytest.fail('consultó ranking'))
+
+        cajero = Usuario(nombre='Cajero', email='cajero@test.mx', rol='mesero')
+        cajero.set_password('Test1234!')
+        db.session.add(cajero)
+        db.session.flush()
+        momento = datetime(2026, 3, 10, 20)
+        hoy = dia_negocio(momento)
+        for dias in (0, 1):
+            db.session.add(Sale(usuario_id=cajero.id, total=Decimal('30.00'), estado='cerrada',
+                                fecha_hora=momento - timedelta(days=dias)))
+        db.session.commit()
+
+        snap = dashboard.snapshot_dashboard(hoy, hoy, hoy)
+        assert snap['kpis'] == {'ventasHoy': 200.0, 'ordenesHoy': 4, 'ticketPromedio': 50.0, 'propinas': 12.0}
+        assert snap['ventas_7dias']['data'][-2:] == [30.0, 200.0]
+        assert snap['top_productos'] == {'labels': ['Pastor'], 'data': [9]}
+
+    def test_delta_solo_secciones_cambiadas(self, app, db, monkeypatch):
+        """La publicación en tiempo real compara contra el último estado y emite solo lo nuevo."""
+        from backend.extensions import cache
+        from backend.models.models import Sale, Usuario
+        from backend.services import contadores_kpi
+        from backend.services.dashboard_tiempo_real import publicar_sala
+
+        monkeypatch.setattr(contadores_kpi, 'kpis_dia', lambda *a, **k: None)
+        cache.clear()
+        cajero = Usuario(nombre='Cajero', email='cajero@test.mx', rol='mesero')
+        cajero.set_password('Test1234!')
+        db.session.add(cajero)
+        db.session.commit()
+
+        assert 'kpis' in publicar_sala(None, 'today')
+        assert publicar_sala(None, 'today') == []
+
+        db.session.add(Sale(usuario_id=cajero.id, total=Decimal('5.00'), estado='cerrada'))
+        db.session.commit()
+        assert publicar_sala(None, 'today') == ['kpis', 'ventas_7dias']
+
+
+class TestContadoresKpi:
+    def test_movimientos_venta(self, app):
+        """Una venta incrementa su sucursal y la vista "todas" en su hora local."""
+        from datetime import date, datetime
+        from types import SimpleNamespace
+        from backend.services.contadores_kpi import movimientos_venta, movimientos_propina
+
+        with app.app_context():
+            venta = SimpleNamespace(id=41, fecha_hora=datetime(2026, 3, 10, 20), fecha_negocio=date(2026, 3, 10),
+                                    sucursal_id=3, total=Decimal('120.50'), usuario_id=7)
+            items = [SimpleNamespace(producto_id=1, cantidad=2)]
+            movs = movimientos_venta(venta, items)['v41']
+
+            assert ('hincrbyfloat', 'kpi:3:2026-03-10', 'ventas', 120.5) in movs
+            assert ('hincrby', 'kpi:todas:2026-03-10', 'ordenes:14', 1) in movs
+            assert ('zincrby', 'kpi:3:2026-03-10:productos', 2, '1') in movs
+            assert ('zincrby', 'kpi:todas:2026-03-10:meseros', 120.5, '7') in movs
+
+            # la propina cuenta en el día en que se liquidó la orden, no en el que se abrió
+            orden = SimpleNamespace(id=9, fecha_negocio=date(2026, 3, 9), fecha_pago=datetime(2026, 3, 10, 20),
+                                    sucursal_id=None, propina=Decimal('0'))
+            assert movimientos_propina(orden) == {}
+            orden.propina = Decimal('15')
+            assert movimientos_propina(orden) == {
+                'p9': [('hincrbyfloat', 'kpi:todas:2026-03-10', 'propinas', 15.0)]}
+
+
+    def test_sql_solo_ventas_cerradas(self, db):
+        """La reconstrucción ignora ventas abiertas y anota cada venta y partida como evento."""
+        from datetime import datetime
+        from types import SimpleNamespace
+        from backend.models.models import Sale, SaleItem, Usuario, Categoria, Producto
+        from backend.services.contadores_kpi import _calcular_sql, movimientos_item
+        from backend.services.dia_negocio import dia_negocio
+
+        mesero = Usuario(nombre='Mesero KPI', email='kpi@test.mx', rol='mesero')
+        mesero.set_password('Test1234!')
+        cat = Categoria(nombre='Tacos')
+        db.session.add_all([mesero, cat])
+        db.session.flush()
+        prod = Producto(nombre='Taco de suadero', precio=Decimal('40.00'), categoria_id=cat.id)
+        db.session.add(prod)
+        db.session.flush()
+        momento = datetime(2026, 3, 10, 20)
+        ids = {}
+        for estado in ('cerrada', 'abierta'):
+            venta = Sale(usuario_id=mesero.id, total=Decimal('80.00'), estado=estado, fecha_hora=momento)
+            db.session.add(venta)
+            db.session.flush()
+            item = SaleItem(sale_id=venta.id, producto_id=prod.id, cantidad=2,
+                            precio_unitario=Decimal('40.00'), subtotal=Decimal('80.00'))
+            db.session.add(item)
+            db.session.flush()
+            ids[estado] = (venta.id, item.id)
+        db.session.commit()
+
+        valores = _calcular_sql(None, dia_negocio(momento))
+        assert (valores['ventas'], valores['ordenes']) == (80.0, 1)
+        assert valores['productos'] == {str(prod.id): 2}
+        venta_id, item_id = ids['cerrada']
+        assert valores['eventos'] == {f'v{venta_id}', f'v{venta_id}:{item_id}'}
+
+        # una partida agregada después de cerrar suma importe y unidades, no órdenes
+        venta = SimpleNamespace(id=venta_id, fecha_hora=momento, fecha_negocio=dia_negocio(momento),
+                                sucursal_id=None, usuario_id=mesero.id)
+        extra = SimpleNamespace(id=99, producto_id=prod.id, cantidad=1, subtotal=Decimal('40.00'))
+        movs = movimientos_item(venta, extra)[f'v{venta_id}:99']
+        assert ('hincrbyfloat', f'kpi:todas:{venta.fecha_negocio}', 'ventas', 40.0) in movs
+        assert not any(m[0] == 'hincrby' for m in movs)
+
+
+class TestTiemposCocina:
+    def test_percentiles_y_transiciones(self, db):
+        """p50/p90 nearest-rank por producto y tiempos sellados por las transiciones."""
+        from datetime import datetime, timedelta
+        from backend.models.models import Estacion, Categoria, Producto, Orden, OrdenDetalle
+        from backend.services.tiempos_cocina import estadisticas_preparacion
+
+        estacion, categoria = Estacion(nombre='taquero'), Categoria(nombre='Tacos')
+        db.session.add_all([estacion, categoria])
+        db.session.flush()
+        taco = Producto(nombre='Taco', precio=Decimal('20'), categoria_id=categoria.id, estacion_id=estacion.id)
+        db.session.add(taco)
+        db.session.flush()
+
+        historica = Orden(estado='pagada')
+        db.session.add(historica)
+        db.session.flush()
+        listo = datetime.utcnow()
+        db.session.add_all([
+            OrdenDetalle(orden_id=historica.id, producto_id=taco.id, estado='listo',
+                         tiempo_enviado=listo - timedelta(minutes=m), tiempo_listo=listo)
+            for m in range(1, 11)
+        ])
+
+        nueva = Orden(estado='pendiente')
+        db.session.add(nueva)
+        db.session.flush()
+        detalle = OrdenDetalle(orden_id=nueva.id, producto_id=taco.id, estado='pendiente')
+        db.session.add(detalle)
+        db.session.commit()
+        assert detalle.tiempo_enviado is None
+
+        nueva.estado = 'enviado'
+        db.session.commit()
+        assert detalle.tiempo_enviado is not None
+        detalle.estado = 'listo'
+        db.session.commit()
+        assert detalle.tiempo_listo >= detalle.tiempo_enviado
+
+        dia = historica.fecha_negocio
+        fila, = estadisticas_preparacion('producto', dia, dia)
+        assert fila['muestras'] == 11
+        assert (fila['p50'], fila['p90']) == (300.0, 540.0)
+        assert estadisticas_preparacion('estacion', dia, dia)[0]['clave'] == 'taquero'